@@ -0,0 +1,5 @@
+"""
+Rackspace Cloud Backup API Asyncio Functionality
+
+Note: Requires Python 3.5+ and aiohttp (pip install python-cloudbackup-sdk[aio])
+"""
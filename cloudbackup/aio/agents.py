@@ -0,0 +1,153 @@
+"""
+Rackspace Cloud Backup Agent API (asyncio)
+"""
+import json
+import logging
+
+from cloudbackup.aio.command import AsyncCommand
+from cloudbackup.client.agents import AgentConfiguration, AgentConfigurationNotAvailable, AgentDetails, AgentDetailsNotAvailable
+
+
+class Agents(AsyncCommand):
+    """
+    Asynchronous version of cloudbackup.client.agents.Agents
+
+    Note: Results are returned directly and also cached the same way as the
+        synchronous API, see AgentDetails() and AgentConfiguration()
+    """
+
+    def __init__(self, sslenabled, authenticator, apihost, api_version=1, project_id=None, transport=None):
+        """
+        Initialize the Agent access
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+          api_version - version of the API
+          project_id - Project Id used by API v2
+          transport - (optional) cloudbackup.aio.command.AsyncTransport to share
+        """
+        super(Agents, self).__init__(sslenabled, authenticator, apihost, transport=transport)
+        self.log = logging.getLogger(__name__)
+        self.agents = {}
+        self.configurations = {}
+
+        if type(api_version) is int:
+            self.api_version = api_version
+        else:
+            self.api_version = 1
+        self.project_id = project_id
+
+    async def __headers(self):
+        if self.api_version == 1:
+            return await self.BuildHeaders()
+        else:
+            return await self.BuildHeaders(project_id=self.project_id)
+
+    async def WakeAgents(self):
+        """
+        Using the API move all agents to active poll mode
+
+        Returns the HTTP status code
+        """
+        headers = await self.__headers()
+        if self.api_version == 1:
+            res = await self.Request('POST', self.BuildUri('/v1.0/user/wakeupagents'),
+                                     headers=headers)
+        else:
+            o = {}
+            o['event'] = 'agent_activate'
+            o['mode'] = 'active'
+            res = await self.Request('POST',
+                                     self.BuildUri('/v{0}/{1}/events'.format(self.api_version,
+                                                                             self.project_id)),
+                                     headers=headers, data=json.dumps(o))
+        self.log.debug('Wake Agent: code = {0:}, reason = {1:}'.format(res.status_code, res.reason))
+        return res.status_code
+
+    async def GetAgentsFromApi(self, page_size=100):
+        """
+        Lookup the associated agents and return a list of their IDs
+          page_size - number of agents retrieved per request (API v2 and newer)
+        """
+        if self.api_version == 1:
+            headers = await self.__headers()
+            res = await self.Request('GET', self.BuildUri('/v1.0/user/agents'), headers=headers)
+            if res.status_code == 200:
+                return [agent['MachineAgentId'] for agent in res.json()]
+            self.log.error('Unable to retrieve agent list system return code ' + str(res.status_code) + ' reason = ' + res.reason)
+            return []
+
+        try:
+            agents = await self.RequestPaginated(self.BuildUri('/v{0}/{1}/agents'.format(self.api_version,
+                                                                                         self.project_id)),
+                                                 self.__headers, 'agents', page_size=page_size)
+        except RuntimeError as ex:
+            self.log.error('Unable to retrieve agent list: ' + str(ex))
+            return []
+        return [agent['id'] for agent in agents]
+
+    async def GetAgentDetails(self, machine_agent_id):
+        """
+        Retrieve all the information regarding the specified Agent ID
+
+        Returns a cloudbackup.client.agents.AgentDetails instance or None on failure
+        """
+        headers = await self.__headers()
+        if self.api_version == 1:
+            uri = self.BuildUri('/v1.0/agent/{0}'.format(machine_agent_id))
+        else:
+            uri = self.BuildUri('/v{0}/{1}/agents/{2}'.format(self.api_version,
+                                                              self.project_id,
+                                                              machine_agent_id))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code == 200:
+            details = AgentDetails(details=res.json(), version=self.api_version)
+            self.agents[machine_agent_id] = details
+            return details
+        else:
+            self.log.error('Unable to retrieve agent details for agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' reason = ' + res.reason)
+            return None
+
+    async def GetAgentConfiguration(self, machine_agent_id):
+        """
+        Retrieve the Configuration for the given agent
+
+        Returns a cloudbackup.client.agents.AgentConfiguration instance or None on failure
+        """
+        headers = await self.__headers()
+        if self.api_version == 1:
+            uri = self.BuildUri('/v1.0/agent/configuration/{0}'.format(machine_agent_id))
+        else:
+            uri = self.BuildUri('/v{0}/{1}/agents/{2}/configuration'.format(self.api_version,
+                                                                            self.project_id,
+                                                                            machine_agent_id))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code == 200:
+            configuration = AgentConfiguration(configuration=res.json(), version=self.api_version)
+            self.configurations[machine_agent_id] = configuration
+            return configuration
+        else:
+            self.log.error('Unable to retrieve agent configuration for agent id ' + str(machine_agent_id) + '. Server returned ' + str(res.status_code) + ': ' + res.text + ' Reason: ' + res.reason)
+            return None
+
+    def AgentDetails(self, machine_agent_id):
+        """
+        The AgentDetails object describing the agent with the given machine_agent_id
+        """
+        try:
+            return self.agents[machine_agent_id]
+        except LookupError:
+            msg = 'Machine Agent Id ({0:}) not available. Did you call GetAgentDetails() for that agent?'.format(machine_agent_id)
+            self.log.error(msg)
+            raise AgentDetailsNotAvailable(msg)
+
+    def AgentConfiguration(self, machine_agent_id):
+        """
+        Return the AgentConfiguration object containing the configuration for the agent with the given machine_agent_id
+        """
+        try:
+            return self.configurations[machine_agent_id]
+        except LookupError:
+            msg = 'Machine Agent Id ({0:}) not available. Did you call GetAgentConfiguration() for that agent?'.format(machine_agent_id)
+            self.log.error(msg)
+            raise AgentConfigurationNotAvailable(msg)
@@ -0,0 +1,325 @@
+"""
+Rackspace Cloud Backup Backup and Restore API (asyncio)
+"""
+import json
+import logging
+
+from cloudbackup.aio.command import AsyncCommand
+from cloudbackup.client.backup import BackupConfigurationV2, _start_retry_rules
+
+
+class Backups(AsyncCommand):
+    """
+    Asynchronous version of cloudbackup.client.backup.Backups
+    """
+
+    def __init__(self, sslenabled, authenticator, apihost, api_version=1,
+                 project_id=None, transport=None):
+        """
+        Initialize the backups
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+
+          api_version - Version of the RCBU API
+          project_id - User's tenant id
+          transport - (optional) cloudbackup.aio.command.AsyncTransport to share
+        """
+        super(Backups, self).__init__(sslenabled, authenticator, apihost, transport=transport)
+        self.log = logging.getLogger(__name__)
+
+        if type(api_version) is int:
+            self.api_version = api_version
+        else:
+            self.api_version = 1
+        self.project_id = project_id
+
+    async def StartBackup(self, backup_config_id, retry=20):
+        """
+        Start a backup with the given backup configuration id
+
+        Returns the snapshot id (v1) or backup id (v2)
+        """
+        if self.api_version == 1:
+            headers = await self.BuildHeaders(content_type='application/json')
+            uri = self.BuildUri('/v1.0/backup/action-requested')
+            o = {}
+            o['Action'] = 'StartManual'
+            o['Id'] = backup_config_id
+            expected_status = 200
+        else:
+            headers = await self.BuildHeaders(project_id=self.project_id)
+            uri = self.BuildUri('/v{0}/{1}/backups'.format(self.api_version,
+                                                            self.project_id))
+            o = {}
+            o['configuration_id'] = backup_config_id
+            o['state'] = 'start_requested'
+            expected_status = 201
+        res = await self.Request('POST', uri, headers=headers, data=json.dumps(o),
+                                 retry_rules=_start_retry_rules(retry))
+        self.log.info('start backup return code %s', res.status_code)
+
+        if res.status_code == 403:
+            raise RuntimeError('Start Backup Failed - Access Forbidden: '
+                               'error code ({0:}) - {1:} - {2:}'
+                               .format(res.status_code, res.reason, res.text))
+        elif res.status_code != expected_status:
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            raise RuntimeError('Start Backup Failed - error code '
+                               '({0:}) - {1:} - {2:}'
+                               .format(res.status_code, res.reason, res.text))
+
+        if self.api_version == 1:
+            return res.text
+        else:
+            return res.json()['id']
+
+    async def GetBackupProgressV1(self, snapshot_id):
+        """
+        Get the progress of the backup for the given snapshot id for a V1 Backup
+        """
+        headers = await self.BuildHeaders()
+        res = await self.Request('GET', self.BuildUri('/v1.0/backup/' + str(snapshot_id)),
+                                 headers=headers)
+        if res.status_code != 200:
+            self.log.warning('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            raise RuntimeError('Get Backup Progress Failed - error code ({0:}) - {1:} - {2:}'.format(res.status_code, res.reason, res.text))
+        return res.json()
+
+    async def GetBackupProgressV2(self, snapshot_id):
+        """
+        Get the progress of the backup for the given snapshot id for a V2 Backup
+        """
+        headers = await self.BuildHeaders(project_id=self.project_id)
+        uri = self.BuildUri('/v{0}/{1}/backups/{2}'.format(self.api_version,
+                                                           self.project_id,
+                                                           snapshot_id))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code != 200:
+            self.log.warning('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            raise RuntimeError('Get Backup Progress Failed - error code ({0:}) - {1:} - {2:}'.format(res.status_code, res.reason, res.text))
+        return res.json()
+
+    async def GetCompletedBackups(self, backup_config_id, page_size=100):
+        """
+        Retrieves all the backups completed for a Backup Configuration
+          page_size - number of backups retrieved per request (API v2 and newer)
+        """
+        if self.api_version == 1:
+            headers = await self.BuildHeaders()
+            uri = self.BuildUri('/v1.0/backup/completed/{0}'.format(backup_config_id))
+            res = await self.Request('GET', uri, headers=headers)
+            if res.status_code == 200:
+                return res.json()
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            self.log.error('error info: %s', res.text)
+            return list()
+
+        async def new_headers():
+            return await self.BuildHeaders(project_id=self.project_id)
+
+        uri = self.BuildUri('/v{0}/{1}/backups'.format(self.api_version,
+                                                       self.project_id))
+        params = {}
+        params['restorable'] = 'true'
+        params['configuration_id'] = str(backup_config_id)
+        try:
+            return await self.RequestPaginated(uri, new_headers, 'backups', page_size=page_size, params=params)
+        except RuntimeError as ex:
+            self.log.error(str(ex))
+            return list()
+
+    async def GetBackupErrors(self, backup_id):
+        """
+        Retrieve the errors recorded for a V2 Backup
+        """
+        if self.api_version == 1:
+            raise NotImplementedError('Not implemented for v1')
+
+        headers = await self.BuildHeaders(project_id=self.project_id,
+                                          content_type='application/json')
+        uri = self.BuildUri('/v{0}/{1}/backups/{2}/errors'.format(self.api_version,
+                                                                  self.project_id,
+                                                                  backup_id))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code == 200:
+            return res.json()
+        else:
+            msg = ('Unable to retrieve backup errors for backup id ({0:}).'
+                   ' RCBU API returned error status ({1:}) with text '
+                   '({2:}) with reason ({3:})'
+                   .format(backup_id, res.status_code, res.text, res.reason))
+            self.log.error(msg)
+            raise RuntimeError(msg)
+
+    async def GetBackupReport(self, backup_id):
+        """
+        Retrieve the backup report the agent stored as a result of performing the backup
+
+        Returns the same (v1 formatted) dict as cloudbackup.client.backup.Backups.GetBackupReport()
+        """
+        if self.api_version == 1:
+            headers = await self.BuildHeaders(content_type='application/json')
+            uri = self.BuildUri('/v1.0/backup/report/' + str(backup_id))
+        else:
+            headers = await self.BuildHeaders(project_id=self.project_id,
+                                              content_type='application/json')
+            uri = self.BuildUri('/v{0}/{1}/backups/{2}'.format(self.api_version,
+                                                               self.project_id,
+                                                               backup_id))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code != 200:
+            msg = ('Unable to retrieve backup report for backup id ({0:}).'
+                   ' RCBU API returned error status ({1:}) with text '
+                   '({2:}) with reason ({3:})'
+                   .format(backup_id, res.status_code, res.text, res.reason))
+            self.log.error(msg)
+            raise RuntimeError(msg)
+
+        if self.api_version == 1:
+            return res.json()
+
+        error_data = None
+        json_data = res.json()
+        try:
+            if json_data['errors']['count'] > 0:
+                error_data = await self.GetBackupErrors(backup_id)
+        except (LookupError, TypeError, RuntimeError):
+            error_data = None
+
+        # convert the response to an object that matches the
+        # information returned by v1
+        return BackupConfigurationV2.convert_backup_report_to_v1(json_data, error_data)
+
+
+class Restores(AsyncCommand):
+    """
+    Asynchronous version of cloudbackup.client.backup.Restores
+    """
+
+    def __init__(self, sslenabled, authenticator, apihost, api_version=1,
+                 project_id=None, transport=None):
+        """
+        Initialize the restores
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+
+          api_version - Version of the RCBU API
+          project_id - User's tenant id
+          transport - (optional) cloudbackup.aio.command.AsyncTransport to share
+        """
+        super(Restores, self).__init__(sslenabled, authenticator, apihost, transport=transport)
+        self.log = logging.getLogger(__name__)
+
+        if type(api_version) is int:
+            self.api_version = api_version
+        else:
+            self.api_version = 1
+        self.project_id = project_id
+
+    async def __StartStopRestore(self, req, retry=20):
+        headers = await self.BuildHeaders(content_type='application/json')
+        res = await self.Request('POST', self.BuildUri('/v1.0/restore/action-requested'),
+                                 headers=headers, data=json.dumps(req),
+                                 retry_rules=_start_retry_rules(retry))
+        if res.status_code == 403:
+            self.log.error('Failed due to access forbidden')
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            return False
+        elif res.status_code != 204:
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            return False
+        return True
+
+    async def StartRestore(self, restoreId, encrypted=None):
+        """
+        Start Restore operation
+          restoreId - restore configuration id
+          encrypted - (optional) encrypted key
+
+        Returns a boolean
+        """
+        o = dict()
+        o['Action'] = 'StartManual'
+        if encrypted is not None:
+            o['EncryptedPassword'] = encrypted
+        o['Id'] = restoreId
+        return await self.__StartStopRestore(o)
+
+    async def StopRestore(self, restoreId):
+        """
+        Stop Restore operation
+
+        Returns a boolean
+        """
+        o = dict()
+        o['Action'] = 'StopManual'
+        o['Id'] = restoreId
+        return await self.__StartStopRestore(o)
+
+    async def StartRestoreV2(self, restore_config, retry=20):
+        """
+        Start a V2 Restore operation
+          restore_config - dict describing the restore
+
+        Returns the restore id or None on failure
+        """
+        uri = self.BuildUri('/v{0}/{1}/restores'.format(self.api_version,
+                                                        self.project_id))
+        headers = await self.BuildHeaders(project_id=self.project_id)
+        res = await self.Request('POST', uri, headers=headers,
+                                 data=json.dumps(restore_config),
+                                 retry_rules=_start_retry_rules(retry))
+        if res.status_code != 201:
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            return None
+        return res.json()['id']
+
+    async def GetRestoreDetails(self, restoreId):
+        """
+        Get details about a Restore
+
+        Returns the same dict as cloudbackup.client.backup.Restores.GetRestoreDetails()
+        """
+        if self.api_version == 1:
+            headers = await self.BuildHeaders()
+            uri = self.BuildUri('/v1.0/restore/{0}'.format(restoreId))
+        else:
+            headers = await self.BuildHeaders(project_id=self.project_id)
+            uri = self.BuildUri('/v{0}/{1}/restores/{2}'.format(self.api_version,
+                                                                self.project_id,
+                                                                restoreId))
+        res = await self.Request('GET', uri, headers=headers)
+        if res.status_code == 200:
+            return res.json()
+        else:
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            self.log.error('error info: %s', res.text)
+            return dict()
+
+    async def GetRestoreReport(self, restoreId):
+        """
+        Returns a report about a specific Restore operation
+
+        Returns the same dict as cloudbackup.client.backup.Restores.GetRestoreReport()
+        """
+        headers = await self.BuildHeaders()
+        res = await self.Request('GET',
+                                 self.BuildUri('/v1.0/restore/report/{0}'.format(restoreId)),
+                                 headers=headers)
+        if res.status_code == 200:
+            return res.json()
+        else:
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
+            self.log.error('error info: %s', res.text)
+            return dict()
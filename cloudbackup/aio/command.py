@@ -0,0 +1,404 @@
+"""
+Rackspace Cloud Backup Asyncio Command API
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from cloudbackup.common.pagination import next_marker
+from cloudbackup.common.ratelimit import get_rate_limiter
+from cloudbackup.common.retry import RetryPolicy
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncResponse(object):
+    """
+    Fully read HTTP response
+
+    Mirrors the parts of requests.Response used by the synchronous clients
+    """
+
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason if reason is not None else ''
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _write_chunk(output, chunk, hashes):
+    """
+    (Internal) Write a chunk of a download and hash it; run on an executor thread
+    """
+    output.write(chunk)
+    for a_hash in hashes:
+        a_hash.update(chunk)
+
+
+class AsyncTransport(object):
+    """
+    Connection pooling asyncio HTTP transport with bounded concurrency
+      max_in_flight - maximum number of requests being processed at once
+      limit_per_host - maximum number of connections per host (0 for no limit)
+      timeout - total timeout in seconds for a single request
+
+    The session is created for the running event loop on first use; call close()
+    (or use the transport with async with) before that loop finishes.
+    """
+
+    def __init__(self, max_in_flight=100, limit_per_host=0, timeout=300):
+        if aiohttp is None:
+            raise ImportError('cloudbackup.aio requires the aiohttp package')
+        self.log = logging.getLogger(__name__)
+        self.max_in_flight = max_in_flight
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.session = None
+        self.semaphore = None
+        self.loop = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def __ensure_session(self):
+        loop = asyncio.get_event_loop()
+        if self.session is not None and not self.session.closed and self.loop is not loop:
+            # a session can not be used (nor closed) from another event loop
+            self.log.warning('AsyncTransport used from a new event loop without being closed; starting a new session')
+        if self.session is None or self.session.closed or self.loop is not loop:
+            self.loop = loop
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight,
+                                             limit_per_host=self.limit_per_host)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    @property
+    def Statistics(self):
+        """
+        In-flight request counters
+        """
+        return {
+            'in-flight': self.in_flight,
+            'peak-in-flight': self.peak_in_flight
+        }
+
+    async def request(self, method, uri, headers=None, data=None, params=None):
+        """
+        Perform an HTTP request and read the entire response body
+
+        Returns an AsyncResponse
+        """
+        self.__ensure_session()
+        async with self.semaphore:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                async with self.session.request(method, uri, headers=headers,
+                                                data=data, params=params) as res:
+                    content = await res.read()
+                    return AsyncResponse(res.status, res.reason,
+                                         res.headers, content)
+            finally:
+                self.in_flight -= 1
+
+    async def download(self, uri, headers, localpath, chunk_size=4 * 1024 * 1024, hashes=()):
+        """
+        Stream an HTTP GET response body into a local file
+          hashes - hashlib objects to update with the data received
+
+        Returns an AsyncResponse without content
+        """
+        self.__ensure_session()
+        async with self.semaphore:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                async with self.session.get(uri, headers=headers) as res:
+                    if res.status < 300:
+                        # the file is written on the default executor so that the event loop never blocks on the disk
+                        loop = asyncio.get_event_loop()
+                        output = await loop.run_in_executor(None, open, localpath, 'wb')
+                        try:
+                            async for chunk in res.content.iter_chunked(chunk_size):
+                                await loop.run_in_executor(None, _write_chunk, output, chunk, hashes)
+                        finally:
+                            await loop.run_in_executor(None, output.close)
+                        content = b''
+                    else:
+                        content = await res.read()
+                    return AsyncResponse(res.status, res.reason,
+                                         res.headers, content)
+            finally:
+                self.in_flight -= 1
+
+    async def close(self):
+        """
+        Close all pooled connections
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_async_transport():
+    """
+    Return the AsyncTransport shared by all AsyncCommand objects
+
+    Note: max_in_flight applies to all the requests sent through it; close it with
+        await get_async_transport().close() before the event loop finishes
+    """
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = AsyncTransport()
+        return _default_transport
+
+
+def configure_async_transport(**kwargs):
+    """
+    Replace the shared AsyncTransport with one using the given configuration, see AsyncTransport
+
+    Note: AsyncCommand objects created before this call keep the transport they were
+        created with; the replaced transport is not closed
+    """
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = AsyncTransport(**kwargs)
+        return _default_transport
+
+
+async def gather_bounded(coroutines, concurrency=100):
+    """
+    Run the coroutines with at most 'concurrency' of them active at once
+
+    Returns the results in the same order as the coroutines
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def __bounded(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*[__bounded(c) for c in coroutines])
+
+
+class AsyncCommand(object):
+    """
+    Base class for defining asynchronous HTTP REST API calls
+    """
+
+    def __init__(self, sslenabled, authenticator, apihost, transport=None, retry_policy=None, rate_limiter=None):
+        """
+        Initialize the AsyncCommand Object
+          sslenabled - True if using HTTPS; otherwise False
+          authenticator - instance of cloudbackup.client.auth.Authentication to use
+          apihost - server to use for API calls
+          transport - (optional) AsyncTransport to use,
+                      defaults to the transport shared by all AsyncCommand objects
+          retry_policy - (optional) cloudbackup.common.retry.RetryPolicy to use,
+                         defaults to a new RetryPolicy (and retry budget) per object
+          rate_limiter - (optional) cloudbackup.common.ratelimit.RateLimiter to use,
+                         defaults to the rate limiter shared by all API objects
+        """
+        self.sslenabled = sslenabled
+        self.authenticator = authenticator
+        self.apihost = apihost
+        if transport is None:
+            transport = get_async_transport()
+        self.transport = transport
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter()
+        self.rate_limiter = rate_limiter
+
+    @property
+    def RetryPolicy(self):
+        """Retry Policy applied to the requests"""
+        return self.retry_policy
+
+    @property
+    def Transport(self):
+        """HTTP Transport used to send the requests"""
+        return self.transport
+
+    @property
+    def RateLimiter(self):
+        """Rate Limiter applied to the requests (None when disabled)"""
+        return self.rate_limiter
+
+    @RateLimiter.setter
+    def RateLimiter(self, rate_limiter):
+        """Change the Rate Limiter, None to disable rate limiting"""
+        self.rate_limiter = rate_limiter
+
+    def BuildUri(self, uripath, apihost=None):
+        """
+        Build the full URI for the given path
+        """
+        if apihost is None:
+            apihost = self.apihost
+        if self.sslenabled:
+            return 'https://' + apihost + uripath
+        else:
+            return 'http://' + apihost + uripath
+
+    async def AuthToken(self):
+        """
+        Retrieve the authentication token without blocking the event loop
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: self.authenticator.AuthToken)
+
+    async def BuildHeaders(self, project_id=None, content_type='application/json; charset=utf-8'):
+        """
+        Build the common headers for an API call
+        """
+        headers = {}
+        headers['X-Auth-Token'] = await self.AuthToken()
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+        if project_id is not None:
+            headers['X-Project-Id'] = project_id
+        return headers
+
+    async def __Reauthenticate(self, headers):
+        """
+        (internal) Replace the token rejected by the server with a new one from the authenticator
+
+        Returns the headers to send the request again with, or None
+        """
+        if headers is None or 'X-Auth-Token' not in headers or not hasattr(self.authenticator, 'InvalidateToken'):
+            return None
+        token = headers['X-Auth-Token']
+
+        def renew():
+            self.authenticator.InvalidateToken(token)
+            return self.authenticator.AuthToken
+
+        try:
+            new_token = await asyncio.get_event_loop().run_in_executor(None, renew)
+        except Exception as ex:
+            logging.getLogger(__name__).error('Unable to renew the rejected auth token: {0:}'.format(str(ex)))
+            return None
+        if not new_token or new_token == token:
+            return None
+        headers = dict(headers)
+        headers['X-Auth-Token'] = new_token
+        return headers
+
+    async def __Send(self, send, method, uri, headers, retry_rules=None):
+        """
+        (internal) Call send(headers) once the rate limiter allows it, sending it again
+        with a renewed token if the server rejects the token (401)
+        """
+        reauthenticated = False
+        while True:
+            rate_limiter = self.rate_limiter
+            if rate_limiter is not None:
+                delay = rate_limiter.Reserve(method, uri, headers)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            res = await send(headers)
+            # a status this call retries (e.g. a 403 while an agent gets ready) is not throttling
+            if rate_limiter is not None and (retry_rules is None or res.status_code not in retry_rules):
+                rate_limiter.Feedback(method, uri, headers, res.status_code)
+            if res.status_code != 401 or reauthenticated:
+                return res
+            reauthenticated = True
+            headers = await self.__Reauthenticate(headers)
+            if headers is None:
+                return res
+
+    async def Request(self, method, uri, headers=None, data=None, params=None, retry_rules=None):
+        """
+        Send an HTTP request over the transport, retrying as the retry policy directs
+          retry_rules - (optional) dict of HTTP status code to cloudbackup.common.retry.RetryRule
+                        overriding the retry policy for this request
+
+        Requests wait for the rate limiter, and a 401 response to a request carrying an
+        X-Auth-Token is sent again once with a renewed token.
+
+        Returns an AsyncResponse
+        """
+        async def send(request_headers):
+            return await self.transport.request(method, uri, headers=request_headers,
+                                                data=data, params=params)
+
+        attempts = {}
+        self.retry_policy.statistics.increment('requests')
+        while True:
+            res = await self.__Send(send, method, uri, headers, retry_rules)
+            delay = self.retry_policy.NextDelay(res, attempts, retry_rules)
+            if delay is None:
+                return res
+            await asyncio.sleep(delay)
+
+    async def Download(self, uri, headers, localpath, hashes=()):
+        """
+        Stream the response to an HTTP GET into a local file, see AsyncTransport.download()
+
+        Waits for the rate limiter and renews a rejected token like Request(); the
+        download is not retried.
+
+        Returns an AsyncResponse
+        """
+        async def send(request_headers):
+            return await self.transport.download(uri, request_headers, localpath, hashes=hashes)
+
+        return await self.__Send(send, 'GET', uri, headers)
+
+    async def RequestPaginated(self, uri, new_headers, collection, page_size=100, params=None, marker=None):
+        """
+        Retrieve all the items of a marker/limit paginated GET listing
+          uri - full URI of the listing
+          new_headers - coroutine function returning the headers for a request; called
+                        for each page so that the authentication token is always current
+          collection - name of the list in the JSON body, e.g. 'agents'
+          page_size - number of items requested per page
+          params - (optional) dict of additional query parameters
+          marker - (optional) marker to start the listing after
+
+        Raises RuntimeError if a page can not be retrieved
+        """
+        items = []
+        while True:
+            query = {}
+            if params is not None:
+                query.update(params)
+            query['limit'] = str(page_size)
+            if marker is not None:
+                query['marker'] = str(marker)
+            res = await self.Request('GET', uri, headers=await new_headers(), params=query)
+            if res.status_code != 200:
+                raise RuntimeError('Unable to list {0:} from {1:}: status code {2:} reason {3:} - {4:}'.format(
+                    collection, uri, res.status_code, res.reason, res.text))
+            body = res.json()
+            page = body[collection]
+            items.extend(page)
+            marker = next_marker(body, page, page_size)
+            if marker is None:
+                return items
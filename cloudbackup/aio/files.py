@@ -0,0 +1,121 @@
+"""
+Rackspace Cloud Files (asyncio)
+"""
+import hashlib
+import logging
+
+from cloudbackup.aio.command import AsyncCommand
+
+
+class CloudFiles(AsyncCommand):
+    """
+    Asynchronous version of cloudbackup.cloud.files.CloudFiles
+    """
+
+    def __init__(self, sslenabled, authenticator, publicnet=False, transport=None):
+        """
+        Setup the CloudFiles API Class in the same manner as cloudbackup.aio.command.AsyncCommand
+          publicnet - True to use publicnet instead of servicenet endpoints
+          transport - (optional) cloudbackup.aio.command.AsyncTransport to share
+        """
+        super(CloudFiles, self).__init__(sslenabled, authenticator, 'localhost', transport=transport)
+        self.usepublicnet = publicnet
+        self.log = logging.getLogger(__name__)
+
+    def _get_container(self, container):
+        """
+        Return the publicnet or servicenet container name.
+
+        Note: servicenet container names start with 'snet-'.
+        """
+        if self.usepublicnet:
+            if container.startswith('snet-'):
+                return container[5:]
+        return container
+
+    async def __list(self, uri, uripath, limit, marker):
+        urioptions = uripath + '?format=json'
+        if limit != -1:
+            urioptions += '&limit=%d' % limit
+        if len(marker):
+            urioptions += '&marker=%s' % marker
+        headers = await self.BuildHeaders(content_type='text/plain; charset=UTF-8')
+        res = await self.Request('GET', self.BuildUri(urioptions, apihost=self._get_container(uri)),
+                                 headers=headers)
+        if res.status_code == 200:
+            # We have a list in JSON format
+            return res.json()
+        elif res.status_code == 204:
+            # Nothing left to retrieve
+            return {}
+        else:
+            # Error
+            self.log.error('Error retrieving list of containers: (code=' + str(res.status_code) + ', text=\"' + res.text + '\")')
+            return {}
+
+    async def GetContainers(self, uri, limit=-1, marker=''):
+        """
+        List all containers for the current account
+        """
+        return await self.__list(uri, '', limit, marker)
+
+    async def GetContainerObjects(self, uri, container, limit=-1, marker=''):
+        """
+        List the objects in a container under the current account
+        """
+        return await self.__list(uri, '/' + container, limit, marker)
+
+    async def CheckBundleDigest(self, container, uripath, bundle_data):
+        """
+        Check the digest of a Bundle in CloudFiles against the expected MD5
+            container - the CloudFiles container in which to find the bundle
+            uripath - the path to the vault in the container
+            bundle_data - a dict containing atleast the 'name' and 'md5' of the bundle
+        """
+        try:
+            fulluri = '/' + uripath + '/BUNDLES/' + bundle_data['name']
+            headers = await self.BuildHeaders(content_type=None)
+            res = await self.Request('HEAD', self.BuildUri(fulluri, apihost=self._get_container(container)),
+                                     headers=headers)
+            if res.status_code == 404:
+                raise UserWarning('Server failed to find the specified bundle')
+            elif res.status_code >= 300:
+                raise UserWarning('Server responded unexpectedly during download (Code: ' + str(res.status_code) + ' )')
+            else:
+                digest = res.headers['etag'].upper()
+                result = (digest == bundle_data['md5'])
+                self.log.debug('CloudFiles Bundle Digest (' + digest + ') == Bundle MD5 (' + bundle_data['md5'] + ')? ' + str(result))
+                return result
+        except LookupError:
+            raise UserWarning('Invalid VaultDB Data provided.')
+
+    async def DownloadBundle(self, container, uripath, bundle_data, localpath):
+        """
+        Download the Bundle from CloudFiles into a local path
+            container - the CloudFiles container in which to find the bundle
+            uripath - the path to the vault in the container
+            bundle_data - a dict containing atleast the 'id' of the bundle
+            localpath - the local path prefix at which to store the downloaded bundle
+
+        Note: Adds 'download-md5', 'download-sha1' and 'file-on-disk' entries to the bundle_data
+        """
+        try:
+            fulluri = '/' + uripath + '/BUNDLES/' + '{0:010}'.format(bundle_data['id'])
+            bundle_file = localpath + '.bundle-{0:010}'.format(bundle_data['id'])
+            headers = await self.BuildHeaders(content_type=None)
+            md5_hash = hashlib.md5()
+            sha1_hash = hashlib.sha1()
+            res = await self.Download(self.BuildUri(fulluri, apihost=self._get_container(container)),
+                                      headers, bundle_file,
+                                      hashes=(md5_hash, sha1_hash))
+            if res.status_code == 404:
+                raise UserWarning('Server failed to find the specified bundle')
+            elif res.status_code >= 300:
+                raise UserWarning('Server responded unexpectedly during download (Code: ' + str(res.status_code) + ' )')
+            bundle_data['download-md5'] = md5_hash.hexdigest().upper()
+            bundle_data['download-sha1'] = sha1_hash.hexdigest().upper()
+            self.log.info('Bundle (' + str(bundle_data['id']) + ') was successfully downloaded to ' + bundle_file)
+            bundle_data['file-on-disk'] = bundle_file
+            return True
+        except LookupError:
+            raise UserWarning('Invalid VaultDB Data provided.')
@@ -8,17 +8,23 @@ import gzip
 import hashlib
 import json
 import logging
-import os
 import requests
 import time
 import threading
 
 import six
 
+from cloudbackup.common.cache import ResponseCache, get_configuration_cache
 from cloudbackup.common.command import Command
+from cloudbackup.common.durability import DurableFileWriter
+from cloudbackup.utils.gunzip import GunzipWriter
 
 requests.packages.urllib3.disable_warnings()
 
+# seconds the agent details are served from the cache; they carry the live status
+# of the agent, so by default every lookup goes to the server
+AGENT_DETAILS_CACHE_TTL = 0.0
+
 class ParameterError(Exception):
     """
     Parameter Error Exception
@@ -33,7 +39,7 @@ def _keep_agent_awake_thread_fn(my_notifier=None, userid=None, usertype=None,
                                 rse_agentkey=None, rse_log=None,
                                 rse_apihost=None, rse_period=None, apihost=None,
                                 agent_id=None, api_version=None,
-                                project_id=None):
+                                project_id=None, authenticator=None):
     """
     (Internal) Thread function that will periodically post the wake agent message and look for the specified agent
     Aside from my_notifier, the function maintains its own objects internally in thread local data storage for thread-safety purposes
@@ -56,19 +62,26 @@ def _keep_agent_awake_thread_fn(my_notifier=None, userid=None, usertype=None,
     Option parameters:
         rse_log - Base log file name, the thread will append data to create a unique RSE log file name for the thread's RSE queries. If not desired, specify None
         rse_apihost - RSE API URL See cloudbackup.clients.rse.Rse for details
+        authenticator - cloudbackup.client.auth.Authentication instance to share with the caller;
+                        if specified then userid, usertype, credentials and method are not required
     """
-    if None in (my_notifier, userid, usertype, credentials, method, rse_app, rse_version, rse_agentkey, rse_period, apihost, agent_id, api_version):
+    if authenticator is None:
+        auth_parameters = (userid, usertype, credentials, method)
+    else:
+        auth_parameters = ()
+    if None in (my_notifier, rse_app, rse_version, rse_agentkey, rse_period, apihost, agent_id, api_version) + auth_parameters:
         msg_missing = []
         if my_notifier is None:
             msg_missing.append('my_notifier')
-        if userid is None:
-            msg_missing.append('userid')
-        if usertype is None:
-            msg_missing.append('usertype')
-        if credentials is None:
-            msg_missing.append('credentials')
-        if method is None:
-            msg_missing.append('method')
+        if authenticator is None:
+            if userid is None:
+                msg_missing.append('userid')
+            if usertype is None:
+                msg_missing.append('usertype')
+            if credentials is None:
+                msg_missing.append('credentials')
+            if method is None:
+                msg_missing.append('method')
         if rse_app is None:
             msg_missing.append('rse_app')
         if rse_version is None:
@@ -93,18 +106,22 @@ def _keep_agent_awake_thread_fn(my_notifier=None, userid=None, usertype=None,
 
     log = logging.getLogger(__name__)
 
-    # For threading simplicity we are going to create thread local version of each of the required objects
+    # The authenticator may be shared, the Agents and RSE objects are thread local since
+    # the RSE channel is stateful
     import cloudbackup.client.auth
     import cloudbackup.client.rse
     data = threading.local()
     data.thread_id = threading.current_thread().ident
     data.log_prefix = 'RSE Wakeup Thread[{0:}] Log'.format(data.thread_id)
-    data.auth_engine = cloudbackup.client.auth.Authentication(
-        userid,
-        credentials,
-        usertype=usertype,
-        method=method
-    )
+    if authenticator is not None:
+        data.auth_engine = authenticator
+    else:
+        data.auth_engine = cloudbackup.client.auth.Authentication(
+            userid,
+            credentials,
+            usertype=usertype,
+            method=method
+        )
     data.agent_engine = cloudbackup.client.agents.Agents(True, data.auth_engine,
                                                          apihost, api_version,
                                                          project_id)
@@ -222,19 +239,19 @@ class AgentLogLevel(Command):
             All
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/logging/{0}'.format(machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('GET',
+                                      '/v1.0/agent/logging/{0}'.format(machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}'.format(self.api_version,
-                                                      self.project_id,
-                                                      machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-        res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}'.format(self.api_version,
+                                                                    self.project_id,
+                                                                    machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+        res = self.Send(request)
         if res.status_code == 200:
             if self.api_version == 1:
                 # the text will be data like "Warn" (with quotes) so remove the quotes.
@@ -265,9 +282,9 @@ class AgentLogLevel(Command):
             if not level in ('Fatal', 'Error', 'Warn', 'Info', 'Debug', 'Trace', 'All', 1, 2, 3, 4, 5, 6, 7):
                 raise ValueError('Log Level (' + str(level) + ') is not valid.')
 
-            self.ReInit(self.sslenabled, "/v1.0/agent/logging")
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('PUT', "/v1.0/agent/logging")
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
             o = {}
             o['MachineAgentId'] = machine_agent_id
 
@@ -285,28 +302,28 @@ class AgentLogLevel(Command):
             else:
                 o['LoggingLevelid'] = level
 
-            self.body = json.dumps(o)
+            request.body = json.dumps(o)
 
-            res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.Send(request)
         else:
             self.log.info('v{0} Set Log Level'.format(self.api_version))
             # TODO: Need to rework this whole function
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}'.format(self.api_version,
-                                                      self.project_id,
-                                                      machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
+            request = self.NewRequest('PATCH',
+                                      '/v{0}/{1}/agents/{2}'.format(self.api_version,
+                                                                    self.project_id,
+                                                                    machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
             o = {}
             o['op'] = 'replace'
             o['path'] = '/log_level'
             o['value'] = level.lower()
             l = []
             l.append(o)
-            self.body = json.dumps(l)
+            request.body = json.dumps(l)
             self.log.debug('Updating Log Level: {0}'.format(o))
-            res = requests.patch(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.Send(request)
 
         if res.status_code == 204:
             self.log.info('Updated log level to {0}'.format(level))
@@ -970,7 +987,8 @@ class Agents(Command):
           api_version - version of the API
           project_id - Project Id used by API v2
         """
-        super(self.__class__, self).__init__(sslenabled, apihost, '/')
+        # the configurations are served from a cache shared with the other Agents and Backups objects
+        super(self.__class__, self).__init__(sslenabled, apihost, '/', response_cache=get_configuration_cache())
         self.log = logging.getLogger(__name__)
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
@@ -978,6 +996,7 @@ class Agents(Command):
         # Some cached data needed, set to invalid values by default
         self.agents = {}
         self.configurations = {}
+        self.details_cache = ResponseCache(max_entries=64, ttl=AGENT_DETAILS_CACHE_TTL)
         self.o = {}
         self.snapshot_id = -1
         self.wake_agent_threads = []
@@ -1013,24 +1032,24 @@ class Agents(Command):
         Note: This may require up to 60 seconds for the agents to respond.
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, "/v1.0/user/wakeupagents")
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.log.debug('headers: %s', self.Headers)
-            res = requests.post(self.Uri, headers=self.Headers)
+            request = self.NewRequest('POST', "/v1.0/user/wakeupagents")
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            self.log.debug('headers: %s', request.headers)
+            res = self.Send(request)
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/events'.format(self.api_version,
-                                                  self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-            self.o = {}
-            self.o['event'] = 'agent_activate'
-            self.o['mode'] = 'active'
-            self.body = json.dumps(self.o)
-            self.log.debug('headers: %s', self.Headers)
-            res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+            request = self.NewRequest('POST',
+                                      '/v{0}/{1}/events'.format(self.api_version,
+                                                                self.project_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+            o = {}
+            o['event'] = 'agent_activate'
+            o['mode'] = 'active'
+            request.body = json.dumps(o)
+            self.log.debug('headers: %s', request.headers)
+            res = self.Send(request)
         self.log.debug('Wake Agent: code = {0:}, reason = {1:}'.format(res.status_code, res.reason))
         return res.status_code
 
@@ -1135,7 +1154,8 @@ class Agents(Command):
                     'project_id': self.project_id,
 
                     'rse_log': rse.rselogfile,
-                    'rse_apihost': rse.apihost
+                    'rse_apihost': rse.apihost,
+                    'authenticator': self.authenticator
                 }
                 a_thread['thread'] = threading.Thread(target=_keep_agent_awake_thread_fn,
                                                       kwargs=a_thread_kwargs
@@ -1162,25 +1182,43 @@ class Agents(Command):
     #
     # Agent Details
     #
+    @property
+    def AgentDetailsCache(self):
+        """Cache of the agent details retrieved by GetAgentDetails()"""
+        return self.details_cache
+
+    @AgentDetailsCache.setter
+    def AgentDetailsCache(self, details_cache):
+        """
+        Change the agent details cache, e.g. to a ResponseCache with a ttl to
+        serve the details of agents that are polled often without a request
+        (the status of the agent may then be up to ttl seconds old)
+        """
+        self.details_cache = details_cache
+
     def GetAgentDetails(self, machine_agent_id):
         """
         Retrieve all the information regarding the specified Agent ID
         """
         self.agents = {}
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/{0}'.format(machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('GET',
+                                      '/v1.0/agent/{0}'.format(machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}'.format(self.api_version,
-                                                      self.project_id,
-                                                      machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-        res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}'.format(self.api_version,
+                                                                    self.project_id,
+                                                                    machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+        # the details carry the live status of the agent and are not served from the configuration cache
+        if self.details_cache is None:
+            res = self.Send(request)
+        else:
+            res = self.CachedGet(request.uri, request.headers, cache=self.details_cache)
         if res.status_code == 200:
             self.log.debug('Agent Details(id: {0:}) - {1:}'.format(machine_agent_id, res.json()))
             self.agents[machine_agent_id] = AgentDetails(details=res.json(), version=self.api_version)
@@ -1193,45 +1231,45 @@ class Agents(Command):
         """
         Lookup the associated agents and return a list of their IDs
         """
-        if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/user/agents')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code == 200:
-                result_list = []
-                results = res.json()
-                for agent in results:
-                    result_list.append(agent['MachineAgentId'])
-                return result_list
-
-            else:
-                self.log.error('Unable to retrieve agent list system return code ' + str(res.status_code) + ' reason = ' + res.reason)
-                return []
+        try:
+            return list(self.IterAgentsFromApi())
+        except RuntimeError as ex:
+            self.log.error('Unable to retrieve agent list: ' + str(ex))
+            return []
 
-        else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents'.format(
-                            self.api_version,
-                            self.project_id
-                        ))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code == 200:
-                result_list = []
-                results = res.json()
-                for agent in results['agents']:
-                    result_list.append(agent['id'])
-                return result_list
+    def IterAgentsFromApi(self, page_size=100, prefetch=True):
+        """
+        Generator returning the IDs of the associated agents, following the API's pagination
+          page_size - number of agents retrieved per request (API v2 and newer)
+          prefetch - True to retrieve the next page while the current one is being consumed
 
-            else:
-                self.log.error('Unable to retrieve agent list system return code ' + str(res.status_code) + ' reason = ' + res.reason)
-                return []
+        Raises RuntimeError if the agents can not be retrieved
+        """
+        if self.api_version == 1:
+            request = self.NewRequest('GET',
+                                      '/v1.0/user/agents')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            res = self.Send(request)
+            if res.status_code != 200:
+                raise RuntimeError('system return code ' + str(res.status_code) + ' reason = ' + res.reason)
+            for agent in res.json():
+                yield agent['MachineAgentId']
 
+        else:
+            def new_request():
+                request = self.NewRequest('GET',
+                                          '/v{0}/{1}/agents'.format(
+                                              self.api_version,
+                                              self.project_id
+                                          ))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['Content-Type'] = 'application/json; charset=utf-8'
+                request.headers['X-Project-Id'] = self.project_id
+                return request
+
+            for agent in self.SendPaginated(new_request, 'agents', page_size=page_size, prefetch=prefetch):
+                yield agent['id']
 
     @property
     def GetAgentIds(self):
@@ -1259,14 +1297,14 @@ class Agents(Command):
         Request a log file upload from the agent
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/requestlog/{0}'.format(
-                            machine_agent_id
-                        ))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('POST',
+                                      '/v1.0/agent/requestlog/{0}'.format(
+                                          machine_agent_id
+                                      ))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
 
-            res = requests.post(self.Uri, headers=self.Headers)
+            res = self.Send(request)
 
             if res.status_code == 200:
                 logfile_request_id = res.json()
@@ -1277,17 +1315,17 @@ class Agents(Command):
                 return None
 
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}/logfiles'.format(
-                            self.api_version,
-                            self.project_id,
-                            machine_agent_id
-                        ))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-
-            res = requests.post(self.Uri, headers=self.Headers)
+            request = self.NewRequest('POST',
+                                      '/v{0}/{1}/agents/{2}/logfiles'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      ))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+
+            res = self.Send(request)
 
             if res.status_code == 202:
                 logfile_request_id = res.json()['id']
@@ -1302,25 +1340,25 @@ class Agents(Command):
         List the existing agent log files
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/logfiles/{0}'.format(
-                            machine_agent_id
-                        ))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('GET',
+                                      '/v1.0/agent/logfiles/{0}'.format(
+                                          machine_agent_id
+                                      ))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
 
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}/logfiles'.format(
-                            self.api_version,
-                            self.project_id,
-                            machine_agent_id
-                        ))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
-
-        res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/logfiles'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      ))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+
+        res = self.Send(request)
 
         result = []
         if res.status_code == 200:
@@ -1356,20 +1394,30 @@ class Agents(Command):
 
         return result
 
-    def DownloadAgentLogFile(self, logfile_data, target_filename):
+    def DownloadAgentLogFile(self, logfile_data, target_filename, streaming=False, keep_gz=False):
+        """
+        Download and decompress an agent log file
+            logfile_data - the log file data (see GetAgentLogFileInfo()); requires 'link'
+            target_filename - the local path at which to store the decompressed log file
+            streaming - decompress the log file with zlib as it is received instead of
+                        downloading it to target_filename + '.gz' first
+            keep_gz - with streaming, also write the compressed log file to target_filename + '.gz'
+
+        Returns True if the log file was downloaded, otherwise False
+        """
         try:
             try:
                 headers = {
                     'X-Auth-Token': self.authenticator.AuthToken
                 }
-                res = requests.get(
+                res = self.Request('GET',
                     logfile_data['link'],
                     stream=True,
-                    headers=self.headers
+                    headers=headers
                 )
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.get(logfile_data['link'], verify=False, stream=True)
+                res = self.Request('GET', logfile_data['link'], verify=False, stream=True)
 
             if res.status_code == 404:
                 raise UserWarning('Temp URL invalid')
@@ -1394,33 +1442,46 @@ class Agents(Command):
             meter['bars-completed'] = 0
             self.log.info('Downloading logfile(gz): {0} bytes...'.format(meter['bytes-remaining']))
             self.log.info('[' + ' ' * meter['bar-count'] + ']')
+
+            def advance_meter():
+                meter['chunks'] += 1
+                if meter['chunks'] == meter['chunks-per-bar']:
+                    meter['chunks'] = 0
+                    meter['bars-completed'] += 1
+                    meter['bars-remaining'] -= 1
+                    self.log.info('[' + '-' * meter['bars-completed'] + ' ' * meter['bars-remaining'] + ']')
+
             gzip_file = target_filename + '.gz'
-            compressed_md5_hash = hashlib.md5()
-            with open(gzip_file, 'wb') as gzipped_db:
-                for lf_chunk in res.iter_content(chunk_size=meter['block-size']):
-                    gzipped_db.write(lf_chunk)
-                    compressed_md5_hash.update(lf_chunk)
-                    gzipped_db.flush()
-                    os.fsync(gzipped_db.fileno())
-                    meter['chunks'] += 1
-                    if meter['chunks'] == meter['chunks-per-bar']:
-                        meter['chunks'] = 0
-                        meter['bars-completed'] += 1
-                        meter['bars-remaining'] -= 1
-                        self.log.info('[' + '-' * meter['bars-completed'] + ' ' * meter['bars-remaining'] + ']')
+            if streaming:
+                with GunzipWriter(target_filename, gzip_file if keep_gz else None, self.durability) as writer:
+                    for lf_chunk in res.iter_content(chunk_size=meter['block-size']):
+                        writer.Write(lf_chunk)
+                        advance_meter()
+                compressed_md5 = writer.Digests['compressed-md5']
+            else:
+                compressed_md5_hash = hashlib.md5()
+                with DurableFileWriter(gzip_file, self.durability) as gzipped_db:
+                    for lf_chunk in res.iter_content(chunk_size=meter['block-size']):
+                        gzipped_db.write(lf_chunk)
+                        compressed_md5_hash.update(lf_chunk)
+                        advance_meter()
+                compressed_md5 = compressed_md5_hash.hexdigest()
 
             if etag_match is not None:
-                if etag_match.upper() != compressed_md5_hash.hexdigest().upper():
+                if etag_match.upper() != compressed_md5.upper():
                     raise UserWarning(
                         'Failed to download. {0} != {1}'.format(
                             etag_match.upper(),
-                            compressed_md5_hash.hexdigest().upper()
+                            compressed_md5.upper()
                         )
                     )
 
+            if streaming:
+                return True
+
             self.log.info('Decompressing the file...')
             gz_lf_file = gzip.open(gzip_file, 'rb')
-            with open(target_filename, 'wb') as lf_file:
+            with DurableFileWriter(target_filename, self.durability) as lf_file:
                 decompress_continue_loop = True
                 while decompress_continue_loop:
                     filechunk = gz_lf_file.read(file_chunk_size)
@@ -1444,26 +1505,26 @@ class Agents(Command):
         Retrieve the Configuration for the given agent
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/configuration/{0}'.format(
-                            machine_agent_id
-                        )
+            request = self.NewRequest('GET',
+                                      '/v1.0/agent/configuration/{0}'.format(
+                                          machine_agent_id
+                                      )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}/configuration'.format(
-                            self.api_version,
-                            self.project_id,
-                            machine_agent_id
-                        )
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/configuration'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
 
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.CachedGet(request.uri, request.headers)
         if res.status_code == 200:
             self.configurations[machine_agent_id] = AgentConfiguration(
                     configuration=res.json(), version=self.api_version)
@@ -1503,28 +1564,28 @@ class Agents(Command):
         agent_config = self.AgentConfiguration(machine_agent_id)
 
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/{0}/system/activity{1}'.format(
-                            self.authenticator.AuthTenantId,
-                            machine_agent_id
-                        )
+            request = self.NewRequest('GET',
+                                      '/v1.0/{0}/system/activity{1}'.format(
+                                          self.authenticator.AuthTenantId,
+                                          machine_agent_id
+                                      )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
 
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}/activities'.format(
-                            self.api_version,
-                            self.project_id,
-                            machine_agent_id
-                        )
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/activities'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
 
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.Send(request)
         if res.status_code == 200:
             results = []
 
@@ -1618,42 +1679,40 @@ class Agents(Command):
         self.GetAgentConfiguration(machine_agent_id)
         agent_config = self.AgentConfiguration(machine_agent_id)
 
-        flip_activity_list_due_to_api_inconsistency = False
+        if self.api_version != 1 and last_event_id is not None:
+            # all the events after the marker, not just the first page of them
+            try:
+                events = self.IterAgentEvents(machine_agent_id,
+                                              last_event_id,
+                                              page_size=event_limit)
+                return self.__GroupAgentEvents(events, last_event_id, results, newest_first=True)
+            except RuntimeError as ex:
+                self.log.error('Unable to retrieve latest agent events for agent id ' + str(machine_agent_id) + ': ' + str(ex))
+                return ([], last_event_id)
+
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/{0}/system/activity{1}'.format(
-                            self.authenticator.AuthTenantId,
-                            machine_agent_id
-                        )
+            request = self.NewRequest('GET',
+                                      '/v1.0/{0}/system/activity{1}'.format(
+                                          self.authenticator.AuthTenantId,
+                                          machine_agent_id
+                                      )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
 
         else:
-            if last_event_id is None:
-                self.ReInit(self.sslenabled,
-                            '/v{0}/{1}/agents/{2}/events'.format(
-                                self.api_version,
-                                self.project_id,
-                                machine_agent_id
-                            )
-                )
-            else:
-                self.ReInit(self.sslenabled,
-                            '/v{0}/{1}/agents/{2}/events?marker={3}&limit={4}&sort_dir=asc'.format(
-                                self.api_version,
-                                self.project_id,
-                                machine_agent_id,
-                                last_event_id,
-                                event_limit
-                            )
-                )
-                flip_activity_list_due_to_api_inconsistency = True
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/events'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      )
+            )
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
 
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.Send(request)
         if res.status_code == 200:
             new_last_event_id = None
 
@@ -1702,58 +1761,114 @@ class Agents(Command):
                     results.reverse()
 
             else:
-                events = res.json()['events']
-                if flip_activity_list_due_to_api_inconsistency:
-                    events.reverse()
+                return self.__GroupAgentEvents(res.json()['events'], last_event_id, results)
 
-                new_last_event_id = last_event_id
-                if new_last_event_id is None:
-                    new_last_event_id = 0
+            return (results, new_last_event_id)
 
-                if not 'heartbeats' in results.keys():
-                    results['heartbeats'] = []
+        else:
+            self.log.error('Unable to retrieve latest agent events for agent id ' + str(machine_agent_id) + '. Server returned ' + str(res.status_code) + ': ' + res.text + ' Reason: ' + res.reason)
+            return ([], last_event_id)
 
-                for event in events:
-                    # update the last event
-                    if event['id'] > new_last_event_id:
-                        new_last_event_id = event['id']
+    def __GroupAgentEvents(self, events, last_event_id, results, newest_first=False):
+        """
+        (internal) Add v2 events to the results of GetAgentEventsSince()
+          events - iterable of events
+          last_event_id - the last event id already seen, None if none
+          results - dictionary the events are grouped into
+          newest_first - True if the events are given oldest first but are to be
+                         grouped newest first, as the API lists them without a marker
 
-                    # filter heart beats
-                    if 'event' in event.keys():
-                        if 'heartbeat' in event['event']:
-                            results['heartbeats'].append(event)
+        Returns a tuple of the results and the last event id
+        """
+        new_last_event_id = last_event_id
+        if new_last_event_id is None:
+            new_last_event_id = 0
 
-                    else:
-                        event_name = None
+        if not 'heartbeats' in results.keys():
+            results['heartbeats'] = []
 
-                        # filter backups
-                        if 'backup' in event.keys():
-                            if 'id' in event['backup'].keys():
-                                event_name = 'Backup {0}'.format(
-                                    event['backup']['id']
-                                )
+        # where the events of this call start in each list
+        starts = {}
+        others = []
 
-                        # filter restores
-                        elif 'restore' in event.keys():
-                            if 'id' in event['restore'].keys():
-                                event_name = 'Restore {0}'.format(
-                                    event['restore']['id']
-                                )
-                        if not event_name is None:
-                            if not event_name in results.keys():
-                                results[event_name] = []
+        def add(event_name, event):
+            if newest_first:
+                results[event_name].insert(starts.setdefault(event_name, len(results[event_name])), event)
+            else:
+                results[event_name].append(event)
 
-                            results[event_name].append(event)
-                        else:
-                            # Dump everything else based on the size of the results
-                            # so that they enter in order
-                            results[len(results)] = event
+        for event in events:
+            # update the last event
+            if event['id'] > new_last_event_id:
+                new_last_event_id = event['id']
 
-            return (results, new_last_event_id)
+            # filter heart beats
+            if 'event' in event.keys():
+                if 'heartbeat' in event['event']:
+                    add('heartbeats', event)
 
-        else:
-            self.log.error('Unable to retrieve latest agent events for agent id ' + str(machine_agent_id) + '. Server returned ' + str(res.status_code) + ': ' + res.text + ' Reason: ' + res.reason)
-            return ([], last_event_id)
+            else:
+                event_name = None
+
+                # filter backups
+                if 'backup' in event.keys():
+                    if 'id' in event['backup'].keys():
+                        event_name = 'Backup {0}'.format(
+                            event['backup']['id']
+                        )
+
+                # filter restores
+                elif 'restore' in event.keys():
+                    if 'id' in event['restore'].keys():
+                        event_name = 'Restore {0}'.format(
+                            event['restore']['id']
+                        )
+                if not event_name is None:
+                    if not event_name in results.keys():
+                        results[event_name] = []
+
+                    add(event_name, event)
+                elif newest_first:
+                    others.append(event)
+                else:
+                    # Dump everything else based on the size of the results
+                    # so that they enter in order
+                    results[len(results)] = event
+
+        others.reverse()
+        for event in others:
+            results[len(results)] = event
+
+        return (results, new_last_event_id)
+
+    def IterAgentEvents(self, machine_agent_id, last_event_id=None, page_size=100, prefetch=True):
+        """
+        Generator returning the events of the agent, oldest first, following the API's pagination
+          machine_agent_id - agent to retrieve the events of
+          last_event_id - (optional) only return the events after this event id
+          page_size - number of events retrieved per request
+          prefetch - True to retrieve the next page while the current one is being consumed
+
+        Raises RuntimeError if the events can not be retrieved or with API v1, which has no events
+        """
+        if self.api_version == 1:
+            raise RuntimeError('Agent events are not available with API version 1')
+
+        def new_request():
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/events'.format(
+                                          self.api_version,
+                                          self.project_id,
+                                          machine_agent_id
+                                      ))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
+            return request
+
+        return self.SendPaginated(new_request, 'events', page_size=page_size,
+                                  params={'sort_dir': 'asc'}, marker=last_event_id,
+                                  prefetch=prefetch)
 
     #
     # Agent Cleanup
@@ -1787,10 +1902,10 @@ class Agents(Command):
             raise ParameterError('Neither Cloud Server Name nor Cloud Server Id (HostServerId) nor Cloud Server IPs were specified. Unable to match a server.')
 
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, "/v1.0/user/agents")
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET', "/v1.0/user/agents")
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            res = self.Send(request)
             if res.status_code == 200:
                 agentlist = list()
                 try:
@@ -1855,12 +1970,12 @@ class Agents(Command):
                 self.log.error('system reason: ' + res.reason)
                 return list()
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents'.format(self.api_version,
-                                                  self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents'.format(self.api_version,
+                                                                self.project_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            res = self.Send(request)
             if res.status_code == 200:
                 resp_body = res.json()
                 agentlist = list()
@@ -1901,13 +2016,13 @@ class Agents(Command):
         De-register the agent from the Rackspace Cloud Backup API
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, '/v1.0/agent/delete')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.o = {}
-            self.o['MachineAgentId'] = machine_agent_id
-            self.body = json.dumps(self.o)
-            res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+            request = self.NewRequest('POST', '/v1.0/agent/delete')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            o = {}
+            o['MachineAgentId'] = machine_agent_id
+            request.body = json.dumps(o)
+            res = self.Send(request)
             if res.status_code == 204:
                 self.log.info('Removed agent id ' + str(machine_agent_id))
                 self.log.warn('Please restart the process to lookup this agent again as the agent id may have changed.')
@@ -1916,13 +2031,13 @@ class Agents(Command):
                 self.log.error('Unable to remove agent id ' + str(machine_agent_id) + ' system return code ' + str(res.status_code) + ' Reason: ' + res.reason)
                 return False
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}'.format(self.api_version,
-                                                      self.project_id,
-                                                      machine_agent_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            res = requests.delete(self.Uri, headers=self.Headers)
+            request = self.NewRequest('DELETE',
+                                      '/v{0}/{1}/agents/{2}'.format(self.api_version,
+                                                                    self.project_id,
+                                                                    machine_agent_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            res = self.Send(request)
             if res.status_code == 204:
                 self.log.info('Removed agent id ' + str(machine_agent_id))
                 self.log.warn('Please restart the process to lookup this '
@@ -1950,15 +2065,15 @@ class Agents(Command):
         Enable or Disable an agent
         """
         # TODO: update for v2 API
-        self.ReInit(self.sslenabled, "/v1.0/agent/enable")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-
-        self.o = {}
-        self.o['MachineAgentId'] = machine_agent_id
-        self.o['Enable'] = enabled
-        self.body = json.dumps(self.o)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        request = self.NewRequest('POST', "/v1.0/agent/enable")
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        o = {}
+        o['MachineAgentId'] = machine_agent_id
+        o['Enable'] = enabled
+        request.body = json.dumps(o)
+        res = self.Send(request)
         if res.status_code == 204:
             # success
             self.log.info('Changed Agent Status - Machine Agent Id: {0:}, Enabled: {1:}'.format(machine_agent_id, enabled))
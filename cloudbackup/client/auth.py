@@ -1,14 +1,16 @@
 """
 Rackspace Authentication API
 """
-import datetime
 import json
 import logging
 import requests
 import time
 import re
+import threading
 
 from cloudbackup.common.command import Command
+from cloudbackup.common.retry import RetryRule
+from cloudbackup.client.token_cache import TokenCache, token_expiration
 
 requests.packages.urllib3.disable_warnings()
 
@@ -40,19 +42,19 @@ class UserInformation(Command):
         apihost = get_identity_apihost(datacenter)
         endpoint = '/v2.0/users?name={0:}'.format(username)
         super(self.__class__, self).__init__(True, apihost, endpoint)
+        self.endpoint = endpoint
 
         self.log = logging.getLogger(__name__)
 
     def get_information(self, auth_token):
-        headers = self.Headers
-        headers['X-Auth-Token'] = auth_token
+        request = self.NewRequest('GET', self.endpoint)
+        request.headers['X-Auth-Token'] = auth_token
 
         self.log.debug('host: %s', self.apihost)
-        self.log.debug('body: %s', self.Body)
-        self.log.debug('headers: %s', headers)
-        self.log.debug('uri: %s', self.Uri)
+        self.log.debug('headers: %s', request.headers)
+        self.log.debug('uri: %s', request.uri)
 
-        response = requests.get(self.Uri, headers=headers)
+        response = self.Send(request)
         if response.status_code in (200, 203):
             return response.json()
 
@@ -62,6 +64,53 @@ class UserInformation(Command):
             raise RuntimeError('Failed: {0:} - {1:}'.format(response.reason, response.text))
 
 
+class ServiceCatalog(object):
+    """
+    Index of the service catalog of an Identity response
+      auth_data - Identity (v2.0 tokens) response
+
+    Endpoints are looked up by (service name, region, interface) where the
+    region is lower case (None for global end-points) and the interface is
+    'public' (publicURL) or 'internal' (internalURL).
+    """
+
+    interfaces = (('public', 'publicURL'), ('internal', 'internalURL'))
+
+    def __init__(self, auth_data):
+        self.services = {}
+        self.endpoints = {}
+        try:
+            catalog = auth_data['access']['serviceCatalog']
+        except (LookupError, TypeError):
+            catalog = []
+        for service in catalog:
+            self.services.setdefault(service['name'], []).extend(service['endpoints'])
+            for endpoint in service['endpoints']:
+                region = endpoint.get('region', None)
+                if region is not None:
+                    region = region.lower()
+                for interface, url_key in self.interfaces:
+                    if url_key in endpoint:
+                        self.endpoints.setdefault((service['name'], region, interface), endpoint[url_key])
+
+    def Endpoints(self, name):
+        """
+        Catalog entries (dicts) of the end-points of a service, empty if there is no such service
+        """
+        return self.services.get(name, [])
+
+    def Endpoint(self, name, region=None, interface='public'):
+        """
+        URL of a service end-point, None if there is no such end-point
+          name - service name, e.g. cloudFiles
+          region - (optional) region of the end-point, None for a global end-point
+          interface - 'public' or 'internal'
+        """
+        if region is not None:
+            region = region.lower()
+        return self.endpoints.get((name, region, interface), None)
+
+
 class Authentication(Command):
     """
     Username+ApiKey Authentication for an HTTP REST API
@@ -86,7 +135,8 @@ class Authentication(Command):
         # tenant_info = TenantInformation(datacenter, username)
         # return tenant_info
 
-    def __init__(self, userid, credentials, usertype='user', method='apikey', datacenter='us'):
+    def __init__(self, userid, credentials, usertype='user', method='apikey', datacenter='us', token_cache=None,
+                 refresh_fraction=None):
         """
         Initialize the Agent access
           sslenabled - True if using HTTPS; otherwise False
@@ -96,6 +146,12 @@ class Authentication(Command):
           usertype - type of userid being provided (username, tenantid, tenantname) ** all lower case **
           userid - username/tenantid/tenantname for the authentication
           credentials - apikey/password/token for the given user
+          token_cache - (optional) cloudbackup.client.token_cache.TokenCache shared with other
+                        processes, or True to use the default cache file; tokens found there
+                        are used instead of contacting Identity
+          refresh_fraction - (optional) fraction (0..1) of the token lifetime after which the token
+                             is renewed on a background thread; AuthToken keeps returning the
+                             current token meanwhile instead of blocking near expiration
         """
         apihost = get_identity_apihost(datacenter)
         super(self.__class__, self).__init__(True, apihost, "/v2.0/tokens")
@@ -167,8 +223,107 @@ class Authentication(Command):
             self.o['auth']['token'] = {}
             self.o['auth']['token']['id'] = credentials
 
-        self.body = json.dumps(self.o)
+        self.credentials_body = json.dumps(self.o)
+        self.body = self.credentials_body
         self.auth_data = {}
+        # serializes token renewal between threads sharing the instance
+        self.token_lock = threading.RLock()
+        if token_cache is True:
+            token_cache = TokenCache()
+        self.token_cache = token_cache
+        self.token_cache_key = None
+        if token_cache is not None:
+            self.token_cache_key = TokenCache.Key(userid, usertype, method, datacenter, credentials)
+        if refresh_fraction is not None and not 0 < refresh_fraction < 1:
+            raise ValueError('refresh_fraction must be between 0 and 1: {0:}'.format(refresh_fraction))
+        self.refresh_fraction = refresh_fraction
+        self.refresh_at = None
+        self.refresh_thread = None
+        # (auth_data, expiration time, ServiceCatalog) of the current token
+        self.parsed = (None, None, ServiceCatalog({}))
+
+    def __Parsed(self):
+        """
+        (internal) Expiration time (seconds since the epoch) and service catalog index
+        of the current token; parsed once per token
+
+        Returns (auth_data, expiration time or None, ServiceCatalog)
+        """
+        parsed = self.parsed
+        auth_data = self.auth_data
+        if parsed[0] is not auth_data:
+            parsed = (auth_data, token_expiration(auth_data), ServiceCatalog(auth_data))
+            self.parsed = parsed
+        return parsed
+
+    def __SetAuthData(self, auth_data):
+        """
+        (internal) Use a new Identity response and schedule its background renewal
+        """
+        with self.token_lock:
+            self.auth_data = auth_data
+            self.__Parsed()
+            self.__ScheduleRefresh()
+
+    def __ScheduleRefresh(self):
+        """
+        (internal) Set the time of the next background renewal to refresh_fraction of
+        the remaining token lifetime from now
+        """
+        expires = self.__Parsed()[1]
+        if self.refresh_fraction is None or expires is None:
+            self.refresh_at = None
+            return
+        now = time.time()
+        self.refresh_at = now + max(0, expires - now) * self.refresh_fraction
+
+    def __RefreshToken(self):
+        """
+        (internal) Background thread renewing the token
+        """
+        try:
+            if self.__LoadCachedToken(newer_only=True):
+                return
+            self.GetToken()
+        except Exception as ex:
+            self.log.error('Background token renewal failed: {0:}'.format(str(ex)))
+        finally:
+            with self.token_lock:
+                # retry later if the renewal failed, or Identity handed back the same token
+                if self.refresh_at is not None and self.refresh_at <= time.time():
+                    self.__ScheduleRefresh()
+                self.refresh_thread = None
+
+    def __StartRefresh(self):
+        """
+        (internal) Start the background renewal if it is due and not already running
+
+        Note: Must be called with the token_lock held
+        """
+        if self.refresh_at is None or self.refresh_thread is not None or time.time() < self.refresh_at:
+            return
+        self.log.debug('Renewing the auth token in the background')
+        self.refresh_thread = threading.Thread(target=self.__RefreshToken)
+        self.refresh_thread.daemon = True
+        self.refresh_thread.start()
+
+    def __LoadCachedToken(self, newer_only=False):
+        """
+        (internal) Use the token from the token cache, if there is a valid one
+          newer_only - only use it if it expires later than the current token
+
+        Returns True if a token was loaded
+        """
+        if self.token_cache is None:
+            return False
+        auth_data = self.token_cache.Load(self.token_cache_key)
+        if auth_data is None:
+            return False
+        if newer_only and token_expiration(auth_data) <= (token_expiration(self.auth_data) or 0):
+            return False
+        self.__SetAuthData(auth_data)
+        self.log.debug('auth token loaded from the token cache')
+        return True
 
     def GetToken(self, retry=5):
         """
@@ -176,24 +331,27 @@ class Authentication(Command):
 
         Note: This may expire quickly. Tokens are valid for 6 hours but are not instance specific
         """
+        request = self.NewRequest('POST', '/v2.0/tokens')
+        request.body = self.credentials_body
         self.log.debug('host: %s', self.apihost)
-        self.log.debug('body: %s', self.Body)
-        self.log.debug('headers: %s', self.Headers)
-        self.log.debug('uri: %s', self.Uri)
-        response = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        self.log.debug('body: %s', request.body)
+        self.log.debug('headers: %s', request.headers)
+        self.log.debug('uri: %s', request.uri)
+        # Identity occasionally reports itself unavailable with a 404
+        response = self.Send(request,
+                             retry_rules={404: RetryRule(max_retries=retry, backoff_base=0.5, backoff_max=5.0)})
         if response.status_code is 200:
-            self.auth_data = response.json()
+            self.__SetAuthData(response.json())
             self.log.info('auth token: %s', self.auth_data['access']['token']['id'])
             self.log.debug('GetToken Response: {0:}'.format(self.auth_data))
+            if self.token_cache is not None:
+                self.token_cache.Store(self.token_cache_key, self.auth_data)
             return self.auth_data['access']['token']['id']
         elif response.status_code is 404:
-            self.log.error('server return unavailable. Trying again up to ' + str(retry) + ' times.')
+            self.log.error('server return unavailable after ' + str(retry) + ' retries.')
             self.log.error('reason: ' + response.reason)
-            if retry is 0:
-                self.log.error('No more retries. Failed.')
-                raise AuthenticationError('No more retries for authentication.')
-            else:
-                return self.GetToken(retry - 1)
+            self.log.error('No more retries. Failed.')
+            raise AuthenticationError('No more retries for authentication.')
         elif response.status_code >= 400:
             self.log.error('reason: ' + response.reason)
             self.log.error('failed to authenticate - ' + str(response.status_code) + ': ' + response.text)
@@ -206,64 +364,18 @@ class Authentication(Command):
     def IsExpired(self, fuzz=0):
         """
         Checks to see if the auth token has expired by comparing its expiration time stamp to the current time in utc
+          fuzz - seconds before the expiration time from which the token is considered expired
         """
-        def time_fuzzy_compare(timeval_older, timeval_newer, new_fuzz):
-            """
-            (internal) Fuzzy Compare two time values
-            """
-
-            def time_layer_compare(val_older, val_newer, next_layer):
-                """
-                (internal) compare layers recursively
-                """
-                if val_older == val_newer:
-                    if next_layer is not None:
-                        return next_layer['call'](next_layer['older'], next_layer['newer'], next_layer['next'])
-                    else:
-                        return True
-                else:
-                    return val_older > val_newer
-
-            return time_layer_compare(timeval_older.year, timeval_newer.year, {  # Year
-                'call': time_layer_compare, 'older': timeval_older.month, 'newer': timeval_newer.month, 'next': {  # Month
-                    'call': time_layer_compare, 'older': timeval_older.day, 'newer': timeval_newer.day, 'next': {  # Day
-                        'call': time_layer_compare, 'older': timeval_older.hour, 'newer': timeval_newer.hour, 'next': {  # Hour
-                            'call': time_layer_compare, 'older': timeval_older.minute, 'newer': timeval_newer.minute, 'next': {  # Minute
-                                'call': time_layer_compare, 'older': timeval_older.second, 'newer': (timeval_newer.second + new_fuzz), 'next': None  # Second
-                                }  # noqa
-                            }  # noqa
-                        }  # noqa
-                    }  # noqa
-                }  # noqa
-                )
-
-        # 2013-12-24T14:02:26.550Z
-        expirationtime = datetime.datetime.utcnow()
-        try:
+        expires = self.__Parsed()[1]
+        if expires is None:
             try:
-                expirationtime = datetime.datetime.strptime(self.AuthExpirationTime, "%Y-%m-%dT%H:%M:%S.%fZ")
-            except ValueError:
-                try:
-                    expirationtime = datetime.datetime.strptime(self.AuthExpirationTime, "%Y-%m-%dT%H:%M:%S")
-                except ValueError:
-                    msg = 'Unknown time format: {1:}'.format(self.AuthExpirationTime)
-                    self.log.error(msg)
-                    raise AuthenticationError(msg)
-        except AuthExpirationError:
-            self.log.debug('Not Auth Token data to check against.')
-            return True
-
-        nowtime = datetime.datetime.utcnow()
-
-        # Log the times and then do a fuzzy comparison
-        self.log.debug('Current Time: ' + str(nowtime))
-        self.log.debug('Auth Token Expiration Time: ' + str(expirationtime))
-        if time_fuzzy_compare(expirationtime, nowtime, fuzz):
-            self.log.debug('Auth Token is still valid (fuzz = {0:} seconds)'.format(fuzz))
-            return False
-        else:
-            self.log.debug('Auth Token is expired (fuzz = {0:} seconds)'.format(fuzz))
-            return True
+                msg = 'Unknown time format: {0:}'.format(self.AuthExpirationTime)
+            except AuthExpirationError:
+                self.log.debug('Not Auth Token data to check against.')
+                return True
+            self.log.error(msg)
+            raise AuthenticationError(msg)
+        return time.time() + fuzz >= expires
 
     @property
     def InitialAuthCredentials(self):
@@ -279,22 +391,67 @@ class Authentication(Command):
         """
         Retrieve the cached Authentication Token
 
-        Note: See GetToken()
+        Note: See GetToken(). With a refresh_fraction the token is renewed in the
+            background and the current token returned without waiting; only a token
+            that is already (about to be) expired is renewed synchronously, without
+            first waiting for it to expire.
         """
         try:
-            if self.IsExpired():
-                # Obviously expired
-                return self.GetToken()
-            elif self.IsExpired(fuzz=2):
-                # Near expiration
-                self.log.info('Token about to expire. Waiting 3 seconds to renew')
-                time.sleep(3)
-                return self.GetToken()
-            else:
-                return self.auth_data['access']['token']['id']
+            refresh_thread = None
+            with self.token_lock:
+                if self.refresh_fraction is not None and not self.IsExpired(fuzz=2):
+                    self.__StartRefresh()
+                    return self.auth_data['access']['token']['id']
+                refresh_thread = self.refresh_thread
+            if refresh_thread is not None:
+                # a renewal is already under way; wait for it instead of starting another
+                refresh_thread.join()
+
+            with self.token_lock:
+                if self.IsExpired(fuzz=2) and self.__LoadCachedToken():
+                    # another process already has a token
+                    return self.auth_data['access']['token']['id']
+                if self.IsExpired():
+                    # Obviously expired
+                    return self.GetToken()
+                elif self.IsExpired(fuzz=2):
+                    # Near expiration
+                    if self.refresh_fraction is not None:
+                        # a running renewal was waited on above; renew at once rather than let the token lapse
+                        self.log.info('Token about to expire. Renewing')
+                        return self.GetToken()
+                    self.log.info('Token about to expire. Waiting 3 seconds to renew')
+                    time.sleep(3)
+                    return self.GetToken()
+                else:
+                    return self.auth_data['access']['token']['id']
         except LookupError:
             raise AuthCredentialsErrors('Unable to retrieve authentication token')
 
+    def InvalidateToken(self, token=None):
+        """
+        Discard the token after the server rejected it (e.g. a 401) so that the
+        next use of AuthToken authenticates again
+          token - (optional) the rejected token; nothing is discarded if the
+                  current token is already a different (renewed) one
+
+        Returns True if the token was discarded
+        """
+        with self.token_lock:
+            try:
+                current = self.auth_data['access']['token']['id']
+            except LookupError:
+                current = None
+            if token is not None and current is not None and current != token:
+                return False
+            if token is None:
+                token = current
+            self.__SetAuthData({})
+            if self.token_cache is not None:
+                self.token_cache.Invalidate(self.token_cache_key, token)
+            self.log.info('auth token invalidated')
+            return True
+
     @property
     def AuthExpirationTime(self):
         """
@@ -348,13 +505,13 @@ class Authentication(Command):
         Note: Assumes all DCs have the same mossoid
         """
         try:
+            # raises a LookupError when there is no token
+            self.auth_data['access']['serviceCatalog']
             mossoid = None
-            for service in self.auth_data['access']['serviceCatalog']:
-                if service['name'] == 'cloudFiles':
-                    for endpoint in service['endpoints']:
-                        if len(endpoint['tenantId']):
-                            mossoid = endpoint['tenantId']
-                            break
+            for endpoint in self.__Parsed()[2].Endpoints('cloudFiles'):
+                if len(endpoint['tenantId']):
+                    mossoid = endpoint['tenantId']
+                    break
             return mossoid
         except LookupError:
             self.log.error('Unable to retrieve MossoID. Did you authenticate?')
@@ -369,19 +526,16 @@ class Authentication(Command):
 
         Note: get_credentials is RAX specific
         """
-        headers = self.Headers
-        headers['X-Auth-Token'] = self.AuthToken
-        old_uri = self.uri
         if not get_credentials:
-            self.ReInit(True, '/v2.0/users/{0:}/OS-KSADM/credentials'.format(self.AuthUserId))
+            request = self.NewRequest('GET', '/v2.0/users/{0:}/OS-KSADM/credentials'.format(self.AuthUserId))
         else:
-            self.ReInit(True, '/v2.0/users/{0:}/OS-KSADM/credentials/RAX-KSKEY:apiKeyCredentials'.format(self.parameters['userid']))
+            request = self.NewRequest('GET', '/v2.0/users/{0:}/OS-KSADM/credentials/RAX-KSKEY:apiKeyCredentials'.format(self.parameters['userid']))
+        request.headers['X-Auth-Token'] = self.AuthToken
 
         self.log.debug('host: %s', self.apihost)
-        self.log.debug('body: %s', self.Body)
-        self.log.debug('headers: %s', headers)
-        self.log.debug('uri: %s', self.Uri)
-        response = requests.get(self.Uri, headers=headers)
+        self.log.debug('headers: %s', request.headers)
+        self.log.debug('uri: %s', request.uri)
+        response = self.Send(request)
 
         self.log.debug('Response ({0:}): {1:}'.format(response.status_code, response.text))
         if response.status_code in (200, 203):
@@ -394,7 +548,18 @@ class Authentication(Command):
             self.log.error('failed to authenticate - ' + str(response.status_code) + ': ' + response.text)
             raise AuthenticationError('Error ({0:}: {1:}'.format(response.status_code, response.text))
 
-        self.uri = old_uri
+    def GetEndpoint(self, name, region=None, interface='public'):
+        """
+        Retrieve the URL of a service end-point from the service catalog
+          name - service name, e.g. cloudFiles
+          region - (optional) region (data center) of the end-point, None for a global end-point
+          interface - 'public' or 'internal' (ServiceNet)
+
+        Returns the URL, or None if the catalog has no such end-point
+        """
+        # We need the auth data so we must have an Auth Token
+        token = self.AuthToken  # noqa
+        return self.__Parsed()[2].Endpoint(name, region, interface)
 
     def GetCloudFilesDataCenters(self):
         """
@@ -404,12 +569,7 @@ class Authentication(Command):
         try:
             # We need the auth data so we must have an Auth Token
             token = self.AuthToken  # noqa
-            dclist = []
-            for service in self.auth_data['access']['serviceCatalog']:
-                if service['name'] == 'cloudFiles':
-                    for endpoint in service['endpoints']:
-                        dclist.append(endpoint['region'])
-            return dclist
+            return [endpoint['region'] for endpoint in self.__Parsed()[2].Endpoints('cloudFiles')]
         except LookupError:
             self.log.error('Unable to retrieve list of DCs for the currently authenticated user')
             raise AuthenticationError('Unable to retrieve User Identifier. Did you authenticate?')
@@ -418,24 +578,27 @@ class Authentication(Command):
         """
         Retrieve the CloudFiles URI for the given DC
 
-        Returns an array of dictionaries containing 'name' and 'uri' pairs
+        Returns an array of dictionaries containing 'name' and 'uri' pairs;
+        'snet' is only listed if the end-point has an internal URL
         """
         try:
             # We need the auth data so we must have an Auth Token
             token = self.AuthToken  # noqa
+            catalog = self.__Parsed()[2]
             dcuri = []
-            for service in self.auth_data['access']['serviceCatalog']:
-                if service['name'] == 'cloudFiles':
-                    for endpoint in service['endpoints']:
-                        if endpoint['region'].lower() == dc.lower():
-                            publicuri = {}
-                            publicuri['name'] = 'public'
-                            publicuri['uri'] = endpoint['publicURL']
-                            dcuri.append(publicuri)
-                            sneturi = {}
-                            sneturi['name'] = 'snet'
-                            sneturi['uri'] = endpoint['internalURL']
-                            dcuri.append(sneturi)
+            publicurl = catalog.Endpoint('cloudFiles', dc, 'public')
+            if publicurl is not None:
+                publicuri = {}
+                publicuri['name'] = 'public'
+                publicuri['uri'] = publicurl
+                dcuri.append(publicuri)
+                # not every end-point has a ServiceNet URL
+                sneturl = catalog.Endpoint('cloudFiles', dc, 'internal')
+                if sneturl is not None:
+                    sneturi = {}
+                    sneturi['name'] = 'snet'
+                    sneturi['uri'] = sneturl
+                    dcuri.append(sneturi)
             return dcuri
         except LookupError:
             self.log.error('Unable to retrieve DC URI for the currently authenticated user')
@@ -452,31 +615,26 @@ class Authentication(Command):
             token = self.AuthToken  # noqa
             dcuri = None
 
-            for service in self.auth_data['access']['serviceCatalog']:
-                if service['name'] == 'cloudBackup':
-                    # check for the global end-point (Phoenix)
-                    if len(service['endpoints']) == 1:
-                        # Global End-Point
-                        endpoint = service['endpoints'][0]
-                        if useServiceNet:
-                            dcuri = endpoint['internalURL']
-                        else:
-                            dcuri = endpoint['publicURL']
-
-                        if self._GetCloudBackupAPiVersion(dcuri) > 1:
-                            # b/c the service catalog end-point is presently broken
-                            # we have to hard code it
-                            dcuri = 'https://api-prod-global.drivesrvr.com/v2/{0}'.format(
-                                self.AuthTenantId
-                            )
-                    else:
-                        # DC-specific End-Points
-                        for endpoint in service['endpoints']:
-                            if endpoint['region'].lower() == dc.lower():
-                                if useServiceNet:
-                                    dcuri = endpoint['internalURL']
-                                else:
-                                    dcuri = endpoint['publicURL']
+            catalog = self.__Parsed()[2]
+            endpoints = catalog.Endpoints('cloudBackup')
+            # check for the global end-point (Phoenix)
+            if len(endpoints) == 1:
+                # Global End-Point
+                endpoint = endpoints[0]
+                if useServiceNet:
+                    dcuri = endpoint['internalURL']
+                else:
+                    dcuri = endpoint['publicURL']
+
+                if self._GetCloudBackupAPiVersion(dcuri) > 1:
+                    # b/c the service catalog end-point is presently broken
+                    # we have to hard code it
+                    dcuri = 'https://api-prod-global.drivesrvr.com/v2/{0}'.format(
+                        self.AuthTenantId
+                    )
+            elif len(endpoints):
+                # DC-specific End-Points
+                dcuri = catalog.Endpoint('cloudBackup', dc, 'internal' if useServiceNet else 'public')
             if dcuri is None:
                 msg = 'Unable to find DC URI for the currently authenticated user'
                 self.log.error(msg)
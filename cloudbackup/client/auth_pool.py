@@ -0,0 +1,239 @@
+"""
+Rackspace Authentication Pool
+
+Holds the authentication (token and service catalog) of many accounts along
+with ready to use API objects per account, for operations that sweep over a
+fleet of tenants.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from cloudbackup.client.agents import Agents
+from cloudbackup.client.auth import Authentication
+from cloudbackup.client.backup import Backups, Restores
+from cloudbackup.common.ratelimit import RateLimiter
+from cloudbackup.common.workers import map_concurrently
+
+
+class Account(object):
+    """
+    Credentials of an account in an AuthenticationPool
+      userid - username/tenantid/tenantname for the authentication
+      credentials - apikey/password/token for the given user
+      usertype - type of userid being provided (user, tenantid, tenantname)
+      method - type of credentials being provided (apikey, password, token)
+      datacenter - data center of the Cloud Backup API to use
+      use_servicenet - True to use the ServiceNet end-points
+    """
+
+    def __init__(self, userid, credentials, usertype='user', method='apikey', datacenter='us', use_servicenet=False):
+        self.userid = userid
+        self.credentials = credentials
+        self.usertype = usertype
+        self.method = method
+        self.datacenter = datacenter
+        self.use_servicenet = use_servicenet
+
+    @property
+    def Key(self):
+        """
+        Identity of the account in the pool; the credentials are only kept as a digest
+        """
+        digest = hashlib.sha256(u'{0:}'.format(self.credentials).encode('utf-8')).hexdigest()
+        return (self.userid, self.usertype, self.method, self.datacenter, self.use_servicenet, digest)
+
+    def __repr__(self):
+        return 'Account({0:}, {1:}, {2:})'.format(self.userid, self.usertype, self.datacenter)
+
+
+class PoolEntry(object):
+    """
+    Authentication and API objects of one account
+    """
+
+    def __init__(self, account, authenticator):
+        self.account = account
+        self.authenticator = authenticator
+        self.clients = {}
+        # serializes creating the API objects of the account
+        self.lock = threading.Lock()
+
+
+class AuthenticationPool(object):
+    """
+    Bounded pool of authenticated accounts
+      max_entries - maximum number of accounts kept; the least recently used is evicted
+      workers - number of threads used by Authenticate() and Map()
+      token_cache - (optional) cloudbackup.client.token_cache.TokenCache shared by all the accounts
+      refresh_fraction - (optional) see cloudbackup.client.auth.Authentication
+      apihost - (optional) Cloud Backup API host to use instead of the one in the service catalog
+      api_version - (optional) Cloud Backup API version to use instead of the one in the service catalog
+      sslenabled - True if using HTTPS for the Cloud Backup API; otherwise False
+      prepare - (optional) callable applied to every Authentication and API object the pool
+                creates (e.g. cloudbackup.tests.services.server.FakeCloudServer.Attach)
+      identity_rate_limiter - (optional) cloudbackup.common.ratelimit.RateLimiter for the Identity
+                              requests of the accounts; by default they are only bounded by the
+                              number of workers, as the shared rate limiter would otherwise put the
+                              token requests of all the accounts in the same bucket
+
+    All the API objects share the process wide transport and rate limiter, so
+    the pool only adds the per-account state.
+    """
+
+    client_classes = {
+        'agents': Agents,
+        'backups': Backups,
+        'restores': Restores
+    }
+
+    def __init__(self, max_entries=256, workers=8, token_cache=None, refresh_fraction=None,
+                 apihost=None, api_version=None, sslenabled=True, prepare=None, identity_rate_limiter=None):
+        self.log = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.workers = workers
+        self.token_cache = token_cache
+        self.refresh_fraction = refresh_fraction
+        self.apihost = apihost
+        self.api_version = api_version
+        self.sslenabled = sslenabled
+        self.prepare = prepare
+        if identity_rate_limiter is None:
+            identity_rate_limiter = RateLimiter(read_rate=None, write_rate=None)
+        self.identity_rate_limiter = identity_rate_limiter
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    @property
+    def Statistics(self):
+        """
+        Counters of the pool look-ups and evictions
+        """
+        with self.lock:
+            result = dict(self.counters)
+            result['entries'] = len(self.entries)
+        return result
+
+    def __Prepare(self, command):
+        if self.prepare is not None:
+            result = self.prepare(command)
+            if result is not None:
+                command = result
+        return command
+
+    def __Entry(self, account):
+        key = account.Key
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                # most recently used last
+                self.entries[key] = self.entries.pop(key)
+                self.counters['hits'] += 1
+                return entry
+
+            self.counters['misses'] += 1
+            authenticator = Authentication(account.userid, account.credentials,
+                                           usertype=account.usertype,
+                                           method=account.method,
+                                           datacenter=account.datacenter,
+                                           token_cache=self.token_cache,
+                                           refresh_fraction=self.refresh_fraction)
+            authenticator.RateLimiter = self.identity_rate_limiter
+            entry = PoolEntry(account, self.__Prepare(authenticator))
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                evicted = self.entries.popitem(last=False)[1]
+                self.counters['evictions'] += 1
+                self.log.debug('Evicted {0:} from the authentication pool'.format(evicted.account))
+            return entry
+
+    def Authenticator(self, account):
+        """
+        Retrieve the cloudbackup.client.auth.Authentication of the account, creating it if needed
+
+        Note: The token is only requested when it is first used, see Authenticate()
+        """
+        return self.__Entry(account).authenticator
+
+    def Client(self, account, client_type='agents'):
+        """
+        Retrieve an API object of the account ready for use
+          account - Account to use
+          client_type - 'agents', 'backups' or 'restores'
+
+        The API object is created once per account (authenticating if needed) and
+        may be used by several threads at once.
+        """
+        if client_type not in self.client_classes:
+            raise ValueError('Unknown client type: {0:}'.format(client_type))
+        entry = self.__Entry(account)
+        with entry.lock:
+            client = entry.clients.get(client_type, None)
+            if client is None:
+                authenticator = entry.authenticator
+                # We need the auth data so we must have an Auth Token
+                token = authenticator.AuthToken  # noqa
+                apihost = self.apihost
+                if apihost is None:
+                    apihost = authenticator.GetCloudBackupApiUri(account.datacenter, account.use_servicenet)
+                api_version = self.api_version
+                if api_version is None:
+                    api_version = authenticator.GetCloudBackupApiVersion(account.datacenter, account.use_servicenet)
+                client = self.client_classes[client_type](self.sslenabled, authenticator, apihost,
+                                                          api_version, authenticator.AuthTenantId)
+                client = self.__Prepare(client)
+                entry.clients[client_type] = client
+            return client
+
+    def Evict(self, account):
+        """
+        Remove an account and its API objects from the pool
+
+        Returns True if the account was in the pool
+        """
+        with self.lock:
+            return self.entries.pop(account.Key, None) is not None
+
+    def Map(self, function, accounts, workers=None):
+        """
+        Call function(account) for each account on a pool of threads
+          workers - (optional) number of threads, defaults to the pool's
+
+        Returns a list of (account, result, exception) in the order of the accounts;
+        exception is None unless the call raised
+        """
+        if workers is None:
+            workers = self.workers
+        results = map_concurrently(function, accounts, workers)
+        for account, result, error in results:
+            if error is not None:
+                self.log.error('{0:} failed for {1:}: {2:}'.format(getattr(function, '__name__', function),
+                                                                   account, str(error)))
+        return results
+
+    def Authenticate(self, accounts=None, workers=None):
+        """
+        Make sure the accounts have a valid token, authenticating them concurrently
+          accounts - (optional) Accounts to authenticate, defaults to all the accounts in the pool
+          workers - (optional) number of threads, defaults to the pool's
+
+        Returns a dict of Account.Key to the token, None for the accounts that failed
+        """
+        if accounts is None:
+            with self.lock:
+                accounts = [entry.account for entry in self.entries.values()]
+
+        def authenticate(account):
+            return self.Authenticator(account).AuthToken
+
+        return dict((account.Key, token) for account, token, error in self.Map(authenticate, accounts, workers))
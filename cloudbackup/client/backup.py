@@ -11,12 +11,25 @@ from time import sleep
 import types
 import uuid
 
+from cloudbackup.common.cache import get_configuration_cache
 from cloudbackup.common.command import Command
+from cloudbackup.common.retry import RetryRule
 from cloudbackup.utils import tz
 
 requests.packages.urllib3.disable_warnings()
 
 
+def _start_retry_rules(retry):
+    """
+    (internal) Retry rules for requests starting a backup or restore
+
+    Note: The API responds with 403 while the agent is not yet ready to
+        accept the request, so it is retried in addition to the status
+        codes covered by the retry policy
+    """
+    return {403: RetryRule(max_retries=retry, backoff_base=1.0, backoff_max=10.0)}
+
+
 class BackupConfiguration(object):
     """
     Python Class to wrap a backup configuration
@@ -1068,7 +1081,8 @@ class Backups(Command):
           api_version - Version of the RCBU API
           project_id - User's tenant id
         """
-        super(self.__class__, self).__init__(sslenabled, apihost, '/')
+        # the configurations are served from a cache shared with the other Agents and Backups objects
+        super(self.__class__, self).__init__(sslenabled, apihost, '/', response_cache=get_configuration_cache())
         self.log = logging.getLogger(__name__)
         # save the ssl status for the various reinits done for each API call supported
         self.sslenabled = sslenabled
@@ -1090,13 +1104,12 @@ class Backups(Command):
           backupinfo is an instance of cloudbackup.client.backup.BackupConfiguration
         """
         if self.api_version == 1 and isinstance(backupinfo, BackupConfiguration):
-            self.ReInit(self.sslenabled, '/v1.0/backup-configuration')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
-            self.body = json.dumps(backupinfo.to_creation_dict)
-            self.log.debug('sending: {0}'.format(self.body))
-            res = requests.post(self.Uri, headers=self.Headers,
-                                data=self.Body)
+            request = self.NewRequest('POST', '/v1.0/backup-configuration')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
+            request.body = json.dumps(backupinfo.to_creation_dict)
+            self.log.debug('sending: {0}'.format(request.body))
+            res = self.Send(request)
             if res.status_code is 200:
                 ret = res.json()
                 backupinfo.ConfigurationId = ret['BackupConfigurationId']
@@ -1107,15 +1120,14 @@ class Backups(Command):
                 self.log.error('error info: %s', res.text)
                 return False
         elif self.api_version == 2 and isinstance(backupinfo, BackupConfigurationV2):
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/configurations'.format(
-                            self.api_version, self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.body = json.dumps(backupinfo.Configuration)
-            self.log.debug('sending: {0}'.format(self.body))
-            res = requests.post(self.Uri, headers=self.Headers,
-                                data=self.Body)
+            request = self.NewRequest('POST',
+                                      '/v{0}/{1}/configurations'.format(
+                                          self.api_version, self.project_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.body = json.dumps(backupinfo.Configuration)
+            self.log.debug('sending: {0}'.format(request.body))
+            res = self.Send(request)
             if res.status_code is 201:
                 resp_body = res.json()
                 self.configuration_id = resp_body['id']
@@ -1135,22 +1147,21 @@ class Backups(Command):
         Enable/Disable a Backup Configuration
         """
         if self.api_version == 1:
-            self.ReInit(
-                self.sslenabled,
+            request = self.NewRequest(
+                'POST',
                 '/v1.0/{0}/backup-configuration/enable/{1}'.format(
                     self.authenticator.AuthTenantId,
                     backup_config_id
                 )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
             config_change = {
                 'Enabled': enabled
             }
-            self.body = json.dumps(config_change)
-            self.log.debug('sending: {0}'.format(self.body))
-            res = requests.post(self.Uri, headers=self.Headers,
-                                data=self.Body)
+            request.body = json.dumps(config_change)
+            self.log.debug('sending: {0}'.format(request.body))
+            res = self.Send(request)
             if res.status_code is 200:
                 ret = res.json()
                 return True
@@ -1161,17 +1172,17 @@ class Backups(Command):
                 return False
 
         else:
-            self.ReInit(
-                self.sslenabled,
+            request = self.NewRequest(
+                'PATCH',
                 '/v{0}/{1}/configurations/{2}'.format(
                     self.api_version,
                     self.project_id,
                     backup_config_id
                 )
             )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
-            self.headers['X-Project-Id'] = self.project_id
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request.headers['X-Project-Id'] = self.project_id
             o = [
                 {
                     'op': 'replace',
@@ -1179,9 +1190,9 @@ class Backups(Command):
                     'value': enabled
                 }
             ]
-            self.body = json.dumps(o)
+            request.body = json.dumps(o)
             self.log.debug('Updating Log Level: {0}'.format(o))
-            res = requests.patch(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.Send(request)
             if res.status_code == 204:
                 self.log.info('Updated configuration enabled status to {0}'.format(enabled))
                 return True
@@ -1193,9 +1204,9 @@ class Backups(Command):
         """
         Retrieve the specific backup configuration from the API
         """
-        self.ReInit(self.sslenabled, '/v1.0/backup-configuration/{0:}'.format(backup_config_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', '/v1.0/backup-configuration/{0:}'.format(backup_config_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        res = self.CachedGet(request.uri, request.headers)
         if res.status_code is 200:
             return BackupConfiguration.from_dict(res.json(), source='backup-configuration')
         else:
@@ -1210,11 +1221,11 @@ class Backups(Command):
         """
         if isinstance(backupinfo, BackupConfiguration):
             self.log.error('Updating Backup Configuration {0:}'.format(backupinfo.ConfigurationId))
-            self.ReInit(self.sslenabled, '/v1.0/backup-configuration/{0:}'.format(backupinfo.ConfigurationId))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
-            self.body = json.dumps(backupinfo.to_update_dict)
-            res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+            request = self.NewRequest('PUT', '/v1.0/backup-configuration/{0:}'.format(backupinfo.ConfigurationId))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
+            request.body = json.dumps(backupinfo.to_update_dict)
+            res = self.Send(request)
             if res.status_code is 200:
                 return True
             else:
@@ -1231,11 +1242,11 @@ class Backups(Command):
         identifier
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/backup-configuration/{0}'.format(
-                            backup_config_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.delete(self.Uri, headers=self.Headers)
+            request = self.NewRequest('DELETE',
+                                      '/v1.0/backup-configuration/{0}'.format(
+                                          backup_config_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
             if res.status_code is 200:
                 return True
             else:
@@ -1244,13 +1255,13 @@ class Backups(Command):
                 self.log.error('error info: %s', res.text)
                 return False
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/configurations/{2}'
-                        .format(self.api_version, self.project_id,
-                                backup_config_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            res = requests.delete(self.Uri, headers=self.Headers)
+            request = self.NewRequest('DELETE',
+                                      '/v{0}/{1}/configurations/{2}'
+                                      .format(self.api_version, self.project_id,
+                                              backup_config_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            res = self.Send(request)
             if res.status_code is 204:
                 return True
             else:
@@ -1262,32 +1273,27 @@ class Backups(Command):
     def StartBackup(self, backup_config_id, retry=20):
         """
         Start a backup with the given backup configuration id
+          retry - maximum number of times to retry while the API responds with 403
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, '/v1.0/backup/action-requested')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
+            request = self.NewRequest('POST', '/v1.0/backup/action-requested')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
             o = {}
             o['Action'] = 'StartManual'
             o['Id'] = backup_config_id
-            self.body = json.dumps(o)
+            request.body = json.dumps(o)
             self.log.info('start manual backup request body: %s',
                           json.dumps(o, sort_keys=False, indent=2))
-            res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.Send(request, retry_rules=_start_retry_rules(retry))
             self.log.info('start backup return code %s', res.status_code)
             self.log.info('start backup text reply %s', res.text)
 
             if res.status_code == 403:
-                if retry <= 0:
-                    raise RuntimeError(
-                            'Start Backup Failed - Access Forbidden: '
-                            'error code ({0:}) - {1:} - {2:}'
-                            .format(res.status_code, res.reason, res.text))
-                else:
-                    self.log.warning('Received 403; retrying after 1 second')
-                    time.sleep(1)
-                    return self.StartBackup(backup_config_id,
-                                            retry=(retry - 1))
+                raise RuntimeError(
+                        'Start Backup Failed - Access Forbidden: '
+                        'error code ({0:}) - {1:} - {2:}'
+                        .format(res.status_code, res.reason, res.text))
             elif res.status_code != 200:
                 self.log.error('status code: %d', res.status_code)
                 self.log.error('reason: ' + res.reason)
@@ -1300,33 +1306,27 @@ class Backups(Command):
             self.log.info('snapshot ID: %s', self.snapshot_id)
             return self.snapshot_id
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/backups'.format(self.api_version,
-                                                   self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            request = self.NewRequest('POST',
+                                      '/v{0}/{1}/backups'.format(self.api_version,
+                                                                 self.project_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.headers['Content-Type'] = 'application/json; charset=utf-8'
             o = {}
             o['configuration_id'] = backup_config_id
             o['state'] = 'start_requested'
-            self.body = json.dumps(o)
+            request.body = json.dumps(o)
             self.log.info('start manual backup request body: %s',
                           json.dumps(o, sort_keys=False, indent=2))
-            res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+            res = self.Send(request, retry_rules=_start_retry_rules(retry))
             self.log.info('start backup return code %s', res.status_code)
             self.log.info('start backup text reply %s', res.text)
             if res.status_code == 403:
-                if retry <= 0:
-                    raise RuntimeError('Start Backup Failed - '
-                                       'Access Forbidden: error code ({0:}) - '
-                                       '{1:} - {2:}'
-                                       .format(res.status_code, res.reason,
-                                               res.text))
-                else:
-                    self.log.warning('Received 403; retrying after 1 second')
-                    time.sleep(1)
-                    return self.StartBackup(backup_config_id,
-                                            retry=(retry - 1))
+                raise RuntimeError('Start Backup Failed - '
+                                   'Access Forbidden: error code ({0:}) - '
+                                   '{1:} - {2:}'
+                                   .format(res.status_code, res.reason,
+                                           res.text))
             elif res.status_code != 201:
                 self.log.error('status code: %d', res.status_code)
                 self.log.error('reason: ' + res.reason)
@@ -1342,9 +1342,9 @@ class Backups(Command):
         """
         Get the progress of the backup for the given snapshot id for a V1 Backup
         """
-        self.ReInit(self.sslenabled, "/v1.0/backup/" + str(snapshot_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', "/v1.0/backup/" + str(snapshot_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        res = self.Send(request)
         if (res.status_code != 200):
             self.log.warn('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -1355,14 +1355,14 @@ class Backups(Command):
         """
         Get the progress of the backup for the given snapshot id for a V2 Backup
         """
-        self.ReInit(self.sslenabled,
-                    '/v{0}/{1}/backups/{2}'.format(self.api_version,
-                                                   self.project_id,
-                                                   snapshot_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['X-Project-Id'] = self.project_id
-        self.headers['Content-Type'] = 'application/json; charset=utf-8'
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET',
+                                  '/v{0}/{1}/backups/{2}'.format(self.api_version,
+                                                                 self.project_id,
+                                                                 snapshot_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['X-Project-Id'] = self.project_id
+        request.headers['Content-Type'] = 'application/json; charset=utf-8'
+        res = self.Send(request)
         if (res.status_code != 200):
             self.log.warn('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -1433,111 +1433,127 @@ class Backups(Command):
         '''
         Retrieve all the backups - in any state - for a given Backup Configuration
         '''
-        if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/{0}/system/activity/{1}'
-                        .format(
-                            self.authenticator.AuthTenantId,
-                           agent_id
-                        )
-            )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code is 200:
-                backups = []
-                for activity in res.json():
-                    if activity['Type'] == 'Backup':
-                        if activity['ParentId'] == backup_config_id:
-                            backups.append(
-                                {
-                                    'id': activity['ID'],
-                                    'state': activity['CurrentState'],
-                                    'agent': activity['SourceMachineAgentId'],
-                                    'updated_at': activity['TimeOfActivity']
-                                }
-                            )
-                return backups
+        try:
+            return list(self.IterAllBackupsForConfiguration(agent_id, backup_config_id))
+        except RuntimeError as ex:
+            self.log.error(str(ex))
+            return []
 
-            else:
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-                return []
+    def IterAllBackupsForConfiguration(self, agent_id, backup_config_id, page_size=100, prefetch=True):
+        '''
+        Generator returning all the backups - in any state - for a given Backup Configuration
+          agent_id - agent the backup configuration belongs to
+          backup_config_id - backup configuration to list the backups of
+          page_size - number of activities retrieved per request (API v2 and newer)
+          prefetch - True to retrieve the next page while the current one is being consumed
 
-        else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/configurations/{2}/activities'
-                        .format(
-                            self.api_version,
-                            self.project_id,
-                            backup_config_id
-                        )
-            )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+        Raises RuntimeError if the backups can not be retrieved
+        '''
+        return self.__IterActivities(agent_id, backup_config_id, 'Backup', page_size, prefetch)
 
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code is 200:
-                resp_json = res.json()
-                activities = resp_json['activities']
-                backups = []
-                for activity in activities:
-                    if activity['type'] == 'backup':
-                        backups.append(
-                            {
-                                'id': activity['id'],
-                                'state': activity['state'],
-                                'agent': activity['agent'],
-                                'updated_at': activity['last_updated_time']
-                            }
-                        )
-
-                return backups
+    def __IterActivities(self, agent_id, backup_config_id, activity_type, page_size, prefetch):
+        '''
+        Generator returning the activities of the given type, see IterAllBackupsForConfiguration()
+          activity_type - 'Backup' or 'Cleanup'
+        '''
+        if self.api_version == 1:
+            request = self.NewRequest('GET',
+                                      '/v1.0/{0}/system/activity/{1}'
+                                      .format(
+                                          self.authenticator.AuthTenantId,
+                                          agent_id
+                                      )
+            )
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
+            if res.status_code != 200:
+                raise RuntimeError('status code: {0:} reason: {1:} error info: {2:}'.format(
+                    res.status_code, res.reason, res.text))
+            for activity in res.json():
+                if activity['Type'] == activity_type:
+                    if backup_config_id is None or activity['ParentId'] == backup_config_id:
+                        yield {
+                            'id': activity['ID'],
+                            'state': activity['CurrentState'],
+                            'agent': activity['SourceMachineAgentId'],
+                            'updated_at': activity['TimeOfActivity']
+                        }
 
+        else:
+            if backup_config_id is None:
+                uripath = '/v{0}/{1}/agents/{2}/activities'.format(
+                    self.api_version,
+                    self.project_id,
+                    agent_id
+                )
             else:
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-                return []
+                uripath = '/v{0}/{1}/configurations/{2}/activities'.format(
+                    self.api_version,
+                    self.project_id,
+                    backup_config_id
+                )
 
+            def new_request():
+                request = self.NewRequest('GET', uripath)
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['X-Project-Id'] = self.project_id
+                request.headers['Content-Type'] = 'application/json; charset=utf-8'
+                return request
+
+            for activity in self.SendPaginated(new_request, 'activities', page_size=page_size, prefetch=prefetch):
+                if activity['type'] == activity_type.lower():
+                    yield {
+                        'id': activity['id'],
+                        'state': activity['state'],
+                        'agent': activity['agent'],
+                        'updated_at': activity['last_updated_time']
+                    }
 
     def GetCompletedBackups(self, backup_config_id):
         '''
         Retrieves all the backups completed for a Backup Configuration
         '''
+        try:
+            return list(self.IterCompletedBackups(backup_config_id))
+        except RuntimeError as ex:
+            self.log.error(str(ex))
+            return list()
+
+    def IterCompletedBackups(self, backup_config_id, page_size=100, prefetch=True):
+        '''
+        Generator returning the backups completed for a Backup Configuration
+          backup_config_id - backup configuration to list the completed backups of
+          page_size - number of backups retrieved per request (API v2 and newer)
+          prefetch - True to retrieve the next page while the current one is being consumed
+
+        Raises RuntimeError if the backups can not be retrieved
+        '''
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/backup/completed/{0}'.format(backup_config_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code is 200:
-                snapshots = res.json()
-            else:
-                snapshots = list()
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-            return snapshots
+            request = self.NewRequest('GET',
+                                      '/v1.0/backup/completed/{0}'.format(backup_config_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
+            if res.status_code != 200:
+                raise RuntimeError('status code: {0:} reason: {1:} error info: {2:}'.format(
+                    res.status_code, res.reason, res.text))
+            for snapshot in res.json():
+                yield snapshot
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/backups'.format(self.api_version,
-                                                   self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+            def new_request():
+                request = self.NewRequest('GET',
+                                          '/v{0}/{1}/backups'.format(self.api_version,
+                                                                     self.project_id))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['X-Project-Id'] = self.project_id
+                request.headers['Content-Type'] = 'application/json; charset=utf-8'
+                return request
+
             params = {}
             params['restorable'] = True
             params['configuration_id'] = backup_config_id
-            res = requests.get(self.Uri, headers=self.Headers, params=params)
-            if res.status_code is 200:
-                snapshots = res.json()['backups']
-            else:
-                snapshots = list()
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-            return snapshots
+            for snapshot in self.SendPaginated(new_request, 'backups', page_size=page_size,
+                                               params=params, prefetch=prefetch):
+                yield snapshot
 
     def GetCompletedBackup(self, backup_config_id, snapshot_id):
         """
@@ -1615,11 +1631,11 @@ class Backups(Command):
             }
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        "/v1.0/backup/report/" + str(backup_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      "/v1.0/backup/report/" + str(backup_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
+            res = self.Send(request)
             if res.status_code == 200:
                 return res.json()
             else:
@@ -1631,13 +1647,13 @@ class Backups(Command):
                 self.log.error(msg)
                 raise RuntimeError(msg)
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/backups/{2}'
-                        .format(self.api_version, self.project_id, backup_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/backups/{2}'
+                                      .format(self.api_version, self.project_id, backup_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.headers['Content-Type'] = 'application/json'
+            res = self.Send(request)
             if res.status_code == 200:
                 error_data = None
                 json_data = res.json()
@@ -1665,13 +1681,13 @@ class Backups(Command):
             raise NotImplemented('Not implemented for v1')
 
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/backups/{2}/errors'
-                        .format(self.api_version, self.project_id, backup_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/backups/{2}/errors'
+                                      .format(self.api_version, self.project_id, backup_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.headers['Content-Type'] = 'application/json'
+            res = self.Send(request)
             if res.status_code == 200:
                 return res.json()
 
@@ -1768,9 +1784,9 @@ class Backups(Command):
                 }
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, '/v1.0/backup/availableforrestore')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET', '/v1.0/backup/availableforrestore')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
             availForRestore = dict()
             availForRestore['backups'] = list()
             availForRestore['code'] = res.status_code
@@ -1791,16 +1807,16 @@ class Backups(Command):
                                'agent {0}'.format(machine_agent_id))
             return availForRestore
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/backups'.format(self.api_version,
-                                                   self.project_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json'
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/backups'.format(self.api_version,
+                                                                 self.project_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.headers['Content-Type'] = 'application/json'
             params = {}
             params['restorable'] = True
             params['configuration_id'] = backup_config_id
-            res = requests.get(self.Uri, headers=self.Headers, params=params)
+            res = self.Send(request, params=params)
             availForRestore = dict()
             availForRestore['backups'] = list()
             availForRestore['code'] = res.status_code
@@ -1822,85 +1838,35 @@ class Backups(Command):
 
     def GetAllCleanupsForConfiguration(self, agent_id):
         '''
-        Retrieve all the backups - in any state - for a given Backup Configuration
+        Retrieve all the cleanups - in any state - for a given agent
         '''
-        if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/{0}/system/activity/{1}'
-                        .format(
-                            self.authenticator.AuthTenantId,
-                           agent_id
-                        )
-            )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code is 200:
-                backups = []
-                for activity in res.json():
-                    if activity['Type'] == 'Cleanup':
-                        backups.append(
-                            {
-                                'id': activity['ID'],
-                                'state': activity['CurrentState'],
-                                'agent': activity['SourceMachineAgentId'],
-                                'updated_at': activity['TimeOfActivity']
-                            }
-                        )
-                return backups
-
-            else:
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-                return []
-
-        else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/configurations/{2}/activities'
-                        .format(
-                            self.api_version,
-                            self.project_id,
-                            backup_config_id
-                        )
-            )
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json; charset=utf-8'
+        try:
+            return list(self.IterAllCleanupsForConfiguration(agent_id))
+        except RuntimeError as ex:
+            self.log.error(str(ex))
+            return []
 
-            res = requests.get(self.Uri, headers=self.Headers)
-            if res.status_code is 200:
-                resp_json = res.json()
-                activities = resp_json['activities']
-                backups = []
-                for activity in activities:
-                    if activity['type'] == 'cleanup':
-                        backups.append(
-                            {
-                                'id': activity['id'],
-                                'state': activity['state'],
-                                'agent': activity['agent'],
-                                'updated_at': activity['last_updated_time']
-                            }
-                        )
-
-                return backups
+    def IterAllCleanupsForConfiguration(self, agent_id, page_size=100, prefetch=True):
+        '''
+        Generator returning all the cleanups - in any state - for a given agent
+          agent_id - agent to list the cleanups of
+          page_size - number of activities retrieved per request (API v2 and newer)
+          prefetch - True to retrieve the next page while the current one is being consumed
 
-            else:
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-                self.log.error('error info: %s', res.text)
-                return []
+        Raises RuntimeError if the cleanups can not be retrieved
+        '''
+        return self.__IterActivities(agent_id, None, 'Cleanup', page_size, prefetch)
 
     def GetCleanupReport(self, cleanup_id):
         """
         Retrieve the cleanup report the agent stored as a result of performing a cleanup
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        "/v1.0/cleanup/report/" + str(cleanup_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      "/v1.0/cleanup/report/" + str(cleanup_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
+            res = self.Send(request)
             if res.status_code == 200:
                 return res.json()
             else:
@@ -1912,13 +1878,13 @@ class Backups(Command):
                 self.log.error(msg)
                 raise RuntimeError(msg)
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/cleanups/{2}'
-                        .format(self.api_version, self.project_id, cleanup_id))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['X-Project-Id'] = self.project_id
-            self.headers['Content-Type'] = 'application/json'
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/cleanups/{2}'
+                                      .format(self.api_version, self.project_id, cleanup_id))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['X-Project-Id'] = self.project_id
+            request.headers['Content-Type'] = 'application/json'
+            res = self.Send(request)
             if res.status_code == 200:
                 error_data = None
                 json_data = res.json()
@@ -2192,14 +2158,14 @@ class Restores(Command):
         ''' Create a restore configuration
         '''
         if isinstance(restoreinfo, RestoreConfiguration):
-            self.ReInit(self.sslenabled, '/v1.0/restore')
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['Content-Type'] = 'application/json'
-            self.body = json.dumps(restoreinfo.Configuration)
-            self.log.info(self.body)
+            request = self.NewRequest('PUT', '/v1.0/restore')
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['Content-Type'] = 'application/json'
+            request.body = json.dumps(restoreinfo.Configuration)
+            self.log.info(request.body)
             self.log.info(self.authenticator.AuthToken)
-            self.log.info(self.uri)
-            res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+            self.log.info(request.uri)
+            res = self.Send(request)
             if res.status_code is 200:
                 return res.json()
             else:
@@ -2220,9 +2186,9 @@ class Restores(Command):
 
     # TODO: Test
     def DeleteRestoreConfiguration(self, restore_file_id):
-        self.ReInit(self.sslenabled, '/v1.0/restore/files/{0}'.format(restore_file_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.delete(self.Uri, headers=self.Headers)
+        request = self.NewRequest('DELETE', '/v1.0/restore/files/{0}'.format(restore_file_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        res = self.Send(request)
         if res.status_code is 200:
             return True
         else:
@@ -2233,11 +2199,11 @@ class Restores(Command):
 
     # TODO: Test
     def __IncExcReq(self, req):
-        self.ReInit(self.sslenabled, "/v1.0/restore/files")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json'
-        self.body = json.dumps(req)
-        res = requests.put(self.Uri, headers=self.Headers, data=self.Body)
+        request = self.NewRequest('PUT', "/v1.0/restore/files")
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'application/json'
+        request.body = json.dumps(req)
+        res = self.Send(request)
         if (res.status_code != 200):
             self.log.error('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -2283,9 +2249,9 @@ class Restores(Command):
 
     # TODO: Test
     def ListIncExcFiles(self, restore_config_id):
-        self.ReInit(self.sslenabled, '/v1.0/restore/files/{0}'.format(restore_config_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', '/v1.0/restore/files/{0}'.format(restore_config_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        res = self.Send(request)
         if res.status_code is 200:
             return res.json()
         else:
@@ -2295,20 +2261,15 @@ class Restores(Command):
             return dict()
 
     def __StartStopRestore(self, req, retry=20):
-        self.ReInit(self.sslenabled, "/v1.0/restore/action-requested")
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'application/json'
-        self.body = json.dumps(req)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        request = self.NewRequest('POST', "/v1.0/restore/action-requested")
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'application/json'
+        request.body = json.dumps(req)
+        res = self.Send(request, retry_rules=_start_retry_rules(retry))
         if res.status_code == 403:
-            if retry <= 0:
-                self.log.error('Failed due to access forbidden')
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-            else:
-                self.log.warning('Received 403; retrying after 1 second')
-                time.sleep(1)
-                return self.__StartStopRestore(req, retry=(retry - 1))
+            self.log.error('Failed due to access forbidden')
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
         elif res.status_code != 204:
             self.log.error('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -2376,20 +2337,15 @@ class Restores(Command):
         return output
 
     def StartRestoreV2(self, restore_config, retry=20):
-        self.ReInit(self.sslenabled, '/v{0}/{1}/restores'.format(
+        request = self.NewRequest('POST', '/v{0}/{1}/restores'.format(
             self.api_version, self.project_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.body = json.dumps(restore_config)
-        res = requests.post(self.Uri, headers=self.Headers, data=self.Body)
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.body = json.dumps(restore_config)
+        res = self.Send(request, retry_rules=_start_retry_rules(retry))
         if res.status_code == 403:
-            if retry <= 0:
-                self.log.error('Failed due to access forbidden')
-                self.log.error('status code: %d', res.status_code)
-                self.log.error('reason: ' + res.reason)
-            else:
-                self.log.warning('Received 403; retrying after 1 second')
-                time.sleep(1)
-                return self.StartRestoreV2(restore_config, retry=(retry - 1))
+            self.log.error('Failed due to access forbidden')
+            self.log.error('status code: %d', res.status_code)
+            self.log.error('reason: ' + res.reason)
         elif res.status_code != 201:
             self.log.error('status code: %d', res.status_code)
             self.log.error('reason: ' + res.reason)
@@ -2458,9 +2414,9 @@ class Restores(Command):
             Exclusions
         '''
         if self.api_version == 1:
-            self.ReInit(self.sslenabled, '/v1.0/restore/{0}'.format(restoreId))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET', '/v1.0/restore/{0}'.format(restoreId))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
             if res.status_code is 200:
                 return res.json()
             else:
@@ -2469,10 +2425,10 @@ class Restores(Command):
                 self.log.error('error info: %s', res.text)
                 return dict()
         else:
-            self.ReInit(self.sslenabled, '/v{0}/{1}/restores/{2}'
-                        .format(self.api_version, self.project_id, restoreId))
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            res = requests.get(self.Uri, headers=self.Headers)
+            request = self.NewRequest('GET', '/v{0}/{1}/restores/{2}'
+                                      .format(self.api_version, self.project_id, restoreId))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            res = self.Send(request)
             if res.status_code is 200:
                 return res.json()
             else:
@@ -2562,9 +2518,9 @@ class Restores(Command):
             Diagnostics
             ErrorList
         '''
-        self.ReInit(self.sslenabled, '/v1.0/restore/report/{0}'.format(restoreId))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', '/v1.0/restore/report/{0}'.format(restoreId))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        res = self.Send(request)
         if res.status_code is 200:
             return res.json()
         else:
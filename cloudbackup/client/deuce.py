@@ -4,7 +4,6 @@ Rackspace Deuce API
 from __future__ import print_function
 
 import logging
-import requests
 
 from cloudbackup.common.command import Command
 
@@ -47,24 +46,24 @@ class DeuceClient(Command):
         self.authenticator = authenticator
         self.primary_dc = primary_dc
 
-    def __update_headers(self):
+    def __update_headers(self, request):
         """
         Update common headers
         """
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['X-Project-ID'] = self.ProjectId
-        for uri in self.authenticator.GetCloudFilesUri(self.primary_dc):
-            if uri['name'] == 'snet':
-                self.headers['X-Storage-URL'] = uri['uri']
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['X-Project-ID'] = self.ProjectId
+        storage_url = self.authenticator.GetEndpoint('cloudFiles', self.primary_dc, 'internal')
+        if storage_url is not None:
+            request.headers['X-Storage-URL'] = storage_url
 
-    def __log_request_data(self):
+    def __log_request_data(self, request):
         """
         Log the information about the request
         """
         self.log.debug('host: %s', self.apihost)
-        self.log.debug('body: %s', self.Body)
-        self.log.debug('headers: %s', self.Headers)
-        self.log.debug('uri: %s', self.Uri)
+        self.log.debug('body: %s', request.body)
+        self.log.debug('headers: %s', request.headers)
+        self.log.debug('uri: %s', request.uri)
 
     @property
     def ProjectId(self):
@@ -79,10 +78,10 @@ class DeuceClient(Command):
         Create a Vault
             vaultname - name of vault to be created
         """
-        self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
-        self.__update_headers()
-        self.__log_request_data()
-        res = requests.put(self.Uri, headers=self.Headers)
+        request = self.NewRequest('PUT', '/v1.0/{0:}'.format(vaultname))
+        self.__update_headers(request)
+        self.__log_request_data(request)
+        res = self.Send(request)
 
         if res.status_code == 201:
             return True
@@ -94,10 +93,10 @@ class DeuceClient(Command):
         Delete a Vault
             vaultname - name of vault to be deleted
         """
-        self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
-        self.__update_headers()
-        self.__log_request_data()
-        res = requests.delete(self.Uri, headers=self.Headers)
+        request = self.NewRequest('DELETE', '/v1.0/{0:}'.format(vaultname))
+        self.__update_headers(request)
+        self.__log_request_data(request)
+        res = self.Send(request)
 
         if res.status_code == 204:
             return True
@@ -109,10 +108,10 @@ class DeuceClient(Command):
         Return the statistics on a Vault
             vaultname - name of vault to be deleted
         """
-        self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
-        self.__update_headers()
-        self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', '/v1.0/{0:}'.format(vaultname))
+        self.__update_headers(request)
+        self.__log_request_data(request)
+        res = self.Send(request)
 
         if res.status_code == 204:
             return True
@@ -126,10 +125,10 @@ class DeuceClient(Command):
         Return the statistics on a Vault
             vaultname - name of vault to be deleted
         """
-        self.ReInit(self.sslenabled, '/v1.0/{0:}'.format(vaultname))
-        self.__update_headers()
-        self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', '/v1.0/{0:}'.format(vaultname))
+        self.__update_headers(request)
+        self.__log_request_data(request)
+        res = self.Send(request)
 
         if res.status_code == 200:
             return res.json()
@@ -156,10 +155,10 @@ class DeuceClient(Command):
             if limit is not None:
                 url = '{0:}limit={1:}'.format(url, limit)
 
-        self.ReInit(self.sslenabled, url)
-        self.__update_headers()
-        self.__log_request_data()
-        res = requests.get(self.Uri, headers=self.Headers)
+        request = self.NewRequest('GET', url)
+        self.__update_headers(request)
+        self.__log_request_data(request)
+        res = self.Send(request)
 
         if res.status_code == 200:
             return res.json()
@@ -103,6 +103,8 @@ class Rse(Command):
         self.apihost = apihost
         self.api_version = api_version
         self.project_id = project_id
+        # request used by Query() to read the channel, see RseInit()
+        self.channel_request = None
 
     def RseInitDirect(self, machine_agent_id):
         """
@@ -111,14 +113,15 @@ class Rse(Command):
 
         Note: Directly interacts with RSE
         """
-        self.apihost = self.agent.GetRseHost(machine_agent_id)
-        self.ReInit(self.sslenabled, self.agent.GetRseChannel(machine_agent_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['X-Agent-Key'] = self.agentkey
+        request = self.NewRequest('GET', self.agent.GetRseChannel(machine_agent_id),
+                                  apihost=self.agent.GetRseHost(machine_agent_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['X-Agent-Key'] = self.agentkey
         # RSE version is hard coded and must be changed when a newer version of RSE is to be used
-        self.headers['X-RSE-Version'] = '2011-05-01'
+        request.headers['X-RSE-Version'] = '2011-05-01'
         # This really matters when we are talkingw ith RSE
-        self.headers['User-Agent'] = self.rsedata.RseUserAgent
+        request.headers['User-Agent'] = self.rsedata.RseUserAgent
+        self.channel_request = request
 
     def RseInitIndirect(self, machine_agent_id):
         """
@@ -127,14 +130,15 @@ class Rse(Command):
         Note: Indirectly interacts with RSE via the API
         """
         if self.api_version == 1:
-            self.ReInit(self.sslenabled,
-                        '/v1.0/agent/events/{0}'.format(machine_agent_id))
+            request = self.NewRequest('GET',
+                                      '/v1.0/agent/events/{0}'.format(machine_agent_id))
         else:
-            self.ReInit(self.sslenabled,
-                        '/v{0}/{1}/agents/{2}/events/'.format(
-                            self.api_version, self.project_id,
-                            machine_agent_id))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request = self.NewRequest('GET',
+                                      '/v{0}/{1}/agents/{2}/events/'.format(
+                                          self.api_version, self.project_id,
+                                          machine_agent_id))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        self.channel_request = request
 
     def RseInit(self, machine_agent_id):
         """
@@ -151,7 +155,7 @@ class Rse(Command):
         """
         Retrieves one record set from the RSE Channel
         """
-        res = requests.get(self.Uri, headers=self.Headers)
+        res = self.Send(self.channel_request)
         self.log.debug('RSE Query: Code (%s)', res.status_code)
         if not self.rselogfile is None:
             with open(self.rselogfile, 'a') as out:
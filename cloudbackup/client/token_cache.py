@@ -0,0 +1,176 @@
+"""
+Rackspace Authentication Token Cache
+
+On-disk cache of the Identity responses (token and service catalog) shared
+by all the processes of a user so that they do not each have to authenticate.
+"""
+import calendar
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from cloudbackup.utils.atomicfile import AtomicFile
+from cloudbackup.utils.filelock import FileLock, FileLockTimeout
+
+
+def default_token_cache_path():
+    """
+    Location of the token cache when none is given: ~/.cloudbackup/token-cache.json
+    """
+    return os.path.join(os.path.expanduser('~'), '.cloudbackup', 'token-cache.json')
+
+
+def token_expiration(auth_data):
+    """
+    Expiration time of the token in an Identity response as seconds since the epoch
+
+    Returns None if the response has no (recognizable) expiration time
+    """
+    try:
+        expires = auth_data['access']['token']['expires']
+    except (LookupError, TypeError):
+        return None
+    # 2013-12-24T14:02:26.550Z
+    for time_format in ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return calendar.timegm(datetime.datetime.strptime(expires, time_format).timetuple())
+        except ValueError:
+            continue
+    return None
+
+
+class TokenCache(object):
+    """
+    Token and service catalog cache shared between processes
+      path - (optional) JSON file holding the cache, defaults to default_token_cache_path()
+      margin - seconds before the expiration time at which a token is no longer handed out
+      lock_timeout - seconds to wait for another process using the cache
+
+    The file is only readable by its owner and is updated atomically under a
+    lock file (path + '.lock') so that concurrent processes never see a partial
+    write. Failures to use the cache are logged and treated as a cache miss.
+    """
+
+    def __init__(self, path=None, margin=60, lock_timeout=10.0):
+        self.log = logging.getLogger(__name__)
+        if path is None:
+            path = default_token_cache_path()
+        self.path = path
+        self.margin = margin
+        self.lock_timeout = lock_timeout
+        # file locks are held per process; threads serialize on this as well
+        self.thread_lock = threading.Lock()
+
+    @staticmethod
+    def Key(userid, usertype, method, datacenter, credentials):
+        """
+        Cache key for a set of credentials
+
+        Note: A digest of the credentials is part of the key so that a changed
+            API key or password never reuses a token obtained with the old one,
+            and so that the credentials themselves are never written to disk.
+        """
+        digest = hashlib.sha256(u'{0:}'.format(credentials).encode('utf-8')).hexdigest()
+        key = u'\n'.join([u'{0:}'.format(value) for value in (userid, usertype, method, datacenter, digest)])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def __Lock(self):
+        directory = os.path.dirname(self.path)
+        if len(directory) and not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        return FileLock(self.path + '.lock', timeout=self.lock_timeout)
+
+    def __Read(self):
+        try:
+            with open(self.path, 'r') as cache_file:
+                entries = json.load(cache_file)
+        except (IOError, OSError):
+            return {}
+        except ValueError:
+            self.log.warning('Ignoring corrupt token cache {0:}'.format(self.path))
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def __Write(self, entries):
+        with AtomicFile(self.path, 'w', prefix='.token-cache-', permissions=0o600) as cache_file:
+            json.dump(entries, cache_file)
+
+    def __IsUsable(self, entry, now):
+        return entry.get('expires', 0) - self.margin > now
+
+    def Load(self, key):
+        """
+        Retrieve the cached Identity response for the key
+
+        Returns the response (dict) or None if there is no unexpired entry
+        """
+        try:
+            with self.thread_lock:
+                with self.__Lock():
+                    entry = self.__Read().get(key, None)
+        except (IOError, OSError, FileLockTimeout) as ex:
+            self.log.warning('Unable to read the token cache {0:}: {1:}'.format(self.path, str(ex)))
+            return None
+        if entry is None or not self.__IsUsable(entry, time.time()):
+            return None
+        return entry.get('auth_data', None)
+
+    def Store(self, key, auth_data):
+        """
+        Save an Identity response under the key; expired entries are dropped
+
+        Returns True if the cache was updated
+        """
+        expires = token_expiration(auth_data)
+        if expires is None:
+            self.log.debug('Not caching a token without an expiration time')
+            return False
+        try:
+            with self.thread_lock:
+                with self.__Lock():
+                    now = time.time()
+                    entries = dict((entry_key, entry) for entry_key, entry in self.__Read().items()
+                                   if isinstance(entry, dict) and self.__IsUsable(entry, now))
+                    entries[key] = {
+                        'expires': expires,
+                        'auth_data': auth_data
+                    }
+                    self.__Write(entries)
+            return True
+        except (IOError, OSError, FileLockTimeout) as ex:
+            self.log.warning('Unable to update the token cache {0:}: {1:}'.format(self.path, str(ex)))
+            return False
+
+    def Invalidate(self, key, token=None):
+        """
+        Remove the entry for the key
+          token - (optional) only remove the entry if it holds this token, so that a
+                  token another process already renewed is kept
+
+        Returns True if an entry was removed
+        """
+        try:
+            with self.thread_lock:
+                with self.__Lock():
+                    entries = self.__Read()
+                    entry = entries.get(key, None)
+                    if entry is None:
+                        return False
+                    if token is not None:
+                        try:
+                            if entry['auth_data']['access']['token']['id'] != token:
+                                return False
+                        except (LookupError, TypeError):
+                            pass
+                    del entries[key]
+                    self.__Write(entries)
+            return True
+        except (IOError, OSError, FileLockTimeout) as ex:
+            self.log.warning('Unable to update the token cache {0:}: {1:}'.format(self.path, str(ex)))
+            return False
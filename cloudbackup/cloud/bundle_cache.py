@@ -0,0 +1,272 @@
+"""
+Rackspace Cloud Backup Bundle Cache
+
+On-disk cache of downloaded bundles shared by all the processes of a user
+so that repeated restores and audits do not download the same bundles from
+Cloud Files again. Bundles are content-addressed by vault, bundle id and MD5
+and the least recently used ones are evicted to stay within a size budget.
+"""
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+from cloudbackup.common.durability import MB, DurableFileWriter
+from cloudbackup.utils.atomicfile import AtomicFile
+from cloudbackup.utils.filelock import FileLock, FileLockTimeout
+
+DEFAULT_BUNDLE_CACHE_SIZE = 10 * 1024 * MB
+
+
+def default_bundle_cache_path():
+    """
+    Location of the bundle cache when none is given: ~/.cloudbackup/bundle-cache
+    """
+    return os.path.join(os.path.expanduser('~'), '.cloudbackup', 'bundle-cache')
+
+
+class BundleCache(object):
+    """
+    Bundle cache shared between processes
+      path - (optional) directory holding the cache, defaults to default_bundle_cache_path()
+      max_bytes - disk space the cached bundles may use; the least recently used are evicted beyond it
+      lock_timeout - seconds to wait for another process evicting bundles
+      block_size - size of the reads made while copying and hashing bundles
+
+    Bundles are added atomically (written to a temporary file and renamed) so
+    that other processes never see a partial bundle, and evicted under a lock
+    file (path + '/.lock'). The modification time of a cached bundle records
+    its last use. Every bundle served is checked against its MD5; a corrupt
+    bundle is removed and reported as a miss. Failures to use the cache are
+    logged and treated as a cache miss.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_BUNDLE_CACHE_SIZE, lock_timeout=30.0, block_size=4 * MB):
+        self.log = logging.getLogger(__name__)
+        if path is None:
+            path = default_bundle_cache_path()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock_timeout = lock_timeout
+        self.block_size = block_size
+        # file locks are held per process; threads serialize on this as well
+        self.thread_lock = threading.Lock()
+        self.counter_lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'bytes-saved': 0,
+            'stored': 0,
+            'corrupt': 0,
+            'evictions': 0
+        }
+
+    @property
+    def Statistics(self):
+        """
+        Cache counters of this object
+          hits - bundles served from the cache
+          misses - bundles that had to be downloaded
+          hit-ratio - hits / (hits + misses)
+          bytes-saved - bytes served from the cache instead of Cloud Files
+          stored - bundles added to the cache
+          corrupt - cached bundles that failed the MD5 check and were removed
+          evictions - bundles removed to honour max_bytes
+        """
+        with self.counter_lock:
+            result = dict(self.counters)
+        lookups = result['hits'] + result['misses']
+        result['hit-ratio'] = float(result['hits']) / lookups if lookups else 0.0
+        return result
+
+    def __Count(self, counter, amount=1):
+        with self.counter_lock:
+            self.counters[counter] += amount
+
+    @staticmethod
+    def Key(vault, bundle_id, md5):
+        """
+        Cache key of a bundle
+          vault - identifies the vault, e.g. its container and path in Cloud Files
+          bundle_id - the bundle id
+          md5 - the MD5 (hex) of the bundle
+
+        Note: The MD5 is part of the key so that a bundle rewritten in the vault
+            (e.g. after garbage collection) never matches the previous version.
+        """
+        vault_digest = hashlib.sha256(u'{0:}'.format(vault).encode('utf-8')).hexdigest()[:32]
+        return (vault_digest, '{0:010}-{1:}'.format(int(bundle_id), md5.upper()))
+
+    def __EntryPath(self, key):
+        return os.path.join(self.path, key[0], key[1])
+
+    def __Lock(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, 0o700)
+        return FileLock(os.path.join(self.path, '.lock'), timeout=self.lock_timeout)
+
+    def __Copy(self, source, destination_file):
+        """
+        Copy an open file into another one
+
+        Returns the (md5, sha1, bytes) of the data copied
+        """
+        md5 = hashlib.md5()
+        sha1 = hashlib.sha1()
+        total = 0
+        while True:
+            data = source.read(self.block_size)
+            if not len(data):
+                break
+            destination_file.write(data)
+            md5.update(data)
+            sha1.update(data)
+            total += len(data)
+        return (md5.hexdigest(), sha1.hexdigest(), total)
+
+    def __Remove(self, entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError as ex:
+            if ex.errno != errno.ENOENT:
+                raise
+
+    def Fetch(self, key, destination, durability=None):
+        """
+        Copy a cached bundle to destination
+          key - see Key()
+          destination - file to write the bundle to
+          durability - (optional) cloudbackup.common.durability.Durability of the destination
+
+        Returns a dictionary with the 'md5', 'sha1' (hex) and 'bytes' of the bundle
+        or None if the bundle is not (or no longer) in the cache
+        """
+        entry_path = self.__EntryPath(key)
+        md5 = key[1].partition('-')[2]
+        try:
+            try:
+                cached = open(entry_path, 'rb')
+            except (IOError, OSError) as ex:
+                if ex.errno != errno.ENOENT:
+                    raise
+                self.__Count('misses')
+                return None
+            with cached:
+                # an open bundle stays readable even if another process evicts it meanwhile
+                try:
+                    os.utime(entry_path, None)
+                except OSError:
+                    pass
+                with DurableFileWriter(destination, durability) as destination_file:
+                    digest, sha1, total = self.__Copy(cached, destination_file)
+        except (IOError, OSError) as ex:
+            self.log.warning('Unable to use the bundle cache {0:}: {1:}'.format(entry_path, str(ex)))
+            self.__Count('misses')
+            return None
+
+        if digest.upper() != md5:
+            self.log.warning('Removing corrupt cached bundle {0:}: MD5 {1:}'.format(entry_path, digest.upper()))
+            self.__Count('corrupt')
+            self.__Count('misses')
+            try:
+                self.__Remove(entry_path)
+            except OSError as ex:
+                self.log.warning('Unable to remove {0:}: {1:}'.format(entry_path, str(ex)))
+            return None
+
+        self.__Count('hits')
+        self.__Count('bytes-saved', total)
+        return {
+            'md5': digest,
+            'sha1': sha1,
+            'bytes': total
+        }
+
+    def Store(self, key, source):
+        """
+        Add a downloaded bundle to the cache, evicting the least recently used bundles as needed
+          key - see Key()
+          source - file holding the bundle; it must match the MD5 of the key
+
+        Returns True if the bundle was added
+        """
+        md5 = key[1].partition('-')[2]
+        entry_path = self.__EntryPath(key)
+        try:
+            size = os.path.getsize(source)
+            if size > self.max_bytes:
+                self.log.debug('Bundle {0:} is larger than the bundle cache'.format(source))
+                return False
+            directory = os.path.dirname(entry_path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory, 0o700)
+                except OSError as ex:
+                    if ex.errno != errno.EEXIST:
+                        raise
+            with AtomicFile(entry_path, 'wb', prefix='.bundle-') as cached, open(source, 'rb') as source_file:
+                digest = self.__Copy(source_file, cached)[0]
+                if digest.upper() != md5:
+                    # discards the copy
+                    raise IOError('{0:} does not match MD5 {1:}'.format(source, md5))
+        except (IOError, OSError) as ex:
+            self.log.warning('Unable to add {0:} to the bundle cache: {1:}'.format(source, str(ex)))
+            return False
+
+        self.__Count('stored')
+        try:
+            self.Evict()
+        except (IOError, OSError, FileLockTimeout) as ex:
+            self.log.warning('Unable to evict bundles from the bundle cache {0:}: {1:}'.format(self.path, str(ex)))
+        return True
+
+    def Evict(self, max_bytes=None):
+        """
+        Remove the least recently used bundles until the cache uses at most max_bytes (defaults to the budget)
+
+        Returns the number of bytes the cache uses afterwards
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        with self.thread_lock:
+            with self.__Lock():
+                entries = []
+                total = 0
+                for vault in os.listdir(self.path):
+                    vault_path = os.path.join(self.path, vault)
+                    if vault.startswith('.') or not os.path.isdir(vault_path):
+                        continue
+                    for name in os.listdir(vault_path):
+                        # temporary files of bundles being added
+                        if name.startswith('.'):
+                            continue
+                        entry_path = os.path.join(vault_path, name)
+                        try:
+                            status = os.stat(entry_path)
+                        except OSError:
+                            continue
+                        entries.append((status.st_mtime, status.st_size, entry_path))
+                        total += status.st_size
+
+                entries.sort()
+                for _, size, entry_path in entries:
+                    if total <= max_bytes:
+                        break
+                    self.log.debug('Evicting cached bundle {0:}'.format(entry_path))
+                    self.__Remove(entry_path)
+                    total -= size
+                    self.__Count('evictions')
+        return total
+
+    def Clear(self):
+        """
+        Remove all the cached bundles
+        """
+        with self.thread_lock:
+            with self.__Lock():
+                for vault in os.listdir(self.path):
+                    vault_path = os.path.join(self.path, vault)
+                    if not vault.startswith('.') and os.path.isdir(vault_path):
+                        shutil.rmtree(vault_path, ignore_errors=True)
@@ -0,0 +1,187 @@
+"""
+Rackspace Cloud Backup Bundle Fetching
+
+Downloads the bundles needed by a restore (as listed by
+cloudbackup.database.sqlite.CloudBackupSqlite.GetFileBundles) on a bounded
+number of threads, verifying each against the MD5 recorded in the VaultDB,
+and plans the byte ranges of the blocks needed to read single files from
+the bundles (see cloudbackup.cloud.files.CloudFiles.DownloadFileBlocks).
+"""
+import logging
+import os
+import threading
+import time
+
+from cloudbackup.cloud.ranges import hash_prefix
+from cloudbackup.common.workers import map_concurrently
+
+
+def bundle_path(localpath, bundle):
+    """
+    Local file of a bundle downloaded by cloudbackup.cloud.files.CloudFiles.DownloadBundle()
+    """
+    return localpath + '.bundle-{0:010}'.format(bundle['id'])
+
+
+def block_key(block):
+    """
+    Where a block is stored: (bundle id, offset in the bundle)
+    """
+    return (block['bundle']['id'], block['bundle']['offset'])
+
+
+def merge_block_ranges(blocks, max_gap=0):
+    """
+    Byte ranges of a bundle covering the given blocks
+      blocks - block dictionaries (see CloudBackupSqlite.GetFileBlocks) of a single bundle
+      max_gap - blocks separated by at most this many unneeded bytes share a range
+
+    Returns a list of (first byte, last byte, blocks in the range) in the order of the bundle
+    """
+    ranges = []
+    unique = {}
+    for block in blocks:
+        unique.setdefault(block_key(block), block)
+    for key in sorted(unique):
+        block = unique[key]
+        first = block['bundle']['offset']
+        last = first + block['size'] - 1
+        if len(ranges) and first <= ranges[-1][1] + 1 + max_gap:
+            ranges[-1][1] = max(ranges[-1][1], last)
+            ranges[-1][2].append(block)
+        else:
+            ranges.append([first, last, [block]])
+    return [tuple(byte_range) for byte_range in ranges]
+
+
+class BundleFetcher(object):
+    """
+    Download many bundles at once
+      cloudfiles - cloudbackup.cloud.files.CloudFiles to download with
+      container - the CloudFiles container holding the vault
+      uripath - the path in the container under which the BUNDLES directory is
+      localpath - the bundles are stored as localpath + '.bundle-NNNNNNNNNN'
+      workers - number of bundles downloaded at once
+      retries - number of times a bundle is downloaded again after a failure or an MD5 mismatch
+      resume - resume interrupted transfers with Range requests, see CloudFiles.DownloadBundle()
+
+    Bundles already on disk with the expected MD5 are not downloaded again.
+    """
+
+    def __init__(self, cloudfiles, container, uripath, localpath, workers=4, retries=3, resume=True):
+        self.log = logging.getLogger(__name__)
+        self.cloudfiles = cloudfiles
+        self.container = container
+        self.uripath = uripath
+        self.localpath = localpath
+        self.workers = max(1, workers)
+        self.retries = max(0, retries)
+        self.resume = resume
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.total = 0
+
+    def __Verified(self, bundle, path):
+        """
+        Whether the file holds the bundle, by its MD5
+        """
+        if not os.path.isfile(path):
+            return False
+        hashes = hash_prefix(path, os.path.getsize(path))
+        if hashes is None:
+            return False
+        md5, sha1 = hashes
+        if md5.hexdigest().upper() != bundle['md5'].upper():
+            return False
+        bundle['download-md5'] = md5.hexdigest().upper()
+        bundle['download-sha1'] = sha1.hexdigest().upper()
+        bundle['file-on-disk'] = path
+        return True
+
+    @staticmethod
+    def __Discard(path):
+        for stale in (path, path + '.download-checkpoint'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    def __Fetch(self, bundle):
+        """
+        Download and verify a single bundle
+
+        Returns True if the bundle was downloaded, False if it was already on disk
+        """
+        path = bundle_path(self.localpath, bundle)
+        if self.__Verified(bundle, path):
+            self.log.debug('Bundle {0:} is already on disk'.format(bundle['id']))
+            downloaded = False
+        else:
+            attempt = 0
+            while True:
+                try:
+                    self.cloudfiles.DownloadBundle(self.container, self.uripath, bundle, self.localpath,
+                                                   resume=self.resume)
+                    if bundle['download-md5'] == bundle['md5'].upper():
+                        break
+                    # a resumed download may have been built on bad data: start over
+                    self.__Discard(path)
+                    error = UserWarning('Bundle {0:} MD5 mismatch: downloaded {1:}, expected {2:}'.format(
+                        bundle['id'], bundle['download-md5'], bundle['md5'].upper()))
+                except Exception as ex:
+                    error = ex
+                attempt += 1
+                if attempt > self.retries:
+                    raise error
+                self.log.warning('Retrying bundle {0:} ({1:} of {2:}): {3:}'.format(bundle['id'], attempt, self.retries,
+                                                                                     str(error)))
+                time.sleep(min(30, 2 ** attempt))
+            downloaded = True
+
+        with self.lock:
+            self.completed += 1
+            self.log.info('Bundle {0:} ready ({1:} of {2:})'.format(bundle['id'], self.completed, self.total))
+        return downloaded
+
+    def Fetch(self, bundles):
+        """
+        Download the bundles not already on disk
+          bundles - list of bundle dictionaries with at least 'id' and 'md5'
+
+        Each bundle dictionary receives 'download-md5', 'download-sha1' and 'file-on-disk'.
+
+        Returns a dictionary with the following data:
+            - 'downloaded' - the bundles that were downloaded
+            - 'skipped' - the bundles that were already on disk
+            - 'failed' - list of (bundle, exception) for the bundles that could not be downloaded
+            - 'bytes' - the number of bytes downloaded
+            - 'seconds' - the time taken
+            - 'bytes-per-second' - the aggregate throughput of the downloads
+        """
+        bundles = list(bundles)
+        self.completed = 0
+        self.total = len(bundles)
+        start = time.time()
+        outcomes = map_concurrently(self.__Fetch, bundles, self.workers)
+        elapsed = time.time() - start
+
+        result = {
+            'downloaded': [],
+            'skipped': [],
+            'failed': [],
+            'bytes': 0,
+            'seconds': elapsed
+        }
+        for bundle, downloaded, error in outcomes:
+            if error is not None:
+                self.log.error('Unable to download bundle {0:}: {1:}'.format(bundle['id'], str(error)))
+                result['failed'].append((bundle, error))
+            elif downloaded:
+                result['downloaded'].append(bundle)
+                result['bytes'] += os.path.getsize(bundle['file-on-disk'])
+            else:
+                result['skipped'].append(bundle)
+        result['bytes-per-second'] = result['bytes'] / elapsed if elapsed > 0 else 0.0
+
+        self.log.info('Downloaded {0:} bundles ({1:} bytes) in {2:.1f} s - {3:.1f} MB/s; {4:} already on disk, {5:} failed'.format(
+            len(result['downloaded']), result['bytes'], elapsed, result['bytes-per-second'] / (1024 * 1024),
+            len(result['skipped']), len(result['failed'])))
+        return result
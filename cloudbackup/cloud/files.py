@@ -1,17 +1,58 @@
 """
 Rackspace Cloud Files
 """
+import datetime
+import email.utils
 import gzip
 import hashlib
+import json
 import logging
 import os.path
+import re
 import requests
 import time
 
+from six.moves.urllib.parse import urlencode
+
+from cloudbackup.cloud.bundles import block_key, bundle_path, merge_block_ranges
+from cloudbackup.cloud.pipeline import GzipReader, StreamBody, gzip_bound
+from cloudbackup.cloud.ranges import (DEFAULT_RANGE_SIZE, DownloadCheckpoint, RangeHasher, hash_prefix, parse_byteranges,
+                                      preallocate, range_header)
+from cloudbackup.cloud.slo import (DEFAULT_SEGMENT_SIZE, MAX_OBJECT_SIZE, FileSegment, SegmentCheckpoint,
+                                   file_digests, manifest_etag, plan_segments, segment_container)
+from cloudbackup.common.cache import ResponseCache
 from cloudbackup.common.command import Command
+from cloudbackup.common.durability import Durability, DurableFileWriter
+from cloudbackup.common.pagination import iterate_items
+from cloudbackup.common.workers import map_concurrently
+from cloudbackup.utils.gunzip import GunzipWriter
 
 requests.packages.urllib3.disable_warnings()
 
+# Content-Range: bytes 100-199/1000
+_content_range_pattern = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def _object_size(res, content_range):
+    """
+    (Internal) Size of the object sent in a 200 or 206 response to an open-ended request, None if unknown
+    """
+    if res.status_code == 200:
+        if 'Content-Length' not in res.headers:
+            return None
+        return int(res.headers['Content-Length'])
+    elif content_range.group(3) != '*':
+        return int(content_range.group(3))
+    # the complete length is not known, but an open-ended range ends with the last byte of the object
+    return int(content_range.group(2)) + 1
+
+
+# Most objects Cloud Files returns in a single page of a listing
+LISTING_PAGE_SIZE = 10000
+
+# Seconds a listing is reused before Cloud Files is asked again
+LISTING_CACHE_TTL = 5.0
+
 
 
 class CloudFiles(Command):
@@ -30,6 +71,8 @@ class CloudFiles(Command):
         self.auth = authenticator
         self.usepublicnet = publicnet
         self.log = logging.getLogger(__name__)
+        self.listing_cache = ResponseCache(max_entries=64, ttl=LISTING_CACHE_TTL)
+        self.bundle_cache = None
 
     def _get_container(self, container):
         """
@@ -46,22 +89,22 @@ class CloudFiles(Command):
         """
         List all containers for the current account
         """
-        self.apihost = self._get_container(uri)
         urioptions = '?format=json'
         if not limit is -1:
             urioptions += '&limit=%d' % limit
         if len(marker):
             urioptions += '&marker=%s' % marker
-        self.ReInit(self.sslenabled, urioptions)
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'text/plain; charset=UTF-8'
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('headers: %s', self.Headers)
+        request = self.NewRequest('GET', urioptions,
+                                  apihost=self._get_container(uri))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'text/plain; charset=UTF-8'
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('headers: %s', request.headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.Send(request)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.Send(request, verify=False)
         if res.status_code == 200:
             # We have a list in JSON format
             return res.json()
@@ -77,22 +120,22 @@ class CloudFiles(Command):
         """
         List the objects in a container under the current account
         """
-        self.apihost = self._get_container(uri)
         urioptions = '/' + container + '?format=json'
         if not limit is -1:
             urioptions += '&limit=%d' % limit
         if len(marker):
             urioptions += '&marker=%s' % marker
-        self.ReInit(self.sslenabled, urioptions)
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'text/plain; charset=UTF-8'
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('headers: %s', self.Headers)
+        request = self.NewRequest('GET', urioptions,
+                                  apihost=self._get_container(uri))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'text/plain; charset=UTF-8'
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('headers: %s', request.headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.Send(request)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.Send(request, verify=False)
         if res.status_code == 200:
             # We have a list in JSON format
             return res.json()
@@ -104,12 +147,152 @@ class CloudFiles(Command):
             self.log.error('Error retrieving list of containers: (code=' + str(res.status_code) + ', text=\"' + res.text + '\")')
             return {}
 
-    def _verify_snapshot(self, container, uripath, snapshot):
+    @property
+    def ListingCache(self):
+        """Cache of the container listings used to discover the VaultDB (None when disabled)"""
+        return self.listing_cache
+
+    @ListingCache.setter
+    def ListingCache(self, listing_cache):
+        """Change the listing cache, None to disable caching"""
+        self.listing_cache = listing_cache
+
+    @property
+    def BundleCache(self):
+        """Local cache of the downloaded bundles, see cloudbackup.cloud.bundle_cache (None when disabled)"""
+        return self.bundle_cache
+
+    @BundleCache.setter
+    def BundleCache(self, bundle_cache):
+        """Change the bundle cache, None to disable caching"""
+        self.bundle_cache = bundle_cache
+
+    def __ListPage(self, container, prefix=None, marker=None, end_marker=None, limit=LISTING_PAGE_SIZE, reverse=False,
+                   cached=True):
+        """
+        Retrieve a single page of the object listing of a container
+
+        Returns the list of object entries; raises RuntimeError on failure
+        """
+        query = [('format', 'json'), ('limit', limit)]
+        if prefix is not None:
+            query.append(('prefix', prefix))
+        if marker is not None:
+            query.append(('marker', marker))
+        if end_marker is not None:
+            query.append(('end_marker', end_marker))
+        if reverse:
+            query.append(('reverse', 'on'))
+        request = self.NewRequest('GET', '?' + urlencode(query),
+                                  apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'text/plain; charset=UTF-8'
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('headers: %s', request.headers)
+        try:
+            if cached and self.listing_cache is not None:
+                res = self.CachedGet(request.uri, request.headers, cache=self.listing_cache)
+            else:
+                res = self.Send(request)
+        except requests.exceptions.SSLError as ex:
+            self.log.error('Requests SSLError: {0}'.format(str(ex)))
+            res = self.Send(request, verify=False)
+        if res.status_code == 200:
+            return res.json()
+        elif res.status_code == 204:
+            # Nothing left to retrieve
+            return []
+        else:
+            self.log.error('Error retrieving data (' + str(res.status_code) + ') - ' + res.text)
+            raise RuntimeError('Error retrieving data (' + str(res.status_code) + ') - ' + res.text)
+
+    def ListObjects(self, container, prefix=None, marker=None, end_marker=None, reverse=False, page_size=LISTING_PAGE_SIZE,
+                    cached=True, prefetch=True):
+        """
+        Generator returning the entries of the objects in a container, following the listing's pagination
+            container - the container in CloudFiles to list
+            prefix - (optional) only list the objects whose name starts with prefix
+            marker - (optional) only list the objects after this name (before it when reverse)
+            end_marker - (optional) only list the objects before this name (after it when reverse)
+            reverse - list the objects in descending order of their names
+            page_size - number of objects requested per page (Cloud Files returns 10,000 at most)
+            cached - allow pages to be served from the listing cache
+            prefetch - retrieve the next page while the current one is being consumed
+
+        Each entry is the dictionary provided by Cloud Files ('name', 'hash', 'bytes', 'last_modified', 'content_type').
+
+        Note: Cloud Files versions without reverse listing support return the objects in ascending order.
+        """
+        def fetch_page(page_marker):
+            entries = self.__ListPage(container, prefix=prefix, marker=page_marker, end_marker=end_marker,
+                                      limit=page_size, reverse=reverse, cached=cached)
+            if len(entries) and len(entries) >= page_size:
+                return (entries, entries[-1]['name'])
+            return (entries, None)
+
+        return iterate_items(fetch_page, marker=marker, prefetch=prefetch)
+
+    @staticmethod
+    def __SnapshotName(uripath, snapshot):
+        """
+        Name of the VaultDB object of a snapshot, see GetSnapshotPath()
+        """
+        return '{0:}/DB/{1:010}'.format(uripath, snapshot)
+
+    @staticmethod
+    def __SnapshotOrdinal(dbpath, name):
+        """
+        Return the ordinal of a VaultDB object name or None if the name is not one of a VaultDB
+        """
+        ordinal = name[len(dbpath):]
+        if not name.startswith(dbpath) or '/' in ordinal or not ordinal.isdigit():
+            return None
+        return int(ordinal)
+
+    def __NewestSnapshot(self, container, dbpath, cached):
+        """
+        Find the VaultDB with the largest ordinal under dbpath
+
+        The DB directory is listed in reverse so that the newest VaultDB is on the first page. The first
+        page only holds two objects, enough to tell whether Cloud Files honoured the reverse listing;
+        if it did not, the whole DB directory is listed page by page instead.
+
+        Returns a tuple of (ordinal, entry) or None if there is no VaultDB
+        """
+        newest = None
+        previous = None
+        descending = None
+        marker = None
+        limit = 2
+        while True:
+            entries = self.__ListPage(container, prefix=dbpath, marker=marker, limit=limit, reverse=True, cached=cached)
+            for cf_entry in entries:
+                name = cf_entry['name']
+                if previous is not None and descending is None:
+                    descending = name < previous
+                    if not descending:
+                        self.log.debug('Reverse listing not supported, listing all of {0:}'.format(dbpath))
+                previous = name
+
+                self.log.debug('Checking path {0:}'.format(name))
+                ordinal = self.__SnapshotOrdinal(dbpath, name)
+                if ordinal is not None and (newest is None or ordinal > newest[0]):
+                    self.log.debug('Changing ordinal to {0:} ({1:})'.format(ordinal, name))
+                    newest = (ordinal, cf_entry)
+                if descending and newest is not None:
+                    return newest
+            if len(entries) < limit:
+                return newest
+            marker = entries[-1]['name']
+            limit = LISTING_PAGE_SIZE
+
+    def _verify_snapshot(self, container, uripath, snapshot, cached=True):
         """
         Look at the Cloud Backup Container in CloudFiles for the agent to find its latest VaultDB
             container - the container in CloudFiles in which to look for the active VaultDB
             uripath - the path in the CloudFiles container under which to look for the DB directory contents
             snapshot - the snapshot desired
+            cached - allow the listing to be served from the listing cache
 
         Returns a python dictionary with the following data:
             - 'name' - the name within the container of the VaultDB file
@@ -120,68 +303,33 @@ class CloudFiles(Command):
             - 'bytes' - the size in bytes of the VaultDB file
             - 'content_type' - the content type of th VaultDB file
         """
-        self.apihost = self._get_container(container)
-        # We take the container and only request the data come back in JSON format
-        # The uripath is used later
-        self.ReInit(self.sslenabled, '?format=json')
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'text/plain; charset=UTF-8'
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('headers: %s', self.Headers)
+        # Only the VaultDB itself is listed: its name is the prefix, so the listing holds at most a few entries
+        # Note: The ordinal also happens to be the internal snapshot id for that database
+        dbname = self.__SnapshotName(uripath, snapshot)
+        self.log.debug('Looking for VaultDB with Snapshot ID ' + str(snapshot))
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
-        except requests.exceptions.SSLError as ex:
-            self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
-        if res.status_code == 200:
-            self.log.debug('Received data from CloudFiles...looking for VaultDB with Snapshot ID ' + str(snapshot))
-            cf_data = res.json()
-            try:
-                # Find the master database by finding the largest ordinal in the listing
-                # Unfortunately there's
-                db_master = {}
-                db_master['name'] = 'INVALID'
-                db_ordinal = -1
-                # Note: By appending the '/' we elimiate /DB from being put into the list, and
-                #       Also eliminate a LookupError from occurring as it won't have an ordinal
-                #       in its name for the cf_entry_ordinal parsing line
-                dbpath = uripath + '/DB/'
-
-                for cf_entry in cf_data:
-                    if cf_entry['name'].startswith(dbpath):
-                        self.log.debug('Checking DB path: ' + cf_entry['name'])
-                        cf_entry_ordinal = int(cf_entry['name'].rpartition('/')[2])
-                        self.log.debug('Checking: DB ordinal (' + str(cf_entry_ordinal) + ') == Snapshot (' + str(snapshot) + ')? ' + str(cf_entry_ordinal == snapshot))
-                        if cf_entry_ordinal == snapshot:
-                            self.log.debug('Found database')
-                            self.log.debug('Changing ordinal from ' + str(db_ordinal) + ' to ' + str(cf_entry_ordinal))
-                            self.log.debug('Changing db master from ' + db_master['name'] + ' to ' + cf_entry['name'])
-                            db_ordinal = cf_entry_ordinal
-                            db_master = cf_entry
-                            # Note: The ordinal also happens to be the internal snapshot id for that database
-                            db_master['dbsnapshotid'] = snapshot
-                            db_master['cf-hash'] = db_master['hash']
-                            db_master['hash'] = db_master['cf-hash'].upper()
-                            return db_master
-
-                # We did not find the specified database
-                self.log.error('Database with snapshot id ' + str(snapshot) + ' in the name could not be located.')
-                raise RuntimeError
-            except LookupError:
-                self.log.error('Unable to lookup CloudFile Container Item Name in specified container.')
-                raise
-        elif res.status_code == 204:
-            self.log.debug('No data in the specified container')
-            raise RuntimeError('No data in the specified container')
-        else:
-            self.log.error('Error retrieving data (' + str(res.status_code) + ') - ' + res.text)
-            raise RuntimeError('Error retrieving data (' + str(res.status_code) + ') - ' + res.text)
+            for cf_entry in self.__ListPage(container, prefix=dbname, limit=1, cached=cached):
+                if cf_entry['name'] == dbname:
+                    self.log.debug('Found database ' + dbname)
+                    db_master = dict(cf_entry)
+                    db_master['dbsnapshotid'] = snapshot
+                    db_master['cf-hash'] = db_master['hash']
+                    db_master['hash'] = db_master['cf-hash'].upper()
+                    return db_master
+        except LookupError:
+            self.log.error('Unable to lookup CloudFile Container Item Name in specified container.')
+            raise
+
+        # We did not find the specified database
+        self.log.error('Database with snapshot id ' + str(snapshot) + ' in the name could not be located.')
+        raise RuntimeError('Database with snapshot id ' + str(snapshot) + ' in the name could not be located.')
 
-    def _auto_detect_snapshot(self, container, uripath):
+    def _auto_detect_snapshot(self, container, uripath, cached=True):
         """
         Look at the Cloud Backup Container in CloudFiles for the agent to find its latest VaultDB
             container - the container in CloudFiles in which to look for the active VaultDB
             uripath - the path in the CloudFiles container under which to look for the DB directory contents
+            cached - allow the listing to be served from the listing cache
 
         Returns a python dictionary with the following data:
             - 'hash' - the MD5 hash of the VaultDB
@@ -191,61 +339,25 @@ class CloudFiles(Command):
             - 'content_type' - the content type of th VaultDB file
             - 'dbsnapshotid' - the snapshot id of the returned database
         """
-        self.apihost = self._get_container(container)
-        # We take the container and only request the data come back in JSON format
-        # The uripath is used later
+        # Note: By appending the '/' we elimiate /DB from being put into the list
         dbpath = uripath + '/DB/'
-        self.ReInit(self.sslenabled, '?format=json&path={0:}'.format(dbpath))
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'text/plain; charset=UTF-8'
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('headers: %s', self.Headers)
+        self.log.debug('Looking for object path {0:}'.format(dbpath))
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
-        except requests.exceptions.SSLError as ex:
-            self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
-        if res.status_code == 200:
-            cf_data = res.json()
-            try:
-                # Find the master database by finding the largest ordinal in the listing
-                # Unfortunately there's
-                db_master = {}
-                db_master['name'] = 'INVALID'
-                db_ordinal = -1
-                # Note: By appending the '/' we elimiate /DB from being put into the list, and
-                #       Also eliminate a LookupError from occurring as it won't have an ordinal
-                #       in its name for the cf_entry_ordinal parsing line
-
-                self.log.debug('Looking for object path {0:}'.format(dbpath))
-
-                for cf_entry in cf_data:
-                    self.log.debug('Checking path {0:}'.format(cf_entry['name']))
-                    if cf_entry['name'].startswith(dbpath):
-                        cf_entry_ordinal = int(cf_entry['name'].rpartition('/')[2])
-                        if cf_entry_ordinal > db_ordinal:
-                            self.log.debug('Changing ordinal from ' + str(db_ordinal) + ' to ' + str(cf_entry_ordinal))
-                            self.log.debug('Changing db master from ' + db_master['name'] + ' to ' + cf_entry['name'])
-                            db_ordinal = cf_entry_ordinal
-                            db_master = cf_entry
-                            # Note: The ordinal also happens to be the internal snapshot id for that database
-                            db_master['dbsnapshotid'] = db_ordinal
-                if not db_master['name'] == 'INVALID':
-                    db_master['cf-hash'] = db_master['hash']
-                    db_master['hash'] = db_master['cf-hash'].upper()
-                    return db_master
-                else:
-                    self.log.error('Unable to locate a VaultDB in the specified container')
-                    raise UserWarning('Unable to locate VaultDB in container ' + container + ' matching ' + uripath)
-            except LookupError:
-                self.log.error('Unable to lookup CloudFile Container Item Name in specified container.')
-                return {}
-        elif res.status_code == 204:
-            self.log.debug('No data in the specified container')
-            raise RuntimeError
-        else:
-            self.log.error('Error retrieving data (' + str(res.status_code) + ') - ' + res.text)
-            raise RuntimeError
+            newest = self.__NewestSnapshot(container, dbpath, cached)
+        except LookupError:
+            self.log.error('Unable to lookup CloudFile Container Item Name in specified container.')
+            return {}
+
+        if newest is None:
+            self.log.error('Unable to locate a VaultDB in the specified container')
+            raise UserWarning('Unable to locate VaultDB in container ' + container + ' matching ' + uripath)
+
+        # Note: The ordinal also happens to be the internal snapshot id for that database
+        db_master = dict(newest[1])
+        db_master['dbsnapshotid'] = newest[0]
+        db_master['cf-hash'] = db_master['hash']
+        db_master['hash'] = db_master['cf-hash'].upper()
+        return db_master
 
     def GetSnapshotPath(self, vaultdb_data, snapshotid):
         """
@@ -276,12 +388,14 @@ class CloudFiles(Command):
 
         return dbdata
 
-    def GetActiveDB(self, container, uripath, snapshot=None):
+    def GetActiveDB(self, container, uripath, snapshot=None, cached=True):
         """
         Look at the Cloud Backup Container in CloudFiles for the agent to find its latest VaultDB
             container - the container in CloudFiles in which to look for the active VaultDB
             uripath - the path in the CloudFiles container under which to look for the DB directory contents
             snapshot - the snapshot id (agent version) for the database to download (optional)
+            cached - allow the listings to be served from the listing cache (see ListingCache);
+                     False to always ask Cloud Files
 
         Note: If 'snapshot' is specified, then this function will try to get the database for that specific
             snapshot; however, if the call fails, then it will try to auto-find the database. The snapshot
@@ -297,22 +411,58 @@ class CloudFiles(Command):
         """
         if not (snapshot is None):
             try:
-                return self._verify_snapshot(container, uripath, snapshot)
+                return self._verify_snapshot(container, uripath, snapshot, cached=cached)
             except:
-                return self._auto_detect_snapshot(container, uripath)
+                return self._auto_detect_snapshot(container, uripath, cached=cached)
         else:
-            return self._auto_detect_snapshot(container, uripath)
+            return self._auto_detect_snapshot(container, uripath, cached=cached)
 
-    def WaitForActiveDb(self, container, uripath, snapshot, timeoutMilliseconds):
+    def __HeadSnapshot(self, container, uripath, snapshot):
+        """
+        Look up the VaultDB of a snapshot with a HEAD request instead of a listing
+
+        Returns the same dictionary as _verify_snapshot() or None if the VaultDB does not exist (yet)
+        """
+        dbname = self.__SnapshotName(uripath, snapshot)
+        headers = self.__ObjectHeaders(container, dbname, missing_ok=True)
+        if headers is None:
+            return None
+
+        db_master = {}
+        db_master['name'] = dbname
+        db_master['dbsnapshotid'] = snapshot
+        db_master['cf-hash'] = headers.get('ETag', '').strip('"')
+        db_master['hash'] = db_master['cf-hash'].upper()
+        db_master['bytes'] = int(headers.get('Content-Length', 0))
+        db_master['content_type'] = headers.get('Content-Type', None)
+        # Use the format of the container listings
+        last_modified = email.utils.parsedate_tz(headers.get('Last-Modified', ''))
+        if last_modified is not None:
+            last_modified = datetime.datetime.utcfromtimestamp(email.utils.mktime_tz(last_modified))
+            db_master['last_modified'] = last_modified.strftime('%Y-%m-%dT%H:%M:%S.%f')
+        else:
+            db_master['last_modified'] = None
+        return db_master
+
+    def WaitForActiveDb(self, container, uripath, snapshot, timeoutMilliseconds, useHead=True,
+                        pollMilliseconds=250, maxPollMilliseconds=15000):
         """
         Look at the Cloud Backup Container in CloudFiles for the agent to find its latest VaultDB
             container - the container in CloudFiles in which to look for the active VaultDB
             uripath - the path in the CloudFiles container under which to look for the DB directory contents
             snapshot - the snapshot id (agent version) for the database to download (optional)
             timeoutMilliseconds - the time in milliseconds to wait for the given database to show up in Cloud Files
+            useHead - poll the VaultDB object itself with HEAD requests instead of listing the container
+            pollMilliseconds - time in milliseconds before the second HEAD request; the time between
+                               two requests doubles after each one up to maxPollMilliseconds
+            maxPollMilliseconds - longest time in milliseconds between two HEAD requests
+
+        Note: Each HEAD request costs a few hundred bytes whereas each listing returns the entries
+            of the whole DB directory; pollMilliseconds and maxPollMilliseconds only apply to useHead.
 
         Returns a python dictionary with the following data:
             - 'hash' - the MD5 hash of the VaultDB
+            - 'cf-hash' - the MD5 hash of the VaultDB as it came from Cloud Files
             - 'last_modified' - a Date-Time Stamp of the last modification to the VaultDB
             - 'bytes' - the size in bytes of the VaultDB file
             - 'name' - the name within the container of the VaultDB file
@@ -326,10 +476,28 @@ class CloudFiles(Command):
         finish_time = start_time + timeoutMilliseconds
 
         result = None
-        while ((int(round(time.time() * 1000))) < finish_time):
+        delay = pollMilliseconds
+        while useHead:
+            try:
+                self.log.debug('Attempting HEAD of VaultDB with Snapshot {0:} - time {1:} '.format(snapshot, (int(round(time.time() * 1000)))))
+                result = self.__HeadSnapshot(container, uripath, snapshot)
+            except Exception as e:
+                self.log.debug('Received Error: ' + str(e))
+                result = None
+            if result is not None:
+                break
+            remaining = finish_time - int(round(time.time() * 1000))
+            if remaining <= 0:
+                break
+            # Back off so that a long wait does not keep polling Cloud Files
+            time.sleep(min(delay, remaining) / 1000.0)
+            delay = min(delay * 2, maxPollMilliseconds)
+
+        while not useHead and ((int(round(time.time() * 1000))) < finish_time):
             try:
                 self.log.debug('Attempting lookup of VaultDB with Snapshot {0:} - time {1:} '.format(snapshot, (int(round(time.time() * 1000)))))
-                result = self._verify_snapshot(container, uripath, snapshot)
+                # a cached listing would hide the database for the life of the cache entry
+                result = self._verify_snapshot(container, uripath, snapshot, cached=False)
                 if result['dbsnapshotid'] == snapshot:
                     break
                 else:
@@ -388,15 +556,352 @@ class CloudFiles(Command):
 
         return hashes
 
-    def DownloadVaultDb(self, container, vaultdb_data, localpath, decompress=True, maximum_file_size_supported=(5 * 1024 * 1024 * 1024)):
+    def __ObjectHeaders(self, container, name, missing_ok=False):
+        """
+        Retrieve the headers of an object (HEAD)
+
+        Returns None instead of raising UserWarning when the object does not exist and missing_ok is True
+        """
+        request = self.NewRequest('HEAD', '/' + name,
+                                  apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        self.log.debug('uri: %s', request.uri)
+        try:
+            res = self.Send(request)
+        except requests.exceptions.SSLError as ex:
+            self.log.error('Requests SSLError: {0}'.format(str(ex)))
+            res = self.Send(request, verify=False)
+        if res.status_code == 404:
+            if missing_ok:
+                return None
+            raise UserWarning('Server failed to find {0:}'.format(name))
+        elif res.status_code >= 300:
+            raise UserWarning('Server responded unexpectedly during download (Code: ' + str(res.status_code) + ' )')
+        return res.headers
+
+    def __DownloadRange(self, container, name, localpath, byte_range, etag, retries, hasher):
+        """
+        Download one byte range of an object into its place in localpath, retrying it on its own if it fails
+
+        A retry only asks for the bytes of the range not yet written.
+        """
+        index, offset, length = byte_range
+        written = 0
+        attempt = 0
+        while True:
+            try:
+                request = self.NewRequest('GET', '/' + name,
+                                          apihost=self._get_container(container))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['Range'] = 'bytes={0:}-{1:}'.format(offset + written, offset + length - 1)
+                if etag is not None:
+                    # fail instead of mixing the ranges of two versions of the object
+                    request.headers['If-Match'] = etag
+                self.log.debug('uri: %s range: %s', request.uri, request.headers['Range'])
+                try:
+                    res = self.Send(request, stream=True)
+                except requests.exceptions.SSLError as ex:
+                    self.log.error('Requests SSLError: {0}'.format(str(ex)))
+                    res = self.Send(request, verify=False, stream=True)
+                try:
+                    if res.status_code in (404, 412):
+                        raise UserWarning('{0:} was removed or replaced during the download (Code: {1:})'.format(name, res.status_code))
+                    elif res.status_code == 200:
+                        raise UserWarning('Server ignored the Range request for {0:}'.format(name))
+                    elif res.status_code == 206:
+                        with open(localpath, 'r+b') as output:
+                            output.seek(offset + written)
+                            for chunk in res.iter_content(chunk_size=1024 * 1024):
+                                chunk = chunk[:length - written]
+                                output.write(chunk)
+                                written += len(chunk)
+                                if written >= length:
+                                    break
+                            output.flush()
+                            # with a durability interval every range is forced to disk
+                            if self.durability.mode == Durability.INTERVAL:
+                                os.fsync(output.fileno())
+                        if written == length:
+                            hasher.Complete(offset, length)
+                            return length
+                        msg = 'received {0:} of {1:} bytes'.format(written, length)
+                    else:
+                        msg = 'Error Code: {0:} Text: {1:}'.format(res.status_code, res.text)
+                finally:
+                    res.close()
+            except requests.exceptions.RequestException as ex:
+                msg = str(ex)
+
+            if attempt >= retries:
+                raise UserWarning('Failed to download range {0:} of {1:}: {2:}'.format(index, name, msg))
+            attempt += 1
+            delay = min(30, 2 ** attempt)
+            self.log.warning('Failed to download range {0:} ({1:}); retry {2:} of {3:} in {4:} seconds'.format(index, msg, attempt, retries, delay))
+            time.sleep(delay)
+
+    def __DownloadRanges(self, container, name, localpath, headers, workers, range_size, range_retries):
+        """
+        Download an object whose headers are known as byte ranges fetched at once
+        """
+        size = int(headers['Content-Length'])
+        etag = headers.get('ETag', None)
+        preallocate(localpath, size)
+        hasher = RangeHasher(localpath, size)
+        byte_ranges = plan_segments(size, range_size) if size > 0 else []
+
+        def download(byte_range):
+            return self.__DownloadRange(container, name, localpath, byte_range, etag, range_retries, hasher)
+
+        results = map_concurrently(download, byte_ranges, workers)
+        failures = [(byte_range[0], error) for byte_range, length, error in results if error is not None]
+        if len(failures):
+            hasher.Abort()
+            for index, error in failures:
+                self.log.error('Range {0:} failed: {1:}'.format(index, str(error)))
+            raise UserWarning('Failed to download {0:} of {1:} ranges of {2:}'.format(len(failures), len(byte_ranges), name))
+        md5, sha1 = hasher.Finish()
+        self.durability.SyncFile(localpath)
+
+        # the ETag of a (static or dynamic) large object is not the MD5 of its data
+        if etag is not None and headers.get('X-Static-Large-Object', None) is None and headers.get('X-Object-Manifest', None) is None:
+            if etag.strip('"').lower() != md5:
+                raise UserWarning('Failed to verify the download of {0:} - {1:} vs {2:}.'.format(name, etag, md5))
+        return {
+            'bytes': size,
+            'etag': etag,
+            'md5': md5,
+            'sha1': sha1
+        }
+
+    def __ResumeDownload(self, checkpoint, name, localpath):
+        """
+        (Internal) State of a download continuing from its checkpoint, or of a new download
+        """
+        download = {
+            'offset': 0,
+            'etag': None,
+            'total': None,
+            'large_object': False
+        }
+        hashes = None
+        if checkpoint.Received and os.path.exists(localpath):
+            hashes = hash_prefix(localpath, checkpoint.Received)
+        if hashes is None:
+            checkpoint.Reset()
+            hashes = (hashlib.md5(), hashlib.sha1())
+        else:
+            download['offset'] = checkpoint.Received
+            download['etag'] = checkpoint.ETag
+            download['total'] = checkpoint.Bytes
+            download['large_object'] = checkpoint.LargeObject
+            # anything written after the checkpoint may not have reached the disk
+            with open(localpath, 'r+b') as partial_file:
+                partial_file.truncate(download['offset'])
+            self.log.info('Resuming the download of {0:} at byte {1:} of {2:}'.format(name, download['offset'], download['total']))
+        download['md5'], download['sha1'] = hashes
+        return download
+
+    @staticmethod
+    def __RestartDownload(download):
+        """
+        (Internal) Discard what a download received so far
+        """
+        download['offset'] = 0
+        download['etag'] = None
+        download['md5'] = hashlib.md5()
+        download['sha1'] = hashlib.sha1()
+
+    @staticmethod
+    def __SaveDownload(checkpoint, download):
+        """
+        (Internal) Record the progress of a download in its checkpoint
+        """
+        checkpoint.Save(download['etag'], download['total'], download['offset'], download['large_object'])
+
+    def __RequestDownload(self, container, name, download):
+        """
+        (Internal) Request the part of the object a download has not received yet
+        """
+        request = self.NewRequest('GET', '/' + name,
+                                  apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        if download['offset']:
+            request.headers['Range'] = 'bytes={0:}-'.format(download['offset'])
+            if download['etag'] is not None:
+                # the rest must come from the same version of the object
+                request.headers['If-Match'] = download['etag']
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('headers: %s', request.headers)
+        try:
+            return self.Send(request, stream=True)
+        except requests.exceptions.SSLError as ex:
+            self.log.error('Requests SSLError: {0}'.format(str(ex)))
+            return self.Send(request, verify=False, stream=True)
+
+    def __ReceiveDownload(self, res, name, localpath, download, checkpoint, maximum_size, progress, checkpoint_interval):
+        """
+        (Internal) Handle the response to __RequestDownload()
+
+        Returns None when the download is complete, otherwise why it is not
+        """
+        content_range = _content_range_pattern.match(res.headers.get('Content-Range', ''))
+        if res.status_code == 404:
+            raise UserWarning('Server failed to find {0:}'.format(name))
+        elif res.status_code == 416 and download['total'] is not None and download['offset'] >= download['total']:
+            # everything was received before the checkpoint was removed
+            return None
+        elif res.status_code in (412, 416) or (res.status_code == 206 and (content_range is None or int(content_range.group(1)) != download['offset'])):
+            self.__RestartDownload(download)
+            checkpoint.Reset()
+            return 'the object changed since the download started (Code: {0:})'.format(res.status_code)
+        elif res.status_code not in (200, 206):
+            return 'Error Code: {0:} Text: {1:}'.format(res.status_code, res.text)
+
+        if res.status_code == 200 and download['offset']:
+            self.log.warning('Server ignored the Range request; downloading {0:} from the start'.format(name))
+            self.__RestartDownload(download)
+        download['total'] = _object_size(res, content_range)
+        download['etag'] = res.headers.get('ETag', download['etag'])
+        download['large_object'] = 'X-Static-Large-Object' in res.headers or 'X-Object-Manifest' in res.headers
+        if maximum_size is not None and download['total'] is not None and download['total'] >= maximum_size:
+            raise NotImplementedError('The object is larger than the presently supported file size.')
+
+        self.__WriteDownload(res, localpath, download, checkpoint, progress, checkpoint_interval)
+        if download['offset'] >= download['total']:
+            return None
+        return 'received {0:} of {1:} bytes'.format(download['offset'], download['total'])
+
+    def __WriteDownload(self, res, localpath, download, checkpoint, progress, checkpoint_interval):
+        """
+        (Internal) Append the data of a response to localpath, saving checkpoints as it arrives
+        """
+        output = DurableFileWriter(localpath, self.durability, append=download['offset'] > 0)
+        unsaved = 0
+        try:
+            for chunk in res.iter_content(chunk_size=1024 * 1024):
+                output.write(chunk)
+                download['md5'].update(chunk)
+                download['sha1'].update(chunk)
+                download['offset'] += len(chunk)
+                unsaved += len(chunk)
+                if progress is not None:
+                    progress(download['offset'], download['total'])
+                if unsaved >= checkpoint_interval:
+                    output.Flush()
+                    self.__SaveDownload(checkpoint, download)
+                    unsaved = 0
+            if download['total'] is None:
+                # the size was not sent; the transfer raised an exception unless all the data arrived
+                download['total'] = download['offset']
+        finally:
+            # keep what was received, even if the transfer dropped
+            output.close()
+
+    def __DownloadResumable(self, container, name, localpath, checkpoint_path, retries, maximum_size=None, progress=None,
+                            checkpoint_interval=64 * 1024 * 1024):
+        """
+        Download an object into localpath, continuing a download interrupted earlier and
+        resuming with a Range request from the last byte written when the transfer drops
+          checkpoint_path - file recording the progress of the download
+          retries - number of times an interrupted transfer is resumed before giving up
+          maximum_size - (optional) refuse objects of this size or larger
+          progress - (optional) callable(received, total) called as the data arrives;
+                     total is None while the size of the object is unknown
+          checkpoint_interval - bytes received between two checkpoints
+
+        Returns a dictionary with the 'bytes', 'etag', 'md5' (hex) and 'sha1' (hex) of the object
+        """
+        checkpoint = DownloadCheckpoint(checkpoint_path, {'object': container.rstrip('/') + '/' + name})
+        download = self.__ResumeDownload(checkpoint, name, localpath)
+
+        attempt = 0
+        while True:
+            try:
+                res = self.__RequestDownload(container, name, download)
+                try:
+                    msg = self.__ReceiveDownload(res, name, localpath, download, checkpoint, maximum_size, progress,
+                                                 checkpoint_interval)
+                finally:
+                    res.close()
+                if msg is None:
+                    break
+            except requests.exceptions.RequestException as ex:
+                msg = str(ex)
+
+            if download['offset']:
+                self.__SaveDownload(checkpoint, download)
+            if attempt >= retries:
+                raise UserWarning('Failed to download {0:}: {1:}; calling again resumes from {2:}'.format(name, msg, checkpoint_path))
+            attempt += 1
+            delay = min(30, 2 ** attempt)
+            self.log.warning('Download of {0:} interrupted at byte {1:} ({2:}); retry {3:} of {4:} in {5:} seconds'.format(name, download['offset'], msg, attempt, retries, delay))
+            time.sleep(delay)
+
+        checkpoint.Remove()
+        etag = download['etag']
+        md5 = download['md5'].hexdigest()
+        # the ETag of a (static or dynamic) large object is not the MD5 of its data
+        if etag is not None and not download['large_object'] and etag.strip('"').lower() != md5:
+            raise UserWarning('Failed to verify the download of {0:} - {1:} vs {2:}.'.format(name, etag, md5))
+        return {
+            'bytes': download['offset'],
+            'etag': etag,
+            'md5': md5,
+            'sha1': download['sha1'].hexdigest()
+        }
+
+    def DownloadObjectRanges(self, container, name, localpath, workers=4, range_size=DEFAULT_RANGE_SIZE, range_retries=3):
+        """
+        Download an object by fetching several byte ranges of it at once
+            container - the CloudFiles container in which to find the object
+            name - the name of the object within the container
+            localpath - the local path at which to store the object
+            workers - number of ranges downloaded at once
+            range_size - size of each range
+            range_retries - number of times a failed range is requested again
+
+        The file is preallocated and each range is written at its offset as it
+        arrives, while the completed part of the file is hashed in order.
+        Unless the object is a large object, the MD5 is checked against its ETag.
+
+        Returns a dictionary with the following data:
+            - 'bytes' - the size of the object
+            - 'etag' - the ETag of the object
+            - 'md5' - the MD5 (hex) of the data downloaded
+            - 'sha1' - the SHA-1 (hex) of the data downloaded
+        """
+        headers = self.__ObjectHeaders(container, name)
+        if headers.get('Accept-Ranges', '').lower() != 'bytes':
+            raise UserWarning('Server does not support Range requests for {0:}'.format(name))
+        self.log.info('Downloading {0:} ({1:} bytes) into {2:}...'.format(name, headers['Content-Length'], localpath))
+        return self.__DownloadRanges(container, name, localpath, headers, workers, range_size, range_retries)
+
+    def DownloadVaultDb(self, container, vaultdb_data, localpath, decompress=True, maximum_file_size_supported=(5 * 1024 * 1024 * 1024),
+                        workers=1, range_size=DEFAULT_RANGE_SIZE, range_retries=3, streaming=False, keep_gz=False,
+                        resume=False, checkpoint_path=None):
         """
         Download the VaultDB from CloudFiles into a local path
             container - the CloudFiles container in which to find the Vault DB
             vaultdb_data - the CloudFiles data regarding the VaultDB (see GetActiveDB() for details)
             localpath - the local path at which to store the downloaded VaultDB
             decompress - whether or not to automatically decompress the downloaded vaultdb
+            workers - number of byte ranges of the VaultDB downloaded at once; with more than one
+                      worker the VaultDB is downloaded by DownloadObjectRanges() when the server
+                      supports Range requests
+            range_size - size of each range (see DownloadObjectRanges())
+            range_retries - number of times a failed range is requested again
+            streaming - decompress the VaultDB with zlib as it is received instead of downloading it to
+                        localpath + '.gz' first; only applies when decompress is True, and the download
+                        is then serial (workers does not apply)
+            keep_gz - with streaming, also write the compressed VaultDB to localpath + '.gz'
+            resume - continue a download of localpath + '.gz' interrupted earlier, and resume an
+                     interrupted transfer with a Range request (up to range_retries times) instead of
+                     starting over; the download is then serial (workers and streaming do not apply)
+            checkpoint_path - (optional) file recording the progress of a resumable download,
+                              defaults to localpath + '.gz.download-checkpoint'
 
         Note: There is a bug in the gzip library that causes a problem for decompressing large objects.
+            A streaming download does not use the gzip library.
 
         Requires the following entries in the 'vaultdb_data' parameter:
             - 'name' - the name within the container of the VaultDB file
@@ -410,30 +915,66 @@ class CloudFiles(Command):
             Note: The 'md5' and 'sha1' entries are only added if the vaultdb is
                 automatically decompressed, e.g decompress = True
         """
-        self.apihost = self._get_container(container)
         file_chunk_size = 4 * 1024 * 1024
         try:
-            self.ReInit(self.sslenabled, '/' + vaultdb_data['name'])
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.log.debug('uri: %s', self.Uri)
-            self.log.debug('headers: %s', self.Headers)
-            try:
-                res = requests.get(self.Uri, headers=self.Headers, stream=True)
-            except requests.exceptions.SSLError as ex:
-                self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.get(self.Uri, headers=self.Headers, verify=False, stream=True)
-            if res.status_code == 404:
-                raise UserWarning('Server failed to find the specified database')
-            elif res.status_code >= 300:
-                raise UserWarning('Server responded unexpectedly during download (Code: ' + str(res.status_code) + ' )')
+            gzip_file = localpath + '.gz'
+            streamed = streaming and decompress is True and not resume
+            headers = None
+            if workers > 1 and not streamed and not resume:
+                headers = self.__ObjectHeaders(container, vaultdb_data['name'])
+                if headers.get('Accept-Ranges', '').lower() != 'bytes':
+                    self.log.info('Server does not support Range requests; downloading the VaultDB serially')
+                    headers = None
+
+            if headers is not None:
+                total_bytes = int(headers['Content-Length'])
+                if maximum_file_size_supported is not None:
+                    if total_bytes >= maximum_file_size_supported:
+                        raise NotImplementedError('The VaultDB is larger than the presently supported file size.')
+                self.log.info('Downloading database(gz): {0} bytes in ranges of {1} bytes on {2} workers...'.format(total_bytes, range_size, workers))
+                result = self.__DownloadRanges(container, vaultdb_data['name'], gzip_file, headers, workers, range_size, range_retries)
+                vaultdb_data['compressed-md5'] = result['md5'].upper()
+                vaultdb_data['compressed-sha1'] = result['sha1'].upper()
+            elif resume:
+                if checkpoint_path is None:
+                    checkpoint_path = gzip_file + '.download-checkpoint'
+                bars = [0]
+
+                def show_progress(received, total):
+                    completed = (received * 50) // total if total else 50
+                    if completed > bars[0]:
+                        bars[0] = completed
+                        self.log.info('[' + '-' * completed + ' ' * (50 - completed) + ']')
+
+                self.log.info('Downloading database(gz) with resume support...')
+                result = self.__DownloadResumable(container, vaultdb_data['name'], gzip_file, checkpoint_path, range_retries,
+                                                  maximum_size=maximum_file_size_supported, progress=show_progress)
+                total_bytes = result['bytes']
+                vaultdb_data['compressed-md5'] = result['md5'].upper()
+                vaultdb_data['compressed-sha1'] = result['sha1'].upper()
             else:
+                request = self.NewRequest('GET', '/' + vaultdb_data['name'],
+                                          apihost=self._get_container(container))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                self.log.debug('uri: %s', request.uri)
+                self.log.debug('headers: %s', request.headers)
+                try:
+                    res = self.Send(request, stream=True)
+                except requests.exceptions.SSLError as ex:
+                    self.log.error('Requests SSLError: {0}'.format(str(ex)))
+                    res = self.Send(request, verify=False, stream=True)
+                if res.status_code == 404:
+                    raise UserWarning('Server failed to find the specified database')
+                elif res.status_code >= 300:
+                    raise UserWarning('Server responded unexpectedly during download (Code: ' + str(res.status_code) + ' )')
+
+                total_bytes = int(res.headers['Content-Length'])
                 if maximum_file_size_supported is not None:
-                    if int(res.headers['Content-Length']) >= maximum_file_size_supported:
+                    if total_bytes >= maximum_file_size_supported:
                         raise NotImplementedError('The VaultDB is larger than the presently supported file size.')
 
                 meter = {}
-                meter['bytes-total'] = int(res.headers['Content-Length'])
-                meter['bytes-remaining'] = int(res.headers['Content-Length'])
+                meter['bytes-remaining'] = total_bytes
                 meter['bar-count'] = 50
                 meter['bytes-per-bar'] = meter['bytes-remaining'] // meter['bar-count']
                 meter['block-size'] = min(file_chunk_size, meter['bytes-per-bar'])
@@ -441,60 +982,78 @@ class CloudFiles(Command):
                 meter['chunks'] = 0
                 meter['bars-remaining'] = meter['bar-count']
                 meter['bars-completed'] = 0
-                self.log.info('Downloading database(gz): {0} bytes...'.format(meter['bytes-remaining']))
-                self.log.info('[' + ' ' * meter['bar-count'] + ']')
-                gzip_file = localpath + '.gz'
-                compressed_md5_hash = hashlib.md5()
-                compressed_sha1_hash = hashlib.sha1()
-                with open(gzip_file, 'wb') as gzipped_db:
-                    for db_chunk in res.iter_content(chunk_size=meter['block-size']):
-                        gzipped_db.write(db_chunk)
-                        compressed_md5_hash.update(db_chunk)
-                        compressed_sha1_hash.update(db_chunk)
-                        gzipped_db.flush()
-                        os.fsync(gzipped_db.fileno())
-                        meter['chunks'] += 1
-                        if meter['chunks'] == meter['chunks-per-bar']:
-                            meter['chunks'] = 0
-                            meter['bars-completed'] += 1
-                            meter['bars-remaining'] -= 1
-                            self.log.info('[' + '-' * meter['bars-completed'] + ' ' * meter['bars-remaining'] + ']')
-                vaultdb_data['compressed-md5'] = compressed_md5_hash.hexdigest().upper()
-                vaultdb_data['compressed-sha1'] = compressed_sha1_hash.hexdigest().upper()
+
+                def advance_meter():
+                    meter['chunks'] += 1
+                    if meter['chunks'] == meter['chunks-per-bar']:
+                        meter['chunks'] = 0
+                        meter['bars-completed'] += 1
+                        meter['bars-remaining'] -= 1
+                        self.log.info('[' + '-' * meter['bars-completed'] + ' ' * meter['bars-remaining'] + ']')
+
+                if streamed:
+                    self.log.info('Downloading and decompressing database(gz): {0} bytes...'.format(meter['bytes-remaining']))
+                    self.log.info('[' + ' ' * meter['bar-count'] + ']')
+                    with GunzipWriter(localpath, gzip_file if keep_gz else None, self.durability) as writer:
+                        for db_chunk in res.iter_content(chunk_size=meter['block-size']):
+                            writer.Write(db_chunk)
+                            advance_meter()
+                    digests = writer.Digests
+                    vaultdb_data['compressed-md5'] = digests['compressed-md5'].upper()
+                    vaultdb_data['compressed-sha1'] = digests['compressed-sha1'].upper()
+                    vaultdb_data['md5'] = digests['md5'].upper()
+                    vaultdb_data['sha1'] = digests['sha1'].upper()
+                    self.log.info('VaultDB (' + vaultdb_data['name'] + ') was successfully downloaded and decompressed to ' + localpath)
+                else:
+                    self.log.info('Downloading database(gz): {0} bytes...'.format(meter['bytes-remaining']))
+                    self.log.info('[' + ' ' * meter['bar-count'] + ']')
+                    compressed_md5_hash = hashlib.md5()
+                    compressed_sha1_hash = hashlib.sha1()
+                    with DurableFileWriter(gzip_file, self.durability) as gzipped_db:
+                        for db_chunk in res.iter_content(chunk_size=meter['block-size']):
+                            gzipped_db.write(db_chunk)
+                            compressed_md5_hash.update(db_chunk)
+                            compressed_sha1_hash.update(db_chunk)
+                            advance_meter()
+                    vaultdb_data['compressed-md5'] = compressed_md5_hash.hexdigest().upper()
+                    vaultdb_data['compressed-sha1'] = compressed_sha1_hash.hexdigest().upper()
+            if not streamed:
                 self.log.info('VaultDB (' + vaultdb_data['name'] + ') was successfully downloaded to ' + gzip_file)
 
-                # To overcome current limits in the gzip module, let the caller decide if decomression should occur
-                if decompress is True:
-                    self.log.info('Decompressing the file...')
-                    md5_hash = hashlib.md5()
-                    sha1_hash = hashlib.sha1()
-                    gz_db_file = gzip.open(gzip_file, 'rb')
-                    with open(localpath, 'wb') as db_file:
-                        decompress_continue_loop = True
-                        while decompress_continue_loop:
-                            filechunk = gz_db_file.read(file_chunk_size)
-                            if len(filechunk) == 0:
-                                decompress_continue_loop = False
-                            else:
-                                db_file.write(filechunk)
-                                md5_hash.update(filechunk)
-                                sha1_hash.update(filechunk)
-                    gz_db_file.close()
-                    self.log.info('VaultDB (' + vaultdb_data['name'] + ') in ' + gzip_file + ' was decompressed to ' + localpath)
-                    vaultdb_data['md5'] = md5_hash.hexdigest().upper()
-                    vaultdb_data['sha1'] = sha1_hash.hexdigest().upper()
-
-                if meter['bytes-total'] > (5 * 1024 * 1024 * 1024):
-                    large_file_hashes = self.__GetLargeFileHashes(localpath)
-                    vaultdb_data['large-file'] = {}
-                    vaultdb_data['large-file']['hashes'] = large_file_hashes['hashes']
-                    vaultdb_data['large-file']['md5'] = large_file_hashes['md5']
+            # To overcome current limits in the gzip module, let the caller decide if decomression should occur
+            if decompress is True and not streamed:
+                self.log.info('Decompressing the file...')
+                md5_hash = hashlib.md5()
+                sha1_hash = hashlib.sha1()
+                gz_db_file = gzip.open(gzip_file, 'rb')
+                with DurableFileWriter(localpath, self.durability) as db_file:
+                    decompress_continue_loop = True
+                    while decompress_continue_loop:
+                        filechunk = gz_db_file.read(file_chunk_size)
+                        if len(filechunk) == 0:
+                            decompress_continue_loop = False
+                        else:
+                            db_file.write(filechunk)
+                            md5_hash.update(filechunk)
+                            sha1_hash.update(filechunk)
+                gz_db_file.close()
+                self.log.info('VaultDB (' + vaultdb_data['name'] + ') in ' + gzip_file + ' was decompressed to ' + localpath)
+                vaultdb_data['md5'] = md5_hash.hexdigest().upper()
+                vaultdb_data['sha1'] = sha1_hash.hexdigest().upper()
 
-                return True
+            if total_bytes > (5 * 1024 * 1024 * 1024):
+                large_file_hashes = self.__GetLargeFileHashes(localpath)
+                vaultdb_data['large-file'] = {}
+                vaultdb_data['large-file']['hashes'] = large_file_hashes['hashes']
+                vaultdb_data['large-file']['md5'] = large_file_hashes['md5']
+
+            return True
         except LookupError:
             raise UserWarning('Invalid VaultDB Data provided.')
 
-    def UploadVaultDb(self, container, vaultdb_data, localpath, skip_md5_check=False, compress=True, maximum_file_size_supported=(5 * 1024 * 1024 * 1024)):
+    def UploadVaultDb(self, container, vaultdb_data, localpath, skip_md5_check=False, compress=True, maximum_file_size_supported=None,
+                      segment_threshold=MAX_OBJECT_SIZE, segment_size=DEFAULT_SEGMENT_SIZE, segment_workers=4, checkpoint_path=None,
+                      streaming=False):
         """
         Upload the VaultDB to CloudFiles from a local path
             container - the CloudFiles container in which to put the VaultDB
@@ -502,9 +1061,21 @@ class CloudFiles(Command):
             localpath - the local path from which to read the VaultDB to upload
             skip_md5_check - enfoce that the detected MD5 matches the 'md5' in the vaultedb_data dictionary
             compress - whether or not to automatically compress the data into a gzip prior to upload
+            maximum_file_size_supported - (optional) refuse to upload files of this size or larger
+            segment_threshold - files larger than this are uploaded as a Static Large Object
+            segment_size - size of the segments of a Static Large Object
+            segment_workers - number of segments uploaded at once
+            checkpoint_path - (optional) checkpoint file of a segmented upload, see UploadSegmentedObject()
+            streaming - compress, hash and upload the VaultDB in a single pass without a temporary file;
+                        the segments of a large VaultDB are then uploaded one after the other and the
+                        upload cannot be resumed (segment_workers and checkpoint_path do not apply)
 
             Note: There is a bug in the gzip module that prevents a file larger than 2 GB from being compressed.
                 When the VaultDB is larger than 2GB, then 'compress' needs to be false and the user needs to pre-compress.
+                This does not apply to a streaming upload, which compresses with zlib directly.
+
+            Note: A streaming upload only knows the MD5s once the data has been sent; if the VaultDB
+                then fails the MD5 check or is too large, the uploaded object is deleted again.
 
         Requires the following entries in the 'vaultdb_data' parameter:
             - 'name' - the name within the container of the VaultDB file
@@ -517,10 +1088,15 @@ class CloudFiles(Command):
             - 'upload-compressed-md5' - the MD5 of the compressed data
             - 'upload-bytes' - the number of bytes for the file on disk
             - 'upload-compressed-bytes' - the number of bytes for the compressed file sent to Cloud Files
+            - 'upload-large-file' - the segment MD5s ('hashes') and the manifest ETag ('md5')
+                                    when uploaded as a Static Large Object
         """
-        self.apihost = self._get_container(container)
         file_chunk_size = 4 * 1024 * 1024
         try:
+            if streaming:
+                return self.__StreamVaultDb(container, vaultdb_data, localpath, skip_md5_check, compress,
+                                            maximum_file_size_supported, segment_threshold, segment_size)
+
             md5_hash = hashlib.md5()
             gzip_file = None
             with open(localpath, 'rb') as db_file:
@@ -560,56 +1136,49 @@ class CloudFiles(Command):
                 if md5_hash.hexdigest().upper() != vaultdb_data['md5']:
                     raise UserWarning('Unable to verify the data read for compression is what was expected to be passed in.')
 
-            # Build an MD5 for the ETAG support in Cloud Files to guarantee that it has the file correctly
-            gz_md5_hash = hashlib.md5()
-            with open(gzip_file, 'rb') as compressed_data:
-                md5_continue_loop = True
-                while md5_continue_loop:
-                    filechunk = compressed_data.read(file_chunk_size)
-                    if len(filechunk) == 0:
-                        break
-                    else:
-                        gz_md5_hash.update(filechunk)
-            vaultdb_data['upload-compressed-md5'] = gz_md5_hash.hexdigest().upper()
-            vaultdb_data['upload-compressed-md5-actual'] = vaultdb_data['upload-compressed-md5']
-
             # Cloud Files requires we split up based on 5 GB limits
-            if os.path.getsize(gzip_file) > 5 * 1024 * 1024 * 1024:
-                large_file_hashes = self.__GetLargeFileHashes(localpath)
-                vaultdb_data['upload-large-file'] = {}
-                vaultdb_data['upload-large-file']['hashes'] = large_file_hashes['hashes']
-                vaultdb_data['upload-large-file']['md5'] = large_file_hashes['md5']
-
-                # This becomes the Etag
-                vaultdb_data['upload-compressed-md5'] = vaultdb_data['upload-large-file']['md5']
+            segmented = os.path.getsize(gzip_file) > segment_threshold
 
-                # 512 MB boundaries
-                vaultdb_data['upload-split-boundary'] = 512 * 1024 * 1024
+            # Build an MD5 for the ETAG support in Cloud Files to guarantee that it has the file correctly,
+            # along with the MD5 of each segment when it is split up
+            gz_md5, segment_hashes = file_digests(gzip_file, segment_size if segmented else None, file_chunk_size)
+            vaultdb_data['upload-compressed-md5'] = gz_md5.upper()
+            vaultdb_data['upload-compressed-md5-actual'] = vaultdb_data['upload-compressed-md5']
 
             # Retrieve the size in bytes of the data files - compressed and uncompressed
             vaultdb_data['upload-bytes'] = os.path.getsize(localpath)
             vaultdb_data['upload-compressed-bytes'] = os.path.getsize(gzip_file)
 
+            if segmented:
+                vaultdb_data['upload-split-boundary'] = segment_size
+                result = self.UploadSegmentedObject(container, vaultdb_data['name'], gzip_file,
+                                                    segment_size=segment_size,
+                                                    workers=segment_workers,
+                                                    checkpoint_path=checkpoint_path,
+                                                    segment_etags=segment_hashes)
+                vaultdb_data['upload-large-file'] = {}
+                vaultdb_data['upload-large-file']['hashes'] = [segment_hash.upper() for segment_hash in segment_hashes]
+                vaultdb_data['upload-large-file']['md5'] = result['etag'].upper()
+
+                # This becomes the Etag
+                vaultdb_data['upload-compressed-md5'] = vaultdb_data['upload-large-file']['md5']
+                return True
+
             # Set the ETag header to guarantee that the object is written correctly to multiple nodes in
             # Cloud Files. Otherwise Cloud Files may truncate the object thus causing the hash to be different that
             # the file we have on disk. We still need to verify it later, but this should guarantee that check will pass
-            self.ReInit(self.sslenabled, '/' + vaultdb_data['name'])
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.headers['ETag'] = vaultdb_data['upload-compressed-md5']
-            self.headers['Content-Type'] = 'application/octet-stream'
-            self.headers['Content-Length'] = str(vaultdb_data['upload-compressed-bytes'])
-            self.log.debug('uri: %s', self.Uri)
-            self.log.debug('headers: %s', self.Headers)
-
-            # TODO:
-            # >5GB File upload support:
-            #   - add extra header line (see Cloud Backup Agent for details)
-            #   - split file into 512MB chunks and upload each
-            #   - generate a manifest file for Cloud Files to make them into a 'large file' object in the container
+            request = self.NewRequest('PUT', '/' + vaultdb_data['name'],
+                                      apihost=self._get_container(container))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            request.headers['ETag'] = vaultdb_data['upload-compressed-md5']
+            request.headers['Content-Type'] = 'application/octet-stream'
+            request.headers['Content-Length'] = str(vaultdb_data['upload-compressed-bytes'])
+            self.log.debug('uri: %s', request.uri)
+            self.log.debug('headers: %s', request.headers)
 
             # Attempt the upload
             with open(gzip_file, 'rb') as upload_data:
-                res = requests.put(self.Uri, headers=self.Headers, data=upload_data)
+                res = self.Send(request, data=upload_data)
 
             # Chek the result
             if res.status_code in (200, 201):
@@ -623,11 +1192,276 @@ class CloudFiles(Command):
 
             else:
                 # Upload failed
-                raise UserWarning('Error while uploading compressed version of {0:} to {1:}. Error Code: {2:} Text: {3:}'.format(localpath, self.Uri, res.status_code, res.text))
+                raise UserWarning('Error while uploading compressed version of {0:} to {1:}. Error Code: {2:} Text: {3:}'.format(localpath, request.uri, res.status_code, res.text))
 
         except LookupError:
             # Something cause a dictionary lookup failure...
             raise UserWarning('Invalid VaultDB Data provided.')
+        finally:
+            # the listings may no longer show the newest VaultDB
+            if self.listing_cache is not None:
+                self.listing_cache.invalidate()
+
+    def __CreateContainer(self, container):
+        """
+        Create the container if it does not exist
+        """
+        request = self.NewRequest('PUT', '', apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        self.log.debug('uri: %s', request.uri)
+        res = self.Send(request)
+        if res.status_code not in (201, 202, 204):
+            raise UserWarning('Unable to create container {0:}. Error Code: {1:} Text: {2:}'.format(container, res.status_code, res.text))
+
+    def __UploadSegment(self, container, objectname, localpath, segment, etag, retries):
+        """
+        Upload one segment of a Static Large Object, retrying it on its own if it fails
+
+        Returns the manifest entry of the segment
+        """
+        index, offset, length = segment
+        attempt = 0
+        while True:
+            try:
+                with FileSegment(localpath, offset, length) as segment_data:
+                    if etag is None:
+                        etag = segment_data.md5()
+                    request = self.NewRequest('PUT', '/' + objectname,
+                                              apihost=self._get_container(container))
+                    request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                    request.headers['ETag'] = etag
+                    request.headers['Content-Type'] = 'application/octet-stream'
+                    request.headers['Content-Length'] = str(length)
+                    self.log.debug('uri: %s', request.uri)
+                    try:
+                        res = self.Send(request, data=segment_data)
+                    except requests.exceptions.SSLError as ex:
+                        self.log.error('Requests SSLError: {0}'.format(str(ex)))
+                        res = self.Send(request, data=segment_data, verify=False)
+                if res.status_code in (200, 201) and res.headers.get('ETag', '').strip('"').lower() == etag.lower():
+                    return {
+                        'path': '/' + container.rstrip('/').rpartition('/')[2] + '/' + objectname,
+                        'etag': etag.lower(),
+                        'size_bytes': length
+                    }
+                msg = 'Error Code: {0:} ETag: {1:} Text: {2:}'.format(res.status_code, res.headers.get('ETag', None), res.text)
+            except requests.exceptions.RequestException as ex:
+                msg = str(ex)
+
+            if attempt >= retries:
+                raise UserWarning('Failed to upload segment {0:} of {1:}: {2:}'.format(index, localpath, msg))
+            attempt += 1
+            delay = min(30, 2 ** attempt)
+            self.log.warning('Failed to upload segment {0:} ({1:}); retry {2:} of {3:} in {4:} seconds'.format(index, msg, attempt, retries, delay))
+            time.sleep(delay)
+
+    def __PutManifest(self, container, name, manifest, localpath):
+        """
+        Write the manifest of a Static Large Object and verify the ETag of the object
+
+        Returns the ETag of the object (MD5 of the segment ETags)
+        """
+        request = self.NewRequest('PUT', '/' + name + '?multipart-manifest=put',
+                                  apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'application/json'
+        request.body = json.dumps(manifest)
+        self.log.debug('uri: %s', request.uri)
+        res = self.Send(request)
+        if res.status_code not in (200, 201):
+            error = UserWarning('Error while writing the manifest of {0:} to {1:}. Error Code: {2:} Text: {3:}'.format(localpath, request.uri, res.status_code, res.text))
+            error.status_code = res.status_code
+            raise error
+
+        expected = manifest_etag([entry['etag'] for entry in manifest])
+        received = res.headers.get('ETag', '').strip('"').lower()
+        if len(received) and received != expected:
+            raise UserWarning('Failed to verify the uploaded segments - {0:} vs {1:}.'.format(received, expected))
+        return expected
+
+    def __DeleteObject(self, container, name, manifest=False):
+        """
+        Delete an object, and the segments of a Static Large Object if manifest is True
+        """
+        request = self.NewRequest('DELETE', '/' + name + ('?multipart-manifest=delete' if manifest else ''),
+                                  apihost=self._get_container(container))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        self.log.debug('uri: %s', request.uri)
+        res = self.Send(request)
+        if res.status_code not in (200, 204, 404):
+            self.log.error('Unable to delete {0:}. Error Code: {1:} Text: {2:}'.format(request.uri, res.status_code, res.text))
+
+    def __PutStream(self, container, objectname, body, retries):
+        """
+        Upload a StreamBody with chunked transfer encoding, retrying it on its own if it fails
+
+        The ETag returned by Cloud Files is checked against the MD5 of the data sent.
+
+        Returns the ETag (MD5 hex) of the object
+        """
+        attempt = 0
+        while True:
+            try:
+                body.seek(0)
+                request = self.NewRequest('PUT', '/' + objectname,
+                                          apihost=self._get_container(container))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['Content-Type'] = 'application/octet-stream'
+                self.log.debug('uri: %s', request.uri)
+                try:
+                    res = self.Send(request, data=body)
+                except requests.exceptions.SSLError as ex:
+                    self.log.error('Requests SSLError: {0}'.format(str(ex)))
+                    body.seek(0)
+                    res = self.Send(request, data=body, verify=False)
+                etag = body.md5()
+                if res.status_code in (200, 201) and res.headers.get('ETag', '').strip('"').lower() == etag:
+                    return etag
+                msg = 'Error Code: {0:} ETag: {1:} vs {2:} Text: {3:}'.format(res.status_code, res.headers.get('ETag', None), etag, res.text)
+            except requests.exceptions.RequestException as ex:
+                msg = str(ex)
+
+            if attempt >= retries:
+                raise UserWarning('Failed to upload {0:}: {1:}'.format(objectname, msg))
+            attempt += 1
+            delay = min(30, 2 ** attempt)
+            self.log.warning('Failed to upload {0:} ({1:}); retry {2:} of {3:} in {4:} seconds'.format(objectname, msg, attempt, retries, delay))
+            time.sleep(delay)
+
+    def __StreamVaultDb(self, container, vaultdb_data, localpath, skip_md5_check, compress,
+                        maximum_file_size_supported, segment_threshold, segment_size, retries=3):
+        """
+        Compress, hash and upload the VaultDB in a single pass, see UploadVaultDb()
+        """
+        expected_md5 = None if skip_md5_check else vaultdb_data['md5']
+        name = vaultdb_data['name']
+        raw_size = os.path.getsize(localpath)
+        if maximum_file_size_supported is not None and not compress and raw_size >= maximum_file_size_supported:
+            raise NotImplementedError('The VaultDB is larger than the presently supported file size.')
+
+        # The compressed size is only known at the end, so split up whenever the
+        # compressed data could exceed the threshold
+        segmented = (gzip_bound(raw_size) if compress else raw_size) > segment_threshold
+
+        with GzipReader(localpath, compress=compress) as reader:
+            if not segmented:
+                self.log.info('Streaming {0:} ({1:} bytes) to {2:}...'.format(localpath, raw_size, name))
+                self.__PutStream(container, name, StreamBody(reader), retries)
+            else:
+                segments_container = segment_container(container)
+                self.__CreateContainer(segments_container)
+                upload_id = '{0:.6f}'.format(time.time())
+                manifest = []
+                self.log.info('Streaming {0:} ({1:} bytes) to {2:} in segments of {3:} bytes...'.format(localpath, raw_size, name, segment_size))
+                while not len(manifest) or not reader.AtEnd():
+                    objectname = '{0:}/{1:}/{2:08}'.format(name, upload_id, len(manifest))
+                    body = StreamBody(reader, limit=segment_size)
+                    etag = self.__PutStream(segments_container, objectname, body, retries)
+                    manifest.append({
+                        'path': '/' + segments_container.rstrip('/').rpartition('/')[2] + '/' + objectname,
+                        'etag': etag,
+                        'size_bytes': body.tell()
+                    })
+                manifest_md5 = self.__PutManifest(container, name, manifest, localpath)
+
+            vaultdb_data['upload-md5'] = reader.RawMd5.upper()
+            vaultdb_data['upload-compressed-md5'] = reader.Md5.upper()
+            vaultdb_data['upload-compressed-md5-actual'] = vaultdb_data['upload-compressed-md5']
+            vaultdb_data['upload-bytes'] = reader.raw_bytes
+            vaultdb_data['upload-compressed-bytes'] = reader.bytes
+
+        problem = None
+        if expected_md5 is not None and vaultdb_data['upload-md5'] != expected_md5:
+            problem = UserWarning('Unable to verify the data read for compression is what was expected to be passed in.')
+        elif maximum_file_size_supported is not None and reader.bytes >= maximum_file_size_supported:
+            problem = NotImplementedError('The Compressed VaultDB is larger than the presently supported file size.')
+        if problem is not None:
+            self.__DeleteObject(container, name, manifest=segmented)
+            raise problem
+
+        if segmented:
+            vaultdb_data['upload-split-boundary'] = segment_size
+            vaultdb_data['upload-large-file'] = {}
+            vaultdb_data['upload-large-file']['hashes'] = [entry['etag'].upper() for entry in manifest]
+            vaultdb_data['upload-large-file']['md5'] = manifest_md5.upper()
+
+            # This becomes the Etag
+            vaultdb_data['upload-compressed-md5'] = vaultdb_data['upload-large-file']['md5']
+        self.log.info('{0:} was streamed to {1:} ({2:} bytes sent)'.format(localpath, name, reader.bytes))
+        return True
+
+    def UploadSegmentedObject(self, container, name, localpath, segment_size=DEFAULT_SEGMENT_SIZE, workers=4,
+                              segment_retries=3, checkpoint_path=None, segment_etags=None):
+        """
+        Upload a file as a Static Large Object
+            container - the CloudFiles container in which to put the object
+            name - the name of the object within the container
+            localpath - the file to upload
+            segment_size - size of each segment
+            workers - number of segments uploaded at once
+            segment_retries - number of times a failed segment is uploaded again
+            checkpoint_path - (optional) file recording the uploaded segments, defaults to localpath + '.upload-checkpoint';
+                              if the upload is interrupted, calling again resumes it
+            segment_etags - (optional) MD5 (hex) of each segment if already known
+
+        The segments are stored in the '<container>_segments' container and checked
+        against their MD5 as they are uploaded. Once all of them are uploaded the
+        manifest is written and the checkpoint file removed.
+
+        Returns a dictionary with the following data:
+            - 'etag' - the ETag of the object (MD5 of the segment ETags)
+            - 'segments' - the manifest entries of the segments
+        """
+        size = os.path.getsize(localpath)
+        if checkpoint_path is None:
+            checkpoint_path = localpath + '.upload-checkpoint'
+        checkpoint = SegmentCheckpoint(checkpoint_path, {
+            'object': container + '/' + name,
+            'bytes': size,
+            'mtime': int(os.path.getmtime(localpath)),
+            'segment-size': segment_size
+        })
+        segments = plan_segments(size, segment_size)
+        if segment_etags is not None and len(segment_etags) != len(segments):
+            raise UserWarning('Expected {0:} segment hashes, received {1:}'.format(len(segments), len(segment_etags)))
+
+        segments_container = segment_container(container)
+        self.__CreateContainer(segments_container)
+
+        def upload(segment):
+            entry = checkpoint.Completed(segment[0])
+            if entry is not None:
+                return entry
+            objectname = '{0:}/{1:}/{2:08}'.format(name, checkpoint.UploadId, segment[0])
+            etag = segment_etags[segment[0]] if segment_etags is not None else None
+            entry = self.__UploadSegment(segments_container, objectname, localpath, segment, etag, segment_retries)
+            checkpoint.Complete(segment[0], entry)
+            return entry
+
+        self.log.info('Uploading {0:} ({1:} bytes) in {2:} segments...'.format(localpath, size, len(segments)))
+        results = map_concurrently(upload, segments, workers)
+        failures = [(segment[0], error) for segment, entry, error in results if error is not None]
+        if len(failures):
+            for index, error in failures:
+                self.log.error('Segment {0:} failed: {1:}'.format(index, str(error)))
+            raise UserWarning('Failed to upload {0:} of {1:} segments of {2:}; calling again resumes from {3:}'.format(
+                len(failures), len(segments), localpath, checkpoint_path))
+
+        manifest = [entry for segment, entry, error in results]
+        try:
+            expected = self.__PutManifest(container, name, manifest, localpath)
+        except UserWarning as ex:
+            if getattr(ex, 'status_code', None) == 400:
+                # the segments are unusable (e.g. removed meanwhile); start over next time
+                checkpoint.Remove()
+            raise
+
+        checkpoint.Remove()
+        self.log.info('{0:} was uploaded as a Static Large Object of {1:} segments'.format(localpath, len(segments)))
+        return {
+            'etag': expected,
+            'segments': manifest
+        }
 
     def CheckBundleDigest(self, container, uripath, bundle_data):
         """
@@ -636,18 +1470,18 @@ class CloudFiles(Command):
             bundle_data - a dict containing atlest the 'id'  and 'md5' of the bundle
             localpath - the local path at which to store the downloaded VaultDB
         """
-        self.apihost = self._get_container(container)
         try:
             fulluri = uripath + '/BUNDLES/' + bundle_data['name']
-            self.ReInit(self.sslenabled, '/' + fulluri)
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.log.debug('uri: %s', self.Uri)
-            self.log.debug('headers: %s', self.Headers)
+            request = self.NewRequest('HEAD', '/' + fulluri,
+                                      apihost=self._get_container(container))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            self.log.debug('uri: %s', request.uri)
+            self.log.debug('headers: %s', request.headers)
             try:
-                res = requests.head(self.Uri, headers=self.Headers)
+                res = self.Send(request)
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.head(self.Uri, headers=self.Headers, verify=False)
+                res = self.Send(request, verify=False)
             if res.status_code == 404:
                 raise UserWarning('Server failed to find the specified bundle')
             elif res.status_code >= 300:
@@ -660,28 +1494,83 @@ class CloudFiles(Command):
         except LookupError:
             raise UserWarning('Invalid VaultDB Data provided.')
 
+    def __VaultId(self, container, uripath):
+        """
+        Identify a vault for the bundle cache independently of the network (publicnet or servicenet) used
+        """
+        if container.startswith('snet-'):
+            container = container[5:]
+        # drop the storage host: the account and container are what identify the vault
+        return container.partition('/')[2] + '/' + uripath
+
+    def __CacheBundle(self, cache_key, bundle_data):
+        """
+        Add a downloaded bundle to the bundle cache if it matches the expected MD5
+        """
+        if cache_key is None:
+            return
+        if bundle_data['download-md5'] != bundle_data['md5'].upper():
+            self.log.debug('Bundle ({0:}) does not match its MD5, not caching it'.format(bundle_data['id']))
+            return
+        self.bundle_cache.Store(cache_key, bundle_data['file-on-disk'])
+
     # TODO: Test
-    def DownloadBundle(self, container, uripath, bundle_data, localpath):
+    def DownloadBundle(self, container, uripath, bundle_data, localpath, resume=False, checkpoint_path=None, retries=3):
         """
         Download the Bundle from CloudFiles into a local path
             container - the CloudFiles container in which to find the Vault DB
             bundle_data - a dict containing atlest the 'id'  and 'md5' of the bundle
             localpath - the local path at which to store the downloaded VaultDB
+            resume - continue a download interrupted earlier, and resume an interrupted
+                     transfer with a Range request (up to retries times) instead of starting over
+            checkpoint_path - (optional) file recording the progress of a resumable download,
+                              defaults to the bundle file + '.download-checkpoint'
 
         Note: Adds 'download-md5' and 'download-sha1' entries to the bundle_data
+
+        Note: When a BundleCache is set, the bundle is copied from it if it holds the bundle with
+            the expected 'md5', and downloaded bundles matching their 'md5' are added to it.
         """
-        self.apihost = self._get_container(container)
         try:
             fulluri = uripath + '/BUNDLES/' + '{0:010}'.format(bundle_data['id'])
-            self.ReInit(self.sslenabled, '/' + fulluri)
-            self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-            self.log.debug('uri: %s', self.Uri)
-            self.log.debug('headers: %s', self.Headers)
+            cache_key = None
+            if self.bundle_cache is not None and bundle_data.get('md5', None):
+                bundle_file = bundle_path(localpath, bundle_data)
+                cache_key = self.bundle_cache.Key(self.__VaultId(container, uripath), bundle_data['id'], bundle_data['md5'])
+                cached = self.bundle_cache.Fetch(cache_key, bundle_file, self.durability)
+                if cached is not None:
+                    bundle_data['download-md5'] = cached['md5'].upper()
+                    bundle_data['download-sha1'] = cached['sha1'].upper()
+                    self.log.info('Bundle ({0:}) was copied from the bundle cache to {1:}'.format(bundle_data['id'], bundle_file))
+                    bundle_data['file-on-disk'] = bundle_file
+                    # an earlier interrupted download of the bundle is no longer needed
+                    stale_checkpoint = checkpoint_path or bundle_file + '.download-checkpoint'
+                    if resume and os.path.exists(stale_checkpoint):
+                        os.remove(stale_checkpoint)
+                    return True
+
+            if resume:
+                bundle_file = bundle_path(localpath, bundle_data)
+                if checkpoint_path is None:
+                    checkpoint_path = bundle_file + '.download-checkpoint'
+                result = self.__DownloadResumable(container, fulluri, bundle_file, checkpoint_path, retries)
+                bundle_data['download-md5'] = result['md5'].upper()
+                bundle_data['download-sha1'] = result['sha1'].upper()
+                self.log.info('Bundle ({0:}) was successfully downloaded to {1:}'.format(bundle_data['id'], bundle_file))
+                bundle_data['file-on-disk'] = bundle_file
+                self.__CacheBundle(cache_key, bundle_data)
+                return True
+
+            request = self.NewRequest('GET', '/' + fulluri,
+                                      apihost=self._get_container(container))
+            request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+            self.log.debug('uri: %s', request.uri)
+            self.log.debug('headers: %s', request.headers)
             try:
-                res = requests.get(self.Uri, headers=self.Headers)
+                res = self.Send(request)
             except requests.exceptions.SSLError as ex:
                 self.log.error('Requests SSLError: {0}'.format(str(ex)))
-                res = requests.get(self.Uri, headers=self.Headers, verify=False)
+                res = self.Send(request, verify=False)
             if res.status_code == 404:
                 raise UserWarning('Server failed to find the specified bundle')
             elif res.status_code >= 300:
@@ -690,7 +1579,7 @@ class CloudFiles(Command):
                 meter = {}
                 meter['bytes-remaining'] = int(res.headers['Content-Length'])
                 meter['bar-count'] = 50
-                meter['bytes-per-bar'] = meter['bytes-remaining'] // meter['bar-count']
+                meter['bytes-per-bar'] = max(1, meter['bytes-remaining'] // meter['bar-count'])
                 meter['block-size'] = min(4 * 1024 * 1024, meter['bytes-per-bar'])
                 meter['chunks-per-bar'] = meter['bytes-per-bar'] // meter['block-size']
                 meter['chunks'] = 0
@@ -698,10 +1587,10 @@ class CloudFiles(Command):
                 meter['bars-completed'] = 0
                 self.log.info('Downloading bundle: {0} bytes...'.format(meter['bytes-remaining']))
                 self.log.info('[' + ' ' * meter['bar-count'] + ']')
-                bundle_file = localpath + '.bundle-{0:010}'.format(bundle_data['id'])
+                bundle_file = bundle_path(localpath, bundle_data)
                 md5_hash = hashlib.md5()
                 sha1_hash = hashlib.sha1()
-                with open(bundle_file, 'wb') as bundle_on_disk:
+                with DurableFileWriter(bundle_file, self.durability) as bundle_on_disk:
                     for bundle_chunk in res.iter_content(chunk_size=meter['block-size']):
                         bundle_on_disk.write(bundle_chunk)
                         md5_hash.update(bundle_chunk)
@@ -714,12 +1603,162 @@ class CloudFiles(Command):
                             self.log.info('[' + '-' * meter['bars-completed'] + ' ' * meter['bars-remaining'] + ']')
                 bundle_data['download-md5'] = md5_hash.hexdigest().upper()
                 bundle_data['download-sha1'] = sha1_hash.hexdigest().upper()
-                self.log.info('Bundle (' + bundle_data['id'] + ') was successfully downloaded to ' + bundle_file)
+                self.log.info('Bundle ({0:}) was successfully downloaded to {1:}'.format(bundle_data['id'], bundle_file))
                 bundle_data['file-on-disk'] = bundle_file
+                self.__CacheBundle(cache_key, bundle_data)
                 return True
         except LookupError:
             raise UserWarning('Invalid VaultDB Data provided.')
 
+    def __FetchBlockRanges(self, container, uripath, bundleid, byte_ranges, retries):
+        """
+        Retrieve the blocks of one bundle with a single (multi-)range request
+            byte_ranges - list of (first byte, last byte, blocks) as built by merge_block_ranges()
+
+        Returns a tuple of (dict of block_key() to the block's data, bytes received)
+        """
+        fulluri = uripath + '/BUNDLES/' + '{0:010}'.format(bundleid)
+        attempt = 0
+        while True:
+            try:
+                request = self.NewRequest('GET', '/' + fulluri,
+                                          apihost=self._get_container(container))
+                request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+                request.headers['Range'] = range_header([(first, last) for first, last, _ in byte_ranges])
+                self.log.debug('uri: %s', request.uri)
+                self.log.debug('headers: %s', request.headers)
+                try:
+                    res = self.Send(request)
+                except requests.exceptions.SSLError as ex:
+                    self.log.error('Requests SSLError: {0}'.format(str(ex)))
+                    res = self.Send(request, verify=False)
+                if res.status_code == 404:
+                    raise LookupError('Server failed to find bundle {0:}'.format(bundleid))
+                elif res.status_code == 206:
+                    content_type = res.headers.get('Content-Type', '')
+                    if content_type.lower().startswith('multipart/byteranges'):
+                        parts = parse_byteranges(content_type, res.content)
+                    else:
+                        match = _content_range_pattern.match(res.headers.get('Content-Range', ''))
+                        if match is None:
+                            raise UserWarning('Server returned bundle {0:} data without a Content-Range'.format(bundleid))
+                        parts = [(int(match.group(1)), res.content)]
+                elif res.status_code == 200:
+                    self.log.warning('Server ignored the byte ranges of bundle {0:}, received the whole bundle'.format(bundleid))
+                    parts = [(0, res.content)]
+                else:
+                    raise UserWarning('Server responded unexpectedly while reading bundle {0:} (Code: {1:} )'.format(
+                        bundleid, res.status_code))
+
+                contents = {}
+                for _, _, blocks in byte_ranges:
+                    for block in blocks:
+                        offset = block['bundle']['offset']
+                        data = None
+                        for first, part in parts:
+                            if first <= offset and offset + block['size'] <= first + len(part):
+                                data = part[offset - first:offset - first + block['size']]
+                                break
+                        if data is None:
+                            raise UserWarning('Server did not return block {0:} of bundle {1:}'.format(block['id'], bundleid))
+                        digest = hashlib.sha1(data).hexdigest().upper()
+                        if digest != block['sha1'].upper():
+                            raise UserWarning('Block {0:} of bundle {1:} failed its SHA1 check: {2:} vs {3:}'.format(
+                                block['id'], bundleid, digest, block['sha1'].upper()))
+                        contents[block_key(block)] = data
+                return (contents, len(res.content))
+
+            except LookupError as ex:
+                raise UserWarning(str(ex))
+            except (UserWarning, ValueError, requests.exceptions.RequestException) as ex:
+                attempt += 1
+                if attempt > retries:
+                    raise UserWarning('Unable to read {0:} byte ranges of bundle {1:}: {2:}'.format(
+                        len(byte_ranges), bundleid, str(ex)))
+                delay = min(30, 2 ** attempt)
+                self.log.warning('Reading bundle {0:} failed ({1:}); retry {2:} of {3:} in {4:} seconds'.format(
+                    bundleid, str(ex), attempt, retries, delay))
+                time.sleep(delay)
+
+    def DownloadFileBlocks(self, container, uripath, database, fileid, writer, window_size=32 * 1024 * 1024, max_ranges=64,
+                           max_gap=0, workers=4, retries=3):
+        """
+        Restore a single file by reading only its blocks from the bundles
+            container - the CloudFiles container in which to find the bundles
+            uripath - the path in the CloudFiles container under which the BUNDLES directory is
+            database - cloudbackup.database.sqlite.CloudBackupSqlite of the VaultDB holding the file
+            fileid - the id of the file in the VaultDB
+            writer - file-like object receiving the contents of the file in order (e.g. a DurableFileWriter)
+            window_size - bytes of blocks retrieved before they are written out, bounding the memory used
+            max_ranges - most byte ranges asked for in a single request
+            max_gap - blocks separated by at most this many unneeded bytes are read as one range
+            workers - number of requests made at once
+            retries - number of times a request is retried after a failure
+
+        The blocks (see CloudBackupSqlite.GetFileBlocks) of each bundle are read with
+        multi-range requests, adjacent blocks merged into one range, and each block is
+        checked against its SHA1 before it is written.
+
+        Note: The blocks are written as stored in the bundles.
+
+        Returns a dictionary with the following data:
+            - 'bytes' - the number of bytes written
+            - 'blocks' - the number of blocks written
+            - 'bundles' - the number of bundles read from
+            - 'requests' - the number of requests made (excluding retries)
+            - 'bytes-received' - the number of bytes received, including multipart framing
+            - 'sha1' - the SHA1 of the data written
+        """
+        blockdata = database.GetFileBlocks(fileid)
+        ordered = [blockdata['blocks'][index] for index in sorted(blockdata['blocks'])]
+        result = {
+            'bytes': 0,
+            'blocks': len(ordered),
+            'bundles': len(blockdata['bundles']),
+            'requests': 0,
+            'bytes-received': 0
+        }
+        sha1_hash = hashlib.sha1()
+
+        position = 0
+        while position < len(ordered):
+            # the next blocks of the file, up to window_size bytes (at least one block)
+            window = []
+            window_bytes = 0
+            while position < len(ordered) and (not len(window) or window_bytes + ordered[position]['size'] <= window_size):
+                window.append(ordered[position])
+                window_bytes += ordered[position]['size']
+                position += 1
+
+            per_bundle = {}
+            for block in window:
+                per_bundle.setdefault(block['bundle']['id'], []).append(block)
+            tasks = []
+            for bundleid in sorted(per_bundle):
+                byte_ranges = merge_block_ranges(per_bundle[bundleid], max_gap)
+                for start in range(0, len(byte_ranges), max(1, max_ranges)):
+                    tasks.append((bundleid, byte_ranges[start:start + max(1, max_ranges)]))
+
+            contents = {}
+            for task, fetched, error in map_concurrently(
+                    lambda task: self.__FetchBlockRanges(container, uripath, task[0], task[1], retries), tasks, workers):
+                if error is not None:
+                    raise error
+                contents.update(fetched[0])
+                result['bytes-received'] += fetched[1]
+            result['requests'] += len(tasks)
+
+            for block in window:
+                data = contents[block_key(block)]
+                writer.write(data)
+                sha1_hash.update(data)
+                result['bytes'] += len(data)
+
+        result['sha1'] = sha1_hash.hexdigest().upper()
+        self.log.info('File {0:} restored from {1:} blocks in {2:} bundles: {3:} bytes written, {4:} bytes received in {5:} requests'.format(
+            fileid, result['blocks'], result['bundles'], result['bytes'], result['bytes-received'], result['requests']))
+        return result
+
     # TODO: Test
     def GetFile(self, uri, uripath, localpath):
         """
@@ -727,15 +1766,15 @@ class CloudFiles(Command):
             uri - uri in CloudFiles to download as source
             localpath - local uri for destination
         """
-        self.apihost = self._get_container(uri)
-        self.ReInit(self.sslenabled, uripath)
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.log.debug('headers: %s', self.Headers)
+        request = self.NewRequest('GET', uripath,
+                                  apihost=self._get_container(uri))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        self.log.debug('headers: %s', request.headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.Send(request)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.Send(request, verify=False)
         return res.status_code
 
     # TODO: Test
@@ -743,19 +1782,19 @@ class CloudFiles(Command):
         """
         Access a file in the user's CloudFile account - not a backup agent file (apparently)
         """
-        self.apihost = self._get_container(uriserver)
-        self.ReInit(self.sslenabled, '/v1/' + str(self.authenticator.AuthId) + '/' + uripath + '/DB')
-        self.headers['X-Auth-Token'] = self.authenticator.AuthToken
-        self.headers['Content-Type'] = 'text/plain; charset=UTF-8'
-        self.headers['Accept'] = 'application/json'  # Retrieve is in JSON format
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('uri: %s', self.Uri)
-        self.log.debug('headers: %s', self.Headers)
+        request = self.NewRequest('GET', '/v1/' + str(self.authenticator.AuthId) + '/' + uripath + '/DB',
+                                  apihost=self._get_container(uriserver))
+        request.headers['X-Auth-Token'] = self.authenticator.AuthToken
+        request.headers['Content-Type'] = 'text/plain; charset=UTF-8'
+        request.headers['Accept'] = 'application/json'  # Retrieve is in JSON format
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('uri: %s', request.uri)
+        self.log.debug('headers: %s', request.headers)
         try:
-            res = requests.get(self.Uri, headers=self.Headers)
+            res = self.Send(request)
         except requests.exceptions.SSLError as ex:
             self.log.error('Requests SSLError: {0}'.format(str(ex)))
-            res = requests.get(self.Uri, headers=self.Headers, verify=False)
+            res = self.Send(request, verify=False)
         if res.status_code == 200:
             self.log.debug('Content is available')
             return True
@@ -0,0 +1,212 @@
+"""
+Rackspace Cloud Files Streaming Upload
+
+Compresses, hashes and uploads a file in a single pass with bounded memory:
+the gzip stream is produced while it is sent, so no compressed copy of the
+file is ever written to disk.
+"""
+import hashlib
+import io
+import struct
+import time
+import zlib
+
+
+def gzip_bound(size):
+    """
+    Largest gzip stream the compression of size bytes can produce (zlib's deflateBound plus the gzip wrapper)
+    """
+    return size + (size >> 12) + (size >> 14) + (size >> 25) + 7 + 18
+
+
+class GzipReader(object):
+    """
+    Produces the gzip compressed form of a file on demand
+      path - file to compress
+      compress - False to produce the file as is
+      compresslevel - zlib compression level
+      block_size - size of the reads made from the file
+
+    The MD5 of the data read from the file and of the data produced are
+    computed along the way. The state of the reader can be saved with
+    Checkpoint() and returned to with Restore() so that a part of the stream
+    can be produced again (e.g. to retry sending it) without keeping it.
+    """
+
+    def __init__(self, path, compress=True, compresslevel=6, block_size=1024 * 1024):
+        self.fileobj = open(path, 'rb')
+        self.compress = compress
+        self.block_size = block_size
+        self.raw_md5 = hashlib.md5()
+        self.md5 = hashlib.md5()
+        self.raw_bytes = 0
+        self.bytes = 0
+        self.crc = 0
+        # output produced but not read yet: pending[offset:]
+        self.pending = b''
+        self.offset = 0
+        self.finished = False
+        self.compressor = None
+        if compress:
+            self.compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+            # gzip member header: no file name, modification time of the compression
+            self.pending = b'\x1f\x8b\x08\x00' + struct.pack('<I', int(time.time()) & 0xffffffff) + b'\x00\xff'
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __Fill(self):
+        """
+        Produce more output into the pending buffer
+        """
+        if self.offset:
+            self.pending = self.pending[self.offset:]
+            self.offset = 0
+        data = self.fileobj.read(self.block_size)
+        if len(data):
+            self.raw_md5.update(data)
+            self.raw_bytes += len(data)
+            if self.compressor is None:
+                self.pending += data
+            else:
+                self.crc = zlib.crc32(data, self.crc) & 0xffffffff
+                self.pending += self.compressor.compress(data)
+        else:
+            self.finished = True
+            if self.compressor is not None:
+                self.pending += self.compressor.flush()
+                self.pending += struct.pack('<II', self.crc, self.raw_bytes & 0xffffffff)
+
+    def Read(self, size):
+        """
+        Return up to size bytes of the stream; an empty result marks its end
+        """
+        while len(self.pending) - self.offset < size and not self.finished:
+            self.__Fill()
+        data = self.pending[self.offset:self.offset + size]
+        self.offset += len(data)
+        self.md5.update(data)
+        self.bytes += len(data)
+        return data
+
+    def AtEnd(self):
+        """
+        True once the whole stream has been read
+        """
+        while len(self.pending) == self.offset and not self.finished:
+            self.__Fill()
+        return len(self.pending) == self.offset
+
+    def Checkpoint(self):
+        """
+        Save the state of the reader, see Restore()
+        """
+        # a flushed compressor can not be copied; it is not used again once the stream is finished
+        compressor = None
+        if self.compressor is not None and not self.finished:
+            compressor = self.compressor.copy()
+        return {
+            'position': self.fileobj.tell(),
+            'compressor': compressor,
+            'raw_md5': self.raw_md5.copy(),
+            'md5': self.md5.copy(),
+            'raw_bytes': self.raw_bytes,
+            'bytes': self.bytes,
+            'crc': self.crc,
+            'pending': self.pending[self.offset:],
+            'finished': self.finished
+        }
+
+    def Restore(self, checkpoint):
+        """
+        Return to a saved state; the same output is produced again from there
+        """
+        self.fileobj.seek(checkpoint['position'])
+        # a saved compressor is copied again so that the checkpoint can be restored more than once;
+        # none is saved for a finished stream, which keeps using its (flushed) compressor
+        if checkpoint['compressor'] is not None:
+            self.compressor = checkpoint['compressor'].copy()
+        elif not checkpoint['finished']:
+            self.compressor = None
+        self.raw_md5 = checkpoint['raw_md5'].copy()
+        self.md5 = checkpoint['md5'].copy()
+        self.raw_bytes = checkpoint['raw_bytes']
+        self.bytes = checkpoint['bytes']
+        self.crc = checkpoint['crc']
+        self.pending = checkpoint['pending']
+        self.offset = 0
+        self.finished = checkpoint['finished']
+
+    @property
+    def RawMd5(self):
+        return self.raw_md5.hexdigest()
+
+    @property
+    def Md5(self):
+        return self.md5.hexdigest()
+
+
+class StreamBody(object):
+    """
+    Request body sending the next part of a GzipReader's stream with chunked transfer encoding
+      reader - GzipReader to read from
+      limit - (optional) maximum number of bytes to send, e.g. the size of a segment
+      chunk_size - size of the chunks sent
+
+    The body can be rewound to its start (seek(0)), as done by
+    cloudbackup.common.command.Command when it retries a request: the
+    reader is restored to where the body started and produces the same
+    bytes again.
+    """
+
+    def __init__(self, reader, limit=None, chunk_size=64 * 1024):
+        self.reader = reader
+        self.limit = limit
+        self.chunk_size = chunk_size
+        self.checkpoint = reader.Checkpoint()
+        self.position = 0
+        self.digest = hashlib.md5()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        if self.limit is not None:
+            size = min(size, self.limit - self.position)
+        if size <= 0:
+            return b''
+        data = self.reader.Read(size)
+        self.position += len(data)
+        self.digest.update(data)
+        return data
+
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not len(data):
+                break
+            yield data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=io.SEEK_SET):
+        # the length is not known until the body has been sent
+        if whence != io.SEEK_SET or position != 0:
+            raise io.UnsupportedOperation('StreamBody can only be rewound to its start')
+        if self.position:
+            self.reader.Restore(self.checkpoint)
+            self.position = 0
+            self.digest = hashlib.md5()
+        return 0
+
+    def md5(self):
+        """
+        MD5 (hex) of the data sent
+        """
+        return self.digest.hexdigest()
@@ -0,0 +1,278 @@
+"""
+Rackspace Cloud Files Ranged Downloads
+
+Helpers for downloading an object as several byte ranges at once into a
+preallocated file, for resuming an interrupted download with a Range
+request, and for reading the parts of a multi-range response.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+from cloudbackup.utils.atomicfile import AtomicFile
+
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+# Content-Range header of a part of a multipart/byteranges body
+_part_range_pattern = re.compile(r'^content-range:\s*bytes (\d+)-(\d+)/(\d+|\*)\s*$', re.IGNORECASE | re.MULTILINE)
+
+
+def preallocate(path, size):
+    """
+    Create (or truncate) the file at path and reserve size bytes for it
+    """
+    with open(path, 'wb') as output:
+        if size > 0 and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(output.fileno(), 0, size)
+                return
+            except OSError:
+                # not supported by the file system; a sparse file will do
+                pass
+        output.truncate(size)
+
+
+class RangeHasher(object):
+    """
+    Computes the MD5 and SHA-1 of a file in order while its byte ranges are
+    written out of order, so that hashing overlaps the download
+      path - file being written
+      size - expected size of the file
+      block_size - size of the reads made while hashing
+
+    Complete() each range once it is on disk, then Finish() for the digests.
+    """
+
+    def __init__(self, path, size, block_size=4 * 1024 * 1024):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self.size = size
+        self.block_size = block_size
+        self.md5 = hashlib.md5()
+        self.sha1 = hashlib.sha1()
+        self.position = 0
+        self.completed = {}
+        self.aborted = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.__Run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def Complete(self, offset, length):
+        """
+        Record that the range [offset, offset + length) has been written
+        """
+        with self.condition:
+            self.completed[offset] = length
+            self.condition.notify()
+
+    def Abort(self):
+        """
+        Stop hashing; the download failed
+        """
+        with self.condition:
+            self.aborted = True
+            self.condition.notify()
+        self.thread.join()
+
+    def __Run(self):
+        try:
+            # unbuffered: a buffered reader would keep the not yet written
+            # bytes read ahead past the end of a range
+            with open(self.path, 'rb', 0) as data_file:
+                while True:
+                    with self.condition:
+                        while (self.position not in self.completed and not self.aborted and
+                               self.position < self.size):
+                            self.condition.wait()
+                        if self.aborted or self.position >= self.size:
+                            return
+                        length = self.completed.pop(self.position)
+                    data_file.seek(self.position)
+                    remaining = length
+                    while remaining > 0:
+                        data = data_file.read(min(self.block_size, remaining))
+                        if not len(data):
+                            raise IOError('{0:} is shorter than expected'.format(self.path))
+                        self.md5.update(data)
+                        self.sha1.update(data)
+                        remaining -= len(data)
+                    self.position += length
+        except Exception as ex:
+            self.log.error('Unable to hash {0:}: {1:}'.format(self.path, str(ex)))
+            self.error = ex
+
+    def Finish(self):
+        """
+        Wait for the whole file to be hashed
+
+        Returns (MD5 hex, SHA-1 hex)
+        """
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        if self.position < self.size:
+            raise IOError('Only {0:} of {1:} bytes of {2:} were hashed'.format(self.position, self.size, self.path))
+        return (self.md5.hexdigest(), self.sha1.hexdigest())
+
+
+class DownloadCheckpoint(object):
+    """
+    Progress of a download saved next to the file so that an interrupted
+    download can continue where it stopped
+      path - checkpoint file
+      download - dict identifying the download (e.g. the object); a checkpoint for a
+                 different download is discarded
+
+    The checkpoint records the ETag and size of the object, whether it is a
+    (static or dynamic) large object and the number of bytes known to be in
+    the file. Hash states cannot be saved, so the part
+    already downloaded is hashed again when resuming.
+    """
+
+    def __init__(self, path, download):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self.state = {
+            'download': download,
+            'etag': None,
+            'bytes': None,
+            'large_object': False,
+            'received': 0
+        }
+        try:
+            with open(path, 'r') as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state.get('download', None) == download and int(state['received']) >= 0:
+                self.state = state
+            else:
+                self.log.info('Ignoring checkpoint {0:} of a different download'.format(path))
+        except (IOError, OSError):
+            pass
+        except (ValueError, LookupError, TypeError):
+            self.log.warning('Ignoring corrupt checkpoint {0:}'.format(path))
+
+    @property
+    def ETag(self):
+        return self.state['etag']
+
+    @property
+    def Bytes(self):
+        return self.state['bytes']
+
+    @property
+    def LargeObject(self):
+        # checkpoints saved by earlier versions do not record it
+        return self.state.get('large_object', False)
+
+    @property
+    def Received(self):
+        return self.state['received']
+
+    def Save(self, etag, size, received, large_object=False):
+        """
+        Record the bytes received; they must already be written to the file
+          large_object - whether the ETag is that of a large object's manifest rather than the MD5 of the data
+        """
+        self.state['etag'] = etag
+        self.state['bytes'] = size
+        self.state['large_object'] = large_object
+        self.state['received'] = received
+        try:
+            with AtomicFile(self.path, 'w', prefix='.checkpoint-') as checkpoint_file:
+                json.dump(self.state, checkpoint_file)
+        except (IOError, OSError) as ex:
+            self.log.warning('Unable to save the checkpoint {0:}: {1:}'.format(self.path, str(ex)))
+
+    def Reset(self):
+        """
+        Start over: nothing received
+        """
+        self.state['etag'] = None
+        self.state['bytes'] = None
+        self.state['large_object'] = False
+        self.state['received'] = 0
+        self.Remove()
+
+    def Remove(self):
+        """
+        Delete the checkpoint file once the download is complete
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def hash_prefix(path, length, block_size=4 * 1024 * 1024):
+    """
+    MD5 and SHA-1 hash objects of the first length bytes of a file, to continue hashing a resumed download
+
+    Returns (md5, sha1) or None if the file is shorter than length
+    """
+    md5 = hashlib.md5()
+    sha1 = hashlib.sha1()
+    remaining = length
+    with open(path, 'rb') as data_file:
+        while remaining > 0:
+            data = data_file.read(min(block_size, remaining))
+            if not len(data):
+                return None
+            md5.update(data)
+            sha1.update(data)
+            remaining -= len(data)
+    return (md5, sha1)
+
+
+def range_header(ranges):
+    """
+    Range header value requesting the (first, last) byte ranges
+    """
+    return 'bytes=' + ','.join('{0:}-{1:}'.format(first, last) for first, last in ranges)
+
+
+def parse_byteranges(content_type, content):
+    """
+    Split a multipart/byteranges response body into its parts
+      content_type - Content-Type header of the response, holding the boundary
+      content - the response body
+
+    Returns a list of (first byte, data) in the order of the body
+
+    Raises ValueError if the body is not a complete multipart/byteranges body
+    """
+    boundary = None
+    for parameter in content_type.split(';')[1:]:
+        name, _, value = parameter.strip().partition('=')
+        if name.lower() == 'boundary':
+            boundary = value.strip('"')
+    if not boundary:
+        raise ValueError('No boundary in {0:}'.format(content_type))
+
+    delimiter = b'--' + boundary.encode('latin-1')
+    parts = []
+    position = 0
+    while True:
+        start = content.find(delimiter, position)
+        if start < 0:
+            raise ValueError('The multipart/byteranges body ended before its closing boundary')
+        position = start + len(delimiter)
+        if content[position:position + 2] == b'--':
+            return parts
+        header_end = content.find(b'\r\n\r\n', position)
+        if header_end < 0:
+            raise ValueError('Incomplete part headers in the multipart/byteranges body')
+        match = _part_range_pattern.search(content[position:header_end].decode('latin-1'))
+        if match is None:
+            raise ValueError('Part without a Content-Range in the multipart/byteranges body')
+        first, last = int(match.group(1)), int(match.group(2))
+        data_start = header_end + 4
+        data = content[data_start:data_start + last - first + 1]
+        if len(data) != last - first + 1:
+            raise ValueError('Truncated part in the multipart/byteranges body')
+        parts.append((first, data))
+        position = data_start + len(data)
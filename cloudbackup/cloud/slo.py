@@ -0,0 +1,231 @@
+"""
+Rackspace Cloud Files Static Large Objects
+
+Helpers for uploading a file as a Static Large Object (SLO): a set of
+segment objects tied together by a manifest. Cloud Files limits a single
+object to 5 GB; larger files must be uploaded this way.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from cloudbackup.utils.atomicfile import AtomicFile
+
+# Cloud Files does not accept single objects larger than this
+MAX_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+
+DEFAULT_SEGMENT_SIZE = 512 * 1024 * 1024
+
+
+class FileSegment(object):
+    """
+    Read-only file-like view of a byte range of a file, used as a request body
+      path - file to read
+      offset - first byte of the segment
+      length - number of bytes in the segment
+      block_size - size of the reads made while hashing
+    """
+
+    def __init__(self, path, offset, length, block_size=4 * 1024 * 1024):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.block_size = block_size
+        self.position = 0
+        self.fileobj = open(path, 'rb')
+        self.fileobj.seek(offset)
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b''
+        data = self.fileobj.read(size)
+        self.position += len(data)
+        return data
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position += self.position
+        elif whence == os.SEEK_END:
+            position += self.length
+        self.position = max(0, min(self.length, position))
+        self.fileobj.seek(self.offset + self.position)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def md5(self):
+        """
+        MD5 (hex) of the segment's data; the read position is restored afterwards
+        """
+        position = self.position
+        self.seek(0)
+        digest = hashlib.md5()
+        while True:
+            data = self.read(self.block_size)
+            if not len(data):
+                break
+            digest.update(data)
+        self.seek(position)
+        return digest.hexdigest()
+
+    def close(self):
+        self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def plan_segments(size, segment_size):
+    """
+    Split a file of the given size into segments
+
+    Returns a list of (index, offset, length)
+    """
+    segments = []
+    offset = 0
+    index = 0
+    while offset < size or not len(segments):
+        length = min(segment_size, size - offset)
+        segments.append((index, offset, length))
+        offset += length
+        index += 1
+    return segments
+
+
+def manifest_etag(etags):
+    """
+    ETag Cloud Files reports for a Static Large Object: the MD5 of the segment ETags
+    """
+    digest = hashlib.md5()
+    for etag in etags:
+        digest.update(etag.strip('"').lower().encode('ascii'))
+    return digest.hexdigest()
+
+
+def segment_container(container):
+    """
+    Container (in the form used by cloudbackup.cloud.files.CloudFiles) holding the segments
+    of objects stored in the given container
+    """
+    return container.rstrip('/') + '_segments'
+
+
+class SegmentCheckpoint(object):
+    """
+    Progress of a segmented upload saved to disk so that an interrupted upload
+    can be resumed without sending the completed segments again
+      path - checkpoint file
+      upload - dict identifying the upload (object, file size and modification
+               time, segment size); a checkpoint for a different upload is discarded
+
+    The file is rewritten atomically after each completed segment.
+    """
+
+    def __init__(self, path, upload):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = None
+        try:
+            with open(path, 'r') as checkpoint_file:
+                state = json.load(checkpoint_file)
+            if state.get('upload', None) == upload:
+                self.state = state
+                self.log.info('Resuming upload of {0:} from {1:}: {2:} segments already uploaded'.format(
+                    upload.get('object', None), path, len(state['segments'])))
+            else:
+                self.log.info('Ignoring checkpoint {0:} of a different upload'.format(path))
+        except (IOError, OSError):
+            pass
+        except (ValueError, LookupError):
+            self.log.warning('Ignoring corrupt checkpoint {0:}'.format(path))
+        if self.state is None:
+            # segment names are unique per upload so that a new upload never mixes
+            # its segments with the ones of an earlier attempt
+            self.state = {
+                'upload': upload,
+                'upload-id': '{0:.6f}'.format(time.time()),
+                'segments': {}
+            }
+
+    @property
+    def UploadId(self):
+        return self.state['upload-id']
+
+    def Completed(self, index):
+        """
+        Segment entry ({'path', 'etag', 'size_bytes'}) if the segment was uploaded, otherwise None
+        """
+        with self.lock:
+            return self.state['segments'].get(str(index), None)
+
+    def Complete(self, index, entry):
+        """
+        Record an uploaded segment
+        """
+        with self.lock:
+            self.state['segments'][str(index)] = entry
+            self.__Save()
+
+    def __Save(self):
+        try:
+            with AtomicFile(self.path, 'w', prefix='.checkpoint-') as checkpoint_file:
+                json.dump(self.state, checkpoint_file)
+        except (IOError, OSError) as ex:
+            self.log.warning('Unable to save the checkpoint {0:}: {1:}'.format(self.path, str(ex)))
+
+    def Remove(self):
+        """
+        Delete the checkpoint file once the upload is complete
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def file_digests(path, segment_size=None, block_size=4 * 1024 * 1024):
+    """
+    Compute the MD5 of a file and, optionally, of each of its segments in a single pass
+      segment_size - (optional) size of the segments to hash separately
+
+    Returns (MD5 hex of the file, list of MD5 hex of the segments)
+    """
+    whole = hashlib.md5()
+    segment_hashes = []
+    segment = hashlib.md5()
+    segment_count = 0
+    with open(path, 'rb') as data_file:
+        while True:
+            data = data_file.read(block_size)
+            if not len(data):
+                break
+            whole.update(data)
+            if segment_size is None:
+                continue
+            while len(data):
+                room = segment_size - segment_count
+                used = data if len(data) <= room else data[:room]
+                segment.update(used)
+                segment_count += len(used)
+                data = data[len(used):]
+                if segment_count == segment_size:
+                    segment_hashes.append(segment.hexdigest())
+                    segment = hashlib.md5()
+                    segment_count = 0
+    if segment_size is not None and (segment_count or not len(segment_hashes)):
+        segment_hashes.append(segment.hexdigest())
+    return (whole.hexdigest(), segment_hashes)
@@ -12,6 +12,8 @@ def main():
     argument_parser.add_argument('-dc', '--datacenter', default='ord', type=str, required=True, help='Datacenter the system is in', choices=['lon', 'syd', 'hkg', 'ord', 'iad', 'dfw'])
     argument_parser.add_argument('-lg', '--log-config', default=None, type=str, dest='logconfig', help='log configuration file')
     argument_parser.add_argument('--use-snet', default=False, action='store_true', help='Use Service Net instead of Public Net')
+    argument_parser.add_argument('--token-cache', default=None, nargs='?', const='', type=str, dest='token_cache', help='Share auth tokens between runs using the given cache file (default ~/.cloudbackup/token-cache.json)')
+    argument_parser.add_argument('--durability', default=None, type=str, help='When downloaded files are forced to disk: none, end (default) or a number of MB to fsync every N MB')
 
     arguments = argument_parser.parse_args()
 
@@ -30,12 +32,20 @@ def main():
 
     log = logging.getLogger()
 
+    if arguments.durability is not None:
+        from cloudbackup.common.durability import Durability, configure_durability
+        try:
+            configure_durability(Durability.Parse(arguments.durability))
+        except ValueError as ex:
+            argument_parser.error(str(ex))
+
     from cloudbackup.cmd.shell.interface import CloudBackupApiShell
     shell = CloudBackupApiShell(
         log,
         arguments.user_config,
         arguments.datacenter,
-        use_servicenet=arguments.use_snet
+        use_servicenet=arguments.use_snet,
+        token_cache_path=arguments.token_cache
     )
 
     return_value = shell.doShell()
@@ -14,6 +14,7 @@ import cloudbackup.client.agents
 import cloudbackup.client.auth
 import cloudbackup.client.backup
 import cloudbackup.client.rse
+import cloudbackup.client.token_cache
 import cloudbackup.cmd.shell.exceptions
 import cloudbackup.cmd.shell.prompter as prompt_user
 import cloudbackup.utils.menus
@@ -21,7 +22,7 @@ from cloudbackup.utils import tz
 
 class CloudBackupApiShell(object):
 
-    def __init__(self, logger, auth_data_file, datacenter, use_servicenet=False):
+    def __init__(self, logger, auth_data_file, datacenter, use_servicenet=False, token_cache_path=None):
         if datacenter not in ('ord', 'syd', 'hkg', 'iad', 'dfw', 'lon'):
             raise cloudbackup.cmd.shell.exceptions.CloudBackupApiBadParameters(
                 'Invalid Datacenter - {0}'.format(datacenter))
@@ -63,13 +64,19 @@ class CloudBackupApiShell(object):
         else:
             raise cloudbackup.cmd.shell.exceptions.CloudBackupApiBadAuthData('invalid json file')
 
+        # Reuse the token of earlier shells if asked to
+        token_cache = None
+        if token_cache_path is not None:
+            token_cache = cloudbackup.client.token_cache.TokenCache(token_cache_path or None)
+
         # Build the Auth Engine
         self.auth_engine = cloudbackup.client.auth.Authentication(
             self.auth_data['user'],
             self.auth_data['credentials'],
             usertype=self.auth_data['user_type'],
             method=self.auth_data['method'],
-            datacenter=self.datacenter
+            datacenter=self.datacenter,
+            token_cache=token_cache
         )
 
         # Get the URI for Cloud Backup API
@@ -0,0 +1,184 @@
+"""
+Rackspace Cloud Backup Response Cache
+
+Bounded LRU cache of GET responses supporting a time-to-live and
+conditional (If-None-Match / If-Modified-Since) revalidation.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# seconds the agent and backup configurations are served from the cache
+DEFAULT_CONFIGURATION_TTL = 10.0
+
+
+class CachedResponse(object):
+    """
+    Response stored in a ResponseCache
+
+    Mirrors the parts of requests.Response used by the API classes
+    """
+
+    def __init__(self, response, stored_at=None):
+        self.status_code = response.status_code
+        self.reason = response.reason
+        self.headers = dict(response.headers)
+        self.content = response.content
+        self.encoding = response.encoding or 'utf-8'
+        self.stored_at = stored_at if stored_at is not None else time.time()
+
+    @property
+    def ETag(self):
+        """ETag validator of the response, if any"""
+        return self.headers.get('ETag', self.headers.get('etag', None))
+
+    @property
+    def LastModified(self):
+        """Last-Modified validator of the response, if any"""
+        return self.headers.get('Last-Modified', self.headers.get('last-modified', None))
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def close(self):
+        pass
+
+
+class ResponseCache(object):
+    """
+    Thread-safe LRU cache of responses
+      max_entries - maximum number of responses kept; the least recently used is evicted
+      ttl - seconds a response is served without contacting the server;
+            0 means every use is revalidated with a conditional request
+    """
+
+    def __init__(self, max_entries=256, ttl=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.counters = {
+            'hits': 0,
+            'revalidated': 0,
+            'misses': 0,
+            'evictions': 0
+        }
+
+    @property
+    def Statistics(self):
+        """
+        Cache counters
+          hits - responses served without a request
+          revalidated - responses served after the server confirmed them (304)
+          misses - responses that had to be (re)downloaded
+          evictions - responses dropped to honour max_entries
+        """
+        with self.lock:
+            result = dict(self.counters)
+            result['entries'] = len(self.entries)
+        return result
+
+    def count(self, counter):
+        """
+        Increment one of the Statistics counters
+        """
+        with self.lock:
+            self.counters[counter] += 1
+
+    def lookup(self, key):
+        """
+        Return the CachedResponse for key or None
+        """
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                # mark as most recently used
+                del self.entries[key]
+                self.entries[key] = entry
+            return entry
+
+    def IsFresh(self, entry):
+        """
+        Whether the entry may be used without revalidating it with the server
+        """
+        return (time.time() - entry.stored_at) < self.ttl
+
+    @staticmethod
+    def ConditionalHeaders(entry):
+        """
+        Headers to make a request conditional on the entry having changed
+        """
+        headers = {}
+        if entry.ETag is not None:
+            headers['If-None-Match'] = entry.ETag
+        if entry.LastModified is not None:
+            headers['If-Modified-Since'] = entry.LastModified
+        return headers
+
+    def store(self, key, response):
+        """
+        Store a 200 response, returning the CachedResponse or None if the
+        response can not be cached (no validators and no ttl)
+        """
+        entry = CachedResponse(response)
+        if self.ttl <= 0 and entry.ETag is None and entry.LastModified is None:
+            return None
+        with self.lock:
+            if key in self.entries:
+                del self.entries[key]
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return entry
+
+    def touch(self, entry):
+        """
+        Mark an entry as fresh again after the server confirmed it
+        """
+        entry.stored_at = time.time()
+
+    def invalidate(self, key=None):
+        """
+        Remove the entry for key, or all entries if key is None
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+_configuration_cache = None
+_configuration_cache_lock = threading.Lock()
+
+
+def get_configuration_cache():
+    """
+    Return the ResponseCache shared by the Agents and Backups API objects
+
+    The configurations carry no ETag or Last-Modified, so the cache serves them
+    for DEFAULT_CONFIGURATION_TTL seconds instead of revalidating them.
+    """
+    global _configuration_cache
+    with _configuration_cache_lock:
+        if _configuration_cache is None:
+            _configuration_cache = ResponseCache(ttl=DEFAULT_CONFIGURATION_TTL)
+        return _configuration_cache
+
+
+def configure_configuration_cache(**kwargs):
+    """
+    Replace the shared configuration cache with one using the given configuration, see ResponseCache
+
+    Note: API objects created before this call keep the ResponseCache they were created with
+    """
+    global _configuration_cache
+    with _configuration_cache_lock:
+        _configuration_cache = ResponseCache(**kwargs)
+        return _configuration_cache
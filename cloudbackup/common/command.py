@@ -1,26 +1,87 @@
 """
 Rackspace Cloud Backup Command API
 """
+import logging
+import time
+
+from cloudbackup.common.cache import ResponseCache
+from cloudbackup.common.durability import get_durability
+from cloudbackup.common.metrics import RequestMetrics, body_size
+from cloudbackup.common.pagination import iterate_items, next_marker
+from cloudbackup.common.ratelimit import get_rate_limiter
+from cloudbackup.common.retry import RetryPolicy
+from cloudbackup.common.transport import connection_timings, get_transport
+
+
+class HttpRequest(object):
+    """
+    A single HTTP request, see Command.NewRequest()
+      method - HTTP method (GET, PUT, POST, etc)
+      uri - full URI for the request
+      headers - dict of HTTP headers
+      body - HTTP message body data (None for no body)
+    """
+
+    def __init__(self, method, uri, headers=None, body=None):
+        self.method = method
+        self.uri = uri
+        if headers is None:
+            headers = {}
+        self.headers = headers
+        self.body = body
 
 
 class Command(object):
     """
     Base class for defining HTTP REST API calls
+
+    Note: Requests are built with NewRequest() and sent with Send() so that
+        a single instance may be used by multiple threads at once. ReInit()
+        and the Uri, Headers and Body properties are kept for compatibility
+        but share state between all the callers.
     """
 
-    def __init__(self, sslenabled, apihost, uripath):
+    def __init__(self, sslenabled, apihost, uripath, transport=None, retry_policy=None, response_cache=None,
+                 rate_limiter=None, durability=None):
         """
         Initialize the Command Object
           sslenabled - True if using HTTPS; otherwise False
           apihost - server to use for API calls
           uripath - HTTP(S) Path for the REST API being defined
+          transport - (optional) cloudbackup.common.transport.Transport to use,
+                      defaults to the transport shared by all Command objects
+          retry_policy - (optional) cloudbackup.common.retry.RetryPolicy to use,
+                         defaults to a new RetryPolicy (and retry budget) per object
+          response_cache - (optional) cloudbackup.common.cache.ResponseCache used by CachedGet(),
+                           defaults to a new revalidating cache per object
+          rate_limiter - (optional) cloudbackup.common.ratelimit.RateLimiter to use,
+                         defaults to the rate limiter shared by all Command objects
+          durability - (optional) cloudbackup.common.durability.Durability of the files downloaded,
+                       defaults to the durability shared by all Command objects
         """
         self.body = {}
         self.headers = {}
         self.headers['X-RCBU-Integration-User-Agent'] = 'RCBU-Integration-Tests/1.0'
         self.headers['User-Agent'] = self.headers['X-RCBU-Integration-User-Agent']
         self.uri = ''
+        self.sslenabled = sslenabled
         self.apihost = apihost
+        if transport is None:
+            transport = get_transport()
+        self.transport = transport
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.request_hooks = []
+        if response_cache is None:
+            response_cache = ResponseCache()
+        self.response_cache = response_cache
+        if rate_limiter is None:
+            rate_limiter = get_rate_limiter()
+        self.rate_limiter = rate_limiter
+        if durability is None:
+            durability = get_durability()
+        self.durability = durability
         self.__ReInit(sslenabled, uripath)
 
     @property
@@ -38,11 +99,124 @@ class Command(object):
         """HTTP Message Header Data"""
         return self.headers
 
+    @property
+    def ResponseCache(self):
+        """Response Cache used for the cacheable GET requests (None when disabled)"""
+        return self.response_cache
+
+    @ResponseCache.setter
+    def ResponseCache(self, response_cache):
+        """Change the Response Cache, None to disable caching"""
+        self.response_cache = response_cache
+
+    @property
+    def RateLimiter(self):
+        """Rate Limiter applied to the requests (None when disabled)"""
+        return self.rate_limiter
+
+    @RateLimiter.setter
+    def RateLimiter(self, rate_limiter):
+        """Change the Rate Limiter, None to disable rate limiting"""
+        self.rate_limiter = rate_limiter
+
+    @property
+    def Durability(self):
+        """Durability of the files downloaded"""
+        return self.durability
+
+    @Durability.setter
+    def Durability(self, durability):
+        """Change the Durability of the files downloaded"""
+        self.durability = durability
+
+    @property
+    def RetryPolicy(self):
+        """Retry Policy applied to the requests"""
+        return self.retry_policy
+
+    @RetryPolicy.setter
+    def RetryPolicy(self, retry_policy):
+        """Change the Retry Policy applied to the requests"""
+        self.retry_policy = retry_policy
+
+    @property
+    def Transport(self):
+        """HTTP Transport used to send the requests"""
+        return self.transport
+
     @property
     def Uri(self):
         """HTTP URI"""
         return self.uri
 
+    def BuildUri(self, uripath, apihost=None):
+        """
+        Build the full URI for the given path
+          uripath - HTTP(S) path (and query string) for the request
+          apihost - (optional) server to use instead of the object's API host
+        """
+        if apihost is None:
+            apihost = self.apihost
+        if self.sslenabled:
+            return 'https://' + apihost + uripath
+        else:
+            return 'http://' + apihost + uripath
+
+    def NewRequest(self, method, uripath, apihost=None):
+        """
+        Create a new HttpRequest for the given path; the object itself is not modified
+          method - HTTP method (GET, PUT, POST, etc)
+          uripath - HTTP(S) path (and query string) for the request
+          apihost - (optional) server to use instead of the object's API host
+
+        Note: The request has no body and only the default Content-Type header,
+            the same as after ReInit()
+        """
+        headers = {}
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+        return HttpRequest(method, self.BuildUri(uripath, apihost=apihost), headers=headers)
+
+    def Send(self, request, **kwargs):
+        """
+        Send an HttpRequest, see Request()
+
+        Returns the requests.Response object
+        """
+        if request.body is not None:
+            kwargs['data'] = request.body
+        return self.Request(request.method, request.uri, headers=request.headers, **kwargs)
+
+    def SendPaginated(self, new_request, collection, page_size=100, params=None, marker=None, prefetch=True):
+        """
+        Generator returning the items of a marker/limit paginated GET listing
+          new_request - callable returning a new HttpRequest for the listing; called for
+                        each page so that the authentication token is always current
+          collection - name of the list in the JSON body, e.g. 'agents'
+          page_size - number of items requested per page
+          params - (optional) dict of additional query parameters
+          marker - (optional) marker to start the listing after
+          prefetch - True to retrieve the next page while the current one is being consumed
+
+        Raises RuntimeError if a page can not be retrieved
+        """
+        def fetch_page(page_marker):
+            query = {}
+            if params is not None:
+                query.update(params)
+            query['limit'] = page_size
+            if page_marker is not None:
+                query['marker'] = page_marker
+            request = new_request()
+            res = self.Send(request, params=query)
+            if res.status_code != 200:
+                raise RuntimeError('Unable to list {0:} from {1:}: status code {2:} reason {3:} - {4:}'.format(
+                    collection, request.uri, res.status_code, res.reason, res.text))
+            body = res.json()
+            items = body[collection]
+            return (items, next_marker(body, items, page_size))
+
+        return iterate_items(fetch_page, marker=marker, prefetch=prefetch)
+
     def ReInit(self, sslenabled, uripath):
         """
         Reinitialize the HTTP URI with the new specification
@@ -60,3 +234,186 @@ class Command(object):
             self.uri = "http://" + self.apihost + uripath
 
     __ReInit = ReInit
+
+    def AddRequestHook(self, hook):
+        """
+        Register a callable to be called after each request with a
+        cloudbackup.common.metrics.RequestMetrics describing it
+
+        Note: Hooks are called on the thread performing the request and should be quick
+        """
+        self.request_hooks.append(hook)
+
+    def RemoveRequestHook(self, hook):
+        """
+        Unregister a callable previously registered with AddRequestHook()
+        """
+        self.request_hooks.remove(hook)
+
+    def __CallRequestHooks(self, metrics):
+        for hook in list(self.request_hooks):
+            try:
+                hook(metrics)
+            except Exception as ex:
+                logging.getLogger(__name__).error('Request hook {0:} failed: {1:}'.format(hook, str(ex)))
+
+    def __Reauthenticate(self, kwargs):
+        """
+        (internal) Replace the token rejected by the server in the request headers
+        with a new one from the object's authenticator, if it has one
+
+        Returns True if the request should be sent again
+        """
+        headers = kwargs.get('headers', None)
+        authenticator = getattr(self, 'authenticator', None)
+        if headers is None or 'X-Auth-Token' not in headers or not hasattr(authenticator, 'InvalidateToken'):
+            return False
+        token = headers['X-Auth-Token']
+        try:
+            authenticator.InvalidateToken(token)
+            new_token = authenticator.AuthToken
+        except Exception as ex:
+            logging.getLogger(__name__).error('Unable to renew the rejected auth token: {0:}'.format(str(ex)))
+            return False
+        if not new_token or new_token == token:
+            return False
+        headers = dict(headers)
+        headers['X-Auth-Token'] = new_token
+        kwargs['headers'] = headers
+        return True
+
+    def __InvalidateCache(self, method, res):
+        """
+        Drop the cached responses once a request changed something on the server
+        """
+        if self.response_cache is None or method.upper() in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        if 200 <= res.status_code < 300:
+            self.response_cache.invalidate()
+
+    def Request(self, method, uri, retry_rules=None, **kwargs):
+        """
+        Send an HTTP request over the pooled transport
+          method - HTTP method (GET, PUT, POST, etc)
+          uri - full URI for the request
+          retry_rules - (optional) dict of HTTP status code to cloudbackup.common.retry.RetryRule
+                        overriding the retry policy for this request
+          kwargs - additional parameters as accepted by requests.request()
+
+        A 401 response to a request carrying an X-Auth-Token is retried once with
+        a renewed token when the object has an authenticator.
+
+        Returns the requests.Response object
+        """
+        rate_limiter = self.rate_limiter
+        headers = kwargs.get('headers', None)
+        queued = [0.0]
+        reauthenticated = [False]
+        # file-like bodies are rewound so that retries send the data again
+        data = kwargs.get('data', None)
+        data_position = None
+        if hasattr(data, 'seek') and hasattr(data, 'tell'):
+            data_position = data.tell()
+
+        def limited(send_request):
+            # only requests actually sent take a token; coalesced ones share the response
+            queued[0] += rate_limiter.Acquire(method, uri, headers)
+            res = send_request()
+            # a status this call retries (e.g. a 403 while an agent gets ready) is not throttling
+            if retry_rules is None or res.status_code not in retry_rules:
+                rate_limiter.Feedback(method, uri, headers, res.status_code)
+            return res
+
+        def attempt():
+            if data_position is not None:
+                data.seek(data_position)
+            if rate_limiter is None:
+                return self.transport.request(method, uri, **kwargs)
+            return self.transport.request(method, uri, upstream=limited, **kwargs)
+
+        def send():
+            res = attempt()
+            # a rejected token is renewed once and the request repeated with the new one
+            if res.status_code == 401 and not reauthenticated[0]:
+                reauthenticated[0] = True
+                if self.__Reauthenticate(kwargs):
+                    res.close()
+                    res = attempt()
+            return res
+
+        if not len(self.request_hooks):
+            res = self.retry_policy.Execute(send, rules=retry_rules)
+            self.__InvalidateCache(method, res)
+            return res
+
+        metrics = RequestMetrics(method, uri)
+        metrics.bytes_out = body_size(data)
+        attempts = {}
+        res = None
+        connection_timings.reset()
+        start = time.time()
+        try:
+            res = self.retry_policy.Execute(send, rules=retry_rules, attempts=attempts)
+            self.__InvalidateCache(method, res)
+            return res
+        finally:
+            metrics.total_time = time.time() - start
+            metrics.queue_time = queued[0]
+            metrics.retries = sum(attempts.values())
+            metrics.dns_time = connection_timings.dns
+            metrics.connect_time = connection_timings.connect
+            if not metrics.bytes_out and data_position is not None:
+                # the size of a stream (e.g. a StreamBody) is only known once it was sent
+                metrics.bytes_out = data.tell() - data_position
+            if res is not None:
+                metrics.status_code = res.status_code
+                metrics.ttfb = res.elapsed.total_seconds()
+                if kwargs.get('stream', False):
+                    metrics.bytes_in = int(res.headers.get('Content-Length', 0))
+                else:
+                    metrics.bytes_in = len(res.content)
+            self.__CallRequestHooks(metrics)
+
+    def CachedGet(self, uri, headers, cache=None):
+        """
+        Send an HTTP GET using the response cache
+          uri - full URI for the request
+          headers - HTTP headers for the request
+          cache - (optional) cloudbackup.common.cache.ResponseCache to use instead of the
+                  object's response cache, e.g. one with a different time-to-live
+
+        Fresh cached responses are returned without contacting the server;
+        otherwise the request is made conditional on the cached response's
+        ETag/Last-Modified and the cached response is returned on a 304.
+        A successful POST, PUT, PATCH or DELETE through Request() empties the
+        object's response cache (a cache passed explicitly is left alone).
+
+        Returns a requests.Response or cloudbackup.common.cache.CachedResponse
+        """
+        if cache is None:
+            cache = self.response_cache
+        if cache is None:
+            return self.Request('GET', uri, headers=headers)
+
+        # the token is part of the key so that different users never share entries
+        key = (uri, headers.get('X-Auth-Token', None))
+        entry = cache.lookup(key)
+        if entry is not None:
+            if cache.IsFresh(entry):
+                cache.count('hits')
+                return entry
+            headers = dict(headers)
+            headers.update(cache.ConditionalHeaders(entry))
+
+        res = self.Request('GET', uri, headers=headers)
+        if res.status_code == 304 and entry is not None:
+            cache.count('revalidated')
+            cache.touch(entry)
+            return entry
+
+        cache.count('misses')
+        if res.status_code == 200:
+            cache.store(key, res)
+        else:
+            cache.invalidate(key)
+        return res
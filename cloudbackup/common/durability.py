@@ -0,0 +1,244 @@
+"""
+Rackspace Cloud Backup Download Durability
+
+Controls when downloaded data is forced to disk (fsync) and buffers the
+writes of downloads into large aligned blocks written behind the download.
+"""
+import logging
+import os
+import threading
+
+import six
+from six.moves import queue
+
+MB = 1024 * 1024
+
+
+class Durability(object):
+    """
+    When downloaded files are forced to disk
+      mode - NONE: leave it to the operating system
+             END: fsync once the file is complete
+             INTERVAL: fsync every 'interval' bytes and once the file is complete
+      interval - bytes written between two fsync in the INTERVAL mode
+    """
+
+    NONE = 'none'
+    END = 'end'
+    INTERVAL = 'interval'
+
+    def __init__(self, mode=END, interval=64 * MB):
+        if mode not in (self.NONE, self.END, self.INTERVAL):
+            raise ValueError('Unknown durability mode: {0:}'.format(mode))
+        if mode == self.INTERVAL and (interval is None or interval <= 0):
+            raise ValueError('The durability interval must be a positive number of bytes')
+        self.mode = mode
+        self.interval = interval
+
+    @classmethod
+    def Parse(cls, text):
+        """
+        Build a Durability from its text form: 'none', 'end' or a number of MB to fsync every N MB
+        """
+        text = text.strip().lower()
+        if text in (cls.NONE, cls.END):
+            return cls(text)
+        try:
+            megabytes = float(text)
+        except ValueError:
+            raise ValueError('Durability must be "none", "end" or a number of MB, not "{0:}"'.format(text))
+        return cls(cls.INTERVAL, int(megabytes * MB))
+
+    def SyncAtEnd(self):
+        """
+        True if completed files are forced to disk
+        """
+        return self.mode != self.NONE
+
+    def SyncFile(self, path):
+        """
+        Force an already written file to disk if the policy requires it
+        """
+        if self.SyncAtEnd():
+            with open(path, 'rb+') as synced_file:
+                os.fsync(synced_file.fileno())
+
+    def __repr__(self):
+        if self.mode == self.INTERVAL:
+            return 'Durability(every {0:} bytes)'.format(self.interval)
+        return 'Durability({0:})'.format(self.mode)
+
+
+_default_durability = None
+_default_durability_lock = threading.Lock()
+
+
+def get_durability():
+    """
+    Return the Durability shared by all API objects
+    """
+    global _default_durability
+    with _default_durability_lock:
+        if _default_durability is None:
+            _default_durability = Durability()
+        return _default_durability
+
+
+def configure_durability(durability):
+    """
+    Replace the shared Durability
+
+    Note: API objects created before this call keep the Durability they were created with
+    """
+    global _default_durability
+    with _default_durability_lock:
+        _default_durability = durability
+        return _default_durability
+
+
+class DurableFileWriter(object):
+    """
+    Write-behind file writer applying a Durability
+      path - file to write (created or truncated)
+      durability - (optional) Durability to apply, defaults to get_durability()
+      buffer_size - bytes collected before they are written out
+      alignment - writes (except the last) are a multiple of this many bytes
+      write_behind - True to write and fsync on a background thread so that the
+                     caller (e.g. receiving from the network) is not held up by the disk
+      queue_depth - number of buffers waiting for the background thread at most
+      append - True to add to the end of an existing file instead of truncating it
+
+    Memory use is bounded by about buffer_size * (queue_depth + 1).
+    """
+
+    def __init__(self, path, durability=None, buffer_size=8 * MB, alignment=1 * MB, write_behind=True, queue_depth=4,
+                 append=False):
+        self.log = logging.getLogger(__name__)
+        if durability is None:
+            durability = get_durability()
+        self.path = path
+        self.durability = durability
+        self.alignment = max(1, alignment)
+        self.buffer_size = max(buffer_size, self.alignment)
+        self.buffer = bytearray()
+        self.unsynced = 0
+        self.error = None
+        self.closed = False
+        self.fileobj = open(path, 'ab' if append else 'wb', 0)
+        self.queue = None
+        self.thread = None
+        if write_behind:
+            self.queue = queue.Queue(maxsize=max(1, queue_depth))
+            self.thread = threading.Thread(target=self.__Run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def __WriteBlock(self, block):
+        view = memoryview(block)
+        while len(view):
+            written = self.fileobj.write(view)
+            # Python 2 file objects write everything and return None
+            if written is None:
+                break
+            view = view[written:]
+        self.unsynced += len(block)
+        if self.durability.mode == Durability.INTERVAL and self.unsynced >= self.durability.interval:
+            os.fsync(self.fileobj.fileno())
+            self.unsynced = 0
+
+    def __Run(self):
+        while True:
+            block = self.queue.get()
+            try:
+                if block is None:
+                    return
+                if self.error is not None:
+                    # drain the queue so that the writer never blocks
+                    continue
+                self.__WriteBlock(block)
+            except Exception as ex:
+                self.log.error('Unable to write {0:}: {1:}'.format(self.path, str(ex)))
+                self.error = ex
+            finally:
+                self.queue.task_done()
+
+    def __RaiseError(self):
+        if self.error is not None:
+            six.reraise(type(self.error), self.error)
+
+    def __Submit(self, block):
+        if self.queue is None:
+            self.__WriteBlock(block)
+        else:
+            self.__RaiseError()
+            self.queue.put(block)
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            length = len(self.buffer) - len(self.buffer) % self.alignment
+            block = bytes(self.buffer[:length])
+            del self.buffer[:length]
+            self.__Submit(block)
+
+    def Flush(self):
+        """
+        Write out all the data received so far and force it to disk unless the Durability is NONE
+
+        Use before recording that the data is on disk (e.g. in a checkpoint)
+        """
+        if len(self.buffer):
+            self.__Submit(bytes(self.buffer))
+            self.buffer = bytearray()
+        if self.queue is not None:
+            self.queue.join()
+        self.__RaiseError()
+        if self.durability.SyncAtEnd() and self.unsynced:
+            os.fsync(self.fileobj.fileno())
+            self.unsynced = 0
+
+    def __Stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        """
+        Write out the remaining data and force the file to disk if the Durability requires it
+        """
+        if self.closed:
+            return
+        try:
+            if len(self.buffer):
+                self.__Submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            self.__Stop()
+            self.__RaiseError()
+            if self.durability.SyncAtEnd() and (self.durability.mode == Durability.END or self.unsynced):
+                os.fsync(self.fileobj.fileno())
+        finally:
+            self.Abort()
+
+    def Abort(self):
+        """
+        Close the file without writing out the buffered data
+        """
+        self.__Stop()
+        self.closed = True
+        if not self.fileobj.closed:
+            self.fileobj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.Abort()
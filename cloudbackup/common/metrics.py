@@ -0,0 +1,261 @@
+"""
+Rackspace Cloud Backup Request Metrics
+
+Provides the data passed to the Command request hooks and an in-process
+histogram aggregator reporting latency percentiles per API endpoint.
+"""
+import logging
+import math
+import re
+import threading
+
+import six
+from requests.utils import super_len
+from six.moves.urllib.parse import urlsplit
+
+
+_uuid_pattern = re.compile('[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+_id_pattern = re.compile('^([0-9]+|[0-9a-fA-F]{16,})$')
+_version_pattern = re.compile('^v([0-9]+)(\\.[0-9]+)?$')
+
+
+def template_endpoint(uri):
+    """
+    Convert a URI into a low cardinality endpoint name suitable for aggregation
+
+    The query string is removed, the segment following a /v2 (or later) API
+    version and Cloud Files account names become {project}, while numeric,
+    UUID and long hexadecimal values become {id}.
+
+    Example: https://host/v2/123456/agents/8f1c...e2?marker=1 -> /v2/{project}/agents/{id}
+    """
+    path = urlsplit(uri).path
+    segments = path.split('/')
+    project_next = False
+    for index, segment in enumerate(segments):
+        if project_next:
+            segments[index] = '{project}'
+            project_next = False
+            continue
+
+        version = _version_pattern.match(segment)
+        if version is not None:
+            # v1.0 has no project in the path; v1 is the Cloud Files account
+            project_next = (version.group(2) is None)
+        elif segment.startswith('MossoCloudFS_'):
+            segments[index] = '{project}'
+        elif _id_pattern.match(segment):
+            segments[index] = '{id}'
+        else:
+            segments[index] = _uuid_pattern.sub('{id}', segment)
+    return '/'.join(segments)
+
+
+def body_size(body):
+    """
+    Number of bytes in a request body, 0 if unknown before it is sent (e.g. a generator)
+
+    File-like bodies count the bytes from their current position to their end.
+    """
+    if body is None:
+        return 0
+    elif isinstance(body, six.text_type):
+        return len(body.encode('utf-8'))
+    elif isinstance(body, (six.binary_type, bytearray)):
+        return len(body)
+    else:
+        return super_len(body)
+
+
+class RequestMetrics(object):
+    """
+    Measurements for a single API call, as passed to the Command request hooks
+
+      method - HTTP method
+      uri - full URI requested
+      endpoint - templated endpoint, see template_endpoint()
+      status_code - HTTP status of the final response (None if the request failed)
+      bytes_out - size of the request body
+      bytes_in - size of the response body (from Content-Length for streamed responses)
+      dns_time - seconds spent resolving host names
+      connect_time - seconds spent establishing TCP and TLS connections
+      ttfb - seconds from sending the (final) request until the response headers were parsed
+      queue_time - seconds the client-side rate limiter held the request back
+      total_time - seconds for the whole call, including retries and queue_time
+      retries - number of times the request was retried
+
+    Note: dns_time and connect_time are zero when a kept-alive connection was reused
+    """
+
+    def __init__(self, method, uri):
+        self.method = method
+        self.uri = uri
+        self.endpoint = template_endpoint(uri)
+        self.status_code = None
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.dns_time = 0.0
+        self.connect_time = 0.0
+        self.ttfb = 0.0
+        self.queue_time = 0.0
+        self.total_time = 0.0
+        self.retries = 0
+
+    def to_dict(self):
+        """
+        Return the measurements as a dict
+        """
+        return {
+            'method': self.method,
+            'uri': self.uri,
+            'endpoint': self.endpoint,
+            'status-code': self.status_code,
+            'bytes-out': self.bytes_out,
+            'bytes-in': self.bytes_in,
+            'dns-time': self.dns_time,
+            'connect-time': self.connect_time,
+            'ttfb': self.ttfb,
+            'queue-time': self.queue_time,
+            'total-time': self.total_time,
+            'retries': self.retries
+        }
+
+
+class Histogram(object):
+    """
+    Log-bucketed histogram of positive values (e.g. latencies in seconds)
+      minimum - smallest value distinguished; anything below lands in the first bucket
+      growth - ratio between the bounds of consecutive buckets, bounding the relative
+               error of the reported percentiles
+    """
+
+    def __init__(self, minimum=0.0001, growth=1.05):
+        self.minimum = minimum
+        self.growth = growth
+        self.log_growth = math.log(growth)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.min_value = None
+        self.max_value = None
+
+    def add(self, value):
+        """
+        Record a value
+        """
+        if value <= self.minimum:
+            bucket = 0
+        else:
+            bucket = int(math.ceil(math.log(value / self.minimum) / self.log_growth))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def percentile(self, percent):
+        """
+        Return the value below which the given percent of the values fall,
+        or None if no values were recorded
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self.buckets.keys()):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                upper = self.minimum * (self.growth ** bucket)
+                return max(self.min_value, min(upper, self.max_value))
+        return self.max_value
+
+    def to_dict(self):
+        """
+        Return the summary statistics of the histogram
+        """
+        return {
+            'count': self.count,
+            'mean': (self.total / self.count) if self.count else None,
+            'min': self.min_value,
+            'max': self.max_value,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class HistogramAggregator(object):
+    """
+    Request hook aggregating RequestMetrics into per-endpoint histograms
+
+    Use with Command.AddRequestHook(); a single instance may be shared by
+    any number of API objects and threads.
+    """
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def __call__(self, metrics):
+        key = '{0:} {1:}'.format(metrics.method, metrics.endpoint)
+        with self.lock:
+            if key not in self.endpoints:
+                self.endpoints[key] = {
+                    'total-time': Histogram(),
+                    'ttfb': Histogram(),
+                    'queue-time': Histogram(),
+                    'errors': 0,
+                    'retries': 0,
+                    'bytes-in': 0,
+                    'bytes-out': 0
+                }
+            endpoint = self.endpoints[key]
+            endpoint['total-time'].add(metrics.total_time)
+            endpoint['ttfb'].add(metrics.ttfb)
+            endpoint['queue-time'].add(metrics.queue_time)
+            endpoint['retries'] += metrics.retries
+            endpoint['bytes-in'] += metrics.bytes_in
+            endpoint['bytes-out'] += metrics.bytes_out
+            if metrics.status_code is None or metrics.status_code >= 400:
+                endpoint['errors'] += 1
+
+    def reset(self):
+        """
+        Discard all the recorded data
+        """
+        with self.lock:
+            self.endpoints = {}
+
+    def to_dict(self):
+        """
+        Return the statistics per endpoint ('METHOD /templated/path')
+        """
+        with self.lock:
+            result = {}
+            for key, endpoint in self.endpoints.items():
+                result[key] = {
+                    'total-time': endpoint['total-time'].to_dict(),
+                    'ttfb': endpoint['ttfb'].to_dict(),
+                    'queue-time': endpoint['queue-time'].to_dict(),
+                    'errors': endpoint['errors'],
+                    'retries': endpoint['retries'],
+                    'bytes-in': endpoint['bytes-in'],
+                    'bytes-out': endpoint['bytes-out']
+                }
+            return result
+
+    def Dump(self):
+        """
+        Log the p50/p95/p99 total time (and p99 rate limiter queue time) per endpoint, slowest p99 first
+        """
+        stats = self.to_dict()
+        ordered = sorted(stats.items(), key=lambda item: item[1]['total-time']['p99'], reverse=True)
+        for key, endpoint in ordered:
+            total = endpoint['total-time']
+            self.log.info('{0:}: count={1:} p50={2:.3f}s p95={3:.3f}s p99={4:.3f}s max={5:.3f}s queued-p99={6:.3f}s errors={7:} retries={8:}'.format(
+                key, total['count'], total['p50'], total['p95'], total['p99'], total['max'],
+                endpoint['queue-time']['p99'], endpoint['errors'], endpoint['retries']))
+        return stats
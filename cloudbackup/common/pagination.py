@@ -0,0 +1,101 @@
+"""
+Rackspace Cloud Backup Pagination
+
+Generators following the marker/limit pagination of the v2 list endpoints.
+The next page can be fetched in the background while the caller is still
+processing the current one.
+"""
+import threading
+
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+
+def next_marker(body, items, limit):
+    """
+    Determine the marker of the page following the one received
+      body - decoded JSON body of the page
+      items - the items of the page
+      limit - the page size requested
+
+    The 'next' link is used when the API provides links; otherwise a full
+    page is assumed to be followed by another one starting after its last item.
+
+    Returns the marker or None if this was the last page
+    """
+    links = body.get('links', None) if isinstance(body, dict) else None
+    if links is not None:
+        for link in links:
+            if link.get('rel', None) == 'next':
+                query = parse_qs(urlsplit(link.get('href', '')).query)
+                if 'marker' in query:
+                    return query['marker'][0]
+        return None
+
+    if len(items) and len(items) >= limit:
+        return items[-1].get('id', None)
+    return None
+
+
+class PageFetcher(threading.Thread):
+    """
+    Thread retrieving a single page so that it is ready when the caller needs it
+      fetch_page - callable taking a marker and returning (items, next marker)
+      marker - marker of the page to retrieve
+    """
+
+    def __init__(self, fetch_page, marker):
+        super(PageFetcher, self).__init__()
+        self.daemon = True
+        self.fetch_page = fetch_page
+        self.marker = marker
+        self.page = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.page = self.fetch_page(self.marker)
+        except Exception as ex:
+            self.error = ex
+
+    def result(self):
+        """
+        Wait for the page and return (items, next marker), re-raising any failure
+        """
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.page
+
+
+def iterate_pages(fetch_page, marker=None, prefetch=True):
+    """
+    Generator returning each page (list of items) of a paginated listing
+      fetch_page - callable taking a marker (None for the first page) and
+                   returning a tuple of (items, next marker or None)
+      marker - (optional) marker to start the listing after
+      prefetch - True to retrieve the next page while the current one is being consumed
+    """
+    items, marker = fetch_page(marker)
+    while True:
+        fetcher = None
+        if prefetch and marker is not None:
+            fetcher = PageFetcher(fetch_page, marker)
+            fetcher.start()
+
+        yield items
+
+        if marker is None:
+            return
+        if fetcher is not None:
+            items, marker = fetcher.result()
+        else:
+            items, marker = fetch_page(marker)
+
+
+def iterate_items(fetch_page, marker=None, prefetch=True):
+    """
+    Generator returning each item of a paginated listing, see iterate_pages()
+    """
+    for items in iterate_pages(fetch_page, marker=marker, prefetch=prefetch):
+        for item in items:
+            yield item
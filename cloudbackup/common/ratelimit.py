@@ -0,0 +1,266 @@
+"""
+Rackspace Cloud Backup Rate Limiter
+
+Client-side token bucket rate limiting per API host and tenant, with
+separate buckets for read and write requests. The rates adapt to the
+service: they are reduced when throttling responses are received and
+slowly raised back while requests succeed (AIMD).
+
+The RateLimiter shared by the API objects (see get_rate_limiter()) only
+starts limiting a host and tenant once it has throttled a request.
+"""
+import logging
+import threading
+import time
+
+from six.moves.urllib.parse import urlsplit
+
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket
+      rate - tokens added per second
+      burst - maximum number of tokens accumulated while idle
+    """
+
+    def __init__(self, rate, burst):
+        self.lock = threading.Lock()
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.decreased = 0.0
+
+    def __refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        Take a token
+
+        Returns the number of seconds to wait before the token may be used;
+        callers are served in the order they reserved their tokens
+        """
+        with self.lock:
+            self.__refill(time.time())
+            self.tokens -= 1.0
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def set_rate(self, rate):
+        """
+        Change the rate at which tokens are added
+        """
+        with self.lock:
+            self.__refill(time.time())
+            self.rate = float(rate)
+
+
+class RateLimitStatistics(object):
+    """
+    Thread-safe counters describing the work of a RateLimiter
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'delayed': 0,
+            'throttled': 0,
+            'wait-seconds': 0.0
+        }
+
+    def increment(self, counter, value=1):
+        """
+        Increment the given counter by value
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def waited(self, delay):
+        """
+        Record a request that was let through after delay seconds
+        """
+        with self.lock:
+            self.counters['requests'] += 1
+            if delay > 0:
+                self.counters['delayed'] += 1
+                self.counters['wait-seconds'] += delay
+
+    def reset(self):
+        """
+        Reset all counters back to zero
+        """
+        with self.lock:
+            for counter in self.counters.keys():
+                self.counters[counter] = 0
+            self.counters['wait-seconds'] = 0.0
+
+    def to_dict(self):
+        """
+        Return a snapshot of the counters
+        """
+        with self.lock:
+            return dict(self.counters)
+
+
+class RateLimiter(object):
+    """
+    Adaptive rate limiter keeping a read and a write bucket per API host and tenant
+      read_rate - requests per second allowed for GET/HEAD/OPTIONS, None for no limit
+      write_rate - requests per second allowed for the other methods, None for no limit
+      burst - number of requests that may be sent at once after being idle,
+              defaults to twice the rate
+      min_rate - lowest rate the throttling adjustments may reduce a bucket to
+      decrease - factor applied to the rate when a throttling response is received
+      increase - requests per second added back to the rate for each successful response
+      cooldown - minimum seconds between two rate reductions of the same bucket so
+                 that the responses to requests already in flight do not compound
+      throttle_status_codes - HTTP status codes indicating the client is being throttled
+      limit_after_throttling - True to leave each host and tenant unlimited until it
+                               responds with one of the throttle_status_codes
+
+    Note: The tenant is taken from the X-Project-Id header; requests without it
+        (e.g. API v1) share the bucket of their host.
+    """
+
+    def __init__(self, read_rate=20.0, write_rate=5.0, burst=None, min_rate=0.5,
+                 decrease=0.5, increase=0.1, cooldown=1.0,
+                 throttle_status_codes=(413, 429), limit_after_throttling=False):
+        self.log = logging.getLogger(__name__)
+        self.rates = {
+            'read': read_rate,
+            'write': write_rate
+        }
+        self.burst = burst
+        self.min_rate = min_rate
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self.throttle_status_codes = throttle_status_codes
+        self.limit_after_throttling = limit_after_throttling
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.statistics = RateLimitStatistics()
+        self.sleep = time.sleep
+
+    @property
+    def Statistics(self):
+        """
+        Rate limiting counters, see RateLimitStatistics.to_dict()
+        """
+        return self.statistics.to_dict()
+
+    @property
+    def Rates(self):
+        """
+        Current rate (requests per second) of each bucket, keyed by 'host tenant kind'
+        """
+        with self.lock:
+            buckets = list(self.buckets.items())
+        return dict(('{0:} {1:} {2:}'.format(*key), bucket.rate) for key, bucket in buckets)
+
+    def Bucket(self, method, uri, headers=None, create=True):
+        """
+        Return the TokenBucket governing the request, or None if it is not limited
+          create - False to return None instead of creating the bucket
+        """
+        kind = 'read' if method.upper() in READ_METHODS else 'write'
+        rate = self.rates[kind]
+        if rate is None:
+            return None
+
+        tenant = None
+        if headers is not None:
+            tenant = headers.get('X-Project-Id', None)
+        key = (urlsplit(uri).netloc, tenant, kind)
+        with self.lock:
+            bucket = self.buckets.get(key, None)
+            if bucket is None and create:
+                burst = self.burst if self.burst is not None else max(1.0, 2.0 * rate)
+                bucket = TokenBucket(rate, burst)
+                self.buckets[key] = bucket
+            return bucket
+
+    def Reserve(self, method, uri, headers=None):
+        """
+        Take a token for the request without waiting, e.g. to wait with asyncio.sleep()
+
+        Returns the number of seconds to wait before sending the request
+        """
+        bucket = self.Bucket(method, uri, headers, create=not self.limit_after_throttling)
+        if bucket is None:
+            return 0.0
+        delay = bucket.reserve()
+        self.statistics.waited(delay)
+        return delay
+
+    def Acquire(self, method, uri, headers=None):
+        """
+        Wait until the request may be sent
+
+        Returns the number of seconds waited
+        """
+        delay = self.Reserve(method, uri, headers)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def Feedback(self, method, uri, headers, status_code):
+        """
+        Adapt the rate of the request's bucket to the response received
+        """
+        throttled = status_code in self.throttle_status_codes
+        bucket = self.Bucket(method, uri, headers, create=throttled or not self.limit_after_throttling)
+        if bucket is None:
+            return
+
+        kind = 'read' if method.upper() in READ_METHODS else 'write'
+        if throttled:
+            self.statistics.increment('throttled')
+            now = time.time()
+            with bucket.lock:
+                if (now - bucket.decreased) < self.cooldown:
+                    return
+                bucket.decreased = now
+            rate = max(self.min_rate, bucket.rate * self.decrease)
+            self.log.warning('Received {0:} from {1:}; reducing the {2:} rate to {3:.2f}/s'.format(
+                status_code, urlsplit(uri).netloc, kind, rate))
+            bucket.set_rate(rate)
+
+        elif status_code < 400 and bucket.rate < self.rates[kind]:
+            bucket.set_rate(min(self.rates[kind], bucket.rate + self.increase))
+
+
+_default_rate_limiter = None
+_default_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Return the RateLimiter shared by all API objects
+
+    Note: It does not limit a host and tenant until they throttle a request
+    """
+    global _default_rate_limiter
+    with _default_rate_limiter_lock:
+        if _default_rate_limiter is None:
+            _default_rate_limiter = RateLimiter(limit_after_throttling=True)
+        return _default_rate_limiter
+
+
+def configure_rate_limiter(**kwargs):
+    """
+    Replace the shared RateLimiter with one using the given configuration, see RateLimiter
+
+    Note: API objects created before this call keep the RateLimiter they were created with
+    """
+    global _default_rate_limiter
+    with _default_rate_limiter_lock:
+        _default_rate_limiter = RateLimiter(**kwargs)
+        return _default_rate_limiter
@@ -0,0 +1,239 @@
+"""
+Rackspace Cloud Backup Retry Policy
+
+Provides exponential backoff with jitter, per HTTP status code rules,
+a per-client retry budget and Retry-After support for the
+cloudbackup.common.command.Command based API classes.
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+
+class RetryRule(object):
+    """
+    How to retry a request that received a specific HTTP status code
+      max_retries - maximum number of times to retry the request
+      backoff_base - delay (seconds) before the first retry
+      backoff_max - maximum delay (seconds) between two attempts
+      honor_retry_after - True to use the server's Retry-After header when present
+    """
+
+    def __init__(self, max_retries=5, backoff_base=1.0, backoff_max=30.0, honor_retry_after=True):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.honor_retry_after = honor_retry_after
+
+
+class RetryBudget(object):
+    """
+    Limits the number of retries a client may perform within a time window
+    so that a failing service is not overloaded by retries
+      max_retries - number of retries allowed within the window
+      period - length of the window in seconds
+    """
+
+    def __init__(self, max_retries=100, period=60.0):
+        self.max_retries = max_retries
+        self.period = period
+        self.lock = threading.Lock()
+        self.retries = deque()
+
+    def acquire(self):
+        """
+        Reserve a retry
+
+        Returns True if the retry may be performed; otherwise False
+        """
+        now = time.time()
+        with self.lock:
+            while len(self.retries) and (now - self.retries[0]) >= self.period:
+                self.retries.popleft()
+            if len(self.retries) >= self.max_retries:
+                return False
+            self.retries.append(now)
+            return True
+
+
+class RetryStatistics(object):
+    """
+    Thread-safe counters describing the retries performed by a RetryPolicy
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'retries': 0,
+            'budget-exhausted': 0,
+            'wait-seconds': 0.0
+        }
+        self.status_codes = {}
+
+    def increment(self, counter, value=1):
+        """
+        Increment the given counter by value
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def retried(self, status_code, delay):
+        """
+        Record a retry for the given status code after waiting delay seconds
+        """
+        with self.lock:
+            self.counters['retries'] += 1
+            self.counters['wait-seconds'] += delay
+            self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def reset(self):
+        """
+        Reset all counters back to zero
+        """
+        with self.lock:
+            for counter in self.counters.keys():
+                self.counters[counter] = 0
+            self.counters['wait-seconds'] = 0.0
+            self.status_codes = {}
+
+    def to_dict(self):
+        """
+        Return a snapshot of the counters
+
+        Note: 'status-codes' maps each HTTP status code to the number of retries it caused
+        """
+        with self.lock:
+            result = dict(self.counters)
+            result['status-codes'] = dict(self.status_codes)
+        return result
+
+
+def parse_retry_after(value, now=None):
+    """
+    Convert a Retry-After header value into a delay in seconds
+
+    Supports both the delta-seconds and HTTP-date formats.
+    Returns None if the value cannot be parsed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, email.utils.mktime_tz(parsed) - now)
+
+
+class RetryPolicy(object):
+    """
+    Decides whether, and how long after, a request should be retried
+      rules - dict of HTTP status code to RetryRule, defaults to DEFAULT_RULES
+      budget - (optional) RetryBudget shared by all the requests using the policy
+      jitter - True to randomize the delays ("full jitter") so that many
+               clients do not retry in lockstep
+    """
+
+    DEFAULT_RULES = {
+        413: RetryRule(max_retries=5, backoff_base=1.0, backoff_max=60.0),
+        429: RetryRule(max_retries=5, backoff_base=1.0, backoff_max=60.0),
+        503: RetryRule(max_retries=5, backoff_base=1.0, backoff_max=30.0)
+    }
+
+    def __init__(self, rules=None, budget=None, jitter=True):
+        self.log = logging.getLogger(__name__)
+        if rules is None:
+            rules = self.DEFAULT_RULES
+        self.rules = dict(rules)
+        if budget is None:
+            budget = RetryBudget()
+        self.budget = budget
+        self.jitter = jitter
+        self.statistics = RetryStatistics()
+        self.sleep = time.sleep
+
+    @property
+    def Statistics(self):
+        """
+        Retry counters, see RetryStatistics.to_dict()
+        """
+        return self.statistics.to_dict()
+
+    def Rule(self, status_code, rules=None):
+        """
+        Return the RetryRule for the status code or None if it should not be retried
+          rules - (optional) dict of per-call rules that take precedence over the policy's
+        """
+        if rules is not None and status_code in rules:
+            return rules[status_code]
+        return self.rules.get(status_code, None)
+
+    def Delay(self, rule, attempt, response=None):
+        """
+        Compute how long to wait before the given retry attempt (0 based)
+        """
+        if rule.honor_retry_after and response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After', None))
+            if retry_after is not None:
+                return min(retry_after, rule.backoff_max)
+
+        delay = min(rule.backoff_max, rule.backoff_base * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def NextDelay(self, response, attempts, rules=None):
+        """
+        Decide whether the response should be retried
+          response - the response received for the request
+          attempts - dict of HTTP status code to number of retries already made
+                     for the request, updated when a retry is decided
+          rules - (optional) dict of per-call status code to RetryRule overrides;
+                  a value of None disables retrying that status code
+
+        Returns the delay (seconds) to wait before retrying, or None to not retry
+        """
+        rule = self.Rule(response.status_code, rules)
+        attempt = attempts.get(response.status_code, 0)
+        if rule is None or attempt >= rule.max_retries:
+            return None
+
+        if not self.budget.acquire():
+            self.log.warning('Retry budget exhausted; not retrying status {0:}'.format(response.status_code))
+            self.statistics.increment('budget-exhausted')
+            return None
+
+        delay = self.Delay(rule, attempt, response)
+        self.log.warning('Received {0:}; retry {1:} of {2:} after {3:.2f} seconds'.format(response.status_code, attempt + 1, rule.max_retries, delay))
+        self.statistics.retried(response.status_code, delay)
+        attempts[response.status_code] = attempt + 1
+        return delay
+
+    def Execute(self, send, rules=None, attempts=None):
+        """
+        Call send() until it returns a response that does not need to be retried
+          send - callable performing the request and returning a requests.Response
+          rules - (optional) dict of per-call status code to RetryRule overrides,
+                  see NextDelay()
+          attempts - (optional) dict receiving the number of retries made per status code
+
+        Returns the last response received
+        """
+        if attempts is None:
+            attempts = {}
+        self.statistics.increment('requests')
+        while True:
+            response = send()
+            delay = self.NextDelay(response, attempts, rules)
+            if delay is None:
+                return response
+            response.close()
+            self.sleep(delay)
@@ -0,0 +1,346 @@
+"""
+Rackspace Cloud Backup HTTP Transport
+
+Provides a keep-alive, connection pooling HTTP layer shared by all the
+cloudbackup.common.command.Command based API classes.
+
+Identical GET requests issued concurrently are coalesced: only the first
+is sent and the others receive a copy of its response.
+"""
+import copy
+import logging
+import socket
+import threading
+import time
+
+import requests
+import requests.adapters
+
+requests.packages.urllib3.disable_warnings()
+
+
+class TransportStatistics(object):
+    """
+    Thread-safe counters describing how the transport is being used
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'connections-created': 0,
+            'coalesced': 0
+        }
+
+    def increment(self, counter, value=1):
+        """
+        Increment the given counter by value
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def reset(self):
+        """
+        Reset all counters back to zero
+        """
+        with self.lock:
+            for counter in self.counters.keys():
+                self.counters[counter] = 0
+
+    def to_dict(self):
+        """
+        Return a snapshot of the counters
+
+        Note: 'connections-reused' is the number of requests that did not
+            require a new TCP (and TLS) connection to be established;
+            'coalesced' is the number of requests that were not sent because
+            they shared the response of an identical in-flight request
+        """
+        with self.lock:
+            result = dict(self.counters)
+        result['connections-reused'] = max(0, result['requests'] - result['connections-created'])
+        return result
+
+
+class ConnectionTimings(threading.local):
+    """
+    Per-thread record of the time spent establishing connections
+
+    Note: Values accumulate until reset() is called, so all the connections
+        created while performing a request (including any retries) are covered.
+        Both stay zero when a kept-alive connection is reused.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the timings back to zero
+        """
+        self.dns = 0.0
+        self.connect = 0.0
+
+
+connection_timings = ConnectionTimings()
+
+
+# requests.request() parameters that may be used by a coalesced request
+_coalescable_parameters = ('headers', 'params', 'verify', 'timeout', 'allow_redirects')
+
+
+def _freeze(value):
+    """
+    (Internal) Convert a request parameter into a hashable value
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return str(value)
+
+
+def coalesce_key(method, uri, kwargs):
+    """
+    Key identifying identical requests, or None if the request may not be coalesced
+
+    Only GET requests without a body whose response is read completely
+    (not streamed) are coalesced. The headers - and thereby the
+    authentication token - are part of the key.
+    """
+    if method.upper() != 'GET':
+        return None
+    for parameter in kwargs.keys():
+        if parameter not in _coalescable_parameters:
+            return None
+    return (uri, tuple((parameter, _freeze(kwargs.get(parameter, None))) for parameter in _coalescable_parameters))
+
+
+class InFlightRequest(object):
+    """
+    A request being performed on behalf of all the callers asking for it
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def wait(self):
+        """
+        Wait for the request to complete and return a copy of its response
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        # a copy so that callers do not share the mutable parts of the response
+        response = copy.copy(self.response)
+        response.headers = copy.copy(self.response.headers)
+        return response
+
+
+def _timed_connection_class(connection_class):
+    """
+    (Internal) Build a urllib3 connection class that records the DNS lookup
+    and connection establishment (TCP and TLS) times into connection_timings
+    """
+
+    class TimedConnection(connection_class):
+
+        def _new_conn(self):
+            # urllib3 1.24 and newer connect to _dns_host (the host without brackets or trailing dot)
+            dns_host = getattr(self, '_dns_host', self.host)
+            start = time.time()
+            try:
+                addresses = socket.getaddrinfo(dns_host, self.port, 0, socket.SOCK_STREAM)
+            except socket.gaierror:
+                # let urllib3 report the resolution failure
+                return super(TimedConnection, self)._new_conn()
+            finally:
+                connection_timings.dns += time.time() - start
+
+            # connect to the resolved addresses in order, as urllib3 would
+            try:
+                for index, address in enumerate(addresses):
+                    self._dns_host = address[4][0]
+                    try:
+                        return super(TimedConnection, self)._new_conn()
+                    except Exception:
+                        if index == len(addresses) - 1:
+                            raise
+            finally:
+                self._dns_host = dns_host
+
+        def connect(self):
+            start = time.time()
+            dns = connection_timings.dns
+            try:
+                return super(TimedConnection, self).connect()
+            finally:
+                connection_timings.connect += (time.time() - start) - (connection_timings.dns - dns)
+
+    return TimedConnection
+
+
+def _counting_pool_class(pool_class, statistics):
+    """
+    (Internal) Build a urllib3 connection pool class that counts the
+    connections it has to establish and times them
+    """
+
+    class CountingConnectionPool(pool_class):
+
+        ConnectionCls = _timed_connection_class(pool_class.ConnectionCls)
+
+        def _new_conn(self):
+            statistics.increment('connections-created')
+            return super(CountingConnectionPool, self)._new_conn()
+
+    return CountingConnectionPool
+
+
+class CountingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """
+    requests HTTPAdapter that records new connections into a TransportStatistics
+    """
+
+    def __init__(self, statistics, **kwargs):
+        self.statistics = statistics
+        super(CountingHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(CountingHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        pool_classes = {}
+        for scheme, pool_class in self.poolmanager.pool_classes_by_scheme.items():
+            pool_classes[scheme] = _counting_pool_class(pool_class, self.statistics)
+        self.poolmanager.pool_classes_by_scheme = pool_classes
+
+
+class Transport(object):
+    """
+    Keep-alive HTTP(S) transport wrapping a requests.Session
+
+      pool_connections - number of hosts to keep connection pools for
+      pool_maxsize - maximum number of connections kept alive per host
+      coalesce - True to share the response of identical concurrent GET requests
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, coalesce=True):
+        self.log = logging.getLogger(__name__)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.coalesce = coalesce
+        self.statistics = TransportStatistics()
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.host_pools = {}
+        self.in_flight = {}
+        self.__mount_defaults()
+
+    def __new_adapter(self, pool_maxsize):
+        return CountingHTTPAdapter(self.statistics,
+                                   pool_connections=self.pool_connections,
+                                   pool_maxsize=pool_maxsize)
+
+    def __mount_defaults(self):
+        for prefix in ('https://', 'http://'):
+            self.session.mount(prefix, self.__new_adapter(self.pool_maxsize))
+
+    def SetHostPoolSize(self, apihost, pool_maxsize, sslenabled=True):
+        """
+        Configure the maximum number of kept-alive connections for a specific host
+          apihost - host name (and optional port) for the API
+          pool_maxsize - maximum number of connections to keep for the host
+          sslenabled - True if the host is accessed using HTTPS; otherwise False
+        """
+        if sslenabled:
+            prefix = 'https://{0:}/'.format(apihost)
+        else:
+            prefix = 'http://{0:}/'.format(apihost)
+        with self.lock:
+            self.host_pools[prefix] = pool_maxsize
+            self.session.mount(prefix, self.__new_adapter(pool_maxsize))
+
+    @property
+    def Statistics(self):
+        """
+        Connection usage counters, see TransportStatistics.to_dict()
+        """
+        return self.statistics.to_dict()
+
+    def request(self, method, uri, upstream=None, **kwargs):
+        """
+        Perform an HTTP request using the pooled session
+          upstream - (optional) callable(send) wrapping the request when it is actually sent,
+                     e.g. for rate limiting; it calls send() and returns its response.
+                     Coalesced requests receive the response without calling it.
+
+        Other parameters are the same as for requests.Session.request()
+        """
+        def send():
+            return self.session.request(method, uri, **kwargs)
+
+        key = None
+        if self.coalesce:
+            key = coalesce_key(method, uri, kwargs)
+        if key is None:
+            self.statistics.increment('requests')
+            return send() if upstream is None else upstream(send)
+
+        with self.lock:
+            flight = self.in_flight.get(key, None)
+            leader = flight is None
+            if leader:
+                flight = InFlightRequest()
+                self.in_flight[key] = flight
+
+        if not leader:
+            self.statistics.increment('coalesced')
+            return flight.wait()
+
+        try:
+            self.statistics.increment('requests')
+            flight.response = send() if upstream is None else upstream(send)
+            return flight.response
+        except Exception as ex:
+            flight.error = ex
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
+
+
+_default_transport = None
+_default_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    Return the Transport shared by all API objects
+    """
+    global _default_transport
+    with _default_transport_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
+
+
+def configure_transport(pool_connections=10, pool_maxsize=10, coalesce=True):
+    """
+    Replace the shared Transport with one using the given configuration, see Transport
+
+    Note: API objects created before this call keep the Transport they were created with
+    """
+    global _default_transport
+    with _default_transport_lock:
+        _default_transport = Transport(pool_connections=pool_connections,
+                                       pool_maxsize=pool_maxsize,
+                                       coalesce=coalesce)
+        return _default_transport
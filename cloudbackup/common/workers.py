@@ -0,0 +1,48 @@
+"""
+Rackspace Cloud Backup Worker Threads
+
+Runs independent calls (uploads, downloads, per-account operations) on a
+bounded number of threads.
+
+Note: Plain threads are used rather than concurrent.futures so that Python 2.7
+    remains supported.
+"""
+import threading
+
+from six.moves import queue
+
+
+def map_concurrently(function, items, workers):
+    """
+    Call function(item) for each item on up to 'workers' threads
+      function - callable taking one item
+      items - iterable of the items
+      workers - maximum number of threads
+
+    Returns a list of (item, result, exception) in the order of the items;
+    exception is None unless the call raised
+    """
+    items = list(items)
+    results = [None] * len(items)
+    pending = queue.Queue()
+    for index, item in enumerate(items):
+        pending.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = (item, function(item), None)
+            except Exception as ex:
+                results[index] = (item, None, ex)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(workers, len(items))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
@@ -0,0 +1,4 @@
+"""
+Rackspace Cloud Backup API
+Performance Benchmarks
+"""
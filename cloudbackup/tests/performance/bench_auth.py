@@ -0,0 +1,141 @@
+"""
+Rackspace Cloud Backup API
+Authentication micro-benchmark
+
+Compares the token expiration check and the service catalog look-ups of
+cloudbackup.client.auth.Authentication against the former approach of
+parsing the expiration time and scanning the catalog on every call.
+
+    python -m cloudbackup.tests.performance.bench_auth --iterations 100000
+"""
+from __future__ import print_function
+
+import argparse
+import datetime
+import time
+import timeit
+
+from cloudbackup.client.auth import Authentication
+
+REGIONS = ('DFW', 'ORD', 'IAD', 'LON', 'SYD', 'HKG')
+SERVICES = ('cloudFiles', 'cloudFilesCDN', 'cloudServersOpenStack', 'cloudBlockStorage',
+            'cloudDatabases', 'cloudLoadBalancers', 'cloudQueues', 'cloudOrchestration',
+            'cloudNetworks', 'cloudImages', 'cloudMonitoring', 'cloudDNS', 'cloudBackup')
+
+
+def build_auth_data(lifetime=86400):
+    """
+    Identity response with a catalog the size of a typical Rackspace account
+    """
+    catalog = []
+    for name in SERVICES:
+        endpoints = []
+        for region in REGIONS:
+            endpoints.append({
+                'region': region,
+                'tenantId': 'MossoCloudFS_123456' if name == 'cloudFiles' else '123456',
+                'publicURL': 'https://{0:}.{1:}.example.com/v1/123456'.format(name.lower(), region.lower()),
+                'internalURL': 'https://snet-{0:}.{1:}.example.com/v1/123456'.format(name.lower(), region.lower())
+            })
+        catalog.append({'name': name, 'type': name, 'endpoints': endpoints})
+    expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=lifetime)
+    return {
+        'access': {
+            'token': {
+                'id': 'benchmark-token',
+                'expires': expires.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                'tenant': {'id': '123456', 'name': '123456'}
+            },
+            'user': {'id': 'benchmark', 'name': 'benchmark'},
+            'serviceCatalog': catalog
+        }
+    }
+
+
+def legacy_is_expired(auth_data, fuzz=0):
+    """
+    Expiration check parsing the time stamp on every call
+    """
+    expires = auth_data['access']['token']['expires']
+    try:
+        expirationtime = datetime.datetime.strptime(expires, '%Y-%m-%dT%H:%M:%S.%fZ')
+    except ValueError:
+        expirationtime = datetime.datetime.strptime(expires, '%Y-%m-%dT%H:%M:%S')
+    nowtime = datetime.datetime.utcnow()
+    for older, newer in ((expirationtime.year, nowtime.year), (expirationtime.month, nowtime.month),
+                         (expirationtime.day, nowtime.day), (expirationtime.hour, nowtime.hour),
+                         (expirationtime.minute, nowtime.minute), (expirationtime.second, nowtime.second + fuzz)):
+        if older != newer:
+            return not older > newer
+    return False
+
+
+def legacy_auth_token(auth_data):
+    """
+    AuthToken as formerly implemented: two parsed expiration checks per access
+    """
+    if legacy_is_expired(auth_data) or legacy_is_expired(auth_data, fuzz=2):
+        raise RuntimeError('benchmark token expired')
+    return auth_data['access']['token']['id']
+
+
+def legacy_cloud_files_uri(auth_data, dc):
+    """
+    Cloud Files look-up scanning the service catalog
+    """
+    legacy_auth_token(auth_data)
+    dcuri = []
+    for service in auth_data['access']['serviceCatalog']:
+        if service['name'] == 'cloudFiles':
+            for endpoint in service['endpoints']:
+                if endpoint['region'].lower() == dc.lower():
+                    dcuri.append({'name': 'public', 'uri': endpoint['publicURL']})
+                    dcuri.append({'name': 'snet', 'uri': endpoint['internalURL']})
+    return dcuri
+
+
+def report(name, legacy, current, iterations):
+    """
+    Print the per-call cost of both implementations
+    """
+    print('{0:<28} legacy {1:>8.2f} us   current {2:>8.2f} us   speed-up {3:>6.1f}x'.format(
+        name, legacy * 1e6 / iterations, current * 1e6 / iterations, legacy / max(current, 1e-12)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Authentication token and catalog look-up benchmark')
+    parser.add_argument('--iterations', type=int, default=20000, help='calls per measurement')
+    arguments = parser.parse_args()
+    iterations = arguments.iterations
+
+    auth_data = build_auth_data()
+    auth = Authentication('benchmark', 'benchmark')
+    auth.auth_data = auth_data
+    # the first access parses the token; only steady state is measured
+    auth.AuthToken
+
+    report('AuthToken',
+           timeit.timeit(lambda: legacy_auth_token(auth_data), number=iterations),
+           timeit.timeit(lambda: auth.AuthToken, number=iterations),
+           iterations)
+    report('GetCloudFilesUri',
+           timeit.timeit(lambda: legacy_cloud_files_uri(auth_data, 'hkg'), number=iterations),
+           timeit.timeit(lambda: auth.GetCloudFilesUri('hkg'), number=iterations),
+           iterations)
+    report('snet storage URL (Deuce)',
+           timeit.timeit(lambda: [uri for uri in legacy_cloud_files_uri(auth_data, 'hkg') if uri['name'] == 'snet'],
+                         number=iterations),
+           timeit.timeit(lambda: auth.GetEndpoint('cloudFiles', 'hkg', 'internal'), number=iterations),
+           iterations)
+
+    tokens = [build_auth_data() for _ in range(iterations // 10 or 1)]
+    start = time.time()
+    for token in tokens:
+        auth.auth_data = token
+        auth.AuthToken
+    print('{0:<28} {1:>8.2f} us per new token (parse and index)'.format(
+        'token arrival', (time.time() - start) * 1e6 / len(tokens)))
+
+
+if __name__ == '__main__':
+    main()
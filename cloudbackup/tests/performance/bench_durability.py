@@ -0,0 +1,83 @@
+"""
+Rackspace Cloud Backup API
+Download durability benchmark
+
+Writes the same data the way the downloads used to (flush and fsync after
+every received chunk) and with each cloudbackup.common.durability mode, and
+reports the throughput of each. Run it on the disk the restores use:
+
+    python -m cloudbackup.tests.performance.bench_durability --directory /restore --size 512
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from cloudbackup.common.durability import MB, Durability, DurableFileWriter
+
+
+def legacy_write(path, chunks):
+    """
+    Former download loop: flush and fsync after every chunk
+    """
+    with open(path, 'wb') as output:
+        for chunk in chunks:
+            output.write(chunk)
+            output.flush()
+            os.fsync(output.fileno())
+
+
+def durable_write(durability, write_behind):
+    """
+    Download loop writing through a DurableFileWriter
+    """
+    def write(path, chunks):
+        with DurableFileWriter(path, durability, write_behind=write_behind) as output:
+            for chunk in chunks:
+                output.write(chunk)
+    return write
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download durability benchmark')
+    parser.add_argument('--directory', default=None, help='directory to write to (default: a temporary directory)')
+    parser.add_argument('--size', type=int, default=256, help='MB written per measurement')
+    parser.add_argument('--chunk', type=int, default=64, help='KB per received chunk')
+    parser.add_argument('--interval', type=int, default=64, help='MB between two fsync for the interval mode')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per mode (the best is reported)')
+    arguments = parser.parse_args()
+
+    chunk = os.urandom(arguments.chunk * 1024)
+    chunks = [chunk] * max(1, (arguments.size * MB) // len(chunk))
+    total = len(chunk) * len(chunks)
+
+    modes = [
+        ('fsync every chunk (legacy)', legacy_write),
+        ('none', durable_write(Durability(Durability.NONE), True)),
+        ('end', durable_write(Durability(Durability.END), True)),
+        ('end, no write-behind', durable_write(Durability(Durability.END), False)),
+        ('every {0:} MB'.format(arguments.interval), durable_write(Durability(Durability.INTERVAL, arguments.interval * MB), True)),
+    ]
+
+    directory = tempfile.mkdtemp(prefix='bench-durability-', dir=arguments.directory)
+    try:
+        path = os.path.join(directory, 'download')
+        print('{0:} MB in chunks of {1:} KB to {2:}'.format(total // MB, arguments.chunk, directory))
+        for name, write in modes:
+            best = None
+            for _ in range(arguments.repeat):
+                start = time.time()
+                write(path, chunks)
+                elapsed = time.time() - start
+                os.remove(path)
+                best = elapsed if best is None else min(best, elapsed)
+            print('{0:<28} {1:>8.2f} s {2:>10.1f} MB/s'.format(name, best, total / MB / max(best, 1e-9)))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+"""
+Fake Rackspace Identity, Cloud Backup and Cloud Files services for
+exercising and benchmarking the SDK offline, see server.FakeCloudServer
+"""
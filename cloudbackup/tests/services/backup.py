@@ -0,0 +1,708 @@
+"""
+Rackspace Cloud Backup Fake Services - Cloud Backup API
+
+Implements the v1.0 and v2 agent, configuration, backup, restore, activity
+and event endpoints used by cloudbackup.client.agents and cloudbackup.client.backup.
+Backups and restores complete on their own after a configurable duration.
+"""
+import itertools
+import re
+import time
+import uuid
+
+from cloudbackup.tests.services.base import (Service, ServiceResponse, error_response,
+                                             page_links, paginate)
+
+
+def iso_time(when):
+    """
+    Time stamp in the v2 API format
+    """
+    if when is None:
+        return None
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(when))
+
+
+def dotnet_time(when):
+    """
+    Time stamp in the v1.0 API format
+    """
+    if when is None:
+        return None
+    return '/Date({0:})/'.format(int(when * 1000))
+
+
+class FakeCloudBackup(Service):
+    """
+    Fake Cloud Backup API for a single tenant
+      project_id - tenant (project) of the account
+      agents - number of agents registered on the account
+      configurations_per_agent - number of backup configurations per agent
+      backups_per_configuration - number of completed backups per configuration
+      events_per_agent - number of heartbeat events recorded per agent
+      backup_duration - seconds a started backup stays in progress
+      restore_duration - seconds a started restore stays in progress
+      files - (optional) FakeCloudFiles in which the agents' vault containers are created
+      behavior - (optional) cloudbackup.tests.services.base.ServiceBehavior
+      identity - (optional) FakeIdentity validating the tokens
+    """
+
+    def __init__(self, project_id='123456', agents=5, configurations_per_agent=1,
+                 backups_per_configuration=3, events_per_agent=10,
+                 backup_duration=0.0, restore_duration=0.0,
+                 files=None, behavior=None, identity=None):
+        super(FakeCloudBackup, self).__init__(behavior=behavior, identity=identity)
+        self.project_id = str(project_id)
+        self.backup_duration = backup_duration
+        self.restore_duration = restore_duration
+        self.files = files
+        self.ids = itertools.count(1000)
+        self.agents = {}
+        self.configurations = {}
+        self.backups = {}
+        self.restores = {}
+        self.events = []
+        self.wakeups = 0
+
+        for _ in range(agents):
+            agent_id = self.AddAgent()
+            for _ in range(configurations_per_agent):
+                configuration_id = self.AddConfiguration(agent_id)
+                for _ in range(backups_per_configuration):
+                    self.AddBackup(configuration_id, started=time.time() - 3600)
+            for _ in range(events_per_agent):
+                self.AddEvent(agent_id, {'event': 'heartbeat'})
+
+        v1 = '/v1.0'
+        v2 = '/v2/' + re.escape(self.project_id)
+        # v1.0
+        self.route('GET', v1 + '/user/agents', self.v1_list_agents)
+        self.route('POST', v1 + '/user/wakeupagents', self.v1_wakeup)
+        self.route('GET', v1 + '/agent/(\\d+)', self.v1_get_agent)
+        self.route('GET', v1 + '/agent/configuration/(\\d+)', self.v1_get_agent_configuration)
+        self.route('POST', v1 + '/backup-configuration', self.v1_create_configuration)
+        self.route('GET', v1 + '/backup-configuration/(\\d+)', self.v1_get_configuration)
+        self.route('PUT', v1 + '/backup-configuration/(\\d+)', self.v1_update_configuration)
+        self.route('DELETE', v1 + '/backup-configuration/(\\d+)', self.delete_configuration)
+        self.route('POST', v1 + '/backup/action-requested', self.v1_backup_action)
+        self.route('GET', v1 + '/backup/(\\d+)', self.v1_get_backup)
+        self.route('GET', v1 + '/backup/report/(\\d+)', self.v1_get_backup_report)
+        self.route('GET', v1 + '/backup/completed/(\\d+)', self.v1_list_completed_backups)
+        self.route('GET', v1 + '/' + re.escape(self.project_id) + '/system/activity/?(\\d+)', self.v1_list_activities)
+        self.route('PUT', v1 + '/restore', self.v1_create_restore)
+        self.route('POST', v1 + '/restore/action-requested', self.v1_restore_action)
+        self.route('GET', v1 + '/restore/(\\d+)', self.v1_get_restore)
+        self.route('GET', v1 + '/restore/report/(\\d+)', self.v1_get_restore_report)
+        # v2
+        self.route('GET', v2 + '/agents', self.v2_list_agents)
+        self.route('GET', v2 + '/agents/(\\d+)', self.v2_get_agent)
+        self.route('GET', v2 + '/agents/(\\d+)/configuration', self.v2_get_agent_configuration)
+        self.route('GET', v2 + '/agents/(\\d+)/events', self.v2_list_events)
+        self.route('GET', v2 + '/agents/(\\d+)/activities', self.v2_list_agent_activities)
+        self.route('POST', v2 + '/events', self.v2_wakeup)
+        self.route('POST', v2 + '/configurations', self.v2_create_configuration)
+        self.route('GET', v2 + '/configurations/(\\d+)', self.v2_get_configuration)
+        self.route('PATCH', v2 + '/configurations/(\\d+)', self.v2_update_configuration)
+        self.route('DELETE', v2 + '/configurations/(\\d+)', self.delete_configuration)
+        self.route('GET', v2 + '/configurations/(\\d+)/activities', self.v2_list_configuration_activities)
+        self.route('POST', v2 + '/backups', self.v2_start_backup)
+        self.route('GET', v2 + '/backups', self.v2_list_backups)
+        self.route('GET', v2 + '/backups/(\\d+)', self.v2_get_backup)
+        self.route('GET', v2 + '/backups/(\\d+)/errors', self.v2_get_backup_errors)
+        self.route('POST', v2 + '/restores', self.v2_start_restore)
+        self.route('GET', v2 + '/restores/(\\d+)', self.v2_get_restore)
+
+    #
+    # Data management
+    #
+    def AddAgent(self):
+        """
+        Register a new agent, returning its id
+        """
+        with self.lock:
+            agent_id = next(self.ids)
+            vault_id = str(uuid.uuid4())
+            container = 'cloudbackup_v2_0_{0:}'.format(vault_id)
+            self.agents[agent_id] = {
+                'id': agent_id,
+                'name': 'agent-{0:}'.format(agent_id),
+                'vault_id': vault_id,
+                'container': container,
+                'machine_id': str(uuid.uuid4()),
+                'rse_channel': '/v1.0/agent/events/{0:}'.format(agent_id)
+            }
+        if self.files is not None:
+            self.files.AddObject(container, 'BACKUPS/v2.0/{0:}/.keep'.format(vault_id), b'')
+        return agent_id
+
+    def AddConfiguration(self, agent_id, name=None):
+        """
+        Add a backup configuration to an agent, returning its id
+        """
+        with self.lock:
+            configuration_id = next(self.ids)
+            self.configurations[configuration_id] = {
+                'id': configuration_id,
+                'agent_id': agent_id,
+                'name': name or 'configuration-{0:}'.format(configuration_id),
+                'enabled': True,
+                'deleted': False
+            }
+            return configuration_id
+
+    def AddBackup(self, configuration_id, started=None):
+        """
+        Record a backup of the configuration started at the given time (default: now), returning its id
+        """
+        with self.lock:
+            backup_id = next(self.ids)
+            configuration = self.configurations[configuration_id]
+            self.backups[backup_id] = {
+                'id': backup_id,
+                'configuration_id': configuration_id,
+                'agent_id': configuration['agent_id'],
+                'snapshot_id': backup_id,
+                'started': started if started is not None else time.time()
+            }
+            return backup_id
+
+    def AddEvent(self, agent_id, event):
+        """
+        Record an event for the agent, returning its id
+        """
+        with self.lock:
+            event = dict(event)
+            event['id'] = next(self.ids)
+            event['agent_id'] = agent_id
+            event.setdefault('time', iso_time(time.time()))
+            self.events.append(event)
+            return event['id']
+
+    def AgentIds(self):
+        """
+        List of the registered agent ids
+        """
+        with self.lock:
+            return sorted(self.agents.keys())
+
+    def ConfigurationIds(self, agent_id=None):
+        """
+        List of the backup configuration ids, optionally only those of an agent
+        """
+        with self.lock:
+            return sorted(configuration_id for configuration_id, configuration in self.configurations.items()
+                          if agent_id is None or configuration['agent_id'] == agent_id)
+
+    def __ended(self, record, duration):
+        ended = record['started'] + duration
+        return ended if ended <= time.time() else None
+
+    def __backup_state(self, backup):
+        return 'completed' if self.__ended(backup, self.backup_duration) is not None else 'in_progress'
+
+    def __restore_state(self, restore):
+        if not restore.get('started', None):
+            return 'queued'
+        return 'completed' if self.__ended(restore, self.restore_duration) is not None else 'in_progress'
+
+    #
+    # v2 representations
+    #
+    def __v2_agent(self, agent):
+        return {
+            'id': agent['id'],
+            'name': agent['name'],
+            'version': '1.30.0',
+            'enabled': True,
+            'status': 'online',
+            'host': {
+                'flavor': 'general1-1',
+                'region': 'DFW',
+                'addresses': [{'addr': '10.0.{0:}.{1:}'.format(agent['id'] // 256 % 256, agent['id'] % 256),
+                               'version': 4}],
+                'machine': {'id': agent['machine_id']},
+                'os': {'name': 'Ubuntu', 'version': '16.04', 'architecture': '64-bit', 'type': 'linux'}
+            },
+            'vault': {
+                'id': agent['vault_id'],
+                'encrypted': False,
+                'use_internal': False,
+                'size': 0
+            },
+            'rsa_public_key': {'modulus': '00', 'exponent': '010001'},
+            'links': []
+        }
+
+    def __v2_configuration(self, configuration):
+        agent = self.agents[configuration['agent_id']]
+        return {
+            'id': configuration['id'],
+            'name': configuration['name'],
+            'agent_id': configuration['agent_id'],
+            'vault_id': agent['vault_id'],
+            'enabled': configuration['enabled'],
+            'deleted': configuration['deleted'],
+            'links': []
+        }
+
+    def __container_url(self, agent):
+        if self.files is not None:
+            return 'https://' + self.files.ContainerUri(agent['container'])
+        return 'https://localhost/v1/MossoCloudFS_{0:}/{1:}'.format(self.project_id, agent['container'])
+
+    def __v2_agent_configuration(self, agent):
+        container_url = self.__container_url(agent)
+        return {
+            'vaults': [{
+                'id': agent['vault_id'],
+                'use_internal': False,
+                'links': [
+                    {'rel': 'publicURL', 'href': container_url},
+                    {'rel': 'internalURL', 'href': container_url}
+                ]
+            }],
+            'system_preferences': {
+                'logging': {'level': 'warn'},
+                'environment': {'minimum_disk_space_mb': {'backup': 512, 'restore': 512, 'cleanup': 512}},
+                'events': {
+                    'rse': {
+                        'channel': agent['rse_channel'],
+                        'host': self.host,
+                        'polling': {'interval_ms': {'idle': 600000, 'active': 10000, 'real_time': 2000}},
+                        'heartbeat': {'timeout_ms': {'idle': 600000, 'active': 30000, 'real_time': 70000}}
+                    }
+                }
+            },
+            'configurations': [self.__v2_configuration(configuration)
+                               for configuration in self.configurations.values()
+                               if configuration['agent_id'] == agent['id']]
+        }
+
+    def __v2_backup(self, backup):
+        configuration = self.configurations[backup['configuration_id']]
+        state = self.__backup_state(backup)
+        return {
+            'id': backup['id'],
+            'state': state,
+            'restorable': state == 'completed',
+            'agent': {'id': backup['agent_id']},
+            'configuration': {'id': configuration['id'], 'name': configuration['name']},
+            'snapshot_id': backup['snapshot_id'],
+            'bytes_searched': 1048576,
+            'bytes_backed_up': 524288,
+            'files_searched': 100,
+            'files_backed_up': 50,
+            'started_time': iso_time(backup['started']),
+            'ended_time': iso_time(self.__ended(backup, self.backup_duration)),
+            'errors': {'count': 0, 'diagnostics': 'No errors'},
+            'links': []
+        }
+
+    def __v2_activity(self, backup):
+        configuration = self.configurations[backup['configuration_id']]
+        return {
+            'id': backup['id'],
+            'type': backup.get('type', 'backup'),
+            'state': self.__backup_state(backup),
+            'agent': {'id': backup['agent_id']},
+            'configuration': {'id': configuration['id'], 'name': configuration['name']},
+            'last_updated_time': iso_time(self.__ended(backup, self.backup_duration) or backup['started'])
+        }
+
+    def __v2_restore(self, restore):
+        return {
+            'id': restore['id'],
+            'state': self.__restore_state(restore),
+            'backup_id': restore.get('backup_id', None),
+            'destination': restore.get('destination', {}),
+            'started_time': iso_time(restore.get('started', None)),
+            'ended_time': iso_time(self.__ended(restore, self.restore_duration) if restore.get('started', None) else None),
+            'links': []
+        }
+
+    def __v2_list(self, request, collection, items):
+        page, marker = paginate(items, request)
+        return ServiceResponse(200, {collection: page, 'links': page_links(request, self.host, marker)})
+
+    #
+    # v1.0 representations
+    #
+    def __v1_agent(self, agent):
+        details = self.__v2_agent(agent)
+        return {
+            'MachineAgentId': agent['id'],
+            'AgentVersion': details['version'],
+            'Architecture': details['host']['os']['architecture'],
+            'Flavor': details['host']['flavor'],
+            'BackupVaultSize': '0 B',
+            'CleanupAllowed': True,
+            'Datacenter': details['host']['region'],
+            'IPAddress': details['host']['addresses'][0]['addr'],
+            'IsDisabled': False,
+            'IsEncrypted': False,
+            'MachineName': agent['name'],
+            'OperatingSystem': details['host']['os']['name'],
+            'OperatingSystemVersion': details['host']['os']['version'],
+            'PublicKey': {'ModulusHex': '00', 'ExponentHex': '010001'},
+            'Status': 'Online',
+            'TimeOfLastSuccessfulBackup': None,
+            'UseServiceNet': False,
+            'HostServerId': agent['machine_id']
+        }
+
+    def __v1_configuration(self, configuration):
+        agent = self.agents[configuration['agent_id']]
+        return {
+            'BackupConfigurationId': configuration['id'],
+            'BackupConfigurationName': configuration['name'],
+            'Id': configuration['id'],
+            'Name': configuration['name'],
+            'MachineAgentId': configuration['agent_id'],
+            'VolumeUri': 'cfs://' + self.__container_url(agent)[8:],
+            'IsActive': configuration['enabled'],
+            'IsDeleted': configuration['deleted'],
+            'Inclusions': [],
+            'Exclusions': []
+        }
+
+    def __v1_backup_state(self, backup):
+        return 'Completed' if self.__backup_state(backup) == 'completed' else 'InProgress'
+
+    #
+    # v1.0 handlers
+    #
+    def v1_list_agents(self, request):
+        return ServiceResponse(200, [self.__v1_agent(self.agents[agent_id]) for agent_id in sorted(self.agents)])
+
+    def v1_wakeup(self, request):
+        self.wakeups += 1
+        return ServiceResponse(200)
+
+    def v1_get_agent(self, request, agent_id):
+        agent = self.agents.get(int(agent_id), None)
+        if agent is None:
+            return error_response(404, 'Agent not found')
+        return ServiceResponse(200, self.__v1_agent(agent))
+
+    def v1_get_agent_configuration(self, request, agent_id):
+        agent = self.agents.get(int(agent_id), None)
+        if agent is None:
+            return error_response(404, 'Agent not found')
+        v2 = self.__v2_agent_configuration(agent)
+        container = 'cfs://' + self.__container_url(agent)[8:]
+        rse = v2['system_preferences']['events']['rse']
+        return ServiceResponse(200, {
+            'Volumes': [{'Uri': container, 'FailoverUri': container, 'BackupVaultId': agent['vault_id'],
+                         'EncryptionEnabled': False, 'Password': None, 'NetworkDrives': [], 'DataServices': []}],
+            'SystemPreferences': {
+                'Logging': {'Level': 'Warn'},
+                'Environment': {'MinimumDiskSpaceMb': {'Backup': 512, 'Restore': 512, 'Cleanup': 512}},
+                'Rse': {
+                    'Channel': rse['channel'],
+                    'HostName': rse['host'],
+                    'Polling': {'Interval': {'Idle': 600000, 'Active': 10000, 'RealTime': 2000}},
+                    'Heartbeat': {'Timeout': {'Idle': 600000, 'Active': 30000, 'RealTime': 70000}}
+                }
+            },
+            'UserPreferences': {},
+            'BackupConfigurations': [self.__v1_configuration(configuration)
+                                     for configuration in self.configurations.values()
+                                     if configuration['agent_id'] == agent['id']]
+        })
+
+    def v1_create_configuration(self, request):
+        body = request.json() or {}
+        agent_id = body.get('MachineAgentId', None)
+        if agent_id not in self.agents:
+            return error_response(400, 'Unknown MachineAgentId')
+        configuration_id = self.AddConfiguration(agent_id, body.get('BackupConfigurationName', None))
+        return ServiceResponse(200, self.__v1_configuration(self.configurations[configuration_id]))
+
+    def v1_get_configuration(self, request, configuration_id):
+        configuration = self.configurations.get(int(configuration_id), None)
+        if configuration is None:
+            return error_response(404, 'Backup configuration not found')
+        return ServiceResponse(200, self.__v1_configuration(configuration))
+
+    def v1_update_configuration(self, request, configuration_id):
+        configuration = self.configurations.get(int(configuration_id), None)
+        if configuration is None:
+            return error_response(404, 'Backup configuration not found')
+        body = request.json() or {}
+        configuration['name'] = body.get('BackupConfigurationName', configuration['name'])
+        return ServiceResponse(200, self.__v1_configuration(configuration))
+
+    def delete_configuration(self, request, configuration_id):
+        configuration = self.configurations.get(int(configuration_id), None)
+        if configuration is None:
+            return error_response(404, 'Backup configuration not found')
+        configuration['deleted'] = True
+        return ServiceResponse(200 if request.path.startswith('/v1.0') else 204)
+
+    def __start_backup(self, configuration_id):
+        """
+        Start a backup, returning (backup id, None) or (None, error response)
+        """
+        configuration = self.configurations.get(configuration_id, None)
+        if configuration is None or configuration['deleted']:
+            return (None, error_response(404, 'Backup configuration not found'))
+        for backup in self.backups.values():
+            if backup['configuration_id'] == configuration_id and self.__backup_state(backup) != 'completed':
+                # the agent is busy with the configuration already
+                return (None, error_response(403, 'A backup of the configuration is already in progress'))
+        backup_id = self.AddBackup(configuration_id)
+        self.AddEvent(configuration['agent_id'], {'backup': {'id': backup_id}, 'state': 'in_progress'})
+        return (backup_id, None)
+
+    def v1_backup_action(self, request):
+        body = request.json() or {}
+        if body.get('Action', None) != 'StartManual':
+            return ServiceResponse(200, '0')
+        backup_id, error = self.__start_backup(body.get('Id', None))
+        if error is not None:
+            return error
+        return ServiceResponse(200, str(backup_id))
+
+    def v1_get_backup(self, request, backup_id):
+        backup = self.backups.get(int(backup_id), None)
+        if backup is None:
+            return error_response(404, 'Backup not found')
+        return ServiceResponse(200, {
+            'BackupId': backup['id'],
+            'BackupConfigurationId': backup['configuration_id'],
+            'MachineAgentId': backup['agent_id'],
+            'CurrentState': self.__v1_backup_state(backup),
+            'StartTime': dotnet_time(backup['started'])
+        })
+
+    def v1_get_backup_report(self, request, backup_id):
+        backup = self.backups.get(int(backup_id), None)
+        if backup is None:
+            return error_response(404, 'Backup not found')
+        configuration = self.configurations[backup['configuration_id']]
+        return ServiceResponse(200, {
+            'BackupId': backup['id'],
+            'BackupConfigurationId': configuration['id'],
+            'BackupConfigurationName': configuration['name'],
+            'BackupConfigurationIsDeleted': configuration['deleted'],
+            'MachineAgentId': backup['agent_id'],
+            'ComputerName': self.agents[backup['agent_id']]['name'],
+            'State': self.__v1_backup_state(backup),
+            'CanRestore': self.__backup_state(backup) == 'completed',
+            'StartTime': dotnet_time(backup['started']),
+            'CompletedTime': dotnet_time(self.__ended(backup, self.backup_duration)),
+            'BytesSearched': '1 MB',
+            'BytesBackedUp': '512 KB',
+            'FilesSearched': '100',
+            'FilesBackedUp': '50',
+            'NumErrors': 0,
+            'ErrorList': [],
+            'Reason': 'Success',
+            'Diagnostics': 'No errors'
+        })
+
+    def v1_list_completed_backups(self, request, configuration_id):
+        return ServiceResponse(200, [{
+            'BackupId': backup['id'],
+            'BackupConfigurationId': backup['configuration_id'],
+            'MachineAgentId': backup['agent_id'],
+            'CompletedTime': dotnet_time(self.__ended(backup, self.backup_duration))
+        } for backup in sorted(self.backups.values(), key=lambda backup: backup['id'])
+            if backup['configuration_id'] == int(configuration_id) and self.__backup_state(backup) == 'completed'])
+
+    def v1_list_activities(self, request, agent_id):
+        activities = []
+        for backup in sorted(self.backups.values(), key=lambda backup: backup['id']):
+            if backup['agent_id'] != int(agent_id):
+                continue
+            activity_type = backup.get('type', 'backup').capitalize()
+            activities.append({
+                'ID': backup['id'],
+                'Id': backup['id'],
+                'Type': activity_type,
+                'ParentId': backup['configuration_id'],
+                'DisplayName': self.configurations[backup['configuration_id']]['name'],
+                'CurrentState': self.__v1_backup_state(backup),
+                'SourceMachineAgentId': backup['agent_id'],
+                'TimeOfActivity': dotnet_time(backup['started'])
+            })
+        return ServiceResponse(200, activities)
+
+    def v1_create_restore(self, request):
+        body = request.json() or {}
+        with self.lock:
+            restore_id = next(self.ids)
+            self.restores[restore_id] = {
+                'id': restore_id,
+                'backup_id': body.get('BackupId', None),
+                'destination': {'machine_agent_id': body.get('DestinationMachineId', None),
+                                'path': body.get('DestinationPath', None)}
+            }
+        result = dict(body)
+        result['RestoreId'] = restore_id
+        result['RestoreStateId'] = 0
+        return ServiceResponse(200, result)
+
+    def v1_restore_action(self, request):
+        body = request.json() or {}
+        restore = self.restores.get(body.get('Id', None), None)
+        if restore is None:
+            return error_response(404, 'Restore not found')
+        if body.get('Action', None) == 'StartManual':
+            restore['started'] = time.time()
+        return ServiceResponse(204)
+
+    def v1_get_restore(self, request, restore_id):
+        restore = self.restores.get(int(restore_id), None)
+        if restore is None:
+            return error_response(404, 'Restore not found')
+        return ServiceResponse(200, {
+            'RestoreId': restore['id'],
+            'BackupId': restore['backup_id'],
+            'DestinationMachineId': restore['destination']['machine_agent_id'],
+            'DestinationPath': restore['destination']['path'],
+            'RestoreStateId': 0,
+            'Inclusions': [],
+            'Exclusions': []
+        })
+
+    def v1_get_restore_report(self, request, restore_id):
+        restore = self.restores.get(int(restore_id), None)
+        if restore is None:
+            return error_response(404, 'Restore not found')
+        state = self.__restore_state(restore)
+        return ServiceResponse(200, {
+            'RestoreId': restore['id'],
+            'BackupReportId': restore['backup_id'],
+            'State': {'completed': 'Completed', 'in_progress': 'InProgress', 'queued': 'Queued'}[state],
+            'StartTime': dotnet_time(restore.get('started', None)),
+            'CompletedTime': dotnet_time(self.__ended(restore, self.restore_duration) if restore.get('started', None) else None),
+            'NumFilesRestored': 50,
+            'NumBytesRestored': '512 KB',
+            'RestoreDestination': restore['destination']['path'],
+            'RestoreDestinationMachineId': restore['destination']['machine_agent_id'],
+            'NumErrors': 0,
+            'ErrorList': [],
+            'Reason': 'Success',
+            'Diagnostics': 'No errors'
+        })
+
+    #
+    # v2 handlers
+    #
+    def v2_list_agents(self, request):
+        return self.__v2_list(request, 'agents',
+                              [self.__v2_agent(self.agents[agent_id]) for agent_id in sorted(self.agents)])
+
+    def v2_get_agent(self, request, agent_id):
+        agent = self.agents.get(int(agent_id), None)
+        if agent is None:
+            return error_response(404, 'Agent not found')
+        return ServiceResponse(200, self.__v2_agent(agent))
+
+    def v2_get_agent_configuration(self, request, agent_id):
+        agent = self.agents.get(int(agent_id), None)
+        if agent is None:
+            return error_response(404, 'Agent not found')
+        return ServiceResponse(200, self.__v2_agent_configuration(agent))
+
+    def v2_list_events(self, request, agent_id):
+        agent_id = int(agent_id)
+        if agent_id not in self.agents:
+            return error_response(404, 'Agent not found')
+        ascending = request.query.get('sort_dir', 'desc') == 'asc'
+        events = sorted((event for event in self.events if event['agent_id'] == agent_id),
+                        key=lambda event: event['id'], reverse=not ascending)
+        marker = request.query.get('marker', None)
+        if marker is not None:
+            marker = int(marker)
+            events = [event for event in events if (event['id'] > marker if ascending else event['id'] < marker)]
+        limit = int(request.query.get('limit', 100))
+        page = events[:limit]
+        next_marker = page[-1]['id'] if len(events) > limit else None
+        return ServiceResponse(200, {'events': page, 'links': page_links(request, self.host, next_marker)})
+
+    def __activities(self, match):
+        return [self.__v2_activity(backup) for backup in sorted(self.backups.values(), key=lambda backup: backup['id'])
+                if match(backup)]
+
+    def v2_list_agent_activities(self, request, agent_id):
+        return self.__v2_list(request, 'activities',
+                              self.__activities(lambda backup: backup['agent_id'] == int(agent_id)))
+
+    def v2_list_configuration_activities(self, request, configuration_id):
+        return self.__v2_list(request, 'activities',
+                              self.__activities(lambda backup: backup['configuration_id'] == int(configuration_id)))
+
+    def v2_wakeup(self, request):
+        self.wakeups += 1
+        return ServiceResponse(200)
+
+    def v2_create_configuration(self, request):
+        body = request.json() or {}
+        agent_id = body.get('agent_id', None)
+        if agent_id not in self.agents:
+            return error_response(400, 'Unknown agent_id')
+        configuration_id = self.AddConfiguration(agent_id, body.get('name', None))
+        return ServiceResponse(201, self.__v2_configuration(self.configurations[configuration_id]))
+
+    def v2_get_configuration(self, request, configuration_id):
+        configuration = self.configurations.get(int(configuration_id), None)
+        if configuration is None:
+            return error_response(404, 'Backup configuration not found')
+        return ServiceResponse(200, self.__v2_configuration(configuration))
+
+    def v2_update_configuration(self, request, configuration_id):
+        configuration = self.configurations.get(int(configuration_id), None)
+        if configuration is None:
+            return error_response(404, 'Backup configuration not found')
+        body = request.json() or {}
+        for key in ('name', 'enabled'):
+            if key in body:
+                configuration[key] = body[key]
+        return ServiceResponse(200, self.__v2_configuration(configuration))
+
+    def v2_start_backup(self, request):
+        body = request.json() or {}
+        backup_id, error = self.__start_backup(body.get('configuration_id', None))
+        if error is not None:
+            return error
+        return ServiceResponse(201, self.__v2_backup(self.backups[backup_id]))
+
+    def v2_list_backups(self, request):
+        configuration_id = request.query.get('configuration_id', None)
+        restorable = request.query.get('restorable', None) in ('True', 'true', '1')
+        backups = [self.__v2_backup(backup) for backup in sorted(self.backups.values(), key=lambda backup: backup['id'])
+                   if configuration_id is None or backup['configuration_id'] == int(configuration_id)]
+        if restorable:
+            backups = [backup for backup in backups if backup['restorable']]
+        return self.__v2_list(request, 'backups', backups)
+
+    def v2_get_backup(self, request, backup_id):
+        backup = self.backups.get(int(backup_id), None)
+        if backup is None:
+            return error_response(404, 'Backup not found')
+        return ServiceResponse(200, self.__v2_backup(backup))
+
+    def v2_get_backup_errors(self, request, backup_id):
+        if int(backup_id) not in self.backups:
+            return error_response(404, 'Backup not found')
+        return ServiceResponse(200, {'errors': [], 'links': []})
+
+    def v2_start_restore(self, request):
+        body = request.json() or {}
+        with self.lock:
+            restore_id = next(self.ids)
+            self.restores[restore_id] = {
+                'id': restore_id,
+                'backup_id': body.get('backup_id', None),
+                'destination': body.get('destination', {}),
+                'started': time.time()
+            }
+        return ServiceResponse(201, self.__v2_restore(self.restores[restore_id]))
+
+    def v2_get_restore(self, request, restore_id):
+        restore = self.restores.get(int(restore_id), None)
+        if restore is None:
+            return error_response(404, 'Restore not found')
+        return ServiceResponse(200, self.__v2_restore(restore))
@@ -0,0 +1,307 @@
+"""
+Rackspace Cloud Backup Fake Services - common request handling
+
+Provides the request/response objects, the URL routing shared by the
+fake services and the ServiceBehavior used to inject latency and errors.
+"""
+import json
+import random
+import re
+import threading
+import time
+
+import six
+
+
+class ServiceRequest(object):
+    """
+    Request received by a fake service
+      method - HTTP method
+      path - URL path, without the query string
+      query - dict of query parameter name to (first) value
+      headers - dict of HTTP headers
+      body - request body (bytes)
+    """
+
+    def __init__(self, method, path, query=None, headers=None, body=b''):
+        self.method = method
+        self.path = path
+        if query is None:
+            query = {}
+        self.query = query
+        if headers is None:
+            headers = {}
+        self.headers = headers
+        self.body = body
+
+    def header(self, name, default=None):
+        """
+        Case insensitive header lookup
+        """
+        for key, value in self.headers.items():
+            if key.lower() == name.lower():
+                return value
+        return default
+
+    def json(self):
+        """
+        Decode the body as JSON, None if it is empty or invalid
+        """
+        if not len(self.body):
+            return None
+        try:
+            return json.loads(self.body.decode('utf-8'))
+        except ValueError:
+            return None
+
+
+class ServiceResponse(object):
+    """
+    Response produced by a fake service
+      status_code - HTTP status code
+      body - response body (bytes, text or a JSON serializable object)
+      headers - dict of HTTP headers
+
+    truncate_after is set (see ServiceBehavior.DropNext()) to only send that
+    many bytes of the body before dropping the connection.
+    """
+
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        if headers is None:
+            headers = {}
+        self.headers = dict(headers)
+        self.truncate_after = None
+        if isinstance(body, six.binary_type):
+            self.body = body
+        elif isinstance(body, six.text_type):
+            self.body = body.encode('utf-8')
+        else:
+            self.body = json.dumps(body).encode('utf-8')
+            self.headers.setdefault('Content-Type', 'application/json; charset=utf-8')
+
+
+def error_response(status_code, message):
+    """
+    JSON error body in the style of the Rackspace APIs
+    """
+    return ServiceResponse(status_code, {'error': {'code': status_code, 'message': message}})
+
+
+def paginate(items, request, default_limit=100, max_limit=1000):
+    """
+    Apply marker/limit pagination to a list of dicts with an 'id'
+
+    Returns (page, next marker or None)
+    """
+    try:
+        limit = min(max_limit, int(request.query.get('limit', default_limit)))
+    except ValueError:
+        limit = default_limit
+    marker = request.query.get('marker', None)
+    if marker is not None:
+        for index, item in enumerate(items):
+            if str(item['id']) == str(marker):
+                items = items[index + 1:]
+                break
+        else:
+            items = []
+    page = items[:limit]
+    if len(items) > limit:
+        return (page, page[-1]['id'])
+    return (page, None)
+
+
+def page_links(request, host, next_marker):
+    """
+    'links' list for a paginated v2 response
+    """
+    if next_marker is None:
+        return []
+    return [{
+        'rel': 'next',
+        'href': 'http://{0:}{1:}?marker={2:}&limit={3:}'.format(
+            host, request.path, next_marker, request.query.get('limit', 100))
+    }]
+
+
+class ServiceBehavior(object):
+    """
+    Latency and error injection for the fake services
+      latency - seconds added to every response
+      latency_jitter - up to this many additional seconds, chosen at random
+      error_rate - probability (0..1) of replacing a response with an error
+      error_status_codes - status codes the random errors are chosen from
+      retry_after - (optional) Retry-After value sent with the injected errors
+      seed - (optional) seed of the random generator, for reproducible runs
+    """
+
+    def __init__(self, latency=0.0, latency_jitter=0.0, error_rate=0.0,
+                 error_status_codes=(503,), retry_after=None, seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.error_status_codes = error_status_codes
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.faults = []
+        self.drops = []
+        self.counters = {
+            'requests': 0,
+            'errors-injected': 0,
+            'connections-dropped': 0
+        }
+
+    @property
+    def Statistics(self):
+        """
+        Counters of the requests seen and errors injected
+        """
+        with self.lock:
+            return dict(self.counters)
+
+    def FailNext(self, status_code, count=1, method=None, path=None, retry_after=None):
+        """
+        Fail the next requests matching method and path with the given status
+          count - number of requests to fail
+          method - (optional) only fail requests using this HTTP method
+          path - (optional) regular expression the request path must match (re.search)
+          retry_after - (optional) Retry-After value to send with the errors
+        """
+        with self.lock:
+            self.faults.append({
+                'status-code': status_code,
+                'count': count,
+                'method': method,
+                'path': re.compile(path) if path is not None else None,
+                'retry-after': retry_after
+            })
+
+    def DropNext(self, count=1, method=None, path=None, after=0):
+        """
+        Drop the connection of the next requests matching method and path part way through the response body
+          count - number of responses to cut short
+          method - (optional) only cut short requests using this HTTP method
+          path - (optional) regular expression the request path must match (re.search)
+          after - number of bytes of the body sent before the connection is dropped
+        """
+        with self.lock:
+            self.drops.append({
+                'count': count,
+                'method': method,
+                'path': re.compile(path) if path is not None else None,
+                'after': after
+            })
+
+    def truncation(self, request):
+        """
+        Number of body bytes to send before dropping the connection, or None to send the whole response
+        """
+        with self.lock:
+            for drop in self.drops:
+                if drop['method'] is not None and drop['method'] != request.method:
+                    continue
+                if drop['path'] is not None and drop['path'].search(request.path) is None:
+                    continue
+                drop['count'] -= 1
+                if drop['count'] <= 0:
+                    self.drops.remove(drop)
+                self.counters['connections-dropped'] += 1
+                return drop['after']
+        return None
+
+    def delay(self):
+        """
+        Seconds to wait before responding
+        """
+        with self.lock:
+            self.counters['requests'] += 1
+            jitter = self.random.uniform(0, self.latency_jitter) if self.latency_jitter > 0 else 0.0
+        return self.latency + jitter
+
+    def error(self, request):
+        """
+        ServiceResponse replacing the normal response, or None
+        """
+        with self.lock:
+            for fault in self.faults:
+                if fault['method'] is not None and fault['method'] != request.method:
+                    continue
+                if fault['path'] is not None and fault['path'].search(request.path) is None:
+                    continue
+                fault['count'] -= 1
+                if fault['count'] <= 0:
+                    self.faults.remove(fault)
+                self.counters['errors-injected'] += 1
+                return self.__error(fault['status-code'], fault['retry-after'])
+
+            if self.error_rate > 0 and self.random.random() < self.error_rate:
+                self.counters['errors-injected'] += 1
+                return self.__error(self.random.choice(self.error_status_codes), self.retry_after)
+        return None
+
+    @staticmethod
+    def __error(status_code, retry_after):
+        response = error_response(status_code, 'Injected failure')
+        if retry_after is not None:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
+
+
+class Service(object):
+    """
+    Base class of the fake services; routes requests to handler methods
+      behavior - (optional) ServiceBehavior; errors are only injected once the
+                 request is routed so that unknown paths still return 404
+      identity - (optional) FakeIdentity validating the X-Auth-Token header
+    """
+
+    def __init__(self, behavior=None, identity=None):
+        self.behavior = behavior
+        self.identity = identity
+        self.lock = threading.RLock()
+        self.routes = []
+        self.host = 'localhost'
+
+    def route(self, method, pattern, handler, authenticated=True):
+        """
+        Register a handler for the method and the path regular expression;
+        the groups of the expression are passed to the handler after the request
+        """
+        self.routes.append((method, re.compile('^' + pattern + '$'), handler, authenticated))
+
+    def handle(self, request):
+        """
+        Produce the ServiceResponse for the request
+        """
+        allowed = False
+        for method, pattern, handler, authenticated in self.routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed = True
+                continue
+
+            if self.behavior is not None:
+                delay = self.behavior.delay()
+                if delay > 0:
+                    time.sleep(delay)
+                injected = self.behavior.error(request)
+                if injected is not None:
+                    return injected
+
+            if authenticated and self.identity is not None:
+                if not self.identity.IsValid(request.header('X-Auth-Token')):
+                    return error_response(401, 'Unauthorized')
+
+            with self.lock:
+                response = handler(request, *match.groups())
+            if self.behavior is not None:
+                response.truncate_after = self.behavior.truncation(request)
+            return response
+
+        if allowed:
+            return error_response(405, 'Method not allowed')
+        return error_response(404, 'Not found')
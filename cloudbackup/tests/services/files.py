@@ -0,0 +1,289 @@
+"""
+Rackspace Cloud Backup Fake Services - Cloud Files
+
+Implements the account and container listings and object GET/HEAD/PUT/DELETE
+(including Range requests and Static Large Object manifests) used by
+cloudbackup.cloud.files.CloudFiles.
+"""
+import email.utils
+import hashlib
+import os
+import re
+import time
+
+from cloudbackup.tests.services.base import Service, ServiceResponse, error_response
+
+
+_range_pattern = re.compile(r'^bytes=(\d*)-(\d*)')
+
+
+class StoredObject(object):
+    """
+    Object stored in a FakeCloudFiles container
+    """
+
+    def __init__(self, data, content_type='application/octet-stream', metadata=None, etag=None):
+        self.data = data
+        self.content_type = content_type
+        self.etag = etag if etag is not None else hashlib.md5(data).hexdigest()
+        self.last_modified = time.time()
+        if metadata is None:
+            metadata = {}
+        self.metadata = metadata
+
+    def listing(self, name):
+        """
+        Entry of the object in a JSON container listing
+        """
+        return {
+            'name': name,
+            'hash': self.etag,
+            'bytes': len(self.data),
+            'content_type': self.content_type,
+            'last_modified': time.strftime('%Y-%m-%dT%H:%M:%S.000000', time.gmtime(self.last_modified))
+        }
+
+    def headers(self):
+        """
+        HTTP headers describing the object
+        """
+        headers = {
+            'ETag': self.etag,
+            'Content-Type': self.content_type,
+            'Last-Modified': email.utils.formatdate(self.last_modified, usegmt=True),
+            'Accept-Ranges': 'bytes'
+        }
+        headers.update(self.metadata)
+        return headers
+
+
+class FakeCloudFiles(Service):
+    """
+    Fake Cloud Files service for a single account
+      account - account name, e.g. MossoCloudFS_123456
+      behavior - (optional) cloudbackup.tests.services.base.ServiceBehavior
+      identity - (optional) FakeIdentity validating the tokens
+    """
+
+    def __init__(self, account='MossoCloudFS_123456', behavior=None, identity=None):
+        super(FakeCloudFiles, self).__init__(behavior=behavior, identity=identity)
+        self.account = account
+        self.containers = {}
+        prefix = '/v1/' + re.escape(account)
+        self.route('GET', prefix + '/?', self.list_containers)
+        self.route('GET', prefix + '/([^/]+)/?', self.list_objects)
+        self.route('PUT', prefix + '/([^/]+)/?', self.create_container)
+        self.route('DELETE', prefix + '/([^/]+)/?', self.delete_container)
+        self.route('GET', prefix + '/([^/]+)/(.+)', self.get_object)
+        self.route('HEAD', prefix + '/([^/]+)/(.+)', self.head_object)
+        self.route('PUT', prefix + '/([^/]+)/(.+)', self.put_object)
+        self.route('DELETE', prefix + '/([^/]+)/(.+)', self.delete_object)
+
+    def ContainerUri(self, container):
+        """
+        Container location in the form used by cloudbackup.cloud.files.CloudFiles (host and path)
+        """
+        return '{0:}/v1/{1:}/{2:}'.format(self.host, self.account, container)
+
+    def CreateContainer(self, container):
+        """
+        Create an empty container if it does not exist
+        """
+        with self.lock:
+            self.containers.setdefault(container, {})
+
+    def AddObject(self, container, name, data, content_type='application/octet-stream', metadata=None):
+        """
+        Store an object, creating the container if needed
+        """
+        with self.lock:
+            self.containers.setdefault(container, {})[name] = StoredObject(data, content_type, metadata)
+
+    def GetObject(self, container, name):
+        """
+        Return the data of a stored object, or None
+        """
+        with self.lock:
+            stored = self.containers.get(container, {}).get(name, None)
+        return stored.data if stored is not None else None
+
+    def Populate(self, container, count, size, prefix='object-'):
+        """
+        Store count objects of size random bytes named prefix + ordinal
+        """
+        for ordinal in range(count):
+            self.AddObject(container, '{0:}{1:010}'.format(prefix, ordinal), os.urandom(size))
+
+    def __container(self, container):
+        return self.containers.get(container, None)
+
+    @staticmethod
+    def __list(names, request):
+        prefix = request.query.get('prefix', None)
+        marker = request.query.get('marker', None)
+        end_marker = request.query.get('end_marker', None)
+        limit = int(request.query.get('limit', 10000))
+        reverse = request.query.get('reverse', '').lower() in ('1', 'true', 'yes', 'on')
+        result = []
+        for name in sorted(names, reverse=reverse):
+            if prefix is not None and not name.startswith(prefix):
+                continue
+            # reversed listings swap the meaning of the markers
+            if marker is not None and (name >= marker if reverse else name <= marker):
+                continue
+            if end_marker is not None and (name <= end_marker if reverse else name >= end_marker):
+                continue
+            result.append(name)
+            if len(result) >= limit:
+                break
+        return result
+
+    def list_containers(self, request):
+        listing = []
+        for name in self.__list(self.containers.keys(), request):
+            objects = self.containers[name]
+            listing.append({
+                'name': name,
+                'count': len(objects),
+                'bytes': sum(len(stored.data) for stored in objects.values())
+            })
+        return ServiceResponse(200, listing)
+
+    def list_objects(self, request, container):
+        objects = self.__container(container)
+        if objects is None:
+            return error_response(404, 'Container not found')
+        return ServiceResponse(200, [objects[name].listing(name)
+                                     for name in self.__list(objects.keys(), request)])
+
+    def create_container(self, request, container):
+        if container in self.containers:
+            return ServiceResponse(202)
+        self.containers[container] = {}
+        return ServiceResponse(201)
+
+    def delete_container(self, request, container):
+        objects = self.__container(container)
+        if objects is None:
+            return error_response(404, 'Container not found')
+        if len(objects):
+            return error_response(409, 'Container not empty')
+        del self.containers[container]
+        return ServiceResponse(204)
+
+    def __stored(self, container, name):
+        objects = self.__container(container)
+        if objects is None:
+            return None
+        return objects.get(name, None)
+
+    def get_object(self, request, container, name):
+        stored = self.__stored(container, name)
+        if stored is None:
+            return error_response(404, 'Object not found')
+
+        headers = stored.headers()
+        if request.header('If-None-Match') == stored.etag:
+            return ServiceResponse(304, headers=headers)
+        expected = request.header('If-Match')
+        if expected is not None and expected != '*' and expected.strip('"') != stored.etag.strip('"'):
+            return error_response(412, 'Precondition failed')
+
+        total = len(stored.data)
+        requested = request.header('Range')
+        if requested is None or not requested.startswith('bytes='):
+            return ServiceResponse(200, stored.data, headers=headers)
+
+        ranges = []
+        for spec in requested[len('bytes='):].split(','):
+            match = _range_pattern.match('bytes=' + spec.strip())
+            if match is None:
+                return ServiceResponse(200, stored.data, headers=headers)
+            first, last = match.groups()
+            if not len(first):
+                # suffix range: the last N bytes
+                first = max(0, total - int(last or 0))
+                last = total - 1
+            else:
+                first = int(first)
+                last = min(total - 1, int(last)) if len(last) else total - 1
+            if first < total and first <= last:
+                ranges.append((first, last))
+        if not len(ranges):
+            headers['Content-Range'] = 'bytes */{0:}'.format(total)
+            return ServiceResponse(416, b'', headers=headers)
+
+        if len(ranges) == 1:
+            first, last = ranges[0]
+            headers['Content-Range'] = 'bytes {0:}-{1:}/{2:}'.format(first, last, total)
+            return ServiceResponse(206, stored.data[first:last + 1], headers=headers)
+
+        # several ranges: multipart/byteranges as Swift sends them
+        boundary = hashlib.md5(requested.encode('utf-8')).hexdigest()
+        parts = []
+        for first, last in ranges:
+            parts.append('--{0:}\r\nContent-Type: {1:}\r\nContent-Range: bytes {2:}-{3:}/{4:}\r\n\r\n'.format(
+                boundary, stored.content_type, first, last, total).encode('utf-8'))
+            parts.append(stored.data[first:last + 1])
+            parts.append(b'\r\n')
+        parts.append('--{0:}--\r\n'.format(boundary).encode('utf-8'))
+        headers['Content-Type'] = 'multipart/byteranges; boundary={0:}'.format(boundary)
+        return ServiceResponse(206, b''.join(parts), headers=headers)
+
+    def head_object(self, request, container, name):
+        stored = self.__stored(container, name)
+        if stored is None:
+            return ServiceResponse(404)
+        headers = stored.headers()
+        headers['Content-Length'] = str(len(stored.data))
+        return ServiceResponse(200, b'', headers=headers)
+
+    def __put_manifest(self, request, objects, name):
+        """
+        Store a Static Large Object; the segments are concatenated right away
+        """
+        manifest = request.json()
+        if not isinstance(manifest, list) or not len(manifest):
+            return error_response(400, 'Invalid manifest')
+        data = []
+        etags = []
+        for entry in manifest:
+            container, _, segment_name = entry.get('path', '').lstrip('/').partition('/')
+            segment = self.__stored(container, segment_name)
+            if segment is None:
+                return error_response(400, 'Segment not found: {0:}'.format(entry.get('path', None)))
+            if entry.get('etag', None) not in (None, segment.etag):
+                return error_response(400, 'Segment ETag mismatch: {0:}'.format(entry['path']))
+            if entry.get('size_bytes', None) not in (None, len(segment.data)):
+                return error_response(400, 'Segment size mismatch: {0:}'.format(entry['path']))
+            data.append(segment.data)
+            etags.append(segment.etag)
+        etag = hashlib.md5(''.join(etags).encode('ascii')).hexdigest()
+        objects[name] = StoredObject(b''.join(data), request.header('Content-Type', 'application/octet-stream'),
+                                     {'X-Static-Large-Object': 'True'}, etag='"{0:}"'.format(etag))
+        return ServiceResponse(201, b'', headers={'ETag': '"{0:}"'.format(etag)})
+
+    def put_object(self, request, container, name):
+        objects = self.__container(container)
+        if objects is None:
+            return error_response(404, 'Container not found')
+
+        if request.query.get('multipart-manifest', None) == 'put':
+            return self.__put_manifest(request, objects, name)
+
+        stored = StoredObject(request.body,
+                              request.header('Content-Type', 'application/octet-stream'),
+                              dict((key, value) for key, value in request.headers.items()
+                                   if key.lower().startswith('x-object-meta-')))
+        expected = request.header('ETag')
+        if expected is not None and expected.strip('"').lower() != stored.etag:
+            return error_response(422, 'ETag does not match the data received')
+        objects[name] = stored
+        return ServiceResponse(201, b'', headers={'ETag': stored.etag})
+
+    def delete_object(self, request, container, name):
+        objects = self.__container(container)
+        if objects is None or name not in objects:
+            return error_response(404, 'Object not found')
+        del objects[name]
+        return ServiceResponse(204)
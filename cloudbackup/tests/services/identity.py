@@ -0,0 +1,155 @@
+"""
+Rackspace Cloud Backup Fake Services - Identity (Keystone v2.0)
+
+Implements the token endpoint used by cloudbackup.client.auth.Authentication.GetToken
+along with the user lookups, issuing tokens with a service catalog pointing
+at the fake Cloud Backup and Cloud Files services.
+"""
+import datetime
+import threading
+import time
+import uuid
+
+from cloudbackup.tests.services.base import Service, ServiceResponse, error_response
+
+
+class FakeIdentity(Service):
+    """
+    Fake Identity service
+      tenant_id - tenant (project) of the account
+      username - user of the account
+      apikey - (optional) API key required to authenticate; any key is accepted if None
+      token_lifetime - seconds a token is valid for
+      behavior - (optional) cloudbackup.tests.services.base.ServiceBehavior
+    """
+
+    def __init__(self, tenant_id='123456', username='cbu-user', apikey=None,
+                 token_lifetime=86400, behavior=None):
+        super(FakeIdentity, self).__init__(behavior=behavior)
+        self.tenant_id = str(tenant_id)
+        self.username = username
+        self.user_id = str(uuid.uuid5(uuid.NAMESPACE_URL, username)).replace('-', '')
+        self.apikey = apikey
+        self.token_lifetime = token_lifetime
+        self.tokens = {}
+        self.tokens_lock = threading.Lock()
+        self.counters = {
+            'tokens-issued': 0
+        }
+        self.route('POST', '/v2.0/tokens', self.create_token, authenticated=False)
+        self.route('GET', '/v2.0/users', self.get_users)
+        self.route('GET', '/v2.0/users/([^/]+)/OS-KSADM/credentials', self.get_credentials)
+        self.route('GET', '/v2.0/users/([^/]+)/OS-KSADM/credentials/RAX-KSKEY:apiKeyCredentials', self.get_apikey)
+
+    @property
+    def Statistics(self):
+        """
+        Counters of the tokens issued
+        """
+        with self.tokens_lock:
+            result = dict(self.counters)
+            result['tokens-valid'] = len([expires for expires in self.tokens.values() if expires > time.time()])
+        return result
+
+    def IsValid(self, token):
+        """
+        Whether the token was issued by this service and has not expired
+        """
+        with self.tokens_lock:
+            expires = self.tokens.get(token, None)
+        return expires is not None and expires > time.time()
+
+    def RevokeTokens(self):
+        """
+        Invalidate all the tokens issued so far; subsequent requests using them get a 401
+        """
+        with self.tokens_lock:
+            self.tokens = {}
+
+    def __catalog(self):
+        files_url = 'http://{0:}/v1/MossoCloudFS_{1:}'.format(self.host, self.tenant_id)
+        backup_url = 'http://{0:}/v2/{1:}'.format(self.host, self.tenant_id)
+        return [
+            {
+                'name': 'cloudFiles',
+                'type': 'object-store',
+                'endpoints': [{
+                    'region': 'DFW',
+                    'tenantId': 'MossoCloudFS_{0:}'.format(self.tenant_id),
+                    'publicURL': files_url,
+                    'internalURL': files_url
+                }]
+            },
+            {
+                'name': 'cloudBackup',
+                'type': 'rax:backup',
+                'endpoints': [{
+                    'tenantId': self.tenant_id,
+                    'publicURL': backup_url,
+                    'internalURL': backup_url
+                }]
+            }
+        ]
+
+    def create_token(self, request):
+        body = request.json()
+        if body is None or 'auth' not in body:
+            return error_response(400, 'Invalid authentication request')
+
+        credentials = body['auth'].get('RAX-KSKEY:apiKeyCredentials', None)
+        if self.apikey is not None and credentials is not None:
+            if credentials.get('apiKey', None) != self.apikey:
+                return error_response(401, 'Username or api key is invalid')
+
+        token = uuid.uuid4().hex
+        expires = time.time() + self.token_lifetime
+        with self.tokens_lock:
+            self.tokens[token] = expires
+            self.counters['tokens-issued'] += 1
+
+        expiration = datetime.datetime.utcfromtimestamp(expires).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        return ServiceResponse(200, {
+            'access': {
+                'token': {
+                    'id': token,
+                    'expires': expiration,
+                    'tenant': {
+                        'id': self.tenant_id,
+                        'name': self.tenant_id
+                    }
+                },
+                'user': {
+                    'id': self.user_id,
+                    'name': self.username,
+                    'roles': [{'name': 'identity:user-admin'}]
+                },
+                'serviceCatalog': self.__catalog()
+            }
+        })
+
+    def get_users(self, request):
+        return ServiceResponse(200, {
+            'user': {
+                'id': self.user_id,
+                'username': self.username,
+                'enabled': True
+            }
+        })
+
+    def get_credentials(self, request, user_id):
+        return ServiceResponse(200, {
+            'credentials': [{
+                'RAX-KSKEY:apiKeyCredentials': {
+                    'username': self.username,
+                    'apiKey': self.apikey or ''
+                }
+            }]
+        })
+
+    def get_apikey(self, request, user_id):
+        return ServiceResponse(200, {
+            'RAX-KSKEY:apiKeyCredentials': {
+                'username': self.username,
+                'apiKey': self.apikey or ''
+            }
+        })
@@ -0,0 +1,234 @@
+"""
+Rackspace Cloud Backup Fake Services - HTTP server
+
+Serves the fake Identity, Cloud Backup and Cloud Files services from a
+single in-process (or standalone) HTTP server so that the SDK can be
+exercised and benchmarked without contacting Rackspace:
+
+    with FakeCloudServer(agents=100, behavior=ServiceBehavior(latency=0.05)) as server:
+        auth = server.Attach(Authentication('user', 'apikey'))
+        agents = server.Attach(Agents(False, auth, server.Host, 2, server.ProjectId))
+        agents.GetAgentsFromApi()
+
+Standalone: python -m cloudbackup.tests.services.server --port 8080 --agents 100
+"""
+from __future__ import print_function
+
+import argparse
+import logging
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qs, urlsplit
+
+from cloudbackup.tests.services.backup import FakeCloudBackup
+from cloudbackup.tests.services.base import ServiceBehavior, ServiceRequest, error_response
+from cloudbackup.tests.services.files import FakeCloudFiles
+from cloudbackup.tests.services.identity import FakeIdentity
+
+
+class FakeRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Translates HTTP requests into ServiceRequests for the FakeCloudServer
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def __read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    # trailer section ends with an empty line
+                    while self.rfile.readline().strip():
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def __handle(self):
+        parts = urlsplit(self.path)
+        query = dict((key, values[0]) for key, values in parse_qs(parts.query).items())
+        request = ServiceRequest(self.command, parts.path, query, dict(self.headers.items()), self.__read_body())
+        try:
+            response = self.server.fake.handle(request)
+        except Exception as ex:
+            logging.getLogger(__name__).exception('Fake service failure')
+            response = error_response(500, str(ex))
+
+        self.send_response(response.status_code)
+        for key, value in response.headers.items():
+            self.send_header(key, value)
+        if 'Content-Length' not in response.headers:
+            self.send_header('Content-Length', str(len(response.body)))
+        body = response.body if self.command != 'HEAD' else b''
+        if response.truncate_after is not None and response.truncate_after < len(body):
+            body = body[:response.truncate_after]
+            self.close_connection = True
+        if hasattr(self, '_headers_buffer'):
+            # send the headers along with the body rather than on their own to avoid
+            # Nagle/delayed-ACK stalls that would distort latency measurements
+            self._headers_buffer.append(b'\r\n')
+            self._headers_buffer.append(body)
+            self.flush_headers()
+        else:
+            self.end_headers()
+            self.wfile.write(body)
+
+    do_GET = __handle
+    do_HEAD = __handle
+    do_PUT = __handle
+    do_POST = __handle
+    do_PATCH = __handle
+    do_DELETE = __handle
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format, *args)
+
+
+class ThreadedHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeCloudServer(object):
+    """
+    HTTP server hosting the fake Identity, Cloud Backup and Cloud Files services
+      host - address to listen on
+      port - port to listen on, 0 for any free port
+      project_id - tenant (project) of the account
+      behavior - (optional) cloudbackup.tests.services.base.ServiceBehavior applied to all the services
+      require_auth - True to reject requests without a valid token with a 401
+      token_lifetime - seconds the issued tokens are valid for
+      kwargs - data sizes passed to cloudbackup.tests.services.backup.FakeCloudBackup
+               (agents, configurations_per_agent, backups_per_configuration, ...)
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, project_id='123456', behavior=None,
+                 require_auth=True, token_lifetime=86400, **kwargs):
+        if behavior is None:
+            behavior = ServiceBehavior()
+        self.behavior = behavior
+        self.identity = FakeIdentity(tenant_id=project_id, token_lifetime=token_lifetime, behavior=behavior)
+        validator = self.identity if require_auth else None
+        self.files = FakeCloudFiles(account='MossoCloudFS_{0:}'.format(project_id),
+                                    behavior=behavior, identity=validator)
+        self.backup = FakeCloudBackup(project_id=project_id, files=self.files,
+                                      behavior=behavior, identity=validator, **kwargs)
+        self.httpd = ThreadedHTTPServer((host, port), FakeRequestHandler)
+        self.httpd.fake = self
+        self.thread = None
+        for service in (self.identity, self.files, self.backup):
+            service.host = self.Host
+
+    @property
+    def Host(self):
+        """
+        host:port of the server, as used for the apihost of the API objects
+        """
+        return '{0:}:{1:}'.format(*self.httpd.server_address[:2])
+
+    @property
+    def ProjectId(self):
+        """
+        Tenant (project) of the account
+        """
+        return self.backup.project_id
+
+    def handle(self, request):
+        """
+        Dispatch a ServiceRequest to the service owning its path
+        """
+        if request.path.startswith('/v2.0/'):
+            return self.identity.handle(request)
+        elif request.path.startswith('/v1/'):
+            return self.files.handle(request)
+        return self.backup.handle(request)
+
+    def Attach(self, command):
+        """
+        Direct an API object (cloudbackup.common.command.Command) at this server
+
+        Returns the object
+        """
+        command.sslenabled = False
+        command.apihost = self.Host
+        return command
+
+    def Start(self):
+        """
+        Serve requests on a background thread
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def Stop(self):
+        """
+        Stop serving requests
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.Start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+
+def main():
+    """
+    Run the fake services standalone
+    """
+    parser = argparse.ArgumentParser(description='Fake Rackspace Identity, Cloud Backup and Cloud Files services')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='port to listen on')
+    parser.add_argument('--project-id', default='123456', help='tenant of the account')
+    parser.add_argument('--agents', type=int, default=5, help='number of agents')
+    parser.add_argument('--backups', type=int, default=3, help='completed backups per configuration')
+    parser.add_argument('--events', type=int, default=10, help='events per agent')
+    parser.add_argument('--backup-duration', type=float, default=5.0, help='seconds a backup runs for')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--latency-jitter', type=float, default=0.0, help='random additional latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='probability of an injected error')
+    parser.add_argument('--error-codes', default='503', help='comma separated status codes to inject')
+    parser.add_argument('--objects', type=int, default=0, help='objects to create in each agent vault')
+    parser.add_argument('--object-size', type=int, default=1024 * 1024, help='size of the created objects')
+    parser.add_argument('--no-auth', action='store_true', help='accept requests without a valid token')
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    behavior = ServiceBehavior(latency=arguments.latency,
+                               latency_jitter=arguments.latency_jitter,
+                               error_rate=arguments.error_rate,
+                               error_status_codes=[int(code) for code in arguments.error_codes.split(',')])
+    server = FakeCloudServer(host=arguments.host, port=arguments.port,
+                             project_id=arguments.project_id, behavior=behavior,
+                             require_auth=not arguments.no_auth,
+                             agents=arguments.agents,
+                             backups_per_configuration=arguments.backups,
+                             events_per_agent=arguments.events,
+                             backup_duration=arguments.backup_duration)
+    if arguments.objects:
+        for agent in server.backup.agents.values():
+            server.files.Populate(agent['container'], arguments.objects, arguments.object_size,
+                                  prefix='BACKUPS/v2.0/{0:}/BUNDLES/'.format(agent['vault_id']))
+    print('Serving on http://{0:} (agents: {1:})'.format(server.Host, server.backup.AgentIds()))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
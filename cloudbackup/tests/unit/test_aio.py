@@ -0,0 +1,136 @@
+"""
+Rackspace Cloud Backup API
+The asyncio API objects against the fake services
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    import aiohttp
+    from cloudbackup.aio.agents import Agents
+    from cloudbackup.aio.backup import Backups
+    from cloudbackup.aio.command import AsyncTransport, get_async_transport
+    from cloudbackup.aio.files import CloudFiles
+except (ImportError, SyntaxError):
+    aiohttp = None
+
+from cloudbackup.client.auth import Authentication
+from cloudbackup.common.ratelimit import RateLimiter
+from cloudbackup.tests.services.server import FakeCloudServer
+
+
+@unittest.skipIf(aiohttp is None, 'cloudbackup.aio requires Python 3.5.3+ and aiohttp')
+class AsyncTestCase(unittest.TestCase):
+    """
+    Runs each test with a FakeCloudServer, an event loop and an AsyncTransport
+    """
+
+    def setUp(self):
+        self.server = FakeCloudServer(agents=7)
+        self.server.Start()
+        self.auth = self.server.Attach(Authentication('user', 'key'))
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.transport = AsyncTransport(max_in_flight=4)
+        self.limiter = RateLimiter(read_rate=None, write_rate=None)
+
+    def tearDown(self):
+        self.complete(self.transport.close())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.server.Stop()
+
+    def complete(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def attach(self, command):
+        command.apihost = self.server.Host
+        command.RateLimiter = self.limiter
+        return command
+
+    def agents(self):
+        return self.attach(Agents(False, self.auth, self.server.Host, 2, self.server.ProjectId,
+                                  transport=self.transport))
+
+
+class TestAsyncCommand(AsyncTestCase):
+
+    def test_shared_transport(self):
+        agents = Agents(False, self.auth, self.server.Host, 2, self.server.ProjectId)
+        backups = Backups(False, self.auth, self.server.Host, 2, self.server.ProjectId)
+        self.assertIs(agents.Transport, get_async_transport())
+        self.assertIs(backups.Transport, agents.Transport)
+
+    def test_renewed_token(self):
+        agents = self.agents()
+        self.complete(agents.GetAgentsFromApi())
+        self.server.identity.RevokeTokens()
+        self.assertEqual(len(self.complete(agents.GetAgentsFromApi())), 7)
+
+    def test_rate_limited(self):
+        self.limiter = RateLimiter(read_rate=100.0, write_rate=100.0, cooldown=0.0)
+        agents = self.agents()
+        agent_id = self.server.backup.AgentIds()[0]
+        self.server.behavior.FailNext(429, count=1, method='GET', path='agents/{0:}$'.format(agent_id),
+                                      retry_after=0)
+        self.assertIsNotNone(self.complete(agents.GetAgentDetails(agent_id)))
+        self.assertEqual(self.limiter.Statistics['requests'], 2)
+        self.assertEqual(self.limiter.Statistics['throttled'], 1)
+
+    def test_bounded_in_flight(self):
+        agents = self.agents()
+        self.server.behavior.latency = 0.1
+        details = self.complete(asyncio.gather(*[agents.GetAgentDetails(agent_id)
+                                                 for agent_id in self.server.backup.AgentIds()]))
+        self.assertEqual(len([detail for detail in details if detail is not None]), 7)
+        self.assertEqual(self.transport.Statistics['peak-in-flight'], 4)
+
+
+class TestAsyncPagination(AsyncTestCase):
+
+    def test_agents(self):
+        agent_ids = self.complete(self.agents().GetAgentsFromApi(page_size=3))
+        self.assertEqual(agent_ids, self.server.backup.AgentIds())
+
+    def test_completed_backups(self):
+        agent_id = self.server.backup.AgentIds()[0]
+        configuration_id = self.server.backup.AddConfiguration(agent_id)
+        backup_ids = [self.server.backup.AddBackup(configuration_id, started=time.time() - 86400) for _ in range(5)]
+        backups = self.attach(Backups(False, self.auth, self.server.Host, 2, self.server.ProjectId,
+                                      transport=self.transport))
+        completed = self.complete(backups.GetCompletedBackups(configuration_id, page_size=2))
+        self.assertEqual([backup['id'] for backup in completed], backup_ids)
+
+
+class TestAsyncDownload(AsyncTestCase):
+
+    def setUp(self):
+        super(TestAsyncDownload, self).setUp()
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        self.files = self.attach(CloudFiles(False, self.auth, transport=self.transport))
+        self.files.sslenabled = False
+        self.uri = self.server.files.ContainerUri('vault')
+        self.server.files.CreateContainer('vault')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super(TestAsyncDownload, self).tearDown()
+
+    def test_bundle(self):
+        data = os.urandom(300 * 1000)
+        self.server.files.AddObject('vault', 'agent/BUNDLES/0000000001', data)
+        bundle = {'id': 1}
+        self.assertTrue(self.complete(self.files.DownloadBundle(self.uri, 'agent', bundle,
+                                                                os.path.join(self.directory, 'restore'))))
+        with open(bundle['file-on-disk'], 'rb') as bundle_file:
+            self.assertEqual(bundle_file.read(), data)
+        self.assertEqual(bundle['download-md5'], hashlib.md5(data).hexdigest().upper())
+
+    def test_missing_bundle(self):
+        self.assertRaises(UserWarning, self.complete,
+                          self.files.DownloadBundle(self.uri, 'agent', {'id': 2}, os.path.join(self.directory, 'restore')))
@@ -0,0 +1,50 @@
+"""
+Rackspace Cloud Backup API
+Atomic file replacement
+"""
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from cloudbackup.utils.atomicfile import AtomicFile
+
+
+class TestAtomicFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        self.path = os.path.join(self.directory, 'state.json')
+        with open(self.path, 'w') as state_file:
+            state_file.write('previous')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def content(self):
+        with open(self.path, 'r') as state_file:
+            return state_file.read()
+
+    def test_replaced(self):
+        with AtomicFile(self.path) as state_file:
+            state_file.write('new')
+            self.assertEqual(self.content(), 'previous')
+        self.assertEqual(self.content(), 'new')
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+
+    def test_failure_leaves_file(self):
+        def fail():
+            with AtomicFile(self.path) as state_file:
+                state_file.write('partial')
+                raise IOError('disk full')
+
+        self.assertRaises(IOError, fail)
+        self.assertEqual(self.content(), 'previous')
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+
+    @unittest.skipIf(os.name == 'nt', 'POSIX permissions')
+    def test_permissions(self):
+        with AtomicFile(self.path, 'wb', permissions=0o600) as state_file:
+            state_file.write(b'secret')
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
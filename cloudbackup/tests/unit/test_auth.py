@@ -0,0 +1,146 @@
+"""
+Rackspace Cloud Backup API
+Authentication against the fake Identity service
+"""
+import time
+import unittest
+
+from cloudbackup.client.auth import Authentication, ServiceCatalog
+from cloudbackup.tests.services.server import FakeCloudServer
+
+
+class AuthTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCloudServer()
+        self.server.Start()
+
+    def tearDown(self):
+        self.server.Stop()
+
+    def authentication(self, **kwargs):
+        return self.server.Attach(Authentication('user', 'key', **kwargs))
+
+    @property
+    def tokens_issued(self):
+        return self.server.identity.Statistics['tokens-issued']
+
+
+class TestServiceCatalog(unittest.TestCase):
+
+    auth_data = {
+        'access': {
+            'serviceCatalog': [
+                {
+                    'name': 'cloudFiles',
+                    'endpoints': [
+                        {'region': 'DFW', 'tenantId': 'MossoCloudFS_1', 'publicURL': 'https://dfw', 'internalURL': 'https://snet-dfw'},
+                        {'region': 'ORD', 'tenantId': 'MossoCloudFS_1', 'publicURL': 'https://ord'}
+                    ]
+                },
+                {
+                    'name': 'cloudBackup',
+                    'endpoints': [{'tenantId': '1', 'publicURL': 'https://backup'}]
+                }
+            ]
+        }
+    }
+
+    def test_endpoint(self):
+        catalog = ServiceCatalog(self.auth_data)
+        self.assertEqual(catalog.Endpoint('cloudFiles', 'dfw'), 'https://dfw')
+        self.assertEqual(catalog.Endpoint('cloudFiles', 'DFW', 'internal'), 'https://snet-dfw')
+        self.assertIsNone(catalog.Endpoint('cloudFiles', 'ORD', 'internal'))
+        self.assertIsNone(catalog.Endpoint('cloudFiles', 'IAD'))
+        self.assertEqual(catalog.Endpoint('cloudBackup'), 'https://backup')
+        self.assertEqual(len(catalog.Endpoints('cloudFiles')), 2)
+        self.assertEqual(catalog.Endpoints('cloudServers'), [])
+
+    def test_no_catalog(self):
+        for auth_data in ({}, None, {'access': {}}):
+            self.assertIsNone(ServiceCatalog(auth_data).Endpoint('cloudFiles', 'DFW'))
+
+
+class TestCatalogLookups(AuthTestCase):
+
+    def test_cloud_files(self):
+        auth = self.authentication()
+        self.assertEqual(auth.GetCloudFilesDataCenters(), ['DFW'])
+        uris = auth.GetCloudFilesUri('dfw')
+        self.assertEqual([uri['name'] for uri in uris], ['public', 'snet'])
+        self.assertEqual(auth.GetEndpoint('cloudFiles', 'DFW'), uris[0]['uri'])
+        self.assertEqual(auth.MossoId, 'MossoCloudFS_{0:}'.format(self.server.ProjectId))
+
+    def test_reindexed_with_new_token(self):
+        auth = self.authentication()
+        self.assertIsNotNone(auth.GetEndpoint('cloudBackup'))
+        # a catalog without the service after the token is renewed
+        auth.auth_data = {'access': {'token': auth.auth_data['access']['token'], 'serviceCatalog': []}}
+        self.assertIsNone(auth.GetEndpoint('cloudBackup'))
+
+
+class TestBackgroundRefresh(AuthTestCase):
+
+    def due(self, auth):
+        """
+        Make the background renewal of the current token due
+        """
+        with auth.token_lock:
+            auth.refresh_at = time.time() - 1
+
+    def wait_refreshed(self, auth):
+        refresh_thread = auth.refresh_thread
+        if refresh_thread is not None:
+            refresh_thread.join(5)
+
+    def test_invalid_fraction(self):
+        for refresh_fraction in (0, 1, 1.5):
+            self.assertRaises(ValueError, self.authentication, refresh_fraction=refresh_fraction)
+
+    def test_scheduled(self):
+        self.server.identity.token_lifetime = 1000
+        auth = self.authentication(refresh_fraction=0.5)
+        auth.AuthToken
+        self.assertAlmostEqual(auth.refresh_at, time.time() + 500, delta=5)
+        self.assertIsNone(self.authentication().refresh_at)
+
+    def test_renewed_in_background(self):
+        auth = self.authentication(refresh_fraction=0.5)
+        token = auth.AuthToken
+        self.due(auth)
+        self.server.behavior.latency = 0.5
+        started = time.time()
+        # the current token is handed out while the renewal runs
+        self.assertEqual(auth.AuthToken, token)
+        self.assertLess(time.time() - started, 0.3)
+        self.wait_refreshed(auth)
+        self.assertNotEqual(auth.AuthToken, token)
+        self.assertEqual(self.tokens_issued, 2)
+        self.assertGreater(auth.refresh_at, time.time())
+
+    def test_single_renewal(self):
+        auth = self.authentication(refresh_fraction=0.5)
+        auth.AuthToken
+        self.due(auth)
+        self.server.behavior.latency = 0.3
+        for _ in range(10):
+            auth.AuthToken
+        self.wait_refreshed(auth)
+        self.assertEqual(self.tokens_issued, 2)
+
+    def test_failed_renewal(self):
+        auth = self.authentication(refresh_fraction=0.5)
+        token = auth.AuthToken
+        self.due(auth)
+        self.server.behavior.FailNext(401, count=1, method='POST', path='tokens$')
+        auth.AuthToken
+        self.wait_refreshed(auth)
+        # the current token is kept and the renewal tried again later
+        self.assertEqual(auth.AuthToken, token)
+        self.assertGreater(auth.refresh_at, time.time())
+
+    def test_expired_renewed_synchronously(self):
+        auth = self.authentication(refresh_fraction=0.5)
+        token = auth.AuthToken
+        auth.auth_data = {'access': {'token': {'id': token, 'expires': '2013-12-24T14:02:26.550Z'}}}
+        self.assertNotEqual(auth.AuthToken, token)
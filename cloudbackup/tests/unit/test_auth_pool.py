@@ -0,0 +1,86 @@
+"""
+Rackspace Cloud Backup API
+The multi-account authentication pool
+"""
+import time
+import unittest
+
+from cloudbackup.client.agents import Agents
+from cloudbackup.client.auth_pool import Account, AuthenticationPool
+from cloudbackup.tests.services.server import FakeCloudServer
+
+
+class TestAccount(unittest.TestCase):
+
+    def test_key(self):
+        account = Account('user', 'secret')
+        self.assertEqual(account.Key, Account('user', 'secret').Key)
+        self.assertNotEqual(account.Key, Account('user', 'changed').Key)
+        self.assertNotEqual(account.Key, Account('user', 'secret', datacenter='uk').Key)
+        self.assertNotIn('secret', account.Key)
+
+
+class TestAuthenticationPool(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCloudServer(agents=3)
+        self.server.Start()
+        self.accounts = [Account('user-{0:}'.format(index), 'key') for index in range(5)]
+
+    def tearDown(self):
+        self.server.Stop()
+
+    def pool(self, **kwargs):
+        return AuthenticationPool(apihost=self.server.Host, api_version=2, sslenabled=False,
+                                  prepare=self.server.Attach, **kwargs)
+
+    @property
+    def tokens_issued(self):
+        return self.server.identity.Statistics['tokens-issued']
+
+    def test_least_recently_used_evicted(self):
+        pool = self.pool(max_entries=2)
+        first = pool.Authenticator(self.accounts[0])
+        pool.Authenticator(self.accounts[1])
+        self.assertIs(pool.Authenticator(self.accounts[0]), first)
+        pool.Authenticator(self.accounts[2])
+        self.assertEqual(len(pool), 2)
+        self.assertIs(pool.Authenticator(self.accounts[0]), first)
+        self.assertEqual(pool.Statistics, {'hits': 2, 'misses': 3, 'evictions': 1, 'entries': 2})
+        self.assertTrue(pool.Evict(self.accounts[0]))
+        self.assertFalse(pool.Evict(self.accounts[0]))
+
+    def test_client(self):
+        pool = self.pool()
+        agents = pool.Client(self.accounts[0])
+        self.assertIsInstance(agents, Agents)
+        self.assertIs(pool.Client(self.accounts[0]), agents)
+        self.assertIs(pool.Client(self.accounts[0], 'backups').authenticator, agents.authenticator)
+        self.assertEqual(agents.GetAgentsFromApi(), self.server.backup.AgentIds())
+        self.assertEqual(self.tokens_issued, 1)
+        self.assertRaises(ValueError, pool.Client, self.accounts[0], 'servers')
+
+    def test_authenticated_concurrently(self):
+        pool = self.pool(workers=5)
+        self.server.behavior.latency = 0.3
+        started = time.time()
+        tokens = pool.Authenticate(self.accounts)
+        # one after the other the accounts take 5 * 0.3 seconds
+        self.assertLess(time.time() - started, 1.0)
+        self.assertEqual(len(set(tokens.values())), 5)
+        self.assertEqual(self.tokens_issued, 5)
+        # the pool's accounts, already authenticated
+        self.assertEqual(pool.Authenticate(), tokens)
+        self.assertEqual(self.tokens_issued, 5)
+
+    def test_map_failures(self):
+        pool = self.pool()
+
+        def userid(account):
+            if account is self.accounts[1]:
+                raise RuntimeError('failed')
+            return account.userid
+
+        results = pool.Map(userid, self.accounts[:3])
+        self.assertEqual([result for _, result, _ in results], ['user-0', None, 'user-2'])
+        self.assertIsInstance(results[1][2], RuntimeError)
@@ -0,0 +1,183 @@
+"""
+Rackspace Cloud Backup API
+Bundle downloads, the bundle cache and single file restores against the fake Cloud Files service
+"""
+import hashlib
+import io
+import os
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cloudbackup.cloud.bundle_cache import BundleCache
+from cloudbackup.cloud.bundles import BundleFetcher, bundle_path
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+
+class BundlesTestCase(CloudFilesTestCase):
+    """
+    Stores bundles of random data in the vault
+    """
+
+    uripath = 'agent'
+
+    def add_bundles(self, count, size):
+        self.bundle_data = {}
+        bundles = []
+        for bundle_id in range(1, count + 1):
+            data = os.urandom(size)
+            self.server.files.AddObject(self.container, '{0:}/BUNDLES/{1:010}'.format(self.uripath, bundle_id), data)
+            self.bundle_data[bundle_id] = data
+            bundles.append({'id': bundle_id, 'md5': hashlib.md5(data).hexdigest()})
+        return bundles
+
+    def fetcher(self, name='restore', **kwargs):
+        return BundleFetcher(self.files, self.uri, self.uripath, self.path(name), **kwargs)
+
+    def assertBundlesOnDisk(self, bundles, name='restore'):
+        for bundle in bundles:
+            with open(bundle_path(self.path(name), bundle), 'rb') as bundle_file:
+                self.assertEqual(bundle_file.read(), self.bundle_data[bundle['id']])
+
+
+class TestBundleFetcher(BundlesTestCase):
+
+    def test_fetch(self):
+        bundles = self.add_bundles(6, 100 * 1000)
+        result = self.fetcher(workers=3).Fetch(bundles)
+        self.assertEqual(len(result['downloaded']), 6)
+        self.assertEqual(result['bytes'], 6 * 100 * 1000)
+        self.assertBundlesOnDisk(bundles)
+
+    def test_skips_bundles_on_disk(self):
+        bundles = self.add_bundles(4, 100 * 1000)
+        self.fetcher().Fetch(bundles[:2])
+        requests = self.server.behavior.Statistics['requests']
+        result = self.fetcher().Fetch(bundles)
+        self.assertEqual(len(result['skipped']), 2)
+        self.assertEqual(len(result['downloaded']), 2)
+        self.assertEqual(self.server.behavior.Statistics['requests'] - requests, 2)
+        self.assertBundlesOnDisk(bundles)
+
+    @mock.patch('time.sleep')
+    def test_failures(self, sleep):
+        bundles = self.add_bundles(4, 100 * 1000)
+        bundles[1]['md5'] = '0' * 32
+        self.server.behavior.FailNext(500, count=2, method='GET', path='BUNDLES/0000000003$')
+        self.server.behavior.DropNext(count=1, method='GET', path='BUNDLES/0000000004$', after=1000)
+        result = self.fetcher(retries=2).Fetch(bundles)
+        self.assertEqual([bundle['id'] for bundle, error in result['failed']], [2])
+        self.assertEqual(len(result['downloaded']), 3)
+        self.assertBundlesOnDisk(bundles[2:])
+
+
+class TestBundleCache(BundlesTestCase):
+
+    def setUp(self):
+        super(TestBundleCache, self).setUp()
+        self.cache = BundleCache(self.path('cache'), max_bytes=5 * 100 * 1000)
+        self.files.BundleCache = self.cache
+
+    def test_served_from_cache(self):
+        bundles = self.add_bundles(4, 100 * 1000)
+        self.fetcher('first').Fetch(bundles)
+        self.assertEqual(self.cache.Statistics['stored'], 4)
+
+        requests = self.server.behavior.Statistics['requests']
+        result = self.fetcher('second').Fetch(bundles)
+        self.assertEqual(len(result['downloaded']), 4)
+        self.assertEqual(self.server.behavior.Statistics['requests'], requests)
+        self.assertEqual(self.cache.Statistics['hits'], 4)
+        self.assertEqual(self.cache.Statistics['bytes-saved'], 4 * 100 * 1000)
+        self.assertBundlesOnDisk(bundles, 'second')
+
+    def test_eviction(self):
+        bundles = self.add_bundles(8, 100 * 1000)
+        self.fetcher(workers=1).Fetch(bundles)
+        self.assertLessEqual(self.cache.Evict(), 5 * 100 * 1000)
+        self.assertEqual(self.cache.Statistics['evictions'], 3)
+
+    def test_corrupt_entry(self):
+        bundles = self.add_bundles(1, 100 * 1000)
+        self.fetcher('first').Fetch(bundles)
+        entries = [os.path.join(directory, name) for directory, _, names in os.walk(self.cache.path)
+                   for name in names if not name.startswith('.')]
+        self.assertEqual(len(entries), 1)
+        with open(entries[0], 'r+b') as cached:
+            cached.write(b'corrupt')
+
+        requests = self.server.behavior.Statistics['requests']
+        self.fetcher('second').Fetch(bundles)
+        self.assertEqual(self.server.behavior.Statistics['requests'] - requests, 1)
+        self.assertEqual(self.cache.Statistics['corrupt'], 1)
+        self.assertBundlesOnDisk(bundles, 'second')
+
+
+class FakeVaultDb(object):
+    """
+    Answers GetFileBlocks() like cloudbackup.database.sqlite.CloudBackupSqlite for a single file
+    """
+
+    def __init__(self, blocks):
+        self.blocks = dict(enumerate(blocks))
+
+    def GetFileBlocks(self, fileid):
+        return {
+            'blocks': self.blocks,
+            'bundles': set(block['bundle']['id'] for block in self.blocks.values())
+        }
+
+
+class TestFileBlocks(BundlesTestCase):
+
+    # (bundle id, offset, size) of the blocks of the file, in order
+    layout = ((2, 1000, 4096), (2, 5096, 4096), (1, 0, 100), (3, 200000, 65536), (2, 9192, 10), (1, 0, 100),
+              (3, 100, 5000))
+
+    def setUp(self):
+        super(TestFileBlocks, self).setUp()
+        self.add_bundles(3, 300 * 1000)
+        blocks = []
+        self.expected = b''
+        for block_id, (bundle_id, offset, size) in enumerate(self.layout):
+            data = self.bundle_data[bundle_id][offset:offset + size]
+            blocks.append({
+                'id': block_id,
+                'sha1': hashlib.sha1(data).hexdigest().upper(),
+                'size': size,
+                'bundle': {'id': bundle_id, 'offset': offset}
+            })
+            self.expected += data
+        self.database = FakeVaultDb(blocks)
+
+    def restore(self, **kwargs):
+        output = io.BytesIO()
+        result = self.files.DownloadFileBlocks(self.uri, self.uripath, self.database, 1, output, **kwargs)
+        self.assertEqual(output.getvalue(), self.expected)
+        return result
+
+    def test_restore(self):
+        result = self.restore()
+        self.assertEqual(result['bytes'], len(self.expected))
+        self.assertEqual(result['bundles'], 3)
+        # one multi-range request per bundle
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['sha1'], hashlib.sha1(self.expected).hexdigest().upper())
+
+    def test_small_window(self):
+        result = self.restore(window_size=5000, max_ranges=1, workers=2)
+        self.assertGreater(result['requests'], 3)
+
+    @mock.patch('time.sleep')
+    def test_retried_requests(self, sleep):
+        self.server.behavior.FailNext(503, count=1, method='GET', path='BUNDLES/0000000003$', retry_after=0)
+        self.server.behavior.DropNext(count=1, method='GET', path='BUNDLES/0000000002$', after=100)
+        self.restore()
+
+    @mock.patch('time.sleep')
+    def test_corrupt_block(self, sleep):
+        self.database.blocks[3] = dict(self.database.blocks[3], sha1='0' * 40)
+        self.assertRaises(UserWarning, self.files.DownloadFileBlocks, self.uri, self.uripath, self.database, 1,
+                          io.BytesIO(), retries=1)
@@ -0,0 +1,128 @@
+"""
+Rackspace Cloud Backup API
+The response cache, its revalidation and its use by the API objects
+"""
+import unittest
+
+from cloudbackup.client.agents import Agents
+from cloudbackup.client.auth import Authentication
+from cloudbackup.common.cache import ResponseCache
+from cloudbackup.tests.services.server import FakeCloudServer
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+
+class FakeResponse(object):
+
+    def __init__(self, headers=None, content=b'{}'):
+        self.status_code = 200
+        self.reason = 'OK'
+        self.headers = headers or {}
+        self.content = content
+        self.encoding = 'utf-8'
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_not_stored_without_validators(self):
+        cache = ResponseCache(ttl=0.0)
+        self.assertIsNone(cache.store('key', FakeResponse()))
+        self.assertIsNone(cache.lookup('key'))
+        self.assertIsNotNone(ResponseCache(ttl=10.0).store('key', FakeResponse()))
+
+    def test_conditional_headers(self):
+        entry = ResponseCache().store('key', FakeResponse({'ETag': '"abc"', 'Last-Modified': 'yesterday'}))
+        self.assertEqual(ResponseCache.ConditionalHeaders(entry),
+                         {'If-None-Match': '"abc"', 'If-Modified-Since': 'yesterday'})
+
+    def test_freshness(self):
+        cache = ResponseCache(ttl=10.0)
+        entry = cache.store('key', FakeResponse())
+        self.assertTrue(cache.IsFresh(entry))
+        entry.stored_at -= 11.0
+        self.assertFalse(cache.IsFresh(entry))
+        cache.touch(entry)
+        self.assertTrue(cache.IsFresh(entry))
+
+    def test_least_recently_used_evicted(self):
+        cache = ResponseCache(max_entries=2, ttl=10.0)
+        cache.store('a', FakeResponse())
+        cache.store('b', FakeResponse())
+        cache.lookup('a')
+        cache.store('c', FakeResponse())
+        self.assertIsNone(cache.lookup('b'))
+        self.assertIsNotNone(cache.lookup('a'))
+        self.assertEqual(cache.Statistics['evictions'], 1)
+
+
+class TestCachedGet(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestCachedGet, self).setUp()
+        self.server.files.AddObject(self.container, 'object', b'version 1')
+        self.object_uri = 'http://{0:}/object'.format(self.uri)
+
+    def cached_get(self, cache):
+        return self.files.CachedGet(self.object_uri, {'X-Auth-Token': self.files.authenticator.AuthToken},
+                                    cache=cache)
+
+    def test_revalidated(self):
+        cache = ResponseCache(ttl=0.0)
+        self.assertEqual(self.cached_get(cache).content, b'version 1')
+        requests = self.server.behavior.Statistics['requests']
+        self.assertEqual(self.cached_get(cache).content, b'version 1')
+        self.assertEqual(self.server.behavior.Statistics['requests'] - requests, 1)
+        self.assertEqual(cache.Statistics['revalidated'], 1)
+
+        self.server.files.AddObject(self.container, 'object', b'version 2')
+        self.assertEqual(self.cached_get(cache).content, b'version 2')
+        self.assertEqual(cache.Statistics['misses'], 2)
+
+    def test_fresh_entry(self):
+        cache = ResponseCache(ttl=60.0)
+        self.cached_get(cache)
+        requests = self.server.behavior.Statistics['requests']
+        self.assertEqual(self.cached_get(cache).content, b'version 1')
+        self.assertEqual(self.server.behavior.Statistics['requests'], requests)
+        self.assertEqual(cache.Statistics['hits'], 1)
+
+    def test_error_invalidates(self):
+        cache = ResponseCache(ttl=0.0)
+        self.cached_get(cache)
+        self.server.behavior.FailNext(404, count=1, method='GET', path='object$')
+        self.assertEqual(self.cached_get(cache).status_code, 404)
+        self.assertEqual(cache.Statistics['entries'], 0)
+
+
+class TestAgentsCaches(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCloudServer(agents=1)
+        self.server.Start()
+        auth = self.server.Attach(Authentication('user', 'key'))
+        self.agents = self.server.Attach(Agents(False, auth, self.server.Host, 2, self.server.ProjectId))
+        self.agents.ResponseCache = ResponseCache(ttl=60.0)
+        self.agent_id = self.server.backup.AgentIds()[0]
+        # authenticate first so that only the API requests are counted
+        auth.AuthToken
+
+    def tearDown(self):
+        self.server.Stop()
+
+    def requests(self):
+        return self.server.behavior.Statistics['requests']
+
+    def test_agent_details_not_cached(self):
+        # the details carry the live status of the agent that callers poll for
+        for name in ('first', 'second'):
+            self.server.backup.agents[self.agent_id]['name'] = name
+            requests = self.requests()
+            self.assertTrue(self.agents.GetAgentDetails(self.agent_id))
+            self.assertEqual(self.requests() - requests, 1)
+            self.assertEqual(self.agents.AgentDetails(self.agent_id).MachineName, name)
+
+    def test_agent_details_cache_opt_in(self):
+        self.agents.AgentDetailsCache = ResponseCache(ttl=60.0)
+        self.agents.GetAgentDetails(self.agent_id)
+        requests = self.requests()
+        self.agents.GetAgentDetails(self.agent_id)
+        self.assertEqual(self.requests(), requests)
@@ -0,0 +1,366 @@
+"""
+Rackspace Cloud Backup API
+Cloud Files transfers against the fake Cloud Files service
+"""
+import gzip
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cloudbackup.client.auth import Authentication
+from cloudbackup.cloud.files import CloudFiles
+from cloudbackup.cloud.ranges import DownloadCheckpoint
+from cloudbackup.common.ratelimit import RateLimiter
+from cloudbackup.tests.services.server import FakeCloudServer
+
+
+def gzip_data(data):
+    output = io.BytesIO()
+    with gzip.GzipFile(fileobj=output, mode='wb') as compressed:
+        compressed.write(data)
+    return output.getvalue()
+
+
+class CloudFilesTestCase(unittest.TestCase):
+    """
+    Runs each test with a FakeCloudServer, a CloudFiles object using it and a temporary directory
+    """
+
+    container = 'vault'
+
+    def setUp(self):
+        self.server = FakeCloudServer()
+        self.server.Start()
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        auth = self.server.Attach(Authentication('user', 'key'))
+        self.files = self.server.Attach(CloudFiles(False, auth))
+        self.files.RateLimiter = RateLimiter(read_rate=None, write_rate=None)
+        self.server.files.CreateContainer(self.container)
+        self.uri = self.server.files.ContainerUri(self.container)
+
+    def tearDown(self):
+        self.server.Stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write_file(self, name, data):
+        path = self.path(name)
+        with open(path, 'wb') as output:
+            output.write(data)
+        return path
+
+    def wrap_handler(self, handler, wrapper):
+        """
+        Replace a request handler of the fake Cloud Files service by wrapper(handler)
+        """
+        routes = self.server.files.routes
+        for index, (method, pattern, route_handler, authenticated) in enumerate(routes):
+            if route_handler == handler:
+                routes[index] = (method, pattern, wrapper(route_handler), authenticated)
+
+
+class TestStreamingUpload(CloudFilesTestCase):
+
+    def decompressed(self, name):
+        return gzip.GzipFile(fileobj=io.BytesIO(self.server.files.GetObject(self.container, name))).read()
+
+    def test_single_object(self):
+        data = os.urandom(256 * 1024)
+        vaultdb = {'name': 'agent/DB/0000000001'}
+        self.assertTrue(self.files.UploadVaultDb(self.uri, vaultdb, self.write_file('db', data),
+                                                 skip_md5_check=True, streaming=True))
+        self.assertEqual(self.decompressed(vaultdb['name']), data)
+        self.assertNotIn('upload-large-file', vaultdb)
+
+    def test_several_segments(self):
+        # the end of the file is reached while an earlier segment is produced
+        for size, segment_size in ((600 * 1000, 100 * 1000), (3 * 1024 * 1024, 1024 * 1024)):
+            data = os.urandom(size)
+            vaultdb = {'name': 'agent/DB/{0:010}'.format(size)}
+            self.assertTrue(self.files.UploadVaultDb(self.uri, vaultdb, self.write_file('db', data),
+                                                     skip_md5_check=True, streaming=True,
+                                                     segment_threshold=segment_size, segment_size=segment_size))
+            self.assertEqual(self.decompressed(vaultdb['name']), data)
+            self.assertGreater(len(vaultdb['upload-large-file']['hashes']), 1)
+
+    def test_retried_segment(self):
+        data = os.urandom(300 * 1000)
+        vaultdb = {'name': 'agent/DB/0000000002'}
+        self.server.behavior.FailNext(503, count=1, method='PUT', path='segments', retry_after=0)
+        self.assertTrue(self.files.UploadVaultDb(self.uri, vaultdb, self.write_file('db', data),
+                                                 skip_md5_check=True, streaming=True,
+                                                 segment_threshold=100 * 1000, segment_size=100 * 1000))
+        self.assertEqual(self.decompressed(vaultdb['name']), data)
+        self.assertEqual(self.server.behavior.Statistics['errors-injected'], 1)
+
+
+class TestSegmentedUpload(CloudFilesTestCase):
+
+    def test_static_large_object(self):
+        data = os.urandom(350 * 1000)
+        result = self.files.UploadSegmentedObject(self.uri, 'object', self.write_file('object', data),
+                                                  segment_size=100 * 1000)
+        self.assertEqual(len(result['segments']), 4)
+        self.assertEqual(self.server.files.GetObject(self.container, 'object'), data)
+        self.assertFalse(os.path.exists(self.path('object.upload-checkpoint')))
+
+    def test_resumed_upload(self):
+        data = os.urandom(350 * 1000)
+        path = self.write_file('object', data)
+        self.server.behavior.FailNext(500, count=10, method='PUT', path='00000002$')
+        with mock.patch('time.sleep'):
+            self.assertRaises(UserWarning, self.files.UploadSegmentedObject, self.uri, 'object', path,
+                              segment_size=100 * 1000, segment_retries=0)
+        self.assertTrue(os.path.exists(path + '.upload-checkpoint'))
+
+        self.server.behavior.faults = []
+        requests = self.server.behavior.Statistics['requests']
+        self.files.UploadSegmentedObject(self.uri, 'object', path, segment_size=100 * 1000)
+        self.assertEqual(self.server.files.GetObject(self.container, 'object'), data)
+        # only the failed segment and the manifest are sent again
+        self.assertLess(self.server.behavior.Statistics['requests'] - requests, 4)
+
+    def test_vaultdb(self):
+        data = os.urandom(300 * 1000)
+        vaultdb = {'name': 'agent/DB/0000000003'}
+        self.assertTrue(self.files.UploadVaultDb(self.uri, vaultdb, self.write_file('db', data),
+                                                 skip_md5_check=True, compress=False,
+                                                 segment_threshold=100 * 1000, segment_size=100 * 1000))
+        self.assertEqual(self.server.files.GetObject(self.container, vaultdb['name']), data)
+        self.assertEqual(len(vaultdb['upload-large-file']['hashes']), 3)
+
+
+class TestRangedDownload(CloudFilesTestCase):
+
+    def test_ranges(self):
+        data = os.urandom(550 * 1000)
+        self.server.files.AddObject(self.container, 'object', data)
+        self.server.behavior.FailNext(503, count=2, method='GET', path='object$', retry_after=0)
+        result = self.files.DownloadObjectRanges(self.uri, 'object', self.path('object'), workers=4,
+                                                 range_size=100 * 1000)
+        with open(self.path('object'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), data)
+        self.assertEqual(result['md5'], hashlib.md5(data).hexdigest())
+        self.assertEqual(result['sha1'], hashlib.sha1(data).hexdigest())
+
+    def test_vaultdb(self):
+        data = os.urandom(256 * 1024) * 2
+        self.server.files.AddObject(self.container, 'db', gzip_data(data))
+        vaultdb = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, vaultdb, self.path('db'), workers=4, range_size=100 * 1000)
+        with open(self.path('db'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), data)
+        self.assertEqual(vaultdb['md5'].lower(), hashlib.md5(data).hexdigest())
+
+
+class TestVaultDbDiscovery(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestVaultDbDiscovery, self).setUp()
+        self.server.files.Populate(self.container, 3, 10, prefix='agent/DB/')
+        self.server.files.Populate(self.container, 20, 10, prefix='agent/BUNDLES/')
+        self.server.files.Populate(self.container, 3, 10, prefix='other/DB/')
+        # authenticate first so that only the listings are counted
+        self.files.authenticator.AuthToken
+
+    @property
+    def requests(self):
+        return self.server.behavior.Statistics['requests']
+
+    def names(self, **kwargs):
+        return [entry['name'] for entry in self.files.ListObjects(self.uri, **kwargs)]
+
+    def test_list_objects(self):
+        bundles = ['agent/BUNDLES/{0:010}'.format(ordinal) for ordinal in range(20)]
+        self.assertEqual(self.names(prefix='agent/BUNDLES/', page_size=3), bundles)
+        self.assertEqual(self.names(prefix='agent/BUNDLES/', page_size=3, reverse=True), bundles[::-1])
+        self.assertEqual(self.names(prefix='agent/BUNDLES/', marker=bundles[14], end_marker=bundles[17]),
+                         bundles[15:17])
+        self.assertEqual(self.names(prefix='missing/'), [])
+
+    def test_newest_snapshot(self):
+        requests = self.requests
+        vaultdb = self.files.GetActiveDB(self.uri, 'agent', cached=False)
+        self.assertEqual(vaultdb['name'], 'agent/DB/0000000002')
+        self.assertEqual(vaultdb['dbsnapshotid'], 2)
+        self.assertEqual(vaultdb['hash'], vaultdb['cf-hash'].upper())
+        # the newest VaultDB is first in the reverse listing
+        self.assertEqual(self.requests - requests, 1)
+
+    def test_reverse_not_supported(self):
+        self.wrap_handler(self.server.files.list_objects, ignore_reverse)
+        self.assertEqual(self.files.GetActiveDB(self.uri, 'agent', cached=False)['dbsnapshotid'], 2)
+
+    def test_no_snapshot(self):
+        self.assertRaises(UserWarning, self.files.GetActiveDB, self.uri, 'missing')
+
+    def test_snapshot(self):
+        self.server.files.AddObject(self.container, 'agent/DB/0000000001.tmp', b'not a VaultDB')
+        self.assertEqual(self.files.GetActiveDB(self.uri, 'agent', snapshot=1)['name'], 'agent/DB/0000000001')
+        # falls back to the newest VaultDB
+        self.assertEqual(self.files.GetActiveDB(self.uri, 'agent', snapshot=7)['dbsnapshotid'], 2)
+
+    def test_listing_cache(self):
+        self.files.GetActiveDB(self.uri, 'agent')
+        requests = self.requests
+        self.files.GetActiveDB(self.uri, 'agent')
+        self.assertEqual(self.requests, requests)
+        self.files.GetActiveDB(self.uri, 'agent', cached=False)
+        self.assertEqual(self.requests, requests + 1)
+
+
+class TestWaitForActiveDb(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestWaitForActiveDb, self).setUp()
+        self.server.files.Populate(self.container, 3, 10, prefix='agent/DB/')
+
+    def test_same_as_listing(self):
+        head = self.files.WaitForActiveDb(self.uri, 'agent', 2, 1000)
+        listed = self.files.WaitForActiveDb(self.uri, 'agent', 2, 1000, useHead=False)
+        self.assertEqual(head, listed)
+
+    def test_backoff(self):
+        delays = []
+
+        def sleep(seconds):
+            delays.append(seconds)
+            if len(delays) == 5:
+                self.server.files.AddObject(self.container, 'agent/DB/0000000003', b'vaultdb')
+
+        with mock.patch('time.sleep', side_effect=sleep):
+            vaultdb = self.files.WaitForActiveDb(self.uri, 'agent', 3, 60 * 1000,
+                                                 pollMilliseconds=250, maxPollMilliseconds=2000)
+        self.assertEqual(vaultdb['bytes'], len(b'vaultdb'))
+        self.assertEqual(delays, [0.25, 0.5, 1.0, 2.0, 2.0])
+
+    def test_timeout(self):
+        started = time.time()
+        self.assertRaises(RuntimeError, self.files.WaitForActiveDb, self.uri, 'agent', 3, 300, pollMilliseconds=50)
+        # never sleeps past the timeout
+        self.assertLess(time.time() - started, 1.0)
+
+    def test_invalid_snapshot(self):
+        self.assertRaises(RuntimeError, self.files.WaitForActiveDb, self.uri, 'agent', -1, 1000)
+
+
+class TestStreamingDownload(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestStreamingDownload, self).setUp()
+        self.data = os.urandom(300 * 1000)
+        self.compressed = gzip_data(self.data)
+        self.server.files.AddObject(self.container, 'db', self.compressed)
+
+    def test_same_hashes(self):
+        streamed = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, streamed, self.path('streamed'), streaming=True)
+        with open(self.path('streamed'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.data)
+        self.assertFalse(os.path.exists(self.path('streamed.gz')))
+
+        two_step = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, two_step, self.path('two-step'))
+        for key in ('md5', 'sha1', 'compressed-md5', 'compressed-sha1'):
+            self.assertEqual(streamed[key], two_step[key])
+        self.assertEqual(streamed['md5'], hashlib.md5(self.data).hexdigest().upper())
+
+    def test_keep_gz(self):
+        self.files.DownloadVaultDb(self.uri, {'name': 'db'}, self.path('db'), streaming=True, keep_gz=True)
+        with open(self.path('db.gz'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), self.compressed)
+
+    def test_missing(self):
+        self.assertRaises(UserWarning, self.files.DownloadVaultDb, self.uri, {'name': 'missing'}, self.path('db'),
+                          streaming=True)
+
+
+class TestResumableDownload(CloudFilesTestCase):
+    # the data is received in chunks of 1MB, so the connection is dropped after a few of them
+
+    @mock.patch('time.sleep')
+    def test_dropped_connection(self, sleep):
+        data = os.urandom(3 * 1024 * 1024)
+        self.server.files.AddObject(self.container, 'db', gzip_data(data))
+        self.server.behavior.DropNext(count=1, method='GET', path='db$', after=2 * 1024 * 1024)
+        vaultdb = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, vaultdb, self.path('db'), resume=True)
+        with open(self.path('db'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), data)
+        self.assertEqual(self.server.behavior.Statistics['connections-dropped'], 1)
+
+    @mock.patch('time.sleep')
+    def test_resumed_on_next_call(self, sleep):
+        data = os.urandom(3 * 1024 * 1024)
+        self.server.files.AddObject(self.container, 'db', gzip_data(data))
+        self.server.behavior.DropNext(count=1, method='GET', path='db$', after=2 * 1024 * 1024)
+        self.assertRaises(UserWarning, self.files.DownloadVaultDb, self.uri, {'name': 'db'}, self.path('db'),
+                          resume=True, range_retries=0)
+        self.assertTrue(os.path.exists(self.path('db.gz.download-checkpoint')))
+
+        vaultdb = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, vaultdb, self.path('db'), resume=True)
+        with open(self.path('db'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), data)
+        self.assertFalse(os.path.exists(self.path('db.gz.download-checkpoint')))
+
+    def test_large_object_received_before_checkpoint_removed(self):
+        # the ETag of the manifest is not the MD5 of the data
+        compressed = gzip_data(os.urandom(300 * 1000))
+        self.files.UploadSegmentedObject(self.uri, 'db', self.write_file('upload', compressed), segment_size=100 * 1000)
+        self.write_file('db.gz', compressed)
+        checkpoint = DownloadCheckpoint(self.path('db.gz.download-checkpoint'), {'object': self.uri + '/db'})
+        etag = self.server.files.containers[self.container]['db'].etag
+        checkpoint.Save(etag, len(compressed), len(compressed), large_object=True)
+
+        vaultdb = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, vaultdb, self.path('db'), resume=True)
+        self.assertEqual(vaultdb['compressed-md5'].lower(), hashlib.md5(compressed).hexdigest())
+        self.assertFalse(os.path.exists(self.path('db.gz.download-checkpoint')))
+
+    @mock.patch('time.sleep')
+    def test_unknown_object_size(self, sleep):
+        data = os.urandom(3 * 1024 * 1024)
+        self.server.files.AddObject(self.container, 'db', gzip_data(data))
+        self.wrap_handler(self.server.files.get_object, unknown_size)
+        self.server.behavior.DropNext(count=1, method='GET', path='db$', after=2 * 1024 * 1024)
+        vaultdb = {'name': 'db'}
+        self.files.DownloadVaultDb(self.uri, vaultdb, self.path('db'), resume=True)
+        with open(self.path('db'), 'rb') as downloaded:
+            self.assertEqual(downloaded.read(), data)
+
+
+def ignore_reverse(handler):
+    """
+    Wrap the handler of the object listings to ignore reverse, as older Cloud Files versions do
+    """
+    def list_objects(request, *args):
+        request.query.pop('reverse', None)
+        return handler(request, *args)
+    return list_objects
+
+
+def unknown_size(handler):
+    """
+    Wrap the handler of the object GETs to send 206 responses whose Content-Range has no complete length
+    """
+    def get_object(request, *args):
+        response = handler(request, *args)
+        if response.status_code == 200:
+            response.status_code = 206
+            response.headers['Content-Range'] = 'bytes 0-{0:}/{1:}'.format(len(response.body) - 1, len(response.body))
+        if response.status_code == 206:
+            response.headers['Content-Range'] = response.headers['Content-Range'].rsplit('/', 1)[0] + '/*'
+        return response
+    return get_object
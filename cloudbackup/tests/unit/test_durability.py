@@ -0,0 +1,136 @@
+"""
+Rackspace Cloud Backup API
+The durability of downloaded files and the write-behind file writer
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cloudbackup.common.durability import MB, DurableFileWriter, Durability, configure_durability, get_durability
+
+
+class RecordingFile(object):
+    """
+    Wraps a file object, recording the size of each write
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(len(data))
+        return self.fileobj.write(data)
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    @property
+    def closed(self):
+        return self.fileobj.closed
+
+    def close(self):
+        self.fileobj.close()
+
+
+class TestDurability(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(Durability.Parse('none').mode, Durability.NONE)
+        self.assertEqual(Durability.Parse(' END ').mode, Durability.END)
+        durability = Durability.Parse('16')
+        self.assertEqual((durability.mode, durability.interval), (Durability.INTERVAL, 16 * MB))
+        self.assertRaises(ValueError, Durability.Parse, 'often')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, Durability, 'always')
+        self.assertRaises(ValueError, Durability, Durability.INTERVAL, 0)
+
+    def test_shared(self):
+        previous = get_durability()
+        try:
+            durability = Durability(Durability.NONE)
+            self.assertIs(configure_durability(durability), durability)
+            self.assertIs(get_durability(), durability)
+        finally:
+            configure_durability(previous)
+
+
+class TestDurableFileWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        self.path = os.path.join(self.directory, 'download')
+        patcher = mock.patch('os.fsync')
+        self.fsync = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def content(self):
+        with open(self.path, 'rb') as written:
+            return written.read()
+
+    def write(self, data, chunk_size=1000, **kwargs):
+        writer = DurableFileWriter(self.path, **kwargs)
+        writer.fileobj = RecordingFile(writer.fileobj)
+        with writer:
+            for offset in range(0, len(data), chunk_size):
+                writer.write(data[offset:offset + chunk_size])
+        return writer.fileobj.writes
+
+    def test_aligned_blocks(self):
+        data = os.urandom(10 * 1000)
+        for write_behind in (True, False):
+            writes = self.write(data, durability=Durability(Durability.NONE), buffer_size=3000, alignment=1024,
+                                write_behind=write_behind)
+            self.assertEqual(self.content(), data)
+            self.assertEqual(sum(writes), len(data))
+            # all the blocks but the last are aligned, and there are fewer of them than chunks written
+            self.assertTrue(all(size % 1024 == 0 for size in writes[:-1]))
+            self.assertLess(len(writes), 10)
+
+    def test_modes(self):
+        data = os.urandom(10 * 1000)
+        expected = ((Durability(Durability.NONE), 0),
+                    (Durability(Durability.END), 1),
+                    (Durability(Durability.INTERVAL, 4096), 3))
+        for durability, fsync_count in expected:
+            self.fsync.reset_mock()
+            self.write(data, durability=durability, buffer_size=2048, alignment=1024)
+            self.assertEqual(self.fsync.call_count, fsync_count, durability)
+
+    def test_flush(self):
+        with DurableFileWriter(self.path, Durability(Durability.END)) as writer:
+            writer.write(b'checkpointed')
+            writer.Flush()
+            self.assertEqual(self.content(), b'checkpointed')
+            self.assertEqual(self.fsync.call_count, 1)
+        self.assertRaises(ValueError, writer.write, b'closed')
+
+    def test_append(self):
+        with open(self.path, 'wb') as existing:
+            existing.write(b'received ')
+        with DurableFileWriter(self.path, Durability(Durability.NONE), append=True) as writer:
+            writer.write(b'resumed')
+        self.assertEqual(self.content(), b'received resumed')
+
+    def test_background_error(self):
+        writer = DurableFileWriter(self.path, Durability(Durability.NONE), buffer_size=1024, alignment=1024)
+        writer.fileobj = RecordingFile(writer.fileobj)
+
+        def fail(data):
+            raise IOError('disk full')
+
+        writer.fileobj.write = fail
+        writer.write(b'x' * 1024)
+        # reported by a later call on the caller's thread
+        self.assertRaises(IOError, writer.close)
+        self.assertTrue(writer.closed)
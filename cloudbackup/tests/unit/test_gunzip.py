@@ -0,0 +1,72 @@
+"""
+Rackspace Cloud Backup API
+Decompression of gzip streams as they are received
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+from cloudbackup.common.durability import Durability
+from cloudbackup.tests.unit.test_cloud_files import gzip_data
+from cloudbackup.utils.gunzip import GunzipWriter
+
+
+class TestGunzipWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        self.path = os.path.join(self.directory, 'db')
+        self.gzip_path = os.path.join(self.directory, 'db.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def content(self, path):
+        with open(path, 'rb') as written:
+            return written.read()
+
+    def decompress(self, compressed, chunk_size=1000, gzip_path=None):
+        with GunzipWriter(self.path, gzip_path, Durability(Durability.NONE)) as writer:
+            for offset in range(0, len(compressed), chunk_size):
+                writer.Write(compressed[offset:offset + chunk_size])
+        return writer
+
+    def test_chunks(self):
+        data = os.urandom(100 * 1000)
+        compressed = gzip_data(data)
+        for chunk_size in (1, 17, 64 * 1024):
+            writer = self.decompress(compressed, chunk_size)
+            self.assertEqual(self.content(self.path), data)
+            self.assertEqual(writer.bytes, len(data))
+            self.assertEqual(writer.compressed_bytes, len(compressed))
+
+    def test_digests(self):
+        data = os.urandom(10 * 1000)
+        compressed = gzip_data(data)
+        self.assertEqual(self.decompress(compressed).Digests, {
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha1': hashlib.sha1(data).hexdigest(),
+            'compressed-md5': hashlib.md5(compressed).hexdigest(),
+            'compressed-sha1': hashlib.sha1(compressed).hexdigest()
+        })
+
+    def test_keep_gzip(self):
+        compressed = gzip_data(b'vaultdb' * 1000)
+        self.decompress(compressed, gzip_path=self.gzip_path)
+        self.assertEqual(self.content(self.gzip_path), compressed)
+
+    def test_members(self):
+        # the member boundary falls inside a chunk
+        self.decompress(gzip_data(b'first ') + gzip_data(b'second'), chunk_size=7)
+        self.assertEqual(self.content(self.path), b'first second')
+
+    def test_truncated(self):
+        compressed = gzip_data(os.urandom(10 * 1000))
+        self.assertRaises(IOError, self.decompress, compressed[:-100])
+        self.assertRaises(IOError, self.decompress, compressed[:-4])
+
+    def test_corrupt(self):
+        self.assertRaises(zlib.error, self.decompress, b'not gzip data')
@@ -0,0 +1,141 @@
+"""
+Rackspace Cloud Backup API
+Request metrics and the request hooks
+"""
+import io
+import os
+import socket
+import unittest
+
+from cloudbackup.common.metrics import Histogram, HistogramAggregator, body_size, template_endpoint
+from cloudbackup.common.transport import Transport, _timed_connection_class, connection_timings
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+
+class TestTemplateEndpoint(unittest.TestCase):
+
+    def test_api_paths(self):
+        self.assertEqual(template_endpoint('https://host/v2/123456/agents/42?marker=1'), '/v2/{project}/agents/{id}')
+        self.assertEqual(template_endpoint('https://host/v1.0/backup-configuration/42'), '/v1.0/backup-configuration/{id}')
+        self.assertEqual(template_endpoint('https://host/v2/123456/agents/8f1c2a6e-1b2c-4d3e-8f9a-0b1c2d3e4f5a/events'),
+                         '/v2/{project}/agents/{id}/events')
+
+    def test_cloud_files_paths(self):
+        self.assertEqual(template_endpoint('https://host/v1/MossoCloudFS_123456/vault/BUNDLES/0000000001'),
+                         '/v1/{project}/vault/BUNDLES/{id}')
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value / 100.0)
+        summary = histogram.to_dict()
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['max'], 1.0)
+        # bounded by the growth of the buckets
+        self.assertAlmostEqual(summary['p50'], 0.5, delta=0.5 * 0.05)
+        self.assertAlmostEqual(summary['p99'], 0.99, delta=0.99 * 0.05)
+
+    def test_empty(self):
+        self.assertIsNone(Histogram().percentile(50))
+
+
+class TestBodySize(unittest.TestCase):
+
+    def test_sizes(self):
+        self.assertEqual(body_size(None), 0)
+        self.assertEqual(body_size(b'abc'), 3)
+        self.assertEqual(body_size(u'é'), 2)
+        body = io.BytesIO(b'0123456789')
+        body.seek(4)
+        self.assertEqual(body_size(body), 6)
+        self.assertEqual(body_size(iter([b'a', b'b'])), 0)
+
+
+class TestTimedConnection(unittest.TestCase):
+
+    def test_without_dns_host(self):
+        # urllib3 before 1.24 has no _dns_host
+        class Connection(object):
+            host = 'localhost'
+            port = 80
+
+            def _new_conn(self):
+                return self.host
+
+        connection_timings.reset()
+        self.assertEqual(_timed_connection_class(Connection)()._new_conn(), 'localhost')
+
+    def test_unresolvable_host(self):
+        class Connection(object):
+            host = 'host.invalid'
+            port = 80
+
+            def _new_conn(self):
+                raise socket.gaierror('unresolvable')
+
+        self.assertRaises(socket.gaierror, _timed_connection_class(Connection)()._new_conn)
+
+
+class TestRequestHooks(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestRequestHooks, self).setUp()
+        self.files.transport = Transport()
+        self.metrics = []
+        self.files.AddRequestHook(self.metrics.append)
+
+    def tearDown(self):
+        self.files.transport.close()
+        super(TestRequestHooks, self).tearDown()
+
+    def get_object(self):
+        return self.files.Request('GET', 'http://{0:}/object'.format(self.uri),
+                                  headers={'X-Auth-Token': self.files.authenticator.AuthToken})
+
+    def bytes_out(self, method, path):
+        return sum(metrics.bytes_out for metrics in self.metrics if metrics.method == method and path in metrics.uri)
+
+    def test_segment_bytes(self):
+        data = os.urandom(250 * 1000)
+        self.files.UploadSegmentedObject(self.uri, 'object', self.write_file('object', data), segment_size=100 * 1000)
+        self.assertEqual(self.bytes_out('PUT', '_segments/'), len(data))
+
+    def test_streamed_bytes(self):
+        data = os.urandom(250 * 1000)
+        vaultdb = {'name': 'agent/DB/0000000001'}
+        self.files.UploadVaultDb(self.uri, vaultdb, self.write_file('db', data), skip_md5_check=True, streaming=True)
+        self.assertEqual(self.bytes_out('PUT', vaultdb['name']),
+                         len(self.server.files.GetObject(self.container, vaultdb['name'])))
+
+    def test_status_and_retries(self):
+        self.server.files.AddObject(self.container, 'object', b'x' * 1000)
+        self.server.behavior.FailNext(503, count=2, method='GET', path='object$', retry_after=0)
+        self.get_object()
+        metrics = self.metrics[-1]
+        self.assertEqual(metrics.status_code, 200)
+        self.assertEqual(metrics.retries, 2)
+        self.assertEqual(metrics.bytes_in, 1000)
+        self.assertEqual(metrics.endpoint, '/v1/{project}/vault/object')
+
+    def test_connection_reused(self):
+        self.server.files.AddObject(self.container, 'object', b'x')
+        self.get_object()
+        self.get_object()
+        self.assertEqual(self.files.transport.Statistics['connections-created'], 1)
+        self.assertEqual(self.metrics[-1].dns_time, 0.0)
+        self.assertEqual(self.metrics[-1].connect_time, 0.0)
+
+    def test_aggregator(self):
+        aggregator = HistogramAggregator()
+        self.files.AddRequestHook(aggregator)
+        self.server.files.AddObject(self.container, 'object', b'x')
+        for _ in range(3):
+            self.get_object()
+        self.server.behavior.FailNext(404, count=1, method='GET', path='object$')
+        self.get_object()
+        endpoint = aggregator.to_dict()['GET /v1/{project}/vault/object']
+        self.assertEqual(endpoint['total-time']['count'], 4)
+        self.assertEqual(endpoint['errors'], 1)
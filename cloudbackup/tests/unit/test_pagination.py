@@ -0,0 +1,123 @@
+"""
+Rackspace Cloud Backup API
+Marker/limit pagination and the prefetching of the next page
+"""
+import time
+import unittest
+
+from cloudbackup.client.agents import Agents
+from cloudbackup.client.auth import Authentication
+from cloudbackup.client.backup import Backups
+from cloudbackup.common.pagination import iterate_items, iterate_pages, next_marker
+from cloudbackup.common.ratelimit import RateLimiter
+from cloudbackup.tests.services.server import FakeCloudServer
+
+
+class TestNextMarker(unittest.TestCase):
+
+    def test_links(self):
+        body = {'links': [{'rel': 'next', 'href': 'https://host/v2/123456/agents?marker=42&limit=2'}]}
+        self.assertEqual(next_marker(body, [{'id': 1}, {'id': 2}], 2), '42')
+        self.assertIsNone(next_marker({'links': []}, [{'id': 1}, {'id': 2}], 2))
+
+    def test_without_links(self):
+        self.assertEqual(next_marker({}, [{'id': 1}, {'id': 2}], 2), 2)
+        self.assertIsNone(next_marker({}, [{'id': 1}], 2))
+        self.assertIsNone(next_marker([], [], 2))
+
+
+def fetch_pages(pages, calls):
+    """
+    fetch_page callable serving pages, a list of item lists, with the marker being the page index
+    """
+    def fetch_page(marker):
+        index = 0 if marker is None else marker
+        calls.append(index)
+        return (pages[index], index + 1 if index + 1 < len(pages) else None)
+    return fetch_page
+
+
+class TestIteratePages(unittest.TestCase):
+
+    pages = [[1, 2], [3, 4], [5]]
+
+    def test_items(self):
+        self.assertEqual(list(iterate_items(fetch_pages(self.pages, []))), [1, 2, 3, 4, 5])
+        self.assertEqual(list(iterate_items(fetch_pages(self.pages, []), prefetch=False)), [1, 2, 3, 4, 5])
+        self.assertEqual(list(iterate_items(fetch_pages(self.pages, []), marker=1)), [3, 4, 5])
+
+    def test_prefetch(self):
+        calls = []
+        pages = iterate_pages(fetch_pages(self.pages, calls))
+        self.assertEqual(next(pages), [1, 2])
+        # the second page is retrieved while the first one is consumed
+        for _ in range(100):
+            if len(calls) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(calls, [0, 1])
+
+    def test_no_prefetch(self):
+        calls = []
+        pages = iterate_pages(fetch_pages(self.pages, calls), prefetch=False)
+        next(pages)
+        self.assertEqual(calls, [0])
+
+    def test_failed_page(self):
+        def fetch_page(marker):
+            if marker is not None:
+                raise RuntimeError('page {0:} failed'.format(marker))
+            return ([1], 'next')
+
+        items = iterate_items(fetch_page)
+        self.assertEqual(next(items), 1)
+        self.assertRaises(RuntimeError, next, items)
+
+
+class TestPaginatedListings(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeCloudServer(agents=7)
+        self.server.Start()
+        auth = self.server.Attach(Authentication('user', 'key'))
+        self.agents = self.server.Attach(Agents(False, auth, self.server.Host, 2, self.server.ProjectId))
+        self.backups = self.server.Attach(Backups(False, auth, self.server.Host, 2, self.server.ProjectId))
+        for command in (self.agents, self.backups):
+            command.RateLimiter = RateLimiter(read_rate=None, write_rate=None)
+        self.agent_id = self.server.backup.AgentIds()[0]
+        # authenticate first so that only the listings are timed
+        auth.AuthToken
+
+    def tearDown(self):
+        self.server.Stop()
+
+    def test_agents(self):
+        for prefetch in (True, False):
+            self.assertEqual(list(self.agents.IterAgentsFromApi(page_size=3, prefetch=prefetch)),
+                             self.server.backup.AgentIds())
+
+    def test_events_after_marker(self):
+        event_ids = [self.server.backup.AddEvent(self.agent_id, {'type': 'test'}) for _ in range(5)]
+        events = list(self.agents.IterAgentEvents(self.agent_id, last_event_id=event_ids[0], page_size=2))
+        self.assertEqual([event['id'] for event in events], event_ids[1:])
+
+    def test_completed_backups(self):
+        configuration_id = self.server.backup.AddConfiguration(self.agent_id)
+        backup_ids = [self.server.backup.AddBackup(configuration_id, started=time.time() - 86400) for _ in range(5)]
+        backups = list(self.backups.IterCompletedBackups(configuration_id, page_size=2))
+        self.assertEqual([backup['id'] for backup in backups], backup_ids)
+
+    def test_failed_page(self):
+        self.server.behavior.FailNext(404, count=2, method='GET', path='agents$')
+        self.assertRaises(RuntimeError, list, self.agents.IterAgentsFromApi(page_size=3))
+        self.assertEqual(self.agents.GetAgentsFromApi(), [])
+
+    def test_prefetched_concurrently(self):
+        self.server.behavior.latency = 0.3
+        started = time.time()
+        for index, _ in enumerate(self.agents.IterAgentsFromApi(page_size=3)):
+            if index % 3 == 0:
+                # consuming a page takes as long as retrieving one
+                time.sleep(0.3)
+        # 3 pages retrieved one after the other take 3 * (0.3 + 0.3) seconds
+        self.assertLess(time.time() - started, 1.5)
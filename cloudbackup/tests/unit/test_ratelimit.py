@@ -0,0 +1,121 @@
+"""
+Rackspace Cloud Backup API
+Client-side rate limiting
+"""
+import unittest
+
+from cloudbackup.common.ratelimit import RateLimiter, TokenBucket
+from cloudbackup.common.retry import RetryRule
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+URI = 'https://api.example.com/v2/123456/agents'
+HEADERS = {'X-Project-Id': '123456'}
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10.0, burst=2.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def limiter(self, **kwargs):
+        limiter = RateLimiter(**kwargs)
+        self.waits = []
+        limiter.sleep = self.waits.append
+        return limiter
+
+    def test_delays_beyond_burst(self):
+        limiter = self.limiter(write_rate=5.0, burst=1)
+        limiter.Acquire('POST', URI, HEADERS)
+        limiter.Acquire('POST', URI, HEADERS)
+        self.assertEqual(len(self.waits), 1)
+        self.assertAlmostEqual(self.waits[0], 0.2, delta=0.01)
+        self.assertEqual(limiter.Statistics['delayed'], 1)
+
+    def test_unlimited(self):
+        limiter = self.limiter(read_rate=None, write_rate=None)
+        for _ in range(100):
+            limiter.Acquire('GET', URI, HEADERS)
+        self.assertEqual(self.waits, [])
+        self.assertEqual(limiter.Rates, {})
+
+    def test_tenants_and_kinds(self):
+        limiter = self.limiter()
+        limiter.Acquire('GET', URI, HEADERS)
+        limiter.Acquire('PUT', URI, HEADERS)
+        limiter.Acquire('GET', URI, {'X-Project-Id': '654321'})
+        self.assertEqual(sorted(limiter.Rates), ['api.example.com 123456 read', 'api.example.com 123456 write',
+                                                 'api.example.com 654321 read'])
+
+    def test_throttling(self):
+        limiter = self.limiter(write_rate=4.0, min_rate=1.5, cooldown=0.0)
+        limiter.Feedback('PUT', URI, HEADERS, 429)
+        self.assertEqual(limiter.Rates['api.example.com 123456 write'], 2.0)
+        limiter.Feedback('PUT', URI, HEADERS, 413)
+        self.assertEqual(limiter.Rates['api.example.com 123456 write'], 1.5)
+        limiter.Feedback('PUT', URI, HEADERS, 201)
+        self.assertAlmostEqual(limiter.Rates['api.example.com 123456 write'], 1.6)
+        self.assertEqual(limiter.Statistics['throttled'], 2)
+
+    def test_cooldown(self):
+        limiter = self.limiter(write_rate=4.0, cooldown=60.0)
+        limiter.Feedback('PUT', URI, HEADERS, 429)
+        limiter.Feedback('PUT', URI, HEADERS, 429)
+        self.assertEqual(limiter.Rates['api.example.com 123456 write'], 2.0)
+
+    def test_forbidden_is_not_throttling(self):
+        limiter = self.limiter(write_rate=4.0, cooldown=0.0)
+        limiter.Feedback('POST', URI, HEADERS, 403)
+        self.assertEqual(limiter.Rates['api.example.com 123456 write'], 4.0)
+        self.assertEqual(limiter.Statistics['throttled'], 0)
+
+    def test_limit_after_throttling(self):
+        limiter = self.limiter(write_rate=4.0, burst=1, limit_after_throttling=True)
+        for _ in range(10):
+            limiter.Acquire('PUT', URI, HEADERS)
+            limiter.Feedback('PUT', URI, HEADERS, 201)
+        self.assertEqual(self.waits, [])
+        self.assertEqual(limiter.Rates, {})
+
+        limiter.Feedback('PUT', URI, HEADERS, 429)
+        self.assertEqual(limiter.Rates, {'api.example.com 123456 write': 2.0})
+        limiter.Acquire('PUT', URI, HEADERS)
+        limiter.Acquire('PUT', URI, HEADERS)
+        self.assertEqual(len(self.waits), 1)
+
+
+class TestRateLimitedRequests(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestRateLimitedRequests, self).setUp()
+        self.limiter = RateLimiter(read_rate=100.0, write_rate=100.0, cooldown=0.0,
+                                   throttle_status_codes=(403, 429))
+        self.files.RateLimiter = self.limiter
+        self.server.files.AddObject(self.container, 'object', b'x')
+
+    def get_object(self, **kwargs):
+        return self.files.Request('GET', 'http://{0:}/object'.format(self.uri),
+                                  headers={'X-Auth-Token': self.files.authenticator.AuthToken}, **kwargs)
+
+    def read_rate(self):
+        return [rate for key, rate in self.limiter.Rates.items() if key.endswith(' read')][0]
+
+    def test_throttled_response(self):
+        self.server.behavior.FailNext(429, count=1, method='GET', path='object$', retry_after=0)
+        self.assertEqual(self.get_object().status_code, 200)
+        self.assertEqual(self.limiter.Statistics['throttled'], 1)
+        self.assertLess(self.read_rate(), 100.0)
+
+    def test_status_retried_by_the_call(self):
+        # e.g. the 403 returned while an agent is not yet ready to start a backup
+        self.server.behavior.FailNext(403, count=3, method='GET', path='object$')
+        rules = {403: RetryRule(max_retries=5, backoff_base=0.0, backoff_max=0.0)}
+        self.assertEqual(self.get_object(retry_rules=rules).status_code, 200)
+        self.assertEqual(self.limiter.Statistics['throttled'], 0)
+        self.assertEqual(self.read_rate(), 100.0)
@@ -0,0 +1,124 @@
+"""
+Rackspace Cloud Backup API
+The retry policy, the retry budget and Retry-After support
+"""
+import email.utils
+import functools
+import time
+import unittest
+
+from cloudbackup.common.retry import RetryBudget, RetryPolicy, RetryRule, parse_retry_after
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+
+class FakeResponse(object):
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestParseRetryAfter(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+
+    def test_http_date(self):
+        now = time.time()
+        self.assertAlmostEqual(parse_retry_after(email.utils.formatdate(now + 30, usegmt=True), now=now), 30, delta=1)
+        self.assertEqual(parse_retry_after(email.utils.formatdate(now - 30, usegmt=True), now=now), 0.0)
+
+    def test_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class TestRetryBudget(unittest.TestCase):
+
+    def test_window(self):
+        budget = RetryBudget(max_retries=2, period=60.0)
+        self.assertTrue(budget.acquire())
+        self.assertTrue(budget.acquire())
+        self.assertFalse(budget.acquire())
+        # retries older than the period no longer count
+        budget.retries[0] -= 61.0
+        self.assertTrue(budget.acquire())
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def policy(self, **kwargs):
+        policy = RetryPolicy(**kwargs)
+        self.waits = []
+        policy.sleep = self.waits.append
+        return policy
+
+    def test_exponential_backoff(self):
+        policy = self.policy(rules={503: RetryRule(max_retries=5, backoff_base=1.0, backoff_max=5.0)}, jitter=False)
+        attempts = {}
+        delays = [policy.NextDelay(FakeResponse(503), attempts) for _ in range(6)]
+        self.assertEqual(delays, [1.0, 2.0, 4.0, 5.0, 5.0, None])
+        self.assertEqual(policy.Statistics['status-codes'], {503: 5})
+
+    def test_jitter(self):
+        policy = self.policy(rules={503: RetryRule(backoff_base=4.0, backoff_max=4.0)})
+        for _ in range(20):
+            self.assertTrue(0.0 <= policy.NextDelay(FakeResponse(503), {}) <= 4.0)
+
+    def test_retry_after(self):
+        policy = self.policy()
+        self.assertEqual(policy.NextDelay(FakeResponse(429, {'Retry-After': '7'}), {}), 7.0)
+        # bounded by the rule
+        self.assertEqual(policy.NextDelay(FakeResponse(429, {'Retry-After': '3600'}), {}), 60.0)
+        rule = RetryRule(backoff_base=1.0, honor_retry_after=False)
+        self.assertLessEqual(policy.NextDelay(FakeResponse(429, {'Retry-After': '7'}), {}, {429: rule}), 1.0)
+
+    def test_per_call_rules(self):
+        policy = self.policy()
+        self.assertIsNone(policy.NextDelay(FakeResponse(403), {}))
+        self.assertIsNotNone(policy.NextDelay(FakeResponse(403), {}, {403: RetryRule()}))
+        self.assertIsNone(policy.NextDelay(FakeResponse(503), {}, {503: None}))
+
+    def test_budget_exhausted(self):
+        policy = self.policy(budget=RetryBudget(max_retries=1))
+        self.assertIsNotNone(policy.NextDelay(FakeResponse(503), {}))
+        self.assertIsNone(policy.NextDelay(FakeResponse(503), {}))
+        self.assertEqual(policy.Statistics['budget-exhausted'], 1)
+
+    def test_execute(self):
+        policy = self.policy(jitter=False)
+        responses = [FakeResponse(503), FakeResponse(429, {'Retry-After': '2'}), FakeResponse(200)]
+        attempts = {}
+        self.assertEqual(policy.Execute(functools.partial(next, iter(responses)), attempts=attempts).status_code, 200)
+        self.assertEqual(self.waits, [1.0, 2.0])
+        self.assertTrue(responses[0].closed)
+        self.assertEqual(attempts, {503: 1, 429: 1})
+
+
+class TestRetriedRequests(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestRetriedRequests, self).setUp()
+        self.files.retry_policy = RetryPolicy(jitter=False)
+        self.waits = []
+        self.files.retry_policy.sleep = self.waits.append
+        self.server.files.AddObject(self.container, 'object', b'x')
+
+    def get_object(self):
+        return self.files.Request('GET', 'http://{0:}/object'.format(self.uri),
+                                  headers={'X-Auth-Token': self.files.authenticator.AuthToken})
+
+    def test_retry_after(self):
+        self.server.behavior.FailNext(503, count=2, method='GET', path='object$', retry_after=3)
+        self.assertEqual(self.get_object().status_code, 200)
+        self.assertEqual(self.waits, [3.0, 3.0])
+
+    def test_gives_up(self):
+        self.server.behavior.FailNext(503, count=10, method='GET', path='object$', retry_after=0)
+        self.assertEqual(self.get_object().status_code, 503)
+        self.assertEqual(self.files.retry_policy.Statistics['retries'], 5)
@@ -0,0 +1,151 @@
+"""
+Rackspace Cloud Backup API
+The token cache shared between processes and the file lock protecting it
+"""
+import datetime
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from cloudbackup.client.auth import Authentication
+from cloudbackup.client.token_cache import TokenCache, token_expiration
+from cloudbackup.tests.services.server import FakeCloudServer
+from cloudbackup.utils.filelock import FileLock, FileLockTimeout
+
+
+def auth_data(token, expires):
+    """
+    Identity response holding token, expiring at expires (seconds since the epoch)
+    """
+    expiration = datetime.datetime.utcfromtimestamp(expires).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    return {'access': {'token': {'id': token, 'expires': expiration}}}
+
+
+class TestTokenExpiration(unittest.TestCase):
+
+    def test_formats(self):
+        expected = 1387893746
+        for expires in ('2013-12-24T14:02:26.550Z', '2013-12-24T14:02:26Z', '2013-12-24T14:02:26'):
+            self.assertEqual(token_expiration({'access': {'token': {'expires': expires}}}), expected)
+
+    def test_invalid(self):
+        self.assertIsNone(token_expiration({}))
+        self.assertIsNone(token_expiration(None))
+        self.assertIsNone(token_expiration({'access': {'token': {'expires': 'tomorrow'}}}))
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='cloudbackup-test-')
+        self.path = os.path.join(self.directory, 'cache', 'token-cache.json')
+        self.cache = TokenCache(self.path, margin=60, lock_timeout=0.2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class TestTokenCache(TokenCacheTestCase):
+
+    def test_key(self):
+        key = TokenCache.Key('user', 'user', 'apikey', 'us', 'secret')
+        self.assertEqual(key, TokenCache.Key('user', 'user', 'apikey', 'us', 'secret'))
+        self.assertNotEqual(key, TokenCache.Key('user', 'user', 'apikey', 'us', 'changed'))
+        self.assertNotEqual(key, TokenCache.Key('user', 'user', 'apikey', 'uk', 'secret'))
+
+    def test_round_trip(self):
+        data = auth_data('token', time.time() + 3600)
+        self.assertIsNone(self.cache.Load('key'))
+        self.assertTrue(self.cache.Store('key', data))
+        self.assertEqual(TokenCache(self.path).Load('key'), data)
+
+    def test_expiration_margin(self):
+        self.assertTrue(self.cache.Store('key', auth_data('token', time.time() + 30)))
+        self.assertIsNone(self.cache.Load('key'))
+        self.assertFalse(self.cache.Store('key', {'access': {'token': {'id': 'token'}}}))
+
+    def test_expired_entries_dropped(self):
+        self.cache.Store('expiring', auth_data('token', time.time() + 3600))
+        self.cache.margin = 7200
+        self.cache.Store('key', auth_data('token', time.time() + 86400))
+        self.cache.margin = 0
+        self.assertIsNone(self.cache.Load('expiring'))
+        self.assertIsNotNone(self.cache.Load('key'))
+
+    def test_invalidate(self):
+        self.cache.Store('key', auth_data('renewed', time.time() + 3600))
+        # another process already replaced the rejected token
+        self.assertFalse(self.cache.Invalidate('key', 'rejected'))
+        self.assertIsNotNone(self.cache.Load('key'))
+        self.assertTrue(self.cache.Invalidate('key', 'renewed'))
+        self.assertIsNone(self.cache.Load('key'))
+        self.assertFalse(self.cache.Invalidate('key'))
+
+    def test_corrupt_file(self):
+        self.cache.Store('key', auth_data('token', time.time() + 3600))
+        with open(self.path, 'w') as cache_file:
+            cache_file.write('{"key": ')
+        self.assertIsNone(self.cache.Load('key'))
+        self.assertTrue(self.cache.Store('key', auth_data('token', time.time() + 3600)))
+        self.assertIsNotNone(self.cache.Load('key'))
+
+    def test_locked_elsewhere(self):
+        self.cache.Store('key', auth_data('token', time.time() + 3600))
+        with FileLock(self.path + '.lock'):
+            # treated as a cache miss rather than waiting forever
+            self.assertIsNone(self.cache.Load('key'))
+            self.assertFalse(self.cache.Store('key', auth_data('token', time.time() + 3600)))
+
+    @unittest.skipIf(os.name == 'nt', 'POSIX permissions')
+    def test_permissions(self):
+        self.cache.Store('key', auth_data('token', time.time() + 3600))
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+
+class TestFileLock(TokenCacheTestCase):
+
+    def test_exclusive(self):
+        path = os.path.join(self.directory, 'test.lock')
+        with FileLock(path) as lock:
+            self.assertTrue(lock.IsLocked)
+            other = FileLock(path, timeout=0.1)
+            self.assertRaises(FileLockTimeout, other.Acquire)
+            self.assertFalse(other.IsLocked)
+        self.assertFalse(lock.IsLocked)
+        with FileLock(path, timeout=0.1) as other:
+            self.assertTrue(other.IsLocked)
+
+
+class TestSharedToken(TokenCacheTestCase):
+
+    def setUp(self):
+        super(TestSharedToken, self).setUp()
+        self.server = FakeCloudServer()
+        self.server.Start()
+
+    def tearDown(self):
+        self.server.Stop()
+        super(TestSharedToken, self).tearDown()
+
+    def authentication(self, apikey='key'):
+        return self.server.Attach(Authentication('user', apikey, token_cache=TokenCache(self.path)))
+
+    def test_token_shared(self):
+        token = self.authentication().AuthToken
+        self.assertEqual(self.authentication().AuthToken, token)
+        self.assertEqual(self.server.identity.Statistics['tokens-issued'], 1)
+
+    def test_changed_credentials(self):
+        self.authentication().AuthToken
+        self.authentication(apikey='other').AuthToken
+        self.assertEqual(self.server.identity.Statistics['tokens-issued'], 2)
+
+    def test_invalidated_token(self):
+        first = self.authentication()
+        token = first.AuthToken
+        first.InvalidateToken(token)
+        self.assertNotEqual(self.authentication().AuthToken, token)
+        self.assertEqual(self.server.identity.Statistics['tokens-issued'], 2)
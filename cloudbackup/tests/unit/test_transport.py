@@ -0,0 +1,84 @@
+"""
+Rackspace Cloud Backup API
+The pooled transport and the coalescing of identical requests
+"""
+import threading
+import unittest
+
+from cloudbackup.common.ratelimit import RateLimiter
+from cloudbackup.common.transport import Transport, coalesce_key
+from cloudbackup.tests.unit.test_cloud_files import CloudFilesTestCase
+
+URI = 'https://api.example.com/v2/123456/agents'
+
+
+class TestCoalesceKey(unittest.TestCase):
+
+    def test_identical_requests(self):
+        self.assertEqual(coalesce_key('GET', URI, {'headers': {'A': '1', 'B': '2'}}),
+                         coalesce_key('get', URI, {'headers': {'B': '2', 'A': '1'}}))
+        self.assertNotEqual(coalesce_key('GET', URI, {'headers': {'X-Auth-Token': 'a'}}),
+                            coalesce_key('GET', URI, {'headers': {'X-Auth-Token': 'b'}}))
+
+    def test_not_coalesced(self):
+        self.assertIsNone(coalesce_key('POST', URI, {}))
+        self.assertIsNone(coalesce_key('GET', URI, {'stream': True}))
+        self.assertIsNone(coalesce_key('GET', URI, {'data': b'body'}))
+
+
+class TestCoalescing(CloudFilesTestCase):
+
+    def setUp(self):
+        super(TestCoalescing, self).setUp()
+        self.files.transport = Transport()
+        self.server.files.AddObject(self.container, 'object', b'x' * 1000)
+        # keeps the first request in flight while the others are issued
+        self.server.behavior.latency = 0.5
+
+    def tearDown(self):
+        self.files.transport.close()
+        super(TestCoalescing, self).tearDown()
+
+    def get_objects(self, count):
+        responses = []
+
+        def get_object():
+            responses.append(self.files.Request('GET', 'http://{0:}/object'.format(self.uri),
+                                                headers={'X-Auth-Token': self.files.authenticator.AuthToken}))
+
+        threads = [threading.Thread(target=get_object) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_identical_requests(self):
+        # authenticate first so that only the object requests are counted
+        self.files.authenticator.AuthToken
+        requests = self.server.behavior.Statistics['requests']
+        responses = self.get_objects(4)
+        self.assertEqual([response.content for response in responses], [b'x' * 1000] * 4)
+        statistics = self.files.transport.Statistics
+        self.assertEqual(statistics['requests'] + statistics['coalesced'], 4)
+        self.assertGreater(statistics['coalesced'], 0)
+        self.assertEqual(self.server.behavior.Statistics['requests'] - requests, statistics['requests'])
+
+    def test_tokens_taken_upstream(self):
+        limiter = RateLimiter(read_rate=100.0, write_rate=100.0)
+        self.files.RateLimiter = limiter
+        self.server.behavior.FailNext(429, count=1, method='GET', path='object$', retry_after=0)
+        self.get_objects(4)
+        statistics = self.files.transport.Statistics
+        self.assertGreater(statistics['coalesced'], 0)
+        # one token and one feedback per request actually sent
+        self.assertEqual(limiter.Statistics['requests'], statistics['requests'])
+        self.assertEqual(limiter.Statistics['throttled'], 1)
+
+    def test_failed_request_shared(self):
+        self.server.behavior.FailNext(404, count=1, method='GET', path='object$')
+        responses = self.get_objects(3)
+        statistics = self.files.transport.Statistics
+        coalesced = statistics['coalesced']
+        self.assertGreater(coalesced, 0)
+        self.assertEqual([response.status_code for response in responses].count(404), coalesced + 1)
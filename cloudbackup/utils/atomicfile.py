@@ -0,0 +1,75 @@
+"""
+Atomic File Replacement Utility
+
+Writes a file under a temporary name in its directory and moves it over
+the destination once complete, so that readers (and a crash) see either
+the previous or the new content but never a partially written file.
+"""
+import os
+import tempfile
+
+
+def replace_file(source, destination):
+    """
+    Rename source to destination, replacing destination if it exists
+
+    os.replace() is atomic on POSIX and Windows; without it (Python 2) Windows
+    cannot rename over an existing file, so the destination is removed first.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(source, destination)
+    else:
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
+class AtomicFile(object):
+    """
+    File written under a temporary name and moved over path once complete
+      path - file to write
+      mode - mode the temporary file is opened with, 'w' or 'wb'
+      prefix - prefix of the temporary file created in the directory of path
+      permissions - (optional) permission bits given to the file, e.g. 0o600
+
+    Usable as a context manager returning the open temporary file:
+
+        with AtomicFile('/tmp/state.json') as state_file:
+            json.dump(state, state_file)
+
+    path is only replaced when the block completes; if it raises, the temporary
+    file is removed and path is left untouched.
+    """
+
+    def __init__(self, path, mode='w', prefix='.tmp-', permissions=None):
+        self.path = path
+        self.mode = mode
+        self.prefix = prefix
+        self.permissions = permissions
+        self.temporary = None
+        self.file = None
+
+    def __enter__(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, self.temporary = tempfile.mkstemp(prefix=self.prefix, dir=directory)
+        try:
+            self.file = os.fdopen(fd, self.mode)
+        except Exception:
+            os.close(fd)
+            os.remove(self.temporary)
+            raise
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        replaced = False
+        try:
+            self.file.close()
+            if exc_type is None:
+                if self.permissions is not None:
+                    os.chmod(self.temporary, self.permissions)
+                replace_file(self.temporary, self.path)
+                replaced = True
+        finally:
+            if not replaced and os.path.exists(self.temporary):
+                os.remove(self.temporary)
+        return False
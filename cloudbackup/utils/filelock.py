@@ -0,0 +1,108 @@
+"""
+Inter-process File Locking Utility
+
+Advisory lock on a file shared by several processes, using fcntl on
+POSIX platforms and msvcrt on Windows.
+"""
+import errno
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLockTimeout(Exception):
+    pass
+
+
+class FileLock(object):
+    """
+    Exclusive advisory lock held on a lock file
+      path - lock file to use; created if it does not exist
+      timeout - (optional) seconds to wait for the lock, None to wait forever
+      poll - seconds between attempts while the lock is held elsewhere
+
+    Usable as a context manager:
+
+        with FileLock('/tmp/some.lock'):
+            ...
+
+    Note: The lock is per-process; threads of the same process must
+        serialize using their own locks.
+    """
+
+    def __init__(self, path, timeout=None, poll=0.05):
+        self.log = logging.getLogger(__name__)
+        self.path = path
+        self.timeout = timeout
+        self.poll = poll
+        self.fd = None
+
+    @property
+    def IsLocked(self):
+        """
+        Whether the lock is held by this object
+        """
+        return self.fd is not None
+
+    def __TryLock(self, fd):
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except (IOError, OSError) as ex:
+            if ex.errno in (errno.EACCES, errno.EAGAIN, errno.EDEADLK):
+                return False
+            raise
+
+    def Acquire(self):
+        """
+        Acquire the lock, waiting up to the timeout
+
+        Raises FileLockTimeout if the lock could not be acquired in time
+        """
+        if self.fd is not None:
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = None if self.timeout is None else time.time() + self.timeout
+        try:
+            while not self.__TryLock(fd):
+                if deadline is not None and time.time() >= deadline:
+                    raise FileLockTimeout('Unable to lock {0:} within {1:} seconds'.format(self.path, self.timeout))
+                time.sleep(self.poll)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def Release(self):
+        """
+        Release the lock if it is held
+        """
+        if self.fd is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        except (IOError, OSError) as ex:
+            self.log.error('Unable to unlock {0:}: {1:}'.format(self.path, str(ex)))
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        self.Acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Release()
@@ -0,0 +1,114 @@
+"""
+Rackspace Cloud Backup Streaming Decompression
+
+Decompresses gzip data as it is received, without writing the compressed
+data to disk first.
+"""
+import hashlib
+import zlib
+
+from cloudbackup.common.durability import DurableFileWriter
+
+
+class GunzipWriter(object):
+    """
+    Decompresses a gzip stream into a file as it is written
+      path - file receiving the decompressed data
+      gzip_path - (optional) file also receiving the compressed data as is
+      durability - (optional) cloudbackup.common.durability.Durability of the file(s)
+
+    The MD5 and SHA-1 of both the compressed and the decompressed data are
+    computed in the same pass. Unlike the gzip module, zlib handles streams of
+    any size. Files of several concatenated gzip members are decompressed as a
+    whole, as gunzip does.
+    """
+
+    def __init__(self, path, gzip_path=None, durability=None):
+        self.path = path
+        self.gzip_path = gzip_path
+        self.output = DurableFileWriter(path, durability)
+        self.gzip_output = DurableFileWriter(gzip_path, durability) if gzip_path is not None else None
+        self.decompressor = self.__NewDecompressor()
+        self.compressed_md5 = hashlib.md5()
+        self.compressed_sha1 = hashlib.sha1()
+        self.md5 = hashlib.md5()
+        self.sha1 = hashlib.sha1()
+        self.compressed_bytes = 0
+        self.bytes = 0
+
+    @staticmethod
+    def __NewDecompressor():
+        # 16 + MAX_WBITS: expect a gzip header and trailer
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def __Output(self, data):
+        if len(data):
+            self.output.write(data)
+            self.md5.update(data)
+            self.sha1.update(data)
+            self.bytes += len(data)
+
+    def Write(self, data):
+        """
+        Add the next bytes of the gzip stream
+        """
+        if not len(data):
+            return
+        if self.gzip_output is not None:
+            self.gzip_output.write(data)
+        self.compressed_md5.update(data)
+        self.compressed_sha1.update(data)
+        self.compressed_bytes += len(data)
+        while len(data):
+            self.__Output(self.decompressor.decompress(data))
+            data = self.decompressor.unused_data
+            if len(data):
+                # the member ended and another one follows
+                self.__Output(self.decompressor.flush())
+                self.decompressor = self.__NewDecompressor()
+
+    def Close(self):
+        """
+        Finish the decompression and write out the file(s)
+
+        Raises IOError if the gzip stream is incomplete
+        """
+        try:
+            self.__Output(self.decompressor.flush())
+            # Python 2 decompressors do not tell whether the stream is complete
+            if not getattr(self.decompressor, 'eof', True) and self.compressed_bytes:
+                raise IOError('Compressed data ended before the end of the gzip stream')
+            for output in (self.output, self.gzip_output):
+                if output is not None:
+                    output.close()
+        finally:
+            self.Abort()
+
+    def Abort(self):
+        """
+        Close the file(s) without finishing the decompression
+        """
+        for output in (self.output, self.gzip_output):
+            if output is not None:
+                output.Abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Close()
+        else:
+            self.Abort()
+
+    @property
+    def Digests(self):
+        """
+        Dictionary of the hex digests: 'md5', 'sha1', 'compressed-md5', 'compressed-sha1'
+        """
+        return {
+            'md5': self.md5.hexdigest(),
+            'sha1': self.sha1.hexdigest(),
+            'compressed-md5': self.compressed_md5.hexdigest(),
+            'compressed-sha1': self.compressed_sha1.hexdigest()
+        }
@@ -29,7 +29,8 @@ def parse_version():
 
 REQUIRES=[
     'pytz==2013.9',
-    'requests>=2.3.0',
+    'requests>=2.20.0',
+    'urllib3>=1.24',
     'tzlocal==1.1.1'
 ]
 
@@ -48,6 +49,10 @@ setup(
     packages=find_packages(),
     zip_safe=False,
     install_requires=REQUIRES,
+    # cloudbackup.aio (async/await API classes) requires Python 3.5.3 or newer
+    extras_require={
+        'aio:python_full_version >= "3.5.3"': ['aiohttp>=3.0']
+    },
     include_package_data=True,
     classifiers=[
         'Development Status :: 4 - Beta',